@@ -1,12 +1,25 @@
 # Usage:
 #   python3 -u hide.py --debug --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
 #   python3 -u hide.py --debug --dry-run --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
-#   python3 -c hide.py
+#   python3 -u hide.py --estimate --model=gpt-4.1-mini --concurrency=8 ../test-data/needle.txt ../test-data/haystack.txt
+#   python3 -u hide.py --ecc=8 --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   python3 -u hide.py --bits-per-sentence=2 --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   python3 -u hide.py --model-cascade=gpt-4.1-mini,gpt-5.1 --escalate-after=2 --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   python3 -u hide.py --hedge-percentile=95 --max-hedge-ratio=0.1 --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   python3 -u hide.py --batch-mode --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   python3 -u hide.py --job-dir=job --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   python3 -u hide.py --resume=job --verbose --token="/home/dev/.token"
+#   python3 -u hide.py --index --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   python3 -u hide.py --durability=default --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   python3 -u hide.py --stream --concurrency=8 --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   python3 -u hide.py --jobs=manifest.jsonl --report=report.jsonl --requests-per-minute=500 --verbose --token="/home/dev/.token"
+#   python3 -u hide.py --shard-dir=/mnt/shared/hide --shard-workers=0 ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   python3 -u hide.py --shard-dir=/mnt/shared/hide --shard-workers=4 --verbose --token="/home/dev/.token"
+#   python3 -u hide.py --profile=profile.json --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#
+# This script is a shortcut for "whisper hide" (see whisper.cli), that does not require the package to be installed.
+# The default debug directory and token file are located next to this script.
 
-from typing import Optional
-import argparse
-from pathlib import Path
-import shutil
 import sys
 import os
 
@@ -14,102 +27,10 @@ CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
 SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
 sys.path.insert(0, SEARCH_PATH)
 
-from whisper.whisperer import HiderConfiguration, Hider
-import whisper.api_tools
-
-def get_script_dir() -> Path:
-    """Returns the path to the directory containing the script."""
-    return Path(__file__).resolve().parent
-
-def init_env(debug_path: Optional[Path]) -> None:
-    if debug_path is None:
-        return
-    if debug_path.exists():
-        for child in debug_path.iterdir():
-            if child.is_file():
-                child.unlink()
-            elif child.is_dir():
-                shutil.rmtree(child)
-    else:
-        debug_path.mkdir(parents=True, exist_ok=True)
+from whisper.cli import main
 
 
 if __name__ == '__main__':
-    script_dir: Path = get_script_dir()
-    default_debug_path: str = script_dir.joinpath("debug").__str__()
-    default_tokens_path: str = script_dir.joinpath(".token").__str__()
-    default_model: str = 'gpt-5.1'
-
-    # Parse the command line arguments
-    parser = argparse.ArgumentParser(description='Hide a text file within a generated text file.')
-    parser.add_argument('--verbose',
-                        dest='verbose_flag',
-                        action='store_true',
-                        help='activate verbose output')
-    parser.add_argument('--dry-run',
-                        dest='dry_run_flag',
-                        action='store_true',
-                        help='dry-run flag')
-    parser.add_argument('--debug',
-                        dest='debug_flag',
-                        action='store_true',
-                        help='debug flag')
-    parser.add_argument('--debug-dir',
-                        dest='debug_dir',
-                        type=str,
-                        required=False,
-                        default=default_debug_path,
-                        help='path to the directory used to store DEBUG data (default: "{}")'.format(default_debug_path))
-    parser.add_argument('--model',
-                        dest='model',
-                        type=str,
-                        required=False,
-                        default=default_model,
-                        help='name of the model to use (ex: "gpt-5.1", "gpt-4.1", "gpt-4.1-mini"...) - default: "{}"'.format(default_model))
-    parser.add_argument('--token',
-                        dest='token',
-                        type=str,
-                        required=False,
-                        default=default_tokens_path,
-                        help='path to the file containing the token to use for ChatGPT API (default: "{}")'.format(default_tokens_path))
-    parser.add_argument('needle',
-                        type=str,
-                        help='path to the text file to hide')
-    parser.add_argument('haystack',
-                        type=str,
-                        help='path to the text file used as a "haystack" for hiding')
-    parser.add_argument('output',
-                        type=str,
-                        help='path to the output file')
-
-    args = parser.parse_args()
-    verbose_flag: bool = args.verbose_flag
-    dry_run_flag: bool = args.dry_run_flag
-    debug_flag: bool = args.debug_flag
-    debug_dir: str = args.debug_dir
-    needle_path: str = args.needle
-    haystack_path: str = args.haystack
-    output_path: str = args.output
-    model: str = args.model
-    token_path: str = args.token
-
-    # Load the API token
-    try:
-        token: str = whisper.api_tools.load_token(token_path)
-    except Exception as e:
-        print('Error loading token file "{}": {}'.format(token_path, str(e)))
-        exit(1)
-
-    # Call the Whisperer
-    options: HiderConfiguration = HiderConfiguration(model,
-                                                     token,
-                                                     Path(debug_dir) if debug_dir else None,
-                                                     verbose_flag,
-                                                     dry_run_flag)
-    init_env(options.debug_path)
-    hider: Hider = Hider(needle_path, haystack_path, output_path, options)
-    try:
-        hider.hide()
-    finally:
-        if not debug_flag:
-            hider.destroy()
+    sys.exit(main(['hide',
+                   '--debug-dir={}'.format(os.path.join(CURRENT_DIR, 'debug')),
+                   '--token={}'.format(os.path.join(CURRENT_DIR, '.token'))] + sys.argv[1:]))
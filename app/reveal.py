@@ -1,7 +1,12 @@
 # Usage:
 #   python3 -u reveal.py --verbose ../test-data/murmur.txt message.txt
+#   python3 -u reveal.py --bulk="murmurs/*.txt" --workers=8 --report=report.jsonl needles
+#   python3 -u reveal.py --profile=profile.json ../test-data/murmur.txt message.txt
+#   python3 -u reveal.py --ecc=8 murmur.txt message.txt
+#   python3 -u reveal.py --bits-per-sentence=2 murmur.txt message.txt
+#
+# This script is a shortcut for "whisper reveal" (see whisper.cli), that does not require the package to be installed.
 
-import argparse
 import sys
 import os
 
@@ -9,29 +14,8 @@ CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
 SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
 sys.path.insert(0, SEARCH_PATH)
 
-from whisper.whisperer import Revealer
+from whisper.cli import main
 
 
 if __name__ == '__main__':
-
-    # Parse the command line arguments
-    parser = argparse.ArgumentParser(description='Reveal a text file hidden within another text file')
-    parser.add_argument('--verbose',
-                        dest='verbose_flag',
-                        action='store_true',
-                        help='activate verbose output')
-    parser.add_argument('murmur',
-                        type=str,
-                        help='path to the text file used as hiding place')
-    parser.add_argument('output',
-                        type=str,
-                        help='path to the output file')
-
-    args = parser.parse_args()
-    verbose_flag: bool = args.verbose_flag
-    murmur_path: str = args.murmur
-    output_path: str = args.output
-
-    revealer = Revealer(murmur_path, output_path, verbose_flag)
-    revealer.reveal()
-
+    sys.exit(main(['reveal'] + sys.argv[1:]))
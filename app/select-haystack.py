@@ -0,0 +1,18 @@
+# Usage:
+#   python3 -u select-haystack.py ../test-data/needle.txt corpora/ --top=10
+#   python3 -u select-haystack.py ../test-data/needle.txt corpora/ --index-dir=/var/cache/whisper --bits-per-sentence=2 --offsets=100 --json
+#
+# This script is a shortcut for "whisper select-haystack" (see whisper.cli), that does not require the package to be installed.
+
+import sys
+import os
+
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.cli import main
+
+
+if __name__ == '__main__':
+    sys.exit(main(['select-haystack'] + sys.argv[1:]))
@@ -0,0 +1,461 @@
+# Usage:
+#   python3 -u bench.py --haystack-size=1MB --needle-size=256 --save=results.json
+#   python3 -u bench.py --haystack-size=1MB --compare=baseline.json --threshold=0.2
+#   python3 -u bench.py --only=read_sentences,reveal --haystack-size=100MB
+#   python3 -u bench.py --only=db_default,db_ephemeral,db_durable --haystack-size=10MB
+#   python3 -u bench.py --only=json_pretty,json_stdlib,json_orjson,json_msgspec --haystack-size=10MB
+#   python3 -u bench.py --only=stegano_db_load,index_build,stegano_db_load_index --haystack-size=10MB
+#   python3 -u bench.py --only=select_haystack --haystack-size=100MB
+
+from typing import Any, Callable, Optional
+from dataclasses import dataclass
+from pathlib import Path
+import argparse
+import datetime
+import gc
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import os
+
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+sys.path.insert(0, CURRENT_DIR)
+
+from generator import generate_haystack, generate_needle, generate_murmur, parse_size
+from fake_llm import FakeLLM
+from import_time import measure_import, TARGETS
+from whisper import codec
+from whisper.configuration import HiderConfiguration
+from whisper.conversion import Conversion
+from whisper.disk_list import DiskList
+from whisper.durability import DURABILITY_DEFAULT, DURABILITY_EPHEMERAL, DURABILITY_DURABLE
+from whisper.haystack_index import HaystackIndex
+from whisper.haystack_selector import HaystackSelector
+from whisper.prompts import PROMPTS_PER_REQUEST, build_request_messages
+from whisper.request_data import RequestData
+from whisper.revealer import Revealer
+from whisper.sentence import Sentence
+from whisper.stegano_db import SteganoDb
+from whisper.text_file_tool import read_sentences_from_file
+
+RESULTS_VERSION: int = 1
+# The default maximum slowdown (ratio) tolerated before a benchmark is reported as a regression
+DEFAULT_THRESHOLD: float = 0.2
+
+
+@dataclass
+class Context:
+    work_dir: Path
+    haystack: str
+    needle: str
+    murmur: str
+    haystack_size: int
+    needle_size: int
+
+
+def measure(function: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    """Run a function `repeat` times. Return the best duration and the result of the last run."""
+    best: Optional[float] = None
+    result: Any = None
+    for _ in range(repeat):
+        gc.collect()
+        start: float = time.perf_counter()
+        result = function()
+        duration: float = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best if best is not None else 0.0, result
+
+
+def rates(seconds: float, items: int, size: Optional[int] = None) -> dict[str, Any]:
+    result: dict[str, Any] = {'seconds': round(seconds, 6), 'items': items, 'items_per_second': round(items / seconds, 3) if seconds > 0 else None}
+    if size is not None:
+        result['bytes_per_second'] = round(size / seconds, 3) if seconds > 0 else None
+    return result
+
+
+# The benchmarks
+
+def bench_read_sentences(ctx: Context, repeat: int) -> dict[str, Any]:
+    seconds, count = measure(lambda: sum(1 for _ in read_sentences_from_file(ctx.haystack)), repeat)
+    return rates(seconds, count, ctx.haystack_size)
+
+
+def bench_stegano_db_load(ctx: Context, repeat: int) -> dict[str, Any]:
+    def load() -> int:
+        db_path: Path = ctx.work_dir.joinpath('stegano-db.sqlite')
+        if db_path.exists():
+            db_path.unlink()
+        db: SteganoDb = SteganoDb(str(db_path))
+        try:
+            return db.load_file(ctx.haystack)
+        finally:
+            db.destroy()
+
+    seconds, count = measure(load, repeat)
+    return rates(seconds, count, ctx.haystack_size)
+
+
+def bench_index_build(ctx: Context, repeat: int) -> dict[str, Any]:
+    def build() -> int:
+        with HaystackIndex.build(ctx.haystack, str(ctx.work_dir.joinpath('haystack.index'))) as index:
+            return len(index)
+
+    seconds, count = measure(build, repeat)
+    return rates(seconds, count, ctx.haystack_size)
+
+
+def bench_stegano_db_load_index(ctx: Context, repeat: int) -> dict[str, Any]:
+    # The index is built once (the first hide), then reused: open the index (hash of the haystack) and load the database
+    HaystackIndex.open(ctx.haystack, ctx.work_dir).close()
+
+    def load() -> int:
+        db_path: Path = ctx.work_dir.joinpath('stegano-db.sqlite')
+        if db_path.exists():
+            db_path.unlink()
+        db: SteganoDb = SteganoDb(str(db_path))
+        try:
+            with HaystackIndex.open(ctx.haystack, ctx.work_dir) as index:
+                return db.load_index(index)
+        finally:
+            db.destroy()
+
+    seconds, count = measure(load, repeat)
+    return rates(seconds, count, ctx.haystack_size)
+
+
+def bench_select_haystack(ctx: Context, repeat: int) -> dict[str, Any]:
+    # The index is built once: the selection only reads the parity bitmaps (XOR and popcount of the needle bitmap)
+    HaystackIndex.open(ctx.haystack, ctx.work_dir).close()
+    selector: HaystackSelector = HaystackSelector(ctx.needle, index_dir=ctx.work_dir)
+    seconds, _ = measure(lambda: selector.select([ctx.haystack]), repeat)
+    return rates(seconds, 1, ctx.haystack_size)
+
+
+def bench_durability(durability: str) -> Callable[[Context, int], dict[str, Any]]:
+    """
+    Return the benchmark of the databases of the hider under a durability profile: load the haystack, update each
+    sentence (one commit per update, as the hider does), dump the database, and append one request per sentence.
+    """
+    def bench(ctx: Context, repeat: int) -> dict[str, Any]:
+        stages: dict[str, float] = {}
+
+        def timed(name: str, function: Callable[[], Any]) -> Any:
+            start: float = time.perf_counter()
+            result: Any = function()
+            stages[name] = min(stages.get(name, float('inf')), time.perf_counter() - start)
+            return result
+
+        def run_profile() -> int:
+            # The databases are created without a path: the ephemeral ones are placed on a tmpfs, as in the hider
+            db: SteganoDb = SteganoDb(durability=durability)
+            requests: DiskList = DiskList(durability=durability)
+            try:
+                count: int = timed('load', lambda: db.load_file(ctx.haystack))
+                timed('update', lambda: [db.set_reformulation_by_position(p, 'One two three.', 1) for p in range(count)])
+                timed('dump', lambda: sum(1 for _ in db.dump_lines()))
+                timed('append', lambda: [requests.append('{"positions": [0]}') for _ in range(count)])
+                return count
+            finally:
+                db.destroy()
+                requests.destroy()
+
+        seconds, count = measure(run_profile, repeat)
+        result: dict[str, Any] = rates(seconds, count, ctx.haystack_size)
+        result['stages'] = {name: rates(stage_seconds, count) for name, stage_seconds in stages.items()}
+        return result
+
+    return bench
+
+
+def bench_json(name: Optional[str]) -> Callable[[Context, int], dict[str, Any]]:
+    """
+    Return the benchmark of a JSON codec: serialize and deserialize the requests of the hider (one per batch of
+    PROMPTS_PER_REQUEST sentences of the haystack), as they are stored into the DiskList and read before each call.
+    The name None stands for the pretty-printed form (indented, sorted keys) used before the codecs.
+    """
+    def bench(ctx: Context, repeat: int) -> dict[str, Any]:
+        json_codec: Optional[codec.JsonCodec] = codec.get_codec(name) if name is not None else None
+        sentences: list[str] = list(read_sentences_from_file(ctx.haystack))
+        requests: list[dict[str, Any]] = []
+        for start in range(0, len(sentences), PROMPTS_PER_REQUEST):
+            batch: list[tuple[int, str]] = list(enumerate(sentences[start:start + PROMPTS_PER_REQUEST], start))
+            requests.append(RequestData.from_dict({'positions': [p for p, _ in batch], 'messages': build_request_messages(batch)}).to_dict())
+        dumps: Callable[[Any], str] = json_codec.dumps if json_codec is not None else codec.dumps_pretty
+        loads: Callable[[str], Any] = json_codec.loads if json_codec is not None else json.loads
+        seconds, _ = measure(lambda: sum(len(loads(dumps(request))['messages']) for request in requests), repeat)
+        return rates(seconds, len(requests))
+
+    return bench
+
+
+def bench_sentence(ctx: Context, repeat: int) -> dict[str, Any]:
+    sentences: list[str] = list(read_sentences_from_file(ctx.haystack))
+    seconds, _ = measure(lambda: [len(Sentence(s).get_words()) % 2 for s in sentences], repeat)
+    return rates(seconds, len(sentences))
+
+
+def bench_conversion(ctx: Context, repeat: int) -> dict[str, Any]:
+    with open(ctx.needle, 'rb') as f:
+        needle: bytes = f.read()
+
+    def convert() -> None:
+        bits = Conversion.int64_to_bit_list(Conversion.bit_list_to_int64(Conversion.int64_to_bit_list(len(needle)))) + Conversion.bytes_to_bit_list(needle)
+        Conversion.bit_list_to_bytes(bits[64:])
+
+    seconds, _ = measure(convert, repeat)
+    return rates(seconds, len(needle))
+
+
+def bench_reveal(ctx: Context, repeat: int) -> dict[str, Any]:
+    output: str = str(ctx.work_dir.joinpath('revealed.txt'))
+    seconds, _ = measure(lambda: Revealer(ctx.murmur, output).reveal(), repeat)
+    return rates(seconds, ctx.needle_size)
+
+
+def bench_reveal_general(ctx: Context, repeat: int) -> dict[str, Any]:
+    output: str = str(ctx.work_dir.joinpath('revealed.txt'))
+    seconds, _ = measure(lambda: Revealer(ctx.murmur, output, fast=False).reveal(), repeat)
+    return rates(seconds, ctx.needle_size)
+
+
+def create_hider(ctx: Context, client: FakeLLM):
+    from whisper.whisperer import Hider
+    config: HiderConfiguration = HiderConfiguration('fake', 'fake', profile=True)
+    return Hider(ctx.needle, ctx.haystack, str(ctx.work_dir.joinpath('murmur.txt')), config, client=client)
+
+
+def bench_prompts_requests(ctx: Context, repeat: int) -> dict[str, Any]:
+    def create() -> int:
+        hider = create_hider(ctx, FakeLLM())
+        try:
+            hider.create_prompts()
+            hider.create_requests()
+            return len(hider.requests_db)
+        finally:
+            hider.destroy()
+
+    seconds, count = measure(create, repeat)
+    return rates(seconds, count)
+
+
+def bench_write_murmur(ctx: Context, repeat: int) -> dict[str, Any]:
+    hider = create_hider(ctx, FakeLLM())
+    try:
+        hider.hide()
+        seconds, _ = measure(hider.write_murmur, repeat)
+    finally:
+        hider.destroy()
+    return rates(seconds, ctx.needle_size, ctx.haystack_size)
+
+
+def bench_hide(ctx: Context, repeat: int) -> dict[str, Any]:
+    stages: dict[str, Any] = {}
+
+    def hide() -> int:
+        client: FakeLLM = FakeLLM(error_rate=0.02)
+        hider = create_hider(ctx, client)
+        try:
+            hider.hide()
+            stages.update(hider.profiler.report()['stages'])
+            return client.calls
+        finally:
+            hider.destroy()
+
+    seconds, calls = measure(hide, repeat)
+    result: dict[str, Any] = rates(seconds, ctx.needle_size, ctx.haystack_size)
+    result['llm_calls'] = calls
+    result['stages'] = stages
+    return result
+
+
+def bench_import_reveal(ctx: Context, repeat: int) -> dict[str, Any]:
+    # The import time is measured by the interpreter: the duration of the subprocess is not relevant
+    seconds: float = min(measure_import(TARGETS['reveal']['modules'])[0] for _ in range(repeat))
+    return rates(seconds, 1)
+
+
+BENCHMARKS: dict[str, Callable[[Context, int], dict[str, Any]]] = {
+    'read_sentences': bench_read_sentences,
+    'stegano_db_load': bench_stegano_db_load,
+    'index_build': bench_index_build,
+    'stegano_db_load_index': bench_stegano_db_load_index,
+    'select_haystack': bench_select_haystack,
+    'db_default': bench_durability(DURABILITY_DEFAULT),
+    'db_ephemeral': bench_durability(DURABILITY_EPHEMERAL),
+    'db_durable': bench_durability(DURABILITY_DURABLE),
+    'json_pretty': bench_json(None),
+    'json_stdlib': bench_json(codec.CODEC_JSON),
+    'json_orjson': bench_json(codec.CODEC_ORJSON),
+    'json_msgspec': bench_json(codec.CODEC_MSGSPEC),
+    'sentence': bench_sentence,
+    'conversion': bench_conversion,
+    'prompts_requests': bench_prompts_requests,
+    'write_murmur': bench_write_murmur,
+    'reveal': bench_reveal,
+    'reveal_general': bench_reveal_general,
+    'hide': bench_hide,
+    'import_reveal': bench_import_reveal
+}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=CURRENT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(haystack_size: int, needle_size: int, repeat: int = 3, only: Optional[list[str]] = None, seed: int = 0, verbose: bool = False) -> dict[str, Any]:
+    """
+    Generate the data and run the benchmarks.
+
+    :param haystack_size: The size of the haystack, in bytes.
+    :param needle_size: The size of the needle, in characters.
+    :param repeat: The number of runs of each benchmark (the best duration is kept).
+    :param only: The names of the benchmarks to run (default: all).
+    :param seed: The seed used to generate the data.
+    :param verbose: Verbose flag.
+    :return: The results.
+    """
+    names: list[str] = only if only is not None else list(BENCHMARKS.keys())
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError('Unknown benchmark "{}" (available: {})'.format(name, ', '.join(BENCHMARKS.keys())))
+    work_dir: Path = Path(tempfile.mkdtemp(prefix='whisper-bench-'))
+    current_dir: str = os.getcwd()
+    results: dict[str, Any] = {}
+    try:
+        # The temporary databases are created in the current directory
+        os.chdir(work_dir)
+        ctx: Context = Context(work_dir, str(work_dir.joinpath('haystack.txt')), str(work_dir.joinpath('needle.txt')), str(work_dir.joinpath('murmur-generated.txt')), haystack_size, needle_size)
+        sentences: int = generate_haystack(ctx.haystack, haystack_size, seed)
+        if 64 + 8 * needle_size > sentences:
+            raise ValueError('The haystack ({} sentences) is too small to hide a needle of {} characters'.format(sentences, needle_size))
+        generate_needle(ctx.needle, needle_size, seed)
+        with open(ctx.needle, 'rb') as f:
+            generate_murmur(ctx.murmur, f.read(), haystack_size, seed)
+        for name in names:
+            try:
+                results[name] = BENCHMARKS[name](ctx, repeat)
+            except ImportError as e:
+                # The hider needs the dependencies of the LLM client
+                results[name] = {'skipped': str(e)}
+            if verbose:
+                result: dict[str, Any] = results[name]
+                print('{:<18} {}'.format(name, 'skipped ({})'.format(result['skipped']) if 'skipped' in result else '{:.6f}s'.format(result['seconds'])), flush=True)
+    finally:
+        os.chdir(current_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        'version': RESULTS_VERSION,
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'haystack_size': haystack_size,
+        'needle_size': needle_size,
+        'repeat': repeat,
+        'seed': seed,
+        'benchmarks': results
+    }
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> list[dict[str, Any]]:
+    """
+    Compare two results. Return the regressions: the benchmarks that are more than `threshold` (ratio) slower.
+    Only the results obtained with the same data sizes are comparable.
+    """
+    if (baseline['haystack_size'], baseline['needle_size']) != (current['haystack_size'], current['needle_size']):
+        raise ValueError('The results have not been obtained with the same data sizes')
+    regressions: list[dict[str, Any]] = []
+    for name, result in current['benchmarks'].items():
+        reference: Optional[dict[str, Any]] = baseline['benchmarks'].get(name)
+        if reference is None or 'seconds' not in reference or 'seconds' not in result or reference['seconds'] == 0:
+            continue
+        ratio: float = result['seconds'] / reference['seconds']
+        if ratio > 1.0 + threshold:
+            regressions.append({'name': name, 'baseline': reference['seconds'], 'current': result['seconds'], 'ratio': round(ratio, 3)})
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the benchmarks of the hider and the revealer.')
+    parser.add_argument('--verbose',
+                        dest='verbose_flag',
+                        action='store_true',
+                        help='activate verbose output')
+    parser.add_argument('--haystack-size',
+                        dest='haystack_size',
+                        type=str,
+                        required=False,
+                        default='1MB',
+                        help='size of the generated haystack, from "1KB" to "1GB" (default: "1MB")')
+    parser.add_argument('--needle-size',
+                        dest='needle_size',
+                        type=str,
+                        required=False,
+                        default='256',
+                        help='size of the generated needle (default: 256 characters)')
+    parser.add_argument('--repeat',
+                        dest='repeat',
+                        type=int,
+                        required=False,
+                        default=3,
+                        help='number of runs of each benchmark, the best duration is kept (default: 3)')
+    parser.add_argument('--seed',
+                        dest='seed',
+                        type=int,
+                        required=False,
+                        default=0,
+                        help='seed used to generate the data (default: 0)')
+    parser.add_argument('--only',
+                        dest='only',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='comma-separated list of the benchmarks to run (available: {})'.format(', '.join(BENCHMARKS.keys())))
+    parser.add_argument('--save',
+                        dest='save',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the JSON file used to store the results')
+    parser.add_argument('--compare',
+                        dest='compare',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the JSON results used as a baseline (the script fails if a benchmark regressed)')
+    parser.add_argument('--threshold',
+                        dest='threshold',
+                        type=float,
+                        required=False,
+                        default=DEFAULT_THRESHOLD,
+                        help='maximum slowdown tolerated before a benchmark is reported as a regression (default: {})'.format(DEFAULT_THRESHOLD))
+    args = parser.parse_args()
+
+    current: dict[str, Any] = run(parse_size(args.haystack_size),
+                                  parse_size(args.needle_size),
+                                  args.repeat,
+                                  args.only.split(',') if args.only else None,
+                                  args.seed,
+                                  args.verbose_flag)
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=4)
+    if not args.verbose_flag:
+        print(json.dumps(current['benchmarks'], indent=4))
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            baseline: dict[str, Any] = json.load(f)
+        regressions: list[dict[str, Any]] = compare(baseline, current, args.threshold)
+        for regression in regressions:
+            print('REGRESSION: {} {:.6f}s -> {:.6f}s (x{})'.format(regression['name'], regression['baseline'], regression['current'], regression['ratio']))
+        if len(regressions) > 0:
+            exit(1)
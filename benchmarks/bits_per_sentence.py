@@ -0,0 +1,206 @@
+# Usage:
+#   python3 -u bits_per_sentence.py --needle-size=256
+#   python3 -u bits_per_sentence.py --needle-size=256 --error-rate=0.02 --miscount-rate=0.2 --save=bits-per-sentence.json
+#   python3 -u bits_per_sentence.py --needle-size=32 --bits=1,2 --model=gpt-4.1-mini --token=/home/dev/.token
+#
+# Compare the hides that conceal k bits into each sentence (the number of words modulo 2^k), for k = 1..3:
+# sentences of the haystack used, LLM calls, success rate of the reformulations (the sentences that have the
+# expected number of words at the first attempt), tokens, cost per byte of the needle and duration.
+# By default, the LLM is simulated (see FakeLLM): use --token to call the real LLM.
+
+from typing import Any, Optional
+from pathlib import Path
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+import os
+
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+sys.path.insert(0, CURRENT_DIR)
+
+from generator import generate_haystack, generate_needle, parse_size
+from fake_llm import FakeLLM
+from whisper.configuration import HiderConfiguration
+from whisper.pricing import ModelPricing, get_pricing, cost
+from whisper.revealer import Revealer
+
+DEFAULT_BITS: list[int] = [1, 2, 3]
+# The model used to price the tokens of the simulated LLM
+DEFAULT_MODEL: str = 'gpt-4.1-mini'
+
+
+def hide(needle: str, haystack: str, work_dir: Path, bits_per_sentence: int, model: str, token: Optional[str], client: Optional[FakeLLM]) -> dict[str, Any]:
+    """Hide the needle with `bits_per_sentence` bits per sentence, and return the measures."""
+    from whisper.whisperer import Hider
+    murmur: str = str(work_dir.joinpath('murmur-{}.txt'.format(bits_per_sentence)))
+    config: HiderConfiguration = HiderConfiguration(model, token if token is not None else 'fake', local_rewrite=False, profile=True, bits_per_sentence=bits_per_sentence)
+    start: float = time.perf_counter()
+    hider = Hider(needle, haystack, murmur, config, client=client)
+    try:
+        hider.hide()
+        prompts: int = sum(1 for _, _, prompt, _ in hider.stegano_db.iter_dump_rows() if prompt is not None)
+        report: dict[str, Any] = hider.profiler.report()
+        sentences: int = len(hider.message_symbols)
+        rows: int = len(hider.stegano_db)
+    finally:
+        hider.destroy()
+    seconds: float = time.perf_counter() - start
+    counters: dict[str, int] = report['counters']
+    retries: int = counters.get('retries', 0)
+    with open(needle, 'rb') as f:
+        expected: bytes = f.read()
+    revealed: bytes = Revealer(murmur, murmur + '.needle', bits_per_sentence=bits_per_sentence).decode()
+    tokens_in: int = counters.get('llm.tokens_in', 0)
+    tokens_out: int = counters.get('llm.tokens_out', 0)
+    pricing: Optional[ModelPricing] = get_pricing(model)
+    total_cost: Optional[float] = cost(pricing, tokens_in, tokens_out) if pricing is not None else None
+    return {
+        'bits_per_sentence': bits_per_sentence,
+        'sentences': sentences,
+        'rows': rows,
+        'llm_sentences': prompts,
+        'llm_calls': counters.get('llm.requests', 0),
+        'retries': retries,
+        'success_rate': round(prompts / (prompts + retries), 4) if prompts > 0 else None,
+        'tokens_in': tokens_in,
+        'tokens_out': tokens_out,
+        'cost': round(total_cost, 6) if total_cost is not None else None,
+        'cost_per_byte': round(total_cost / len(expected), 8) if total_cost is not None and len(expected) > 0 else None,
+        'seconds': round(seconds, 3),
+        'revealed': revealed == expected
+    }
+
+
+def run(haystack_size: int, needle_size: int, bits: list[int], model: str = DEFAULT_MODEL, token: Optional[str] = None,
+        error_rate: float = 0.0, miscount_rate: float = 0.0, seed: int = 0, verbose: bool = False) -> dict[str, Any]:
+    """
+    Generate the data and hide the needle once per number of bits per sentence.
+
+    :param haystack_size: The size of the haystack, in bytes.
+    :param needle_size: The size of the needle, in characters.
+    :param bits: The numbers of bits per sentence to compare.
+    :param model: The LLM model (used to price the tokens).
+    :param token: The API token. If None, the LLM is simulated (see FakeLLM).
+    :param error_rate: The probability that a simulated reformulation is wrong.
+    :param miscount_rate: The probability that a simulated reformulation with an exact number of words is one word off.
+    :param seed: The seed used to generate the data and the errors.
+    :param verbose: Verbose flag.
+    :return: The results.
+    """
+    work_dir: Path = Path(tempfile.mkdtemp(prefix='whisper-bits-'))
+    current_dir: str = os.getcwd()
+    results: list[dict[str, Any]] = []
+    try:
+        # The temporary databases are created in the current directory
+        os.chdir(work_dir)
+        haystack: str = str(work_dir.joinpath('haystack.txt'))
+        needle: str = str(work_dir.joinpath('needle.txt'))
+        sentences: int = generate_haystack(haystack, haystack_size, seed)
+        if 64 + 8 * needle_size > sentences * min(bits):
+            raise ValueError('The haystack ({} sentences) is too small to hide a needle of {} characters'.format(sentences, needle_size))
+        generate_needle(needle, needle_size, seed)
+        for k in bits:
+            client: Optional[FakeLLM] = FakeLLM(error_rate=error_rate, seed=seed, miscount_rate=miscount_rate) if token is None else None
+            result: dict[str, Any] = hide(needle, haystack, work_dir, k, model, token, client)
+            results.append(result)
+            if verbose:
+                print('k={bits_per_sentence}: {sentences} sentences, {llm_sentences} sent to the LLM, {llm_calls} calls, success rate {success_rate}, cost per byte {cost_per_byte}, {seconds}s'.format(**result), flush=True)
+    finally:
+        os.chdir(current_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        'haystack_size': haystack_size,
+        'needle_size': needle_size,
+        'model': model,
+        'simulated': token is None,
+        'error_rate': error_rate,
+        'miscount_rate': miscount_rate,
+        'seed': seed,
+        'results': results
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the hides with 1, 2 or 3 bits per sentence.')
+    parser.add_argument('--verbose',
+                        dest='verbose_flag',
+                        action='store_true',
+                        help='activate verbose output')
+    parser.add_argument('--haystack-size',
+                        dest='haystack_size',
+                        type=str,
+                        required=False,
+                        default='512KB',
+                        help='size of the generated haystack (default: "512KB")')
+    parser.add_argument('--needle-size',
+                        dest='needle_size',
+                        type=str,
+                        required=False,
+                        default='256',
+                        help='size of the generated needle (default: 256 characters)')
+    parser.add_argument('--bits',
+                        dest='bits',
+                        type=str,
+                        required=False,
+                        default=','.join(str(k) for k in DEFAULT_BITS),
+                        help='comma-separated list of the numbers of bits per sentence to compare (default: "1,2,3")')
+    parser.add_argument('--model',
+                        dest='model',
+                        type=str,
+                        required=False,
+                        default=DEFAULT_MODEL,
+                        help='LLM model, used to price the tokens (default: "{}")'.format(DEFAULT_MODEL))
+    parser.add_argument('--token',
+                        dest='token',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the file that contains the API token: the real LLM is called (default: the LLM is simulated)')
+    parser.add_argument('--error-rate',
+                        dest='error_rate',
+                        type=float,
+                        required=False,
+                        default=0.02,
+                        help='simulated LLM: probability that a reformulation is wrong (default: 0.02)')
+    parser.add_argument('--miscount-rate',
+                        dest='miscount_rate',
+                        type=float,
+                        required=False,
+                        default=0.1,
+                        help='simulated LLM: probability that a reformulation with an exact number of words is one word off (default: 0.1)')
+    parser.add_argument('--seed',
+                        dest='seed',
+                        type=int,
+                        required=False,
+                        default=0,
+                        help='seed used to generate the data and the errors (default: 0)')
+    parser.add_argument('--save',
+                        dest='save',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the JSON file used to store the results')
+    args = parser.parse_args()
+
+    token: Optional[str] = None
+    if args.token is not None:
+        from whisper.api_tools import load_token
+        token = load_token(args.token)
+    current: dict[str, Any] = run(parse_size(args.haystack_size),
+                                  parse_size(args.needle_size),
+                                  [int(k) for k in args.bits.split(',')],
+                                  args.model,
+                                  token,
+                                  args.error_rate,
+                                  args.miscount_rate,
+                                  args.seed,
+                                  args.verbose_flag)
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=4)
+    print(json.dumps(current['results'], indent=4))
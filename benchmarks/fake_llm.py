@@ -0,0 +1,107 @@
+from typing import Any, Optional, Union
+import json
+import random
+import re
+import threading
+import time
+
+PROMPT_PATTERN = re.compile(r'^\[id=(\d+)\] .*\*\*(pair|impair)\*\* de mots : "(.*)"$', re.DOTALL)
+WORDS_PROMPT_PATTERN = re.compile(r'^\[id=(\d+)\] .*exactement \*\*(\d+)\*\* mots : "(.*)"$', re.DOTALL)
+
+
+class StatusError(Exception):
+    """An error of the API, with its HTTP status (see whisper.dispatcher.retryable)."""
+
+    def __init__(self, status_code: int) -> None:
+        super().__init__('Error code: {}'.format(status_code))
+        self.status_code: int = status_code
+
+
+class FakeLLM:
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0, miscount_rate: float = 0.0,
+                 failures: Optional[set[Union[int, str]]] = None,
+                 omissions: Optional[set[Union[int, str]]] = None,
+                 error: Optional[Exception] = None,
+                 errors: Optional[int] = None) -> None:
+        """
+        A deterministic stand-in for the LLM: each sentence is "reformulated" by adding a word,
+        which modifies the parity of its number of words (or by adding or removing words, if an exact number of
+        words is requested).
+
+        :param latency: The number of seconds spent in each call.
+        :param error_rate: The probability that a reformulation is wrong (the sentence is returned unchanged).
+        :param seed: The seed of the random generator used to inject the errors.
+        :param miscount_rate: The probability that a reformulation with an exact number of words is one word off.
+        :param failures: The IDs (or the sentences) whose first reformulation is wrong.
+        :param omissions: The IDs (or the sentences) whose first reformulation is missing from the response.
+        :param error: The error raised by the failed calls (see `errors`).
+        :param errors: The number of calls that fail with `error`, before the others succeed (None: every call fails).
+        """
+        self.latency: float = latency
+        self.error_rate: float = error_rate
+        self.miscount_rate: float = miscount_rate
+        self.rng: random.Random = random.Random(seed)
+        self.failures: set[Union[int, str]] = failures if failures is not None else set()
+        self.omissions: set[Union[int, str]] = omissions if omissions is not None else set()
+        self.error: Optional[Exception] = error
+        self.errors: Optional[int] = errors
+        self.lock: threading.Lock = threading.Lock()
+        self.calls: int = 0
+        self.prompts: int = 0
+        self.prompt_tokens: int = 0
+        self.completion_tokens: int = 0
+
+    def __getstate__(self) -> dict[str, Any]:
+        # The lock cannot be sent to another process (see whisper.shards.run_workers)
+        state: dict[str, Any] = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def take(keys: set[Union[int, str]], identifier: int, sentence: str) -> bool:
+        """Remove the ID (or the sentence) from the set of keys. Return True if it was in the set."""
+        for key in (identifier, sentence):
+            if key in keys:
+                keys.remove(key)
+                return True
+        return False
+
+    def call(self, messages: list[dict[str, str]], response_format: Optional[dict[str, Any]] = None) -> str:
+        with self.lock:
+            self.calls += 1
+            if self.error is not None and (self.errors is None or self.errors > 0):
+                if self.errors is not None:
+                    self.errors -= 1
+                raise self.error
+        if self.latency > 0:
+            time.sleep(self.latency)
+        results: list[dict[str, Any]] = []
+        for message in messages:
+            match = PROMPT_PATTERN.match(message['content']) or WORDS_PROMPT_PATTERN.match(message['content'])
+            if match is None:
+                continue
+            identifier: int = int(match.group(1))
+            sentence: str = match.group(3).rstrip('.!?')
+            with self.lock:
+                self.prompts += 1
+                if FakeLLM.take(self.omissions, identifier, sentence):
+                    continue
+                wrong: bool = FakeLLM.take(self.failures, identifier, sentence) or (self.error_rate > 0 and self.rng.random() < self.error_rate)
+                miscount: bool = self.miscount_rate > 0 and self.rng.random() < self.miscount_rate
+            if not wrong and match.group(2).isdigit():
+                words: int = max(1, int(match.group(2)) + (1 if miscount else 0))
+                text: str = ' '.join((re.split(r'[\s,;]+', sentence) + ['indeed'] * words)[:words]) + '.'
+                results.append({'id': identifier, 'text': text})
+                continue
+            results.append({'id': identifier, 'text': sentence + ('.' if wrong else ' indeed.')})
+        response: str = json.dumps({'results': results})
+        with self.lock:
+            # A rough estimation: 4 characters per token
+            self.prompt_tokens += sum(len(m['content']) for m in messages) // 4
+            self.completion_tokens += len(response) // 4
+        return response
@@ -0,0 +1,161 @@
+# Usage:
+#   python3 generator.py haystack --size=10MB --seed=1 haystack.txt
+#   python3 generator.py needle --size=1KB --seed=1 needle.txt
+#   python3 generator.py murmur --size=10MB --needle=needle.txt murmur.txt
+
+from typing import Iterator, Optional
+import argparse
+import random
+import re
+import string
+import sys
+import os
+
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.conversion import Conversion
+from whisper import Bit, Int64
+
+SUBJECTS: list[str] = ['The car', 'The engine', 'The driver', 'The passenger', 'The road', 'The vehicle', 'The window',
+                       'The old bridge', 'A cyclist', 'The small village', 'The river', 'The wind', 'The traffic light']
+VERBS: list[str] = ['moves', 'stays', 'turns', 'stops', 'remains', 'runs', 'looks', 'continues', 'crosses', 'waits',
+                    'passes', 'shines', 'slows down']
+COMPLEMENTS: list[str] = ['forward', 'slowly', 'on its way', 'near the field', 'without noise', 'at the corner',
+                          'under the bright sun', 'along the coast', 'in the rain', 'for a while', 'behind the truck',
+                          'before the long curve', 'with a soft sound', 'as usual', 'in the distance']
+ENDINGS: list[str] = ['.', '.', '.', '.', '!', '?']
+# The number of sentences written on each line of the haystack
+SENTENCES_PER_LINE: int = 8
+# The size of the blocks written into the generated files
+WRITE_BLOCK_SIZE: int = 1 << 20
+SIZE_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)\s*(B|KB|MB|GB)?$', re.IGNORECASE)
+SIZE_UNITS: dict[str, int] = {'B': 1, 'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30}
+
+
+def parse_size(size: str) -> int:
+    """Convert a size such as "1KB", "10MB" or "1GB" into a number of bytes."""
+    match = SIZE_PATTERN.match(size.strip())
+    if match is None:
+        raise ValueError('Invalid size: "{}"'.format(size))
+    return int(float(match.group(1)) * SIZE_UNITS[(match.group(2) or 'B').upper()])
+
+
+def generate_sentence(rng: random.Random, words_parity: Optional[int] = None) -> str:
+    """Generate a sentence. If `words_parity` is given, the number of words of the sentence has this parity."""
+    sentence: str = '{} {} {}'.format(rng.choice(SUBJECTS), rng.choice(VERBS), rng.choice(COMPLEMENTS))
+    if rng.random() < 0.3:
+        sentence += ', {}'.format(rng.choice(COMPLEMENTS))
+    if words_parity is not None and len(re.split(r'[\s,;]+', sentence)) % 2 != words_parity:
+        sentence += ' today'
+    return sentence + (rng.choice(ENDINGS) if words_parity is None else '.')
+
+
+def write_blocks(path: str, size: int, lines: Iterator[str], minimum: int = 0) -> int:
+    """
+    Write lines into a file until its size reaches `size` bytes (and at least `minimum` lines are written).
+    Return the number of lines written.
+    """
+    count: int = 0
+    written: int = 0
+    block: list[str] = []
+    block_size: int = 0
+    with open(path, 'w') as f:
+        while written + block_size < size or count < minimum:
+            line: str = next(lines)
+            block.append(line)
+            block_size += len(line)
+            count += 1
+            if block_size >= WRITE_BLOCK_SIZE:
+                f.write(''.join(block))
+                written += block_size
+                block = []
+                block_size = 0
+        f.write(''.join(block))
+    return count
+
+
+def generate_haystack(path: str, size: int, seed: int = 0) -> int:
+    """
+    Generate a haystack of (about) `size` bytes. The same seed always produces the same haystack.
+
+    :param path: The path to the haystack.
+    :param size: The size of the haystack, in bytes (the last line may exceed it).
+    :param seed: The seed of the random generator.
+    :return: The number of sentences.
+    """
+    rng: random.Random = random.Random(seed)
+
+    def lines() -> Iterator[str]:
+        while True:
+            yield ' '.join(generate_sentence(rng) for _ in range(SENTENCES_PER_LINE)) + '\n'
+
+    return write_blocks(path, size, lines()) * SENTENCES_PER_LINE
+
+
+def generate_needle(path: str, size: int, seed: int = 0) -> None:
+    """Generate a needle of `size` (printable ASCII) characters."""
+    rng: random.Random = random.Random(seed)
+    alphabet: str = string.ascii_letters + string.digits + ' .,;!?'
+    with open(path, 'w') as f:
+        for offset in range(0, size, WRITE_BLOCK_SIZE):
+            f.write(''.join(rng.choice(alphabet) for _ in range(min(WRITE_BLOCK_SIZE, size - offset))))
+
+
+def generate_murmur(path: str, needle: bytes, size: int, seed: int = 0) -> int:
+    """
+    Generate a murmur (one sentence per line) that hides the given needle, padded to (about) `size` bytes.
+    The murmur contains all the sentences needed to hide the needle, even if it exceeds `size` bytes.
+
+    :return: The number of sentences.
+    """
+    rng: random.Random = random.Random(seed)
+    bits: list[Bit] = Conversion.int64_to_bit_list(Int64(len(needle))) + Conversion.bytes_to_bit_list(needle)
+
+    def lines() -> Iterator[str]:
+        for bit in bits:
+            yield generate_sentence(rng, bit) + '\n'
+        while True:
+            yield generate_sentence(rng) + '\n'
+
+    return write_blocks(path, size, lines(), len(bits))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate deterministic haystacks, needles and murmurs for the benchmarks.')
+    parser.add_argument('kind',
+                        type=str,
+                        choices=['haystack', 'needle', 'murmur'],
+                        help='kind of file to generate')
+    parser.add_argument('--size',
+                        dest='size',
+                        type=str,
+                        required=True,
+                        help='size of the generated file (ex: "1KB", "10MB", "1GB")')
+    parser.add_argument('--seed',
+                        dest='seed',
+                        type=int,
+                        required=False,
+                        default=0,
+                        help='seed of the random generator (default: 0)')
+    parser.add_argument('--needle',
+                        dest='needle',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the needle hidden into the murmur (required for "murmur")')
+    parser.add_argument('output',
+                        type=str,
+                        help='path to the generated file')
+    args = parser.parse_args()
+
+    if args.kind == 'haystack':
+        print('{} sentences'.format(generate_haystack(args.output, parse_size(args.size), args.seed)))
+    elif args.kind == 'needle':
+        generate_needle(args.output, parse_size(args.size), args.seed)
+    else:
+        if args.needle is None:
+            parser.error('--needle is required to generate a murmur')
+        with open(args.needle, 'rb') as fd:
+            print('{} sentences'.format(generate_murmur(args.output, fd.read(), parse_size(args.size), args.seed)))
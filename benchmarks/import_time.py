@@ -0,0 +1,108 @@
+# Usage:
+#   python3 -u import_time.py
+#   python3 -u import_time.py --runs=10 --max-ms=80 --save=import-time.json
+#
+# Measure the time needed to import the modules used by each command of the CLI ("python -X importtime").
+# The script fails (exit code 1) if a command imports a forbidden module (ex: the LLM client to reveal a message),
+# or if its import time exceeds the given limit.
+
+from typing import Any, Optional
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+
+# The modules imported by each command, and the modules that the command must not import
+TARGETS: dict[str, dict[str, list[str]]] = {
+    'reveal': {'modules': ['whisper.cli', 'whisper.revealer'], 'forbidden': ['openai', 'tiktoken', 'sqlite3', 'concurrent.futures']},
+    'check': {'modules': ['whisper.cli', 'whisper.post_dump'], 'forbidden': ['openai', 'tiktoken', 'sqlite3']},
+    'dump': {'modules': ['whisper.cli', 'whisper.stegano_db'], 'forbidden': ['openai', 'tiktoken']},
+    'hide': {'modules': ['whisper.cli', 'whisper.whisperer'], 'forbidden': ['openai', 'tiktoken']}
+}
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def measure_import(modules: list[str]) -> tuple[float, list[str]]:
+    """
+    Import modules in a new interpreter.
+
+    :param modules: The modules to import.
+    :return: The cumulative import time of the modules (in seconds), and the names of all the imported modules.
+    """
+    env: dict[str, str] = dict(os.environ)
+    env['PYTHONPATH'] = SEARCH_PATH + (os.pathsep + env['PYTHONPATH'] if env.get('PYTHONPATH') else '')
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', '; '.join('import {}'.format(m) for m in modules)],
+                             env=env, capture_output=True, text=True, check=True)
+    total: int = 0
+    imported: list[str] = []
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is None:
+            continue
+        imported.append(match.group(4))
+        # Only the top-level imports are added: their time includes the time of their own imports
+        if len(match.group(3)) == 1:
+            total += int(match.group(2))
+    return total / 1e6, imported
+
+
+def run(runs: int = 5) -> dict[str, Any]:
+    """Measure the import time of each command (the median of `runs` runs)."""
+    results: dict[str, Any] = {}
+    for name, target in TARGETS.items():
+        times: list[float] = []
+        imported: list[str] = []
+        for _ in range(runs):
+            seconds, imported = measure_import(target['modules'])
+            times.append(seconds)
+        results[name] = {
+            'seconds': round(statistics.median(times), 6),
+            'modules': len(imported),
+            'forbidden': sorted({m for m in imported for f in target['forbidden'] if m == f or m.startswith(f + '.')})
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the import time of the commands of the CLI.')
+    parser.add_argument('--runs',
+                        dest='runs',
+                        type=int,
+                        required=False,
+                        default=5,
+                        help='number of runs of each measure, the median is kept (default: 5)')
+    parser.add_argument('--max-ms',
+                        dest='max_ms',
+                        type=float,
+                        required=False,
+                        default=None,
+                        help='maximum import time of the "reveal" command, in milliseconds (default: no limit)')
+    parser.add_argument('--save',
+                        dest='save',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the JSON file used to store the results')
+    args = parser.parse_args()
+    max_ms: Optional[float] = args.max_ms
+
+    results: dict[str, Any] = run(args.runs)
+    print(json.dumps(results, indent=4))
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=4)
+    failed: bool = False
+    for name, result in results.items():
+        if len(result['forbidden']) > 0:
+            print('ERROR: the command "{}" imports {}'.format(name, ', '.join(result['forbidden'])))
+            failed = True
+    if max_ms is not None and results['reveal']['seconds'] * 1000 > max_ms:
+        print('ERROR: the import time of the command "reveal" ({:.1f} ms) exceeds {:.1f} ms'.format(results['reveal']['seconds'] * 1000, max_ms))
+        failed = True
+    exit(1 if failed else 0)
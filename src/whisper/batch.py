@@ -0,0 +1,170 @@
+from typing import Any, Optional, Protocol, Generator, Tuple, Union, cast
+from pathlib import Path
+import json
+import os
+import time
+
+from . import codec
+from .disk_list import DiskList
+from .request_data import RequestData
+
+BATCH_ENDPOINT: str = '/v1/chat/completions'
+BATCH_FINAL_STATUSES: tuple[str, ...] = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchEndpoint(Protocol):
+    """The provider operations needed to run an offline batch."""
+
+    model: str
+
+    def upload_batch_file(self, path: str) -> str: ...
+
+    def create_batch(self, file_id: str) -> str: ...
+
+    def get_batch(self, batch_id: str) -> dict[str, Optional[str]]: ...
+
+    def download_file(self, file_id: str) -> str: ...
+
+
+class BatchJob:
+
+    def __init__(self, endpoint: BatchEndpoint, state_path: Path, poll_interval: float = 60.0, verbose: bool = False,
+                 response_format: Optional[dict[str, Any]] = None) -> None:
+        """
+        Send the requests to the LLM through the provider's (asynchronous) batch endpoint.
+
+        The state of the job is saved into a JSON file after every transition, so that a
+        process that exits while a batch is pending can resume polling instead of submitting
+        (and paying for) the batch again.
+
+        :param endpoint: The provider client.
+        :param state_path: The path to the file used to store the state of the job.
+        :param poll_interval: The number of seconds to wait between two polls.
+        :param verbose: activate verbose mode.
+        :param response_format: the format of the responses (structured outputs), if any.
+        """
+        self.endpoint: BatchEndpoint = endpoint
+        self.state_path: Path = state_path
+        self.input_path: Path = state_path.with_suffix('.jsonl')
+        self.poll_interval: float = poll_interval
+        self.verbose: bool = verbose
+        self.response_format: Optional[dict[str, Any]] = response_format
+        self.batch_id: Optional[str] = None
+        self.input_file_id: Optional[str] = None
+        self.requests: dict[str, list[int]] = {}
+        self.completed: dict[int, str] = {}
+        self.load()
+
+    def load(self) -> None:
+        if not self.state_path.exists():
+            return
+        with open(self.state_path, 'r') as f:
+            state = json.load(f)
+        self.batch_id = state['batch_id']
+        self.input_file_id = state['input_file_id']
+        self.requests = state['requests']
+        self.completed = {int(p): s for p, s in state['completed'].items()}
+
+    def save(self) -> None:
+        state = {
+            'model': self.endpoint.model,
+            'batch_id': self.batch_id,
+            'input_file_id': self.input_file_id,
+            'requests': self.requests,
+            'completed': {str(p): s for p, s in self.completed.items()}
+        }
+        tmp_path: Path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def clear(self) -> None:
+        """Remove the files used by the job once all the results have been ingested."""
+        for path in (self.state_path, self.input_path):
+            if path.exists():
+                path.unlink()
+
+    def pending(self) -> bool:
+        """Tell whether a batch has been submitted but its results have not been ingested yet."""
+        return self.batch_id is not None
+
+    def complete(self, position: int, reformulation: str) -> None:
+        self.completed[position] = reformulation
+
+    def export(self, requests_db: DiskList) -> int:
+        """Write the requests as a JSONL batch file. Return the number of exported requests."""
+        self.requests = {}
+        with open(self.input_path, 'w') as f:
+            for i in range(len(requests_db)):
+                request: dict[str, Union[list[int], list[dict[str, str]]]] = RequestData.dict_from_json(requests_db[i])
+                positions: list[int] = cast(list[int], request['positions'])
+                if len(positions) == 0:
+                    continue
+                custom_id: str = 'request-{}'.format(i)
+                body: dict[str, Any] = {
+                    'model': self.endpoint.model,
+                    'messages': request['messages']
+                }
+                if self.response_format is not None:
+                    body['response_format'] = self.response_format
+                line = {
+                    'custom_id': custom_id,
+                    'method': 'POST',
+                    'url': BATCH_ENDPOINT,
+                    'body': body
+                }
+                f.write(codec.dumps(line) + '\n')
+                self.requests[custom_id] = positions
+        return len(self.requests)
+
+    def submit(self, requests_db: DiskList) -> None:
+        """Export the requests, upload the batch file and create the batch."""
+        count: int = self.export(requests_db)
+        if count == 0:
+            return
+        self.input_file_id = self.endpoint.upload_batch_file(str(self.input_path))
+        self.save()
+        self.batch_id = self.endpoint.create_batch(self.input_file_id)
+        self.save()
+        if self.verbose:
+            print('Batch "{}" submitted ({} requests)'.format(self.batch_id, count), flush=True)
+
+    def wait(self) -> Generator[Tuple[list[int], str], None, None]:
+        """
+        Poll the batch until it reaches a final status, then yield the positions and the
+        response of every successful request. Failed requests are not yielded: their positions
+        are left without reformulation, so that they are sent again.
+        """
+        if self.batch_id is None:
+            return
+        while True:
+            batch: dict[str, Optional[str]] = self.endpoint.get_batch(self.batch_id)
+            status: str = cast(str, batch['status'])
+            if self.verbose:
+                print('Batch "{}": {}'.format(self.batch_id, status), flush=True)
+            if status in BATCH_FINAL_STATUSES:
+                break
+            time.sleep(self.poll_interval)
+
+        if status == 'failed' or status == 'cancelled':
+            self.batch_id = None
+            self.save()
+            raise RuntimeError('The batch has not been processed (status: {})'.format(status))
+
+        output_file_id: Optional[str] = batch.get('output_file_id')
+        if output_file_id is not None:
+            for line in self.endpoint.download_file(output_file_id).splitlines():
+                if line.strip() == '':
+                    continue
+                result = codec.loads(line)
+                positions: Optional[list[int]] = self.requests.get(result['custom_id'])
+                if positions is None:
+                    continue
+                response = result.get('response')
+                if result.get('error') is not None or response is None or response['status_code'] != 200:
+                    print('WARNING: batch request "{}" failed: {}'.format(result['custom_id'], result.get('error')))
+                    continue
+                yield positions, response['body']['choices'][0]['message']['content']
+        self.batch_id = None
+        self.input_file_id = None
+        self.save()
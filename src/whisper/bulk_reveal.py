@@ -0,0 +1,125 @@
+from typing import Any, Optional, Generator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+import glob
+import json
+import os
+import time
+
+from .revealer import Revealer
+
+# The number of murmurs sent to a worker process at once
+CHUNK_SIZE: int = 16
+
+
+@dataclass
+class RevealResult:
+    murmur: str
+    output: Optional[str]
+    success: bool
+    length: int = 0
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'murmur': self.murmur,
+            'output': self.output,
+            'success': self.success,
+            'length': self.length,
+            'error': self.error,
+            'elapsed': round(self.elapsed, 6)
+        }
+
+
+def find_murmurs(source: str) -> list[str]:
+    """
+    Find the murmurs to reveal.
+
+    :param source: A directory (all the files it contains) or a glob pattern.
+    :return: The paths to the murmurs, sorted.
+    """
+    if os.path.isdir(source):
+        return sorted(str(p) for p in Path(source).iterdir() if p.is_file())
+    return sorted(p for p in glob.glob(source, recursive=True) if os.path.isfile(p))
+
+
+def output_path(murmur: str, output_dir: str) -> str:
+    """Return the path to the file used to store the needle revealed from a murmur."""
+    return os.path.join(output_dir, Path(murmur).stem + '.needle.txt')
+
+
+def reveal_one(murmur: str, output: str, ecc: int = 0, bits_per_sentence: int = 1) -> RevealResult:
+    """Reveal the needle hidden into a murmur. The errors are reported, not raised."""
+    start: float = time.monotonic()
+    try:
+        body: bytes = Revealer(murmur, output, ecc=ecc, bits_per_sentence=bits_per_sentence).decode()
+        with open(output, 'w') as f:
+            f.write(str(body, 'ascii'))
+    except Exception as e:
+        return RevealResult(murmur, None, False, error='{}: {}'.format(type(e).__name__, str(e)), elapsed=time.monotonic() - start)
+    return RevealResult(murmur, output, True, length=len(body), elapsed=time.monotonic() - start)
+
+
+class BulkRevealer:
+
+    def __init__(self, murmurs: list[str], output_dir: str, workers: Optional[int] = None, verbose: bool = False, ecc: int = 0, bits_per_sentence: int = 1) -> None:
+        """
+        Reveal the needles hidden into many murmurs, across a pool of processes.
+
+        :param murmurs: The paths to the murmurs.
+        :param output_dir: The path to the directory used to store the revealed needles.
+        :param workers: The number of processes (default: the number of CPUs).
+        :param verbose: Verbose flag.
+        :param ecc: The number of ECC bytes per block used to hide the needles (see Revealer).
+        :param bits_per_sentence: The number of bits hidden into each sentence (see Revealer).
+        """
+        self.murmurs: list[str] = murmurs
+        self.output_dir: str = output_dir
+        self.workers: Optional[int] = workers
+        self.verbose: bool = verbose
+        self.ecc: int = ecc
+        self.bits_per_sentence: int = bits_per_sentence
+
+    def run(self) -> Generator[RevealResult, None, None]:
+        """Reveal the murmurs. Yield the result of each murmur, in the order of the murmurs."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        outputs: list[str] = [output_path(m, self.output_dir) for m in self.murmurs]
+        if len(set(outputs)) != len(outputs):
+            raise ValueError("Several murmurs have the same name: their needles would be written into the same file!")
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for result in executor.map(reveal_one, self.murmurs, outputs, [self.ecc] * len(outputs), [self.bits_per_sentence] * len(outputs), chunksize=CHUNK_SIZE):
+                if self.verbose:
+                    print('{} {}{}'.format('OK  ' if result.success else 'FAIL', result.murmur, ' ({})'.format(result.error) if result.error is not None else ''))
+                yield result
+
+    def write_report(self, report_path: str) -> dict[str, Any]:
+        """
+        Reveal the murmurs and write a JSONL report: one line per murmur, then a summary line.
+
+        :param report_path: The path to the report.
+        :return: The summary (successes, failures, throughput).
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        start: float = time.monotonic()
+        successes: int = 0
+        failures: int = 0
+        with open(report_path, 'w') as f:
+            for result in self.run():
+                if result.success:
+                    successes += 1
+                else:
+                    failures += 1
+                f.write(json.dumps(result.to_dict()) + "\n")
+            elapsed: float = time.monotonic() - start
+            summary: dict[str, Any] = {
+                'summary': True,
+                'murmurs': successes + failures,
+                'successes': successes,
+                'failures': failures,
+                'elapsed': round(elapsed, 3),
+                'murmurs_per_second': round((successes + failures) / elapsed, 3) if elapsed > 0 else None
+            }
+            f.write(json.dumps(summary) + "\n")
+        return summary
@@ -0,0 +1,123 @@
+from typing import Any, Optional
+from dataclasses import dataclass
+
+from .dispatcher import LLMClient
+from .pricing import ModelPricing, get_pricing, cost
+
+
+@dataclass
+class CascadeTier:
+    model: str
+    client: LLMClient
+    # The sentences sent to the model (one per attempt), and the ones that got a valid reformulation
+    sentences: int = 0
+    successes: int = 0
+    calls: int = 0
+    seconds: float = 0.0
+
+    def tokens(self) -> tuple[int, int]:
+        """Return the number of input and output tokens used by the model (if the client counts them)."""
+        return getattr(self.client, 'prompt_tokens', 0), getattr(self.client, 'completion_tokens', 0)
+
+    def cost(self) -> Optional[float]:
+        pricing: Optional[ModelPricing] = get_pricing(self.model)
+        if pricing is None:
+            return None
+        input_tokens, output_tokens = self.tokens()
+        return cost(pricing, input_tokens, output_tokens)
+
+    def to_dict(self) -> dict[str, Any]:
+        input_tokens, output_tokens = self.tokens()
+        return {
+            'model': self.model,
+            'sentences': self.sentences,
+            'successes': self.successes,
+            'success_rate': round(self.successes / self.sentences, 4) if self.sentences > 0 else None,
+            'calls': self.calls,
+            'latency': round(self.seconds / self.calls, 3) if self.calls > 0 else None,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cost': self.cost()
+        }
+
+
+class ModelCascade:
+
+    def __init__(self, tiers: list[CascadeTier], escalate_after: int = 1) -> None:
+        """
+        Send the sentences to the cheapest model first, and escalate the sentences that keep failing the parity
+        check to the next (stronger) model: a sentence is sent to the tier `attempts // escalate_after`, and the
+        last tier handles all the remaining attempts.
+
+        :param tiers: The models, from the cheapest to the strongest.
+        :param escalate_after: The number of failed attempts of a sentence on a tier before it is escalated.
+        """
+        if len(tiers) == 0:
+            raise ValueError("The cascade must contain at least one model!")
+        if escalate_after < 1:
+            raise ValueError("The number of attempts before an escalation must be at least 1!")
+        self.tiers: list[CascadeTier] = tiers
+        self.escalate_after: int = escalate_after
+        # The number of attempts of each sentence (position -> attempts)
+        self.attempts: dict[int, int] = {}
+
+    @staticmethod
+    def create(models: list[str], token: str, escalate_after: int = 1, clients: Optional[list[LLMClient]] = None) -> 'ModelCascade':
+        """
+        Create a cascade of models.
+
+        :param models: The names of the models, from the cheapest to the strongest.
+        :param token: The token used to authenticate the requests.
+        :param escalate_after: The number of failed attempts before an escalation.
+        :param clients: The clients of the models (default: a ChatGPT client per model).
+        """
+        if clients is None:
+            from .chat_gpt import ChatGPT
+            clients = [ChatGPT(model, token) for model in models]
+        if len(clients) != len(models):
+            raise ValueError("The cascade needs one client per model!")
+        return ModelCascade([CascadeTier(model, client) for model, client in zip(models, clients)], escalate_after)
+
+    def tier_of(self, position: int) -> int:
+        """Return the tier used for the next attempt of a sentence."""
+        return min(self.attempts.get(position, 0) // self.escalate_after, len(self.tiers) - 1)
+
+    def record_call(self, tier: int, positions: list[int], seconds: float) -> None:
+        """Record a call to a tier, for the sentences at the given positions."""
+        t: CascadeTier = self.tiers[tier]
+        t.calls += 1
+        t.sentences += len(positions)
+        t.seconds += seconds
+        for position in positions:
+            self.attempts[position] = self.attempts.get(position, 0) + 1
+
+    def record_results(self, sent: dict[int, int], failures: set[int]) -> None:
+        """
+        Record the results of a round of calls.
+
+        :param sent: The sentences sent during the round (position -> tier).
+        :param failures: The positions of the sentences that failed the parity check.
+        """
+        for position, tier in sent.items():
+            if position not in failures:
+                self.tiers[tier].successes += 1
+
+    def tokens(self) -> tuple[int, int]:
+        """Return the number of input and output tokens used by all the models."""
+        tokens: list[tuple[int, int]] = [t.tokens() for t in self.tiers]
+        return sum(i for i, _ in tokens), sum(o for _, o in tokens)
+
+    def report(self) -> list[dict[str, Any]]:
+        return [t.to_dict() for t in self.tiers]
+
+    def lines(self) -> list[str]:
+        lines: list[str] = ['Model cascade:']
+        for tier in self.report():
+            lines.append('- {}: {} sentences, success rate {}, {} calls, latency {}, cost {}'.format(
+                tier['model'],
+                tier['sentences'],
+                '{:.1%}'.format(tier['success_rate']) if tier['success_rate'] is not None else '-',
+                tier['calls'],
+                '{:.2f} s'.format(tier['latency']) if tier['latency'] is not None else '-',
+                '${:.4f}'.format(tier['cost']) if tier['cost'] is not None else 'unknown'))
+        return lines
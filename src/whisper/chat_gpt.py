@@ -1,11 +1,15 @@
-from typing import Union, Optional, cast
-from openai import OpenAI
-from openai.types.chat import (
-    ChatCompletionSystemMessageParam,
-    ChatCompletionUserMessageParam,
-    ChatCompletionAssistantMessageParam,
-    ChatCompletion
-)
+from typing import Any, Union, Optional, cast, TYPE_CHECKING
+import threading
+
+# The OpenAI client is imported when the first ChatGPT object is created: it takes a long time to import,
+# and it is not needed to reveal a message
+if TYPE_CHECKING:
+    from openai.types.chat import (
+        ChatCompletionSystemMessageParam,
+        ChatCompletionUserMessageParam,
+        ChatCompletionAssistantMessageParam,
+        ChatCompletion
+    )
 
 class ChatGPT:
 
@@ -15,11 +19,21 @@ class ChatGPT:
         self.model: str = model
         self.token: str = token
         self.options: dict[str, str] = options if options is not None else {}
+        from openai import OpenAI
         self.client = OpenAI(api_key=token, **self.options)
+        # The number of tokens sent and received (for all the calls)
+        self.lock: threading.Lock = threading.Lock()
+        self.prompt_tokens: int = 0
+        self.completion_tokens: int = 0
 
     @staticmethod
     def list_to_chat_messages(messages: list[dict[str, str]]) -> list[
-        Union[ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam, ChatCompletionAssistantMessageParam]]:
+        Union['ChatCompletionSystemMessageParam', 'ChatCompletionUserMessageParam', 'ChatCompletionAssistantMessageParam']]:
+        from openai.types.chat import (
+            ChatCompletionSystemMessageParam,
+            ChatCompletionUserMessageParam,
+            ChatCompletionAssistantMessageParam
+        )
         result: list[Union[ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam, ChatCompletionAssistantMessageParam]] = []
         message: dict[str, str]
         for message in messages:
@@ -33,12 +47,46 @@ class ChatGPT:
                 raise ValueError(f"Invalid role: {message['role']}")
         return result
 
-    def call(self, messages: list[dict[str, str]]) -> str:
-        response: ChatCompletion = self.client.chat.completions.create(
-            model=self.model,
-            messages=ChatGPT.list_to_chat_messages(messages)
-        )
+    def call(self, messages: list[dict[str, str]], response_format: Optional[dict[str, Any]] = None) -> str:
+        if response_format is not None:
+            response: 'ChatCompletion' = self.client.chat.completions.create(
+                model=self.model,
+                messages=ChatGPT.list_to_chat_messages(messages),
+                response_format=cast(Any, response_format)
+            )
+        else:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=ChatGPT.list_to_chat_messages(messages)
+            )
         if response is None:
             raise RuntimeError("ChatGPT response is None")
+        if response.usage is not None:
+            with self.lock:
+                self.prompt_tokens += response.usage.prompt_tokens
+                self.completion_tokens += response.usage.completion_tokens
         return cast(str, response.choices[0].message.content)
 
+    def upload_batch_file(self, path: str) -> str:
+        """Upload a JSONL batch file. Return the ID of the uploaded file."""
+        with open(path, 'rb') as fd:
+            uploaded = self.client.files.create(file=fd, purpose='batch')
+        return uploaded.id
+
+    def create_batch(self, file_id: str) -> str:
+        """Create a batch from an uploaded JSONL file. Return the ID of the batch."""
+        batch = self.client.batches.create(input_file_id=file_id,
+                                           endpoint='/v1/chat/completions',
+                                           completion_window='24h')
+        return batch.id
+
+    def get_batch(self, batch_id: str) -> dict[str, Optional[str]]:
+        batch = self.client.batches.retrieve(batch_id)
+        return {
+            'status': batch.status,
+            'output_file_id': batch.output_file_id,
+            'error_file_id': batch.error_file_id
+        }
+
+    def download_file(self, file_id: str) -> str:
+        return self.client.files.content(file_id).text
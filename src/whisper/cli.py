@@ -0,0 +1,851 @@
+# Usage:
+#   whisper hide --verbose --token="/home/dev/.token" ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   whisper hide --estimate --model=gpt-4.1-mini --concurrency=8 ../test-data/needle.txt ../test-data/haystack.txt
+#   whisper reveal --verbose ../test-data/murmur.txt message.txt
+#   whisper reveal --bits-per-sentence=2 murmur.txt message.txt
+#   whisper dump debug/stegano-db.sqlite debug/stegano-db.txt
+#   whisper dump debug/debug-archive.sqlite --calls
+#   whisper dump debug/debug-archive.sqlite --call=2 debug/haystack-post-processing-2.txt
+#   whisper dump debug/debug-archive.sqlite --call=2 --responses
+#   whisper check debug/debug-archive.sqlite --call=2
+#   whisper check debug/stegano-db.sqlite
+#   whisper check debug/haystack-post-processing.txt
+#   whisper hide --shard-dir=/mnt/shared/hide --shard-workers=0 ../test-data/needle.txt ../test-data/haystack.txt murmur.txt
+#   whisper hide --shard-dir=/mnt/shared/hide --shard-workers=4
+#   whisper select-haystack ../test-data/needle.txt corpora/ --top=10
+
+from typing import Any, Iterator, Optional, TYPE_CHECKING
+from pathlib import Path
+import argparse
+import json
+import shutil
+import sys
+
+if TYPE_CHECKING:
+    from .configuration import HiderConfiguration
+
+# Only the modules used by the requested command are imported (the LLM client and the tokenizer
+# take a long time to import, and they are not needed to reveal a message).
+
+DEFAULT_DEBUG_PATH: str = 'debug'
+DEFAULT_TOKEN_PATH: str = '.token'
+DEFAULT_MODEL: str = 'gpt-5.1'
+
+
+def init_env(debug_path: Optional[Path]) -> None:
+    if debug_path is None:
+        return
+    if debug_path.exists():
+        for child in debug_path.iterdir():
+            if child.is_file():
+                child.unlink()
+            elif child.is_dir():
+                shutil.rmtree(child)
+    else:
+        debug_path.mkdir(parents=True, exist_ok=True)
+
+
+def add_hide_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--verbose',
+                        dest='verbose_flag',
+                        action='store_true',
+                        help='activate verbose output')
+    parser.add_argument('--dry-run',
+                        dest='dry_run_flag',
+                        action='store_true',
+                        help='dry-run flag: create the prompts and the requests (recorded into the debug archive with --debug), but do not call the LLM')
+    parser.add_argument('--estimate',
+                        dest='estimate_flag',
+                        action='store_true',
+                        help='only estimate the capacity of the haystack, the number of requests, the tokens, the cost and the duration of the hide (nothing is written)')
+    parser.add_argument('--latency',
+                        dest='latency',
+                        type=float,
+                        required=False,
+                        default=None,
+                        help='with --estimate: number of seconds taken by one request to the LLM (default: estimated from the number of output tokens)')
+    parser.add_argument('--input-price',
+                        dest='input_price',
+                        type=float,
+                        required=False,
+                        default=None,
+                        help='with --estimate: price of one million input tokens, in dollars (default: the public price of the model)')
+    parser.add_argument('--output-price',
+                        dest='output_price',
+                        type=float,
+                        required=False,
+                        default=None,
+                        help='with --estimate: price of one million output tokens, in dollars (default: the public price of the model)')
+    parser.add_argument('--debug',
+                        dest='debug_flag',
+                        action='store_true',
+                        help='debug flag')
+    parser.add_argument('--debug-dir',
+                        dest='debug_dir',
+                        type=str,
+                        required=False,
+                        default=DEFAULT_DEBUG_PATH,
+                        help='path to the directory used to store DEBUG data (default: "{}")'.format(DEFAULT_DEBUG_PATH))
+    parser.add_argument('--batch-mode',
+                        dest='batch_mode_flag',
+                        action='store_true',
+                        help='send the requests through the (offline) batch endpoint of the provider')
+    parser.add_argument('--batch-state',
+                        dest='batch_state',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the file used to store the state of the batch job, so that it can be resumed (default: "<output>.batch.json")')
+    parser.add_argument('--batch-poll-interval',
+                        dest='batch_poll_interval',
+                        type=float,
+                        required=False,
+                        default=60.0,
+                        help='number of seconds between two polls of the batch (default: 60)')
+    parser.add_argument('--no-structured-output',
+                        dest='no_structured_output_flag',
+                        action='store_true',
+                        help='do not enforce the format of the responses with a JSON schema (for providers that do not support structured outputs)')
+    parser.add_argument('--no-local-rewrite',
+                        dest='no_local_rewrite_flag',
+                        action='store_true',
+                        help='send all the sentences to the LLM, instead of rewriting the easy ones with deterministic rules')
+    parser.add_argument('--rewrite-rules',
+                        dest='rewrite_rules',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the JSON file that contains the rewrite rules (default: the rules shipped with the package)')
+    parser.add_argument('--ecc',
+                        dest='ecc',
+                        type=int,
+                        required=False,
+                        default=0,
+                        help='number of error correcting (Reed-Solomon) bytes per block of 255 bytes of the needle: the LLM is not called again for the wrong sentences that can be corrected (default: 0, no error correction)')
+    parser.add_argument('--bits-per-sentence',
+                        dest='bits_per_sentence',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help='number of bits hidden into each sentence: the number of words modulo 2^k (default: 1, the parity). With k > 1, the LLM is asked for an exact number of words')
+    parser.add_argument('--durability',
+                        dest='durability',
+                        type=str,
+                        required=False,
+                        default=None,
+                        choices=['ephemeral', 'durable', 'default'],
+                        help='durability of the SQLite databases: "ephemeral" (no synchronous writes, in-memory journal, tmpfs), "durable" (write-ahead log) or "default" (the SQLite defaults). Default: "durable" for a resumable job, "ephemeral" otherwise')
+    parser.add_argument('--index',
+                        dest='index_flag',
+                        action='store_true',
+                        help='read the sentences of the haystack from its index (a sidecar file "<haystack>.index" built on first use, and rebuilt when the haystack changes): later hides skip the segmentation')
+    parser.add_argument('--index-dir',
+                        dest='index_dir',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='directory of the haystack indexes, instead of the directory of the haystack (implies --index)')
+    parser.add_argument('--job-dir',
+                        dest='job_dir',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the directory used to store the durable state of the job (the job can be resumed with --resume)')
+    parser.add_argument('--resume',
+                        dest='resume',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the directory of an interrupted job to resume (the needle, the haystack and the output are those of the job)')
+    parser.add_argument('--stream',
+                        dest='stream_flag',
+                        action='store_true',
+                        help='hide the needle with the streaming pipeline (bounded memory, the murmur is written progressively)')
+    parser.add_argument('--concurrency',
+                        dest='concurrency',
+                        type=int,
+                        required=False,
+                        default=4,
+                        help='number of requests sent to the LLM simultaneously by the streaming pipeline, and by the projection of --estimate (default: 4)')
+    parser.add_argument('--jobs',
+                        dest='jobs',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to a JSONL manifest of jobs to run in one process (one {"needle", "haystack", "output"} object per line)')
+    parser.add_argument('--requests-per-minute',
+                        dest='requests_per_minute',
+                        type=float,
+                        required=False,
+                        default=None,
+                        help='maximum number of requests per minute sent to the LLM by all the jobs of a manifest, or by each worker of a sharded hide (default: no limit)')
+    parser.add_argument('--max-attempts',
+                        dest='max_attempts',
+                        type=int,
+                        required=False,
+                        default=10,
+                        help='with --stream, --jobs or --shard-dir: maximum number of attempts for a sentence (invalid reformulations and failed requests, retried with an exponential backoff) before the hide, its job or its shard fails (default: 10)')
+    parser.add_argument('--shard-dir',
+                        dest='shard_dir',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='shared directory of a sharded hide: with the needle, the haystack and the output, the hide is split into shards published into this directory; without them, the shards of the directory are processed (workers on several nodes can share the directory)')
+    parser.add_argument('--shard-size',
+                        dest='shard_size',
+                        type=int,
+                        required=False,
+                        default=1000,
+                        help='with --shard-dir: number of sentences of a shard (default: 1000)')
+    parser.add_argument('--shard-workers',
+                        dest='shard_workers',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help='with --shard-dir: number of worker processes started on this node, 0 to publish the shards only (default: 1)')
+    parser.add_argument('--shard-lease',
+                        dest='shard_lease',
+                        type=float,
+                        required=False,
+                        default=300.0,
+                        help='with --shard-dir: number of seconds without progress after which the shard of a worker is given to another worker (default: 300)')
+    parser.add_argument('--report',
+                        dest='report',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the JSONL file used to store the status and the timing of each job of a manifest')
+    parser.add_argument('--profile',
+                        dest='profile',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the JSON profile report (the timeline is written into "<profile>.trace.json")')
+    parser.add_argument('--model',
+                        dest='model',
+                        type=str,
+                        required=False,
+                        default=DEFAULT_MODEL,
+                        help='name of the model to use (ex: "gpt-5.1", "gpt-4.1", "gpt-4.1-mini"...) - default: "{}"'.format(DEFAULT_MODEL))
+    parser.add_argument('--model-cascade',
+                        dest='model_cascade',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='comma-separated list of models, from the cheapest to the strongest (ex: "gpt-4.1-mini,gpt-5.1"): the sentences are sent to the first model, and the sentences that keep failing are sent to the next one (replaces --model)')
+    parser.add_argument('--escalate-after',
+                        dest='escalate_after',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help='with --model-cascade: number of failed attempts of a sentence before it is sent to the next model (default: 1)')
+    parser.add_argument('--hedge-percentile',
+                        dest='hedge_percentile',
+                        type=float,
+                        required=False,
+                        default=None,
+                        help='duplicate a request that has not completed after this percentile of the recent latencies (ex: 90), the first valid response wins (default: no hedging)')
+    parser.add_argument('--hedge-model',
+                        dest='hedge_model',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='with --hedge-percentile: model used for the duplicated requests (default: the model)')
+    parser.add_argument('--hedge-token',
+                        dest='hedge_token',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='with --hedge-percentile: path to the file that contains the API token used for the duplicated requests (default: the token)')
+    parser.add_argument('--hedge-base-url',
+                        dest='hedge_base_url',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='with --hedge-percentile: endpoint used for the duplicated requests (default: the endpoint of the provider)')
+    parser.add_argument('--max-hedge-ratio',
+                        dest='max_hedge_ratio',
+                        type=float,
+                        required=False,
+                        default=0.1,
+                        help='with --hedge-percentile: maximum number of duplicated requests, as a fraction of the requests (default: 0.1)')
+    parser.add_argument('--token',
+                        dest='token',
+                        type=str,
+                        required=False,
+                        default=DEFAULT_TOKEN_PATH,
+                        help='path to the file containing the token to use for ChatGPT API (default: "{}")'.format(DEFAULT_TOKEN_PATH))
+    parser.add_argument('needle',
+                        type=str,
+                        nargs='?',
+                        help='path to the text file to hide')
+    parser.add_argument('haystack',
+                        type=str,
+                        nargs='?',
+                        help='path to the text file used as a "haystack" for hiding')
+    parser.add_argument('output',
+                        type=str,
+                        nargs='?',
+                        help='path to the output file (not used with --estimate)')
+
+
+def estimate(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+    from .estimator import Estimator, Estimate
+    from .haystack_index import HaystackIndex
+    from .local_rewriter import LocalRewriter
+    from .pricing import ModelPricing, get_pricing
+
+    if args.needle is None or args.haystack is None:
+        parser.error('the needle and the haystack are required by --estimate')
+    if args.jobs is not None or args.resume is not None:
+        parser.error('--estimate cannot be used with --jobs or --resume')
+    pricing: Optional[ModelPricing] = get_pricing(args.model)
+    if args.input_price is not None or args.output_price is not None:
+        if pricing is None and (args.input_price is None or args.output_price is None):
+            parser.error('the model "{}" has no known price: both --input-price and --output-price are required'.format(args.model))
+        pricing = ModelPricing(args.input_price if args.input_price is not None else pricing.input_price,
+                               args.output_price if args.output_price is not None else pricing.output_price)
+    rewriter: Optional[LocalRewriter] = None
+    if not args.no_local_rewrite_flag:
+        rewriter = LocalRewriter.load(Path(args.rewrite_rules) if args.rewrite_rules else None)
+    index: Optional[HaystackIndex] = None
+    if args.index_flag or args.index_dir is not None:
+        index = HaystackIndex.open(args.haystack, Path(args.index_dir) if args.index_dir is not None else None)
+    result: Estimate = Estimator(args.needle,
+                                 args.haystack,
+                                 args.model,
+                                 concurrency=args.concurrency,
+                                 local_rewriter=rewriter,
+                                 pricing=pricing,
+                                 batch_mode=args.batch_mode_flag,
+                                 request_latency=args.latency,
+                                 ecc=args.ecc,
+                                 bits_per_sentence=args.bits_per_sentence,
+                                 index=index).estimate()
+    if index is not None:
+        index.close()
+    for line in result.lines():
+        print(line)
+    if not result.enough():
+        print('The haystack is not wide enough to conceal the needle! It should contain at least {} sentences!'.format(result.needle_sentences()))
+        return 1
+    return 0
+
+
+def hide(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+    import json
+    from .ecc import MAX_ECC_SYMBOLS
+    from .conversion import MAX_BITS_PER_SENTENCE
+    from .api_tools import load_token
+    from .configuration import HiderConfiguration
+    from .job import HideJob, HideInterrupted
+
+    verbose_flag: bool = args.verbose_flag
+    dry_run_flag: bool = args.dry_run_flag
+    debug_flag: bool = args.debug_flag
+    debug_dir: str = args.debug_dir
+    needle_path: str = args.needle
+    haystack_path: str = args.haystack
+    output_path: str = args.output
+    model: str = args.model
+    token_path: str = args.token
+    batch_mode_flag: bool = args.batch_mode_flag
+    batch_state: Optional[str] = args.batch_state
+    batch_poll_interval: float = args.batch_poll_interval
+    structured_output: bool = not args.no_structured_output_flag
+    local_rewrite: bool = not args.no_local_rewrite_flag
+    rewrite_rules: Optional[str] = args.rewrite_rules
+    resume: Optional[str] = args.resume
+    job_dir: Optional[str] = resume if resume is not None else args.job_dir
+    stream_flag: bool = args.stream_flag
+    concurrency: int = args.concurrency
+    jobs: Optional[str] = args.jobs
+    requests_per_minute: Optional[float] = args.requests_per_minute
+    report: Optional[str] = args.report
+    profile: Optional[str] = args.profile
+    shard_dir: Optional[str] = args.shard_dir
+
+    if args.ecc != 0 and (args.ecc < 2 or args.ecc > MAX_ECC_SYMBOLS):
+        parser.error('--ecc must be between 2 and {}'.format(MAX_ECC_SYMBOLS))
+    if args.bits_per_sentence < 1 or args.bits_per_sentence > MAX_BITS_PER_SENTENCE:
+        parser.error('--bits-per-sentence must be between 1 and {}'.format(MAX_BITS_PER_SENTENCE))
+    model_cascade: Optional[list[str]] = [m.strip() for m in args.model_cascade.split(',') if m.strip() != ''] if args.model_cascade is not None else None
+    if model_cascade is not None and len(model_cascade) == 0:
+        parser.error('--model-cascade must contain at least one model')
+    if args.escalate_after < 1:
+        parser.error('--escalate-after must be at least 1')
+    if args.estimate_flag:
+        if model_cascade is not None:
+            # The first pass is sent to the first model of the cascade
+            args.model = model_cascade[0]
+        return estimate(parser, args)
+    if jobs is not None and (needle_path is not None or job_dir is not None or stream_flag or batch_mode_flag or dry_run_flag):
+        parser.error('--jobs cannot be used with positional arguments, --job-dir, --resume, --stream, --batch-mode or --dry-run')
+    if jobs is None and resume is None and (shard_dir is None or needle_path is not None) and (needle_path is None or haystack_path is None or output_path is None):
+        parser.error('the needle, the haystack and the output are required (unless --resume or --shard-dir is used)')
+    if resume is None and job_dir is not None and HideJob(Path(job_dir)).exists():
+        parser.error('the directory "{}" already contains a job: use --resume to resume it'.format(job_dir))
+    if profile is not None and (jobs is not None or stream_flag):
+        parser.error('--profile cannot be used with --jobs or --stream')
+    if stream_flag and (job_dir is not None or batch_mode_flag or dry_run_flag):
+        parser.error('--stream cannot be used with --job-dir, --resume, --batch-mode or --dry-run')
+    if model_cascade is not None and (jobs is not None or stream_flag or batch_mode_flag):
+        parser.error('--model-cascade cannot be used with --jobs, --stream or --batch-mode')
+    if args.hedge_percentile is not None and (args.hedge_percentile <= 0 or args.hedge_percentile > 100):
+        parser.error('--hedge-percentile must be between 0 and 100')
+    if args.hedge_percentile is not None and (batch_mode_flag or model_cascade is not None):
+        parser.error('--hedge-percentile cannot be used with --batch-mode or --model-cascade')
+    if shard_dir is not None and (jobs is not None or job_dir is not None or stream_flag or batch_mode_flag or dry_run_flag or model_cascade is not None or profile is not None):
+        parser.error('--shard-dir cannot be used with --jobs, --job-dir, --resume, --stream, --batch-mode, --dry-run, --model-cascade or --profile')
+    if args.max_attempts < 1:
+        parser.error('--max-attempts must be at least 1')
+    if args.shard_size < 1:
+        parser.error('--shard-size must be at least 1')
+    if args.shard_workers < 0:
+        parser.error('--shard-workers cannot be negative')
+    if args.shard_lease <= 0:
+        parser.error('--shard-lease must be positive')
+
+    # Load the API token
+    try:
+        token: str = load_token(token_path)
+    except Exception as e:
+        print('Error loading token file "{}": {}'.format(token_path, str(e)))
+        return 1
+    hedge_token: Optional[str] = None
+    if args.hedge_token is not None:
+        try:
+            hedge_token = load_token(args.hedge_token)
+        except Exception as e:
+            print('Error loading token file "{}": {}'.format(args.hedge_token, str(e)))
+            return 1
+
+    # Call the Whisperer
+    options: HiderConfiguration = HiderConfiguration(model,
+                                                     token,
+                                                     debug_path=Path(debug_dir) if debug_dir else None,
+                                                     verbose=verbose_flag,
+                                                     dry_run=dry_run_flag,
+                                                     batch_mode=batch_mode_flag,
+                                                     batch_state_path=Path(batch_state) if batch_state else None,
+                                                     batch_poll_interval=batch_poll_interval,
+                                                     structured_output=structured_output,
+                                                     local_rewrite=local_rewrite,
+                                                     rewrite_rules_path=Path(rewrite_rules) if rewrite_rules else None,
+                                                     job_path=Path(job_dir) if job_dir else None,
+                                                     streaming=stream_flag,
+                                                     concurrency=concurrency,
+                                                     profile=profile is not None,
+                                                     ecc=args.ecc,
+                                                     bits_per_sentence=args.bits_per_sentence,
+                                                     durability=args.durability,
+                                                     model_cascade=model_cascade,
+                                                     escalate_after=args.escalate_after,
+                                                     hedge_percentile=args.hedge_percentile,
+                                                     hedge_model=args.hedge_model,
+                                                     hedge_token=hedge_token,
+                                                     hedge_base_url=args.hedge_base_url,
+                                                     max_hedge_ratio=args.max_hedge_ratio,
+                                                     haystack_index=args.index_flag or args.index_dir is not None or shard_dir is not None,
+                                                     index_dir=Path(args.index_dir) if args.index_dir is not None else None)
+    if jobs is not None:
+        from .multi_job import MultiJobRunner, JobStatus, STATUS_DONE
+        statuses: list[JobStatus] = MultiJobRunner(MultiJobRunner.load_manifest(jobs), options, requests_per_minute=requests_per_minute,
+                                                   max_attempts=args.max_attempts).run()
+        if report is not None:
+            with open(report, 'w') as f:
+                for status in statuses:
+                    f.write(json.dumps(status.to_dict()) + "\n")
+        return 0 if all(status.status == STATUS_DONE for status in statuses) else 1
+    if shard_dir is not None:
+        return hide_shards(Path(shard_dir), needle_path, haystack_path, output_path, options, args)
+    if stream_flag:
+        from .pipeline import StreamingHider
+        StreamingHider(needle_path, haystack_path, output_path, options, max_attempts=args.max_attempts).hide()
+        return 0
+    from .whisperer import Hider
+    if resume is None:
+        init_env(options.debug_path)
+        hider: Hider = Hider(needle_path, haystack_path, output_path, options)
+    else:
+        try:
+            hider = Hider.resume(options)
+        except ValueError as e:
+            print(str(e))
+            return 1
+    completed: bool = False
+    try:
+        hider.hide()
+        completed = True
+    except HideInterrupted:
+        # Only raised for a job (see Hider.hide): its state is kept
+        print('The job has been interrupted. Resume it with: --resume="{}"'.format(options.job_path))
+        return 130
+    finally:
+        if profile is not None:
+            hider.profiler.write(profile)
+        # The state of an unfinished job is kept, so that the job can be resumed
+        if not debug_flag and (completed or job_dir is None):
+            hider.destroy()
+    return 0
+
+
+def hide_shards(shard_dir: Path, needle_path: Optional[str], haystack_path: Optional[str], output_path: Optional[str],
+                options: 'HiderConfiguration', args: argparse.Namespace) -> int:
+    from .shards import ShardQueue, merge_shards, run_workers
+
+    if needle_path is not None:
+        try:
+            ShardQueue.publish(shard_dir, needle_path, haystack_path, output_path, options, args.shard_size).close()
+        except (OSError, ValueError) as e:
+            print('Error publishing the shards into "{}": {}'.format(shard_dir, str(e)))
+            return 1
+    elif not ShardQueue.exists(shard_dir):
+        print('No sharded hide found in "{}"'.format(shard_dir))
+        return 1
+    queue: ShardQueue = ShardQueue(shard_dir)
+    try:
+        if args.shard_workers == 0:
+            print('{} shards published into "{}"'.format(len(queue.shards()), shard_dir))
+            return 0
+    finally:
+        queue.close()
+    for stats in run_workers(shard_dir, options, args.shard_workers, lease=args.shard_lease, requests_per_minute=args.requests_per_minute,
+                             max_attempts=args.max_attempts):
+        if options.verbose:
+            print('Worker: {}'.format(json.dumps(stats)))
+    # The workers stop once no shard is pending or claimed: the murmur can be assembled (by each node, atomically)
+    try:
+        murmur: str = merge_shards(shard_dir, options)
+    except ValueError as e:
+        print(str(e))
+        return 1
+    if options.verbose:
+        print('Murmur written into "{}"'.format(murmur))
+    return 0
+
+
+def add_reveal_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--verbose',
+                        dest='verbose_flag',
+                        action='store_true',
+                        help='activate verbose output')
+    parser.add_argument('--bulk',
+                        dest='bulk',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='directory or glob pattern of the murmurs to reveal (the output is then a directory)')
+    parser.add_argument('--workers',
+                        dest='workers',
+                        type=int,
+                        required=False,
+                        default=None,
+                        help='number of processes used to reveal the murmurs in bulk (default: the number of CPUs)')
+    parser.add_argument('--report',
+                        dest='report',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the JSONL report of the bulk reveal (default: "<output>/report.jsonl")')
+    parser.add_argument('--profile',
+                        dest='profile',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='path to the JSON profile report (the timeline is written into "<profile>.trace.json")')
+    parser.add_argument('--ecc',
+                        dest='ecc',
+                        type=int,
+                        required=False,
+                        default=0,
+                        help='number of error correcting bytes per block used to hide the needle (the value of --ecc used by the hider, default: 0)')
+    parser.add_argument('--bits-per-sentence',
+                        dest='bits_per_sentence',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help='number of bits hidden into each sentence (the value of --bits-per-sentence used by the hider, default: 1)')
+    parser.add_argument('murmur',
+                        type=str,
+                        nargs='?',
+                        help='path to the text file used as hiding place')
+    parser.add_argument('output',
+                        type=str,
+                        nargs='?',
+                        help='path to the output file (or directory, with --bulk)')
+
+
+def reveal(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+    import os
+    from .conversion import MAX_BITS_PER_SENTENCE
+    from .profiler import Profiler
+    from .revealer import Revealer
+
+    verbose_flag: bool = args.verbose_flag
+    bulk: Optional[str] = args.bulk
+    workers: Optional[int] = args.workers
+    report: Optional[str] = args.report
+    profile: Optional[str] = args.profile
+    murmur_path: str = args.murmur
+    output_path: str = args.output
+    ecc: int = args.ecc
+    bits_per_sentence: int = args.bits_per_sentence
+
+    if bits_per_sentence < 1 or bits_per_sentence > MAX_BITS_PER_SENTENCE:
+        parser.error('--bits-per-sentence must be between 1 and {}'.format(MAX_BITS_PER_SENTENCE))
+    if bulk is not None:
+        # With --bulk, the only positional argument is the output directory
+        if output_path is not None or murmur_path is None:
+            parser.error('--bulk expects a single positional argument: the output directory')
+        output_dir: str = murmur_path
+        from .bulk_reveal import BulkRevealer, find_murmurs
+        murmurs: list[str] = find_murmurs(bulk)
+        if len(murmurs) == 0:
+            print('No murmur found: "{}"'.format(bulk))
+            return 1
+        summary: dict[str, Any] = BulkRevealer(murmurs, output_dir, workers, verbose_flag, ecc, bits_per_sentence).write_report(report if report is not None else os.path.join(output_dir, 'report.jsonl'))
+        print('{} murmurs: {} successes, {} failures ({} murmurs/s)'.format(summary['murmurs'], summary['successes'], summary['failures'], summary['murmurs_per_second']))
+        return 0 if summary['failures'] == 0 else 1
+
+    if murmur_path is None or output_path is None:
+        parser.error('the murmur and the output are required (unless --bulk is used)')
+    profiler: Optional[Profiler] = Profiler() if profile is not None else None
+    revealer = Revealer(murmur_path, output_path, verbose_flag, profiler, ecc=ecc, bits_per_sentence=bits_per_sentence)
+    try:
+        revealer.reveal()
+    finally:
+        if profiler is not None:
+            profiler.write(profile)
+    return 0
+
+
+def add_dump_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('database',
+                        type=str,
+                        help='path to the database file, or to the debug archive')
+    parser.add_argument('output',
+                        type=str,
+                        nargs='?',
+                        default=None,
+                        help='path to the output file (default: standard output)')
+    parser.add_argument('--call',
+                        type=int,
+                        required=False,
+                        default=None,
+                        help='debug archive only: dump the database as it was after this call to the LLM (-1: before the first call, default: after the last call)')
+    parser.add_argument('--calls',
+                        action='store_true',
+                        help='debug archive only: list the calls to the LLM recorded into the archive')
+    parser.add_argument('--requests',
+                        action='store_true',
+                        help='debug archive only: dump the requests sent during the call (one JSON document per line)')
+    parser.add_argument('--responses',
+                        action='store_true',
+                        help='debug archive only: dump the responses received during the call (one JSON document per line)')
+
+
+def dump_archive(args: argparse.Namespace) -> Iterator[str]:
+    from .debug_archive import DebugArchive
+
+    archive = DebugArchive(args.database, init=False)
+    try:
+        if args.calls:
+            for summary in archive.calls():
+                yield 'call {call:<5} | requests: {requests:<5} | responses: {responses:<5} | changes: {changes}'.format(**summary)
+            return
+        call: int = args.call if args.call is not None else archive.last_call()
+        if args.requests:
+            for request in archive.requests(call):
+                yield json.dumps(request, ensure_ascii=False)
+        elif args.responses:
+            for response in archive.responses(call):
+                yield json.dumps(response, ensure_ascii=False)
+        else:
+            yield from archive.dump(call)
+    finally:
+        archive.close()
+
+
+def dump(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+    from .debug_archive import is_archive
+    from .stegano_db import SteganoDb
+
+    database_path: str = args.database
+    output_path: Optional[str] = args.output
+    if not is_archive(database_path):
+        if args.call is not None or args.calls or args.requests or args.responses:
+            parser.error('--call, --calls, --requests and --responses only apply to a debug archive')
+        if output_path is None:
+            parser.error('the output file is required to dump a database')
+        db = SteganoDb(db_path=database_path, init=False)
+        print('Generating dump into "{}"'.format(output_path))
+        db.dump(output_path)
+        return 0
+    if output_path is None:
+        for line in dump_archive(args):
+            print(line)
+        return 0
+    print('Generating dump into "{}"'.format(output_path))
+    with open(output_path, 'w') as f:
+        for line in dump_archive(args):
+            print(line, file=f)
+    return 0
+
+
+def add_check_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('input',
+                        type=str,
+                        help='path to the file to check (a stegano database, the debug archive, or a dump)')
+    parser.add_argument('--call',
+                        type=int,
+                        required=False,
+                        default=None,
+                        help='debug archive only: check the database as it was after this call to the LLM (default: after the last call)')
+    parser.add_argument('--bits-per-sentence',
+                        dest='bits_per_sentence',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help='stegano database only: number of bits hidden into each sentence (the value of --bits-per-sentence used by the hider, default: 1)')
+
+
+def check(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+    from .debug_archive import DebugArchive, is_archive, is_sqlite
+    from .post_dump import check_post_dump, check_post_dump_lines, check_stegano_db
+    from .stegano_db import SteganoDb
+
+    if args.bits_per_sentence != 1 and (is_archive(args.input) or not is_sqlite(args.input)):
+        parser.error('--bits-per-sentence only applies to a stegano database')
+    if is_archive(args.input):
+        archive = DebugArchive(args.input, init=False)
+        try:
+            for line in check_post_dump_lines(archive.dump(args.call)):
+                print(line)
+        finally:
+            archive.close()
+        return 0
+    if args.call is not None:
+        parser.error('--call only applies to a debug archive')
+    if is_sqlite(args.input):
+        # The input is not modified: the words of a database created by an older version are counted while it is checked
+        db = SteganoDb(db_path=args.input, read_only=True)
+        try:
+            for line in check_stegano_db(db, 1 << args.bits_per_sentence):
+                print(line)
+        finally:
+            db.close()
+        return 0
+    for line in check_post_dump(args.input):
+        print(line)
+    return 0
+
+
+def add_select_haystack_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('needle',
+                        type=str,
+                        help='path to the text file to hide')
+    parser.add_argument('haystacks',
+                        type=str,
+                        nargs='+',
+                        help='candidate haystacks: text files, or directories of text files')
+    parser.add_argument('--pattern',
+                        dest='pattern',
+                        type=str,
+                        required=False,
+                        default='*.txt',
+                        help='pattern of the candidate haystacks in the directories (default: "*.txt")')
+    parser.add_argument('--index-dir',
+                        dest='index_dir',
+                        type=str,
+                        required=False,
+                        default=None,
+                        help='directory of the haystack indexes (default: the indexes are stored next to the haystacks)')
+    parser.add_argument('--bits-per-sentence',
+                        dest='bits_per_sentence',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help='number of bits hidden into each sentence (the value of --bits-per-sentence used to hide, default: 1)')
+    parser.add_argument('--ecc',
+                        dest='ecc',
+                        type=int,
+                        required=False,
+                        default=0,
+                        help='number of error correcting bytes per block (the value of --ecc used to hide, default: 0)')
+    parser.add_argument('--offsets',
+                        dest='offsets',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help='number of start sentences tried in each haystack, evenly spaced (default: 1, the needle starts at the first sentence, as in the hider)')
+    parser.add_argument('--top',
+                        dest='top',
+                        type=int,
+                        required=False,
+                        default=None,
+                        help='number of candidates printed (default: all)')
+    parser.add_argument('--json',
+                        dest='json_flag',
+                        action='store_true',
+                        help='print the candidates as JSON')
+    parser.add_argument('--verbose',
+                        dest='verbose_flag',
+                        action='store_true',
+                        help='activate verbose output')
+
+
+def select_haystack(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+    from .conversion import MAX_BITS_PER_SENTENCE
+    from .ecc import MAX_ECC_SYMBOLS
+    from .haystack_selector import Candidate, HaystackSelector, candidates_lines, find_haystacks
+
+    if args.bits_per_sentence < 1 or args.bits_per_sentence > MAX_BITS_PER_SENTENCE:
+        parser.error('--bits-per-sentence must be between 1 and {}'.format(MAX_BITS_PER_SENTENCE))
+    if args.ecc != 0 and (args.ecc < 2 or args.ecc > MAX_ECC_SYMBOLS):
+        parser.error('--ecc must be between 2 and {}'.format(MAX_ECC_SYMBOLS))
+    if args.offsets < 1:
+        parser.error('--offsets must be at least 1')
+    haystacks: list[str] = find_haystacks(args.haystacks, args.pattern)
+    if len(haystacks) == 0:
+        print('No candidate haystack found')
+        return 1
+    try:
+        selector: HaystackSelector = HaystackSelector(args.needle, args.bits_per_sentence, args.ecc,
+                                                      Path(args.index_dir) if args.index_dir is not None else None, args.offsets)
+        candidates: list[Candidate] = selector.select(haystacks, args.verbose_flag)
+    except OSError as e:
+        print('Error reading the needle or the haystacks: {}'.format(str(e)))
+        return 1
+    if args.top is not None:
+        candidates = candidates[:args.top]
+    if args.json_flag:
+        print(json.dumps([c.to_dict() for c in candidates], indent=4))
+    else:
+        for line in candidates_lines(candidates):
+            print(line)
+    return 0 if len(candidates) > 0 and candidates[0].enough() else 1
+
+
+COMMANDS: dict[str, tuple[str, Any, Any]] = {
+    'hide': ('Hide a text file within a generated text file.', add_hide_arguments, hide),
+    'reveal': ('Reveal a text file hidden within another text file', add_reveal_arguments, reveal),
+    'dump': ('Dump a steganographic database, or a snapshot of the debug archive', add_dump_arguments, dump),
+    'check': ('Check the parity of the reformulations of a stegano database, of a snapshot of the debug archive, or of a dump', add_check_arguments, check),
+    'select-haystack': ('Rank candidate haystacks by the number of sentences to reformulate to hide a needle', add_select_haystack_arguments, select_haystack)
+}
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='whisper', description='Hide a text file within another text file, by modifying the parity of the number of words of its sentences.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    parsers: dict[str, argparse.ArgumentParser] = {}
+    for name, (description, add_arguments, _) in COMMANDS.items():
+        parsers[name] = subparsers.add_parser(name, description=description, help=description)
+        add_arguments(parsers[name])
+    args = parser.parse_args(argv)
+    return COMMANDS[args.command][2](parsers[args.command], args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+from typing import Any, Callable, Optional, Union
+import json
+
+# The JSON codecs used on the hot paths (the requests stored into the DiskList, the responses of the LLM, the JSONL
+# exports): compact separators, no sorting of the keys, and the non-ASCII characters kept as is. The fastest
+# backend installed is used: orjson, then msgspec, then the standard library (orjson and msgspec are optional).
+# The pretty-printed form (see dumps_pretty) is kept for the files read by humans (debug archive, states).
+CODEC_JSON: str = 'json'
+CODEC_ORJSON: str = 'orjson'
+CODEC_MSGSPEC: str = 'msgspec'
+# The backends, from the fastest to the slowest
+CODEC_PREFERENCE: list[str] = [CODEC_ORJSON, CODEC_MSGSPEC, CODEC_JSON]
+
+
+class JsonCodec:
+
+    def __init__(self, name: str, encode: Callable[[Any], Union[str, bytes]], decode: Callable[[Union[str, bytes]], Any], errors: tuple[type[Exception], ...] = ()) -> None:
+        """
+        A JSON backend.
+
+        :param name: The name of the backend.
+        :param encode: The function that serializes an object (to a string or to UTF-8 bytes).
+        :param decode: The function that deserializes a document.
+        :param errors: The exceptions raised by `decode` for an invalid document, other than ValueError.
+        """
+        self.name: str = name
+        self.encode: Callable[[Any], Union[str, bytes]] = encode
+        self.decode: Callable[[Union[str, bytes]], Any] = decode
+        self.errors: tuple[type[Exception], ...] = errors
+
+    def dumps(self, data: Any) -> str:
+        encoded: Union[str, bytes] = self.encode(data)
+        return encoded.decode('utf-8') if isinstance(encoded, bytes) else encoded
+
+    def loads(self, text: Union[str, bytes]) -> Any:
+        """Deserialize a document. Raise a ValueError if the document is not valid JSON, whatever the backend."""
+        try:
+            return self.decode(text)
+        except ValueError:
+            raise
+        except self.errors as e:
+            raise ValueError(str(e))
+
+
+def json_codec() -> JsonCodec:
+    return JsonCodec(CODEC_JSON, lambda data: json.dumps(data, ensure_ascii=False, separators=(',', ':')), json.loads)
+
+
+def orjson_codec() -> JsonCodec:
+    import orjson
+    return JsonCodec(CODEC_ORJSON, orjson.dumps, orjson.loads)
+
+
+def msgspec_codec() -> JsonCodec:
+    import msgspec
+    return JsonCodec(CODEC_MSGSPEC, msgspec.json.encode, msgspec.json.decode, (msgspec.DecodeError,))
+
+
+CODECS: dict[str, Callable[[], JsonCodec]] = {
+    CODEC_JSON: json_codec,
+    CODEC_ORJSON: orjson_codec,
+    CODEC_MSGSPEC: msgspec_codec
+}
+
+
+def get_codec(name: str) -> JsonCodec:
+    """Return a backend by name. Raise an ImportError if the backend is not installed."""
+    if name not in CODECS:
+        raise ValueError('Unknown JSON codec "{}" (available: {})'.format(name, ', '.join(CODECS.keys())))
+    return CODECS[name]()
+
+
+def available_codecs() -> list[str]:
+    """Return the names of the backends installed, from the fastest to the slowest."""
+    names: list[str] = []
+    for name in CODEC_PREFERENCE:
+        try:
+            get_codec(name)
+            names.append(name)
+        except ImportError:
+            continue
+    return names
+
+
+# The backend used by dumps and loads (selected on first use, see default_codec)
+_codec: Optional[JsonCodec] = None
+
+
+def default_codec() -> JsonCodec:
+    global _codec
+    if _codec is None:
+        _codec = get_codec(available_codecs()[0])
+    return _codec
+
+
+def set_codec(name: Optional[str]) -> JsonCodec:
+    """Select the backend used by dumps and loads (None: the fastest installed)."""
+    global _codec
+    _codec = get_codec(name) if name is not None else None
+    return default_codec()
+
+
+def dumps(data: Any) -> str:
+    """Serialize an object into a compact JSON document (hot paths)."""
+    return default_codec().dumps(data)
+
+
+def loads(text: Union[str, bytes]) -> Any:
+    """Deserialize a JSON document. Raise a ValueError if the document is not valid."""
+    return default_codec().loads(text)
+
+
+def dumps_pretty(data: Any) -> str:
+    """Serialize an object into an indented JSON document, with sorted keys (files read by humans)."""
+    return json.dumps(data, indent=4, ensure_ascii=False, sort_keys=True)
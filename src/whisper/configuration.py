@@ -0,0 +1,34 @@
+from typing import Optional
+from pathlib import Path
+from dataclasses import dataclass
+
+
+@dataclass
+class HiderConfiguration:
+    model: str
+    token: str
+    debug_path: Optional[Path] = None
+    verbose: bool = False
+    dry_run: bool = False
+    batch_mode: bool = False
+    batch_state_path: Optional[Path] = None
+    batch_poll_interval: float = 60.0
+    structured_output: bool = True
+    local_rewrite: bool = True
+    rewrite_rules_path: Optional[Path] = None
+    job_path: Optional[Path] = None
+    streaming: bool = False
+    concurrency: int = 4
+    profile: bool = False
+    ecc: int = 0
+    bits_per_sentence: int = 1
+    durability: Optional[str] = None
+    model_cascade: Optional[list[str]] = None
+    escalate_after: int = 1
+    hedge_percentile: Optional[float] = None
+    hedge_model: Optional[str] = None
+    hedge_token: Optional[str] = None
+    hedge_base_url: Optional[str] = None
+    max_hedge_ratio: float = 0.1
+    haystack_index: bool = False
+    index_dir: Optional[Path] = None
@@ -2,6 +2,9 @@
 from .types import Bit, Int64
 from typing import cast
 
+# The maximum number of bits hidden into one sentence (the number of words modulo 16)
+MAX_BITS_PER_SENTENCE: int = 4
+
 class Conversion:
 
     @staticmethod
@@ -46,3 +49,22 @@ class Conversion:
                 byte = (byte << 1) | bit
             bytes_list.append(byte)
         return bytes(bytes_list)
+
+    @staticmethod
+    def bit_list_to_symbols(bits: list[Bit], bits_per_symbol: int) -> list[int]:
+        """Group a list of bits into symbols of `bits_per_symbol` bits (the last symbol is padded with zeros)."""
+        symbols: list[int] = []
+        for i in range(0, len(bits), bits_per_symbol):
+            group: list[Bit] = bits[i:i + bits_per_symbol]
+            symbol: int = 0
+            for bit in group:
+                symbol = (symbol << 1) | bit
+            symbols.append(symbol << (bits_per_symbol - len(group)))
+        return symbols
+
+    @staticmethod
+    def symbols_to_bit_list(symbols: list[int], bits_per_symbol: int) -> list[Bit]:
+        """Convert symbols of `bits_per_symbol` bits to a list of bits."""
+        if bits_per_symbol == 1:
+            return cast(list[Bit], list(symbols))
+        return [cast(Bit, (symbol >> i) & 1) for symbol in symbols for i in range(bits_per_symbol - 1, -1, -1)]
@@ -0,0 +1,157 @@
+from typing import Optional, Generator, Iterable, Any
+import json
+import sqlite3
+
+from .stegano_db import SteganoDb
+
+# The name of the archive, in the debug directory
+ARCHIVE_NAME: str = 'debug-archive.sqlite'
+# The call number of the state of the database before the first call to the LLM
+PREPARED_CALL: int = -1
+
+SQLITE_HEADER: bytes = b'SQLite format 3\x00'
+
+
+def is_sqlite(path: str) -> bool:
+    """Test whether a file is a SQLite database (and not a text dump)."""
+    with open(path, 'rb') as f:
+        return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+
+def is_archive(path: str) -> bool:
+    """Test whether a file is a debug archive (and not a stegano database or a text dump)."""
+    if not is_sqlite(path):
+        return False
+    db = sqlite3.connect(path)
+    try:
+        tables: set[str] = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        db.close()
+    return {'sentences', 'changes'}.issubset(tables)
+
+
+class DebugArchive:
+
+    def __init__(self, path: str, init: bool = True) -> None:
+        """
+        Append-only archive of the debug artifacts of a run.
+
+        The archive records the state of the sentences before the first call to the LLM, the requests, the responses
+        and, for each call, only the reformulations that changed. Any snapshot of the database (after a given call)
+        is rebuilt on demand from these records.
+
+        :param path: The path to the archive.
+        :param init: If True, the tables are created (if they don't exist).
+        """
+        self.path: str = path
+        self.db: sqlite3.Connection = sqlite3.connect(path)
+        if init:
+            cursor = self.db.cursor()
+            try:
+                cursor.execute("""CREATE TABLE IF NOT EXISTS requests ("id" INTEGER PRIMARY KEY,
+                                                                       "call" INTEGER NOT NULL,
+                                                                       "request" INTEGER NOT NULL,
+                                                                       "positions" TEXT NOT NULL,
+                                                                       "messages" TEXT NOT NULL)""")
+                cursor.execute('CREATE INDEX IF NOT EXISTS requests_call ON requests ("call", "request")')
+                cursor.execute("""CREATE TABLE IF NOT EXISTS responses ("id" INTEGER PRIMARY KEY,
+                                                                        "call" INTEGER NOT NULL,
+                                                                        "request" INTEGER NOT NULL,
+                                                                        "response" TEXT NOT NULL)""")
+                cursor.execute('CREATE INDEX IF NOT EXISTS responses_call ON responses ("call", "request")')
+                cursor.execute("""CREATE TABLE IF NOT EXISTS sentences ("position" INTEGER PRIMARY KEY,
+                                                                        "sentence" TEXT NOT NULL,
+                                                                        "prompt" TEXT DEFAULT NULL,
+                                                                        "reformulation" TEXT DEFAULT NULL)""")
+                cursor.execute("""CREATE TABLE IF NOT EXISTS changes ("id" INTEGER PRIMARY KEY,
+                                                                      "call" INTEGER NOT NULL,
+                                                                      "request" INTEGER NOT NULL,
+                                                                      "position" INTEGER NOT NULL,
+                                                                      "reformulation" TEXT NOT NULL)""")
+                cursor.execute('CREATE INDEX IF NOT EXISTS changes_position ON changes ("position", "call")')
+                cursor.execute('CREATE INDEX IF NOT EXISTS changes_call ON changes ("call")')
+            finally:
+                cursor.close()
+            self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def commit(self) -> None:
+        self.db.commit()
+
+    def add_sentences(self, rows: Iterable[tuple[int, str, Optional[str], Optional[str]]]) -> None:
+        """
+        Record the state of the sentences before the first call to the LLM.
+
+        :param rows: The rows (position, sentence, prompt, reformulation).
+        """
+        self.db.executemany('INSERT OR REPLACE INTO sentences ("position", "sentence", "prompt", "reformulation") VALUES (?, ?, ?, ?)', rows)
+
+    def add_request(self, call: int, request: int, positions: list[int], messages: str) -> None:
+        self.db.execute('INSERT INTO requests ("call", "request", "positions", "messages") VALUES (?, ?, ?, ?)', (call, request, json.dumps(positions), messages))
+
+    def add_response(self, call: int, request: int, response: str) -> None:
+        self.db.execute('INSERT INTO responses ("call", "request", "response") VALUES (?, ?, ?)', (call, request, response))
+
+    def add_changes(self, call: int, request: int, reformulations: dict[int, str]) -> None:
+        """
+        Record the reformulations extracted from a response.
+
+        :param call: The call number.
+        :param request: The index of the request, within the call.
+        :param reformulations: The reformulations (position -> reformulation).
+        """
+        self.db.executemany('INSERT INTO changes ("call", "request", "position", "reformulation") VALUES (?, ?, ?, ?)',
+                            [(call, request, p, s) for p, s in reformulations.items()])
+
+    def last_call(self) -> int:
+        """Return the number of the last call recorded (PREPARED_CALL if the LLM has not been called)."""
+        row = self.db.execute('SELECT max("call") FROM (SELECT "call" FROM changes UNION ALL SELECT "call" FROM responses)').fetchone()
+        return row[0] if row[0] is not None else PREPARED_CALL
+
+    def calls(self) -> list[dict[str, int]]:
+        """Return a summary of the calls: number of requests, responses and changed rows per call."""
+        summary: dict[int, dict[str, int]] = {}
+        for table in ('requests', 'responses', 'changes'):
+            for call, count in self.db.execute('SELECT "call", count(*) FROM {} GROUP BY "call"'.format(table)):
+                summary.setdefault(call, {'call': call, 'requests': 0, 'responses': 0, 'changes': 0})[table] = count
+        return [summary[call] for call in sorted(summary)]
+
+    def snapshot(self, call: Optional[int] = None) -> Generator[tuple[int, str, Optional[str], Optional[str]], None, None]:
+        """
+        Rebuild the state of the database after a call to the LLM.
+
+        :param call: The call number (PREPARED_CALL: before the first call, None: after the last call).
+        :return: The rows (position, sentence, prompt, reformulation), ordered by position.
+        """
+        if call is None:
+            call = self.last_call()
+        cursor = self.db.cursor()
+        try:
+            res = cursor.execute("""SELECT s."position", s."sentence", s."prompt",
+                                           coalesce((SELECT c."reformulation" FROM changes c
+                                                     WHERE c."position" = s."position" AND c."call" <= ?
+                                                     ORDER BY c."call" DESC, c."id" DESC LIMIT 1), s."reformulation")
+                                    FROM sentences s
+                                    ORDER BY s."position"
+                                 """, (call,))
+            for row in res:
+                yield row
+        finally:
+            cursor.close()
+
+    def dump(self, call: Optional[int] = None) -> Generator[str, None, None]:
+        """Return the lines of the dump of a snapshot (same format as SteganoDb.dump)."""
+        rows: list[tuple[int, str, Optional[str], Optional[str]]] = list(self.snapshot(call))
+        max_sentence_length: int = max((len(r[1]) for r in rows), default=0)
+        max_reformulation_length: int = max((len(r[3]) for r in rows if r[3] is not None), default=0)
+        return SteganoDb.format_dump(rows, max_sentence_length, max_reformulation_length)
+
+    def requests(self, call: int) -> Generator[dict[str, Any], None, None]:
+        for request, positions, messages in self.db.execute('SELECT "request", "positions", "messages" FROM requests WHERE "call" = ? ORDER BY "request", "id"', (call,)):
+            yield {'call': call, 'request': request, 'positions': json.loads(positions), 'messages': json.loads(messages)}
+
+    def responses(self, call: int) -> Generator[dict[str, Any], None, None]:
+        for request, response in self.db.execute('SELECT "request", "response" FROM responses WHERE "call" = ? ORDER BY "request", "id"', (call,)):
+            yield {'call': call, 'request': request, 'response': response}
@@ -0,0 +1,112 @@
+from typing import Callable, Optional
+from pathlib import Path
+import queue
+import threading
+import time
+
+from .profiler import Profiler, DISABLED
+from .debug_archive import DebugArchive, ARCHIVE_NAME
+
+# The maximum number of debug records waiting to be written (the producers wait beyond this limit)
+DEBUG_QUEUE_SIZE: int = 1024
+# The maximum number of records written into the archive between two commits
+COMMIT_INTERVAL: int = 256
+
+END = object()
+
+
+class DebugWriter:
+
+    def __init__(self, path: Optional[Path], profiler: Optional[Profiler] = None, queue_size: int = DEBUG_QUEUE_SIZE) -> None:
+        """
+        Write the debug records (requests, responses, changed sentences...) into the debug archive, from a background thread.
+
+        The records are queued by the hider and written by the writer thread, so that the hider only pays the cost of
+        queuing them. The queue is bounded: if the writer cannot keep up, the hider waits. The archive is committed
+        when the queue is empty (or every COMMIT_INTERVAL records).
+
+        :param path: The path to the directory where the debug archive will be written (None: debug is disabled).
+        :param profiler: The profiler used to measure the writer (default: no profiling).
+        :param queue_size: The maximum number of records waiting to be written.
+        """
+        self.path: Optional[Path] = path
+        self.profiler: Profiler = profiler if profiler is not None else DISABLED
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.thread: Optional[threading.Thread] = None
+        self.items_count: int = 0
+        self.commits_count: int = 0
+        self.busy_seconds: float = 0.0
+        self.wait_seconds: float = 0.0
+        self.errors_count: int = 0
+        self.error: Optional[BaseException] = None
+
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def archive_path(self) -> Optional[Path]:
+        return self.path.joinpath(ARCHIVE_NAME) if self.path is not None else None
+
+    def submit(self, record: Callable[[DebugArchive], None]) -> None:
+        """
+        Queue a record.
+
+        :param record: The function that writes the record into the archive (called by the writer thread).
+        """
+        if self.path is None:
+            return
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='debug-writer', daemon=True)
+            self.thread.start()
+        start: float = time.perf_counter()
+        self.queue.put(record)
+        self.wait_seconds += time.perf_counter() - start
+
+    def run(self) -> None:
+        # The archive is opened by the writer thread: SQLite connections are bound to the thread that creates them
+        try:
+            archive: DebugArchive = DebugArchive(str(self.archive_path()))
+        except Exception as e:
+            self.errors_count += 1
+            self.error = e
+            while self.queue.get() is not END:
+                self.errors_count += 1
+            return
+        pending: int = 0
+        try:
+            while True:
+                item = self.queue.get()
+                if item is END:
+                    break
+                start: float = time.perf_counter()
+                try:
+                    with self.profiler.stage('debug_write'):
+                        item(archive)
+                        pending += 1
+                        if pending >= COMMIT_INTERVAL or self.queue.empty():
+                            archive.commit()
+                            self.commits_count += 1
+                            pending = 0
+                except Exception as e:
+                    # The debug records must not stop the hider: the errors are reported when the writer is closed
+                    self.errors_count += 1
+                    if self.error is None:
+                        self.error = e
+                    continue
+                self.busy_seconds += time.perf_counter() - start
+                self.items_count += 1
+                self.profiler.count('debug.items')
+        finally:
+            archive.commit()
+            archive.close()
+
+    def close(self) -> None:
+        """Wait until all the queued records are written."""
+        if self.thread is None:
+            return
+        self.queue.put(END)
+        self.thread.join()
+        self.thread = None
+        if self.error is not None:
+            print("WARNING: unable to write {} debug records: {}".format(self.errors_count, str(self.error)))
+            self.error = None
+            self.errors_count = 0
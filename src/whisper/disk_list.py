@@ -1,16 +1,17 @@
 from typing import Optional
-from .rand_tools import RandTools
+from .durability import DURABILITY_DEFAULT, apply_durability, checkpoint, default_db_path
 import os
 import sqlite3
 from pathlib import Path
 
 
 class DiskList:
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(self, db_path: Optional[str] = None, durability: str = DURABILITY_DEFAULT):
         if db_path is None:
-            db_path = 'disk-list-' + RandTools.random_string(10) + '.sqlite'
+            db_path = default_db_path('disk-list-', durability)
         self.db_file_path: Path = Path(db_path)
         self.db = sqlite3.connect(db_path)
+        apply_durability(self.db, durability)
         cursor: sqlite3.Cursor = self.db.cursor()
         try:
             cursor.execute("CREATE TABLE IF NOT EXISTS t (idx INTEGER PRIMARY KEY, value BLOB)")
@@ -28,6 +29,10 @@ class DiskList:
             print("Unable to remove file: " + str(self.db_file_path), flush=True)
         self.db = None
 
+    def checkpoint(self) -> None:
+        """Copy the write-ahead log of a durable list into the database (see durability.checkpoint)."""
+        checkpoint(self.db)
+
     def append(self, value: str) -> None:
         cursor: sqlite3.Cursor = self.db.cursor()
         try:
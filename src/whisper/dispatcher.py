@@ -0,0 +1,96 @@
+from typing import Any, Optional, Callable, Generator, Generic, Tuple, Protocol
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+import threading
+import time
+
+from .types import T
+
+# The maximum number of attempts for a sentence (invalid reformulations and failed requests) before giving up
+DEFAULT_MAX_ATTEMPTS: int = 10
+# After a failed request, the next round of requests waits BACKOFF_BASE * 2^(n-1) seconds (n consecutive rounds with
+# errors), at most BACKOFF_MAX seconds
+BACKOFF_BASE: float = 1.0
+BACKOFF_MAX: float = 60.0
+# The HTTP statuses of the errors that are not fixed by sending the request again (bad request, authentication,
+# permission, unknown model, unprocessable request)
+NON_RETRYABLE_STATUSES: frozenset[int] = frozenset({400, 401, 403, 404, 422})
+
+
+def retryable(error: Exception) -> bool:
+    """Test whether a failed request may succeed if it is sent again (the API errors carry their HTTP status)."""
+    return getattr(error, 'status_code', None) not in NON_RETRYABLE_STATUSES
+
+
+def backoff_delay(failures: int, base: float = BACKOFF_BASE) -> float:
+    """Return the number of seconds to wait after `failures` consecutive rounds of requests with errors."""
+    if failures <= 0:
+        return 0.0
+    return min(base * 2 ** (failures - 1), BACKOFF_MAX)
+
+
+class LLMClient(Protocol):
+
+    def call(self, messages: list[dict[str, str]], response_format: Optional[dict[str, Any]] = None) -> str: ...
+
+
+class RateLimiter:
+
+    def __init__(self, requests_per_minute: Optional[float] = None) -> None:
+        """
+        Space the requests evenly so that no more than `requests_per_minute` requests are started per minute.
+
+        :param requests_per_minute: The maximum number of requests per minute (None: no limit).
+        """
+        self.interval: float = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.lock: threading.Lock = threading.Lock()
+        self.next_time: float = 0.0
+
+    def acquire(self) -> None:
+        """Wait until a new request can be started."""
+        if self.interval == 0.0:
+            return
+        with self.lock:
+            now: float = time.monotonic()
+            start: float = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class Dispatcher(Generic[T]):
+
+    def __init__(self, client: LLMClient, concurrency: int = 4, rate_limiter: Optional[RateLimiter] = None,
+                 response_format: Optional[dict[str, Any]] = None) -> None:
+        """
+        Send requests to the LLM from a pool of threads, within the limits of a rate limiter.
+
+        :param client: The client used to call the LLM.
+        :param concurrency: The number of requests sent simultaneously.
+        :param rate_limiter: The rate limiter shared by all the requests (default: no limit).
+        :param response_format: the format of the responses (structured outputs), if any.
+        """
+        self.client: LLMClient = client
+        self.concurrency: int = concurrency
+        self.rate_limiter: RateLimiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.response_format: Optional[dict[str, Any]] = response_format
+        self.requests_count: int = 0
+
+    def call(self, messages: list[dict[str, str]]) -> str:
+        self.rate_limiter.acquire()
+        return self.client.call(messages, self.response_format)
+
+    def run(self, batches: list[T], build: Callable[[T], list[dict[str, str]]]) -> Generator[Tuple[T, Optional[str], Optional[Exception]], None, None]:
+        """
+        Send one request per batch. Yield each batch with the response of the LLM (or the error), as soon as it is received.
+
+        :param batches: The batches to send.
+        :param build: The function that builds the messages of the request for a batch.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures: dict[Future, T] = {executor.submit(self.call, build(batch)): batch for batch in batches}
+            self.requests_count += len(futures)
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
@@ -0,0 +1,69 @@
+from typing import Optional
+import os
+import sqlite3
+
+from .rand_tools import RandTools
+
+# The durability profiles of the SQLite databases used by the hider (see SteganoDb and DiskList)
+# - default: the SQLite defaults (rollback journal, full synchronous commits).
+# - ephemeral: the databases are deleted at the end of the hide (see destroy): nothing is synchronized, the journal
+#   and the temporary tables are kept in memory, and the databases created without a path are placed on a tmpfs.
+# - durable: the databases of a resumable job survive a crash of the process: write-ahead log, checkpointed
+#   periodically (every WAL_AUTOCHECKPOINT pages, and after each call to the LLM, see checkpoint).
+DURABILITY_DEFAULT: str = 'default'
+DURABILITY_EPHEMERAL: str = 'ephemeral'
+DURABILITY_DURABLE: str = 'durable'
+# The size of the page cache of the ephemeral databases (in KB)
+EPHEMERAL_CACHE_SIZE: int = 65536
+# The number of pages of the write-ahead log that triggers a checkpoint
+WAL_AUTOCHECKPOINT: int = 1000
+DURABILITY_PROFILES: dict[str, tuple[str, ...]] = {
+    DURABILITY_DEFAULT: (),
+    DURABILITY_EPHEMERAL: ('PRAGMA journal_mode=MEMORY',
+                           'PRAGMA synchronous=OFF',
+                           'PRAGMA temp_store=MEMORY',
+                           'PRAGMA cache_size=-{}'.format(EPHEMERAL_CACHE_SIZE)),
+    DURABILITY_DURABLE: ('PRAGMA journal_mode=WAL',
+                         'PRAGMA synchronous=NORMAL',
+                         'PRAGMA wal_autocheckpoint={}'.format(WAL_AUTOCHECKPOINT))
+}
+# The directory used to store the ephemeral databases, if it exists (a tmpfs on most Linux systems)
+TMPFS_PATH: str = '/dev/shm'
+
+
+def check_durability(durability: str) -> None:
+    if durability not in DURABILITY_PROFILES:
+        raise ValueError('Unknown durability profile "{}" (available: {})'.format(durability, ', '.join(DURABILITY_PROFILES.keys())))
+
+
+def resolve_durability(durability: Optional[str], resumable: bool) -> str:
+    """
+    Return the durability profile of the databases of a hide.
+
+    :param durability: The requested profile (None: "durable" for a resumable job, "ephemeral" otherwise).
+    :param resumable: True if the hide is a resumable job.
+    """
+    if durability is None:
+        return DURABILITY_DURABLE if resumable else DURABILITY_EPHEMERAL
+    check_durability(durability)
+    return durability
+
+
+def apply_durability(db: sqlite3.Connection, durability: str) -> None:
+    """Set the pragmas of a durability profile on a connection."""
+    check_durability(durability)
+    for pragma in DURABILITY_PROFILES[durability]:
+        db.execute(pragma).fetchall()
+
+
+def default_db_path(prefix: str, durability: str) -> str:
+    """Return the path of a database created without a path (the ephemeral databases are placed on a tmpfs, if any)."""
+    name: str = prefix + RandTools.random_string(10) + '.sqlite'
+    if durability == DURABILITY_EPHEMERAL and os.path.isdir(TMPFS_PATH) and os.access(TMPFS_PATH, os.W_OK):
+        return os.path.join(TMPFS_PATH, name)
+    return name
+
+
+def checkpoint(db: sqlite3.Connection) -> None:
+    """Copy the write-ahead log into the database, without blocking (no effect if the database does not use a WAL)."""
+    db.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchall()
@@ -0,0 +1,254 @@
+from typing import Iterable
+
+# Reed-Solomon code over GF(2^8) (primitive polynomial x^8 + x^4 + x^3 + x^2 + 1, generator roots 2^0, 2^1...).
+# The polynomials are lists of coefficients, highest degree first.
+
+PRIMITIVE_POLYNOMIAL: int = 0x11d
+# The maximum size of a block (data and ECC bytes)
+BLOCK_SIZE: int = 255
+# The number of bytes used to store the length of the needle
+LENGTH_SIZE: int = 8
+# The number of ECC bytes is limited to half a block
+MAX_ECC_SYMBOLS: int = 128
+
+GF_EXP: list[int] = [0] * 512
+GF_LOG: list[int] = [0] * 256
+_x: int = 1
+for _i in range(255):
+    GF_EXP[_i] = _x
+    GF_LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= PRIMITIVE_POLYNOMIAL
+for _i in range(255, 512):
+    GF_EXP[_i] = GF_EXP[_i - 255]
+
+
+def gf_mul(a: int, b: int) -> int:
+    if a == 0 or b == 0:
+        return 0
+    return GF_EXP[GF_LOG[a] + GF_LOG[b]]
+
+
+def gf_div(a: int, b: int) -> int:
+    if b == 0:
+        raise ZeroDivisionError()
+    if a == 0:
+        return 0
+    return GF_EXP[(GF_LOG[a] + 255 - GF_LOG[b]) % 255]
+
+
+def gf_pow(a: int, n: int) -> int:
+    return GF_EXP[(GF_LOG[a] * n) % 255]
+
+
+def gf_inverse(a: int) -> int:
+    return GF_EXP[255 - GF_LOG[a]]
+
+
+def poly_scale(p: list[int], x: int) -> list[int]:
+    return [gf_mul(c, x) for c in p]
+
+
+def poly_add(p: list[int], q: list[int]) -> list[int]:
+    r: list[int] = [0] * max(len(p), len(q))
+    for i in range(len(p)):
+        r[i + len(r) - len(p)] = p[i]
+    for i in range(len(q)):
+        r[i + len(r) - len(q)] ^= q[i]
+    return r
+
+
+def poly_mul(p: list[int], q: list[int]) -> list[int]:
+    r: list[int] = [0] * (len(p) + len(q) - 1)
+    for j in range(len(q)):
+        for i in range(len(p)):
+            r[i + j] ^= gf_mul(p[i], q[j])
+    return r
+
+
+def poly_eval(p: list[int], x: int) -> int:
+    y: int = p[0]
+    for c in p[1:]:
+        y = gf_mul(y, x) ^ c
+    return y
+
+
+def poly_remainder(dividend: list[int], divisor: list[int]) -> list[int]:
+    out: list[int] = list(dividend)
+    for i in range(len(dividend) - (len(divisor) - 1)):
+        coef: int = out[i]
+        if coef != 0:
+            for j in range(1, len(divisor)):
+                if divisor[j] != 0:
+                    out[i + j] ^= gf_mul(divisor[j], coef)
+    return out[-(len(divisor) - 1):]
+
+
+def generator_polynomial(nsym: int) -> list[int]:
+    g: list[int] = [1]
+    for i in range(nsym):
+        g = poly_mul(g, [1, gf_pow(2, i)])
+    return g
+
+
+def rs_encode(data: bytes, nsym: int) -> bytes:
+    """Return the block made of the data followed by `nsym` ECC bytes."""
+    generator: list[int] = generator_polynomial(nsym)
+    out: list[int] = list(data) + [0] * nsym
+    for i in range(len(data)):
+        coef: int = out[i]
+        if coef != 0:
+            for j in range(1, len(generator)):
+                out[i + j] ^= gf_mul(generator[j], coef)
+    return bytes(data) + bytes(out[len(data):])
+
+
+def syndromes(block: list[int], nsym: int) -> list[int]:
+    # The leading 0 makes the indices of the syndromes match the powers of the roots
+    return [0] + [poly_eval(block, gf_pow(2, i)) for i in range(nsym)]
+
+
+def error_locator(synd: list[int], nsym: int) -> list[int]:
+    """Compute the error locator polynomial (Berlekamp-Massey)."""
+    locator: list[int] = [1]
+    old: list[int] = [1]
+    for i in range(nsym):
+        k: int = i + 1
+        delta: int = synd[k]
+        for j in range(1, len(locator)):
+            delta ^= gf_mul(locator[-(j + 1)], synd[k - j])
+        old = old + [0]
+        if delta != 0:
+            if len(old) > len(locator):
+                new: list[int] = poly_scale(old, delta)
+                old = poly_scale(locator, gf_inverse(delta))
+                locator = new
+            locator = poly_add(locator, poly_scale(old, delta))
+    while len(locator) > 0 and locator[0] == 0:
+        del locator[0]
+    if (len(locator) - 1) * 2 > nsym:
+        raise ValueError("Too many errors to correct")
+    return locator
+
+
+def error_positions(locator: list[int], size: int) -> list[int]:
+    """Find the positions of the errors (Chien search on the reversed locator)."""
+    positions: list[int] = [size - 1 - i for i in range(size) if poly_eval(locator, gf_pow(2, i)) == 0]
+    if len(positions) != len(locator) - 1:
+        raise ValueError("Too many errors to correct")
+    return positions
+
+
+def correct_errors(block: list[int], synd: list[int], positions: list[int]) -> list[int]:
+    """Compute the magnitudes of the errors (Forney) and correct them."""
+    coef_positions: list[int] = [len(block) - 1 - p for p in positions]
+    locator: list[int] = [1]
+    for i in coef_positions:
+        locator = poly_mul(locator, poly_add([1], [gf_pow(2, i), 0]))
+    # The error evaluator: (syndromes * locator) mod x^(errors + 1)
+    evaluator: list[int] = poly_remainder(poly_mul(synd[::-1], locator), [1] + [0] * len(locator))[::-1]
+    roots: list[int] = [gf_pow(2, i - 255) for i in coef_positions]
+    magnitudes: list[int] = [0] * len(block)
+    for i, root in enumerate(roots):
+        root_inverse: int = gf_inverse(root)
+        denominator: int = 1
+        for j, other in enumerate(roots):
+            if j != i:
+                denominator = gf_mul(denominator, 1 ^ gf_mul(root_inverse, other))
+        y: int = gf_mul(root, poly_eval(evaluator[::-1], root_inverse))
+        magnitudes[positions[i]] = gf_div(y, denominator)
+    return poly_add(block, magnitudes)
+
+
+def rs_decode(block: bytes, nsym: int) -> tuple[bytes, int]:
+    """
+    Correct the errors of a block (at most nsym / 2 bytes).
+
+    :param block: The data followed by the ECC bytes.
+    :param nsym: The number of ECC bytes.
+    :return: The data, and the number of corrected bytes.
+    """
+    values: list[int] = list(block)
+    synd: list[int] = syndromes(values, nsym)
+    if max(synd) == 0:
+        return bytes(values[:-nsym]), 0
+    positions: list[int] = error_positions(error_locator(synd, nsym)[::-1], len(values))
+    values = correct_errors(values, synd, positions)
+    if max(syndromes(values, nsym)) != 0:
+        raise ValueError("Too many errors to correct")
+    return bytes(values[:-nsym]), len(positions)
+
+
+class ErrorCorrection:
+
+    def __init__(self, nsym: int) -> None:
+        """
+        Protect the framed needle (length and body) with a Reed-Solomon code, so that the revealer corrects the
+        sentences that do not have the expected parity.
+
+        The length (8 bytes) is encoded as a block of its own, followed by the blocks of the body: each block
+        contains up to 255 - nsym bytes of the needle followed by `nsym` ECC bytes. Each block corrects up to
+        nsym / 2 wrong bytes (that is: up to nsym / 2 wrong sentences, or more if they are in the same bytes).
+
+        :param nsym: The number of ECC bytes per block (the redundancy).
+        """
+        if nsym < 2 or nsym > MAX_ECC_SYMBOLS:
+            raise ValueError("The number of ECC bytes must be between 2 and {}!".format(MAX_ECC_SYMBOLS))
+        self.nsym: int = nsym
+        self.data_size: int = BLOCK_SIZE - nsym
+        self.header_size: int = LENGTH_SIZE + nsym
+
+    def budget(self) -> int:
+        """Return the number of wrong bytes that can be corrected in each block."""
+        return self.nsym // 2
+
+    def encode(self, body: bytes) -> bytes:
+        """Return the frame of a needle: the encoded length, followed by the encoded blocks of the body."""
+        frame: bytes = rs_encode(len(body).to_bytes(LENGTH_SIZE, 'big'), self.nsym)
+        for offset in range(0, len(body), self.data_size):
+            frame += rs_encode(body[offset:offset + self.data_size], self.nsym)
+        return frame
+
+    def decode_header(self, header: bytes) -> tuple[int, int]:
+        """Return the length of the needle (from the first `header_size` bytes of the frame), and the number of corrected bytes."""
+        data, corrected = rs_decode(header, self.nsym)
+        return int.from_bytes(data, 'big'), corrected
+
+    def decode_length(self, header: bytes) -> int:
+        """Return the length of the needle, from the first `header_size` bytes of the frame."""
+        return self.decode_header(header)[0]
+
+    def body_size(self, length: int) -> int:
+        """Return the number of bytes of the encoded body of a needle of `length` bytes."""
+        blocks: int = (length + self.data_size - 1) // self.data_size
+        return length + blocks * self.nsym
+
+    def capacity(self, frame_size: int) -> int:
+        """Return the length of the longest needle whose frame fits into `frame_size` bytes."""
+        available: int = max(0, frame_size - self.header_size)
+        return (available // BLOCK_SIZE) * self.data_size + max(0, available % BLOCK_SIZE - self.nsym)
+
+    def decode_body(self, encoded: bytes) -> tuple[bytes, int]:
+        """Return the body of the needle, and the number of corrected bytes."""
+        body: bytes = b''
+        corrected: int = 0
+        for offset in range(0, len(encoded), BLOCK_SIZE):
+            data, count = rs_decode(encoded[offset:offset + BLOCK_SIZE], self.nsym)
+            body += data
+            corrected += count
+        return body, corrected
+
+    def block_of(self, byte_index: int) -> int:
+        """Return the block that contains a byte of the frame (0: the length)."""
+        if byte_index < self.header_size:
+            return 0
+        # All the blocks of the body, except the last one, are full
+        return 1 + (byte_index - self.header_size) // BLOCK_SIZE
+
+    def correctable(self, bit_indices: Iterable[int]) -> bool:
+        """Test whether wrong bits of the frame (the positions of the wrong sentences) can all be corrected."""
+        wrong_bytes: dict[int, set[int]] = {}
+        for index in bit_indices:
+            wrong_bytes.setdefault(self.block_of(index // 8), set()).add(index // 8)
+        return all(len(b) <= self.budget() for b in wrong_bytes.values())
@@ -0,0 +1,198 @@
+from typing import Any, Callable, Iterable, Optional
+from dataclasses import dataclass, asdict
+import json
+import math
+
+from .ecc import ErrorCorrection
+from .haystack_index import HaystackIndex
+from .local_rewriter import LocalRewriter
+from .message import Message
+from .pricing import ModelPricing, get_pricing, cost
+from .conversion import Conversion
+from .prompts import PROMPTS_PER_REQUEST, hide_prompt, build_request_messages
+from .sentence import Sentence
+from .text_file_tool import read_sentences_from_file
+from .types import Vector
+
+# The number of bits used to store the length of the needle
+LENGTH_BITS: int = 64
+# The latency of a request before the first output token (in seconds)
+FIRST_TOKEN_LATENCY: float = 1.0
+# The number of output tokens generated per second, for one request
+OUTPUT_TOKENS_PER_SECOND: float = 50.0
+# The number of tokens added by the chat format for each message, and for each request (see llm.calculate_tokens)
+TOKENS_PER_MESSAGE: int = 4
+TOKENS_PER_REQUEST: int = 2
+
+
+def needle_capacity(sentences: int, bits_per_sentence: int = 1, ecc: int = 0) -> int:
+    """Return the number of characters of the longest needle that can be hidden into a number of sentences."""
+    bits: int = sentences * bits_per_sentence
+    if ecc > 0:
+        return ErrorCorrection(ecc).capacity(bits // 8)
+    return max(0, (bits - LENGTH_BITS) // 8)
+
+
+@dataclass
+class Estimate:
+    model: str
+    needle_bits: int
+    bits_per_sentence: int
+    haystack_sentences: int
+    capacity: int
+    unchanged: int
+    local_rewrites: int
+    to_reformulate: int
+    requests: int
+    input_tokens: int
+    output_tokens: int
+    cost: Optional[float]
+    request_latency: float
+    concurrency: int
+    wall_clock: float
+
+    def enough(self) -> bool:
+        """Test whether the haystack contains enough sentences to hide the needle."""
+        return self.haystack_sentences >= self.needle_sentences()
+
+    def needle_sentences(self) -> int:
+        """Return the number of sentences needed to hide the needle."""
+        return (self.needle_bits + self.bits_per_sentence - 1) // self.bits_per_sentence
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = asdict(self)
+        data['enough'] = self.enough()
+        return data
+
+    def lines(self) -> list[str]:
+        return ['Estimation:',
+                '- needle bits:                    {}'.format(self.needle_bits),
+                '- bits per sentence:              {}'.format(self.bits_per_sentence),
+                '- haystack sentences:             {}'.format(self.haystack_sentences),
+                '- capacity (needle characters):   {} ({})'.format(self.capacity, 'enough' if self.enough() else 'NOT ENOUGH'),
+                '- sentences already valid:        {}'.format(self.unchanged),
+                '- sentences rewritten locally:    {}'.format(self.local_rewrites),
+                '- sentences to reformulate:       {}'.format(self.to_reformulate),
+                '- requests:                       {} ({} sentences per request)'.format(self.requests, PROMPTS_PER_REQUEST),
+                '- input tokens:                   {}'.format(self.input_tokens),
+                '- output tokens:                  {}'.format(self.output_tokens),
+                '- cost:                           {}'.format('${:.2f} ({})'.format(self.cost, self.model) if self.cost is not None else 'unknown (no price for "{}")'.format(self.model)),
+                '- latency of a request:           {:.1f} s'.format(self.request_latency),
+                '- wall-clock time:                {:.0f} s ({} concurrent requests)'.format(self.wall_clock, self.concurrency)]
+
+
+def default_token_counter(text: str) -> int:
+    """Count the tokens of a text with the tokenizer used by the hider (see llm.calculate_tokens)."""
+    from .llm import get_encoding
+    return len(get_encoding('gpt-4').encode(text))
+
+
+class Estimator:
+
+    def __init__(self, needle: str, haystack: str, model: str,
+                 concurrency: int = 4,
+                 local_rewriter: Optional[LocalRewriter] = None,
+                 pricing: Optional[ModelPricing] = None,
+                 batch_mode: bool = False,
+                 request_latency: Optional[float] = None,
+                 ecc: int = 0,
+                 bits_per_sentence: int = 1,
+                 count_tokens: Callable[[str], int] = default_token_counter,
+                 index: Optional[HaystackIndex] = None) -> None:
+        """
+        Estimate the work needed to hide a needle into a haystack, without calling the LLM and without writing anything.
+
+        The haystack is read once: the parity of each sentence (or its number of words modulo 2^k) is compared to the bit(s) of the needle it carries,
+        and the tokens of the prompts (and of the expected responses) of the sentences to reformulate are counted.
+        The retries (reformulations with the wrong parity) are not included.
+
+        :param needle: The message to hide.
+        :param haystack: The message used to hide the needle.
+        :param model: The LLM model (used to get the prices).
+        :param concurrency: The number of requests sent to the LLM simultaneously.
+        :param local_rewriter: If not None, the sentences that can be rewritten locally are not sent to the LLM.
+        :param pricing: The prices of the model (default: the public prices, see pricing.MODEL_PRICES).
+        :param batch_mode: If True, the requests are sent through the batch endpoint (the cost is discounted).
+        :param request_latency: The number of seconds taken by one request (default: estimated from the output tokens).
+        :param ecc: The number of ECC bytes per block added to the needle (see ErrorCorrection).
+        :param bits_per_sentence: The number of bits hidden into each sentence (the number of words modulo 2^k).
+        :param count_tokens: The function used to count the tokens of a text.
+        :param index: The index of the haystack (see HaystackIndex): only the needle-bearing sentences are read.
+        """
+        self.needle: str = needle
+        self.haystack: str = haystack
+        self.model: str = model
+        self.concurrency: int = max(1, concurrency)
+        self.local_rewriter: Optional[LocalRewriter] = local_rewriter
+        self.pricing: Optional[ModelPricing] = pricing if pricing is not None else get_pricing(model)
+        self.batch_mode: bool = batch_mode
+        self.request_latency: Optional[float] = request_latency
+        self.ecc: int = ecc
+        self.bits_per_sentence: int = bits_per_sentence
+        self.count_tokens: Callable[[str], int] = count_tokens
+        self.index: Optional[HaystackIndex] = index
+
+    def message_tokens(self, message: dict[str, str]) -> int:
+        return TOKENS_PER_MESSAGE + self.count_tokens(message['role']) + self.count_tokens(message['content'])
+
+    def capacity(self, sentences: int) -> int:
+        """Return the number of characters of the longest needle that can be hidden into a number of sentences."""
+        return needle_capacity(sentences, self.bits_per_sentence, self.ecc)
+
+    def estimate(self) -> Estimate:
+        bits: Vector = Message.load_text_file_as_vector(self.needle, self.ecc)
+        symbols: list[int] = Conversion.bit_list_to_symbols(bits, self.bits_per_sentence)
+        modulus: int = 1 << self.bits_per_sentence
+        haystack_sentences: int = 0
+        unchanged: int = 0
+        local_rewrites: int = 0
+        to_reformulate: int = 0
+        prompt_tokens: int = 0
+        reformulation_tokens: int = 0
+        sentences: Iterable[tuple[str, Optional[int]]] = ((sentence, None) for sentence in read_sentences_from_file(self.haystack))
+        if self.index is not None:
+            # The number of sentences of the haystack is known: only the needle-bearing sentences are read
+            haystack_sentences = len(self.index) - min(len(self.index), len(symbols))
+            sentences = self.index.iter_sentences(0, len(symbols))
+        for position, (sentence, count) in enumerate(sentences):
+            haystack_sentences += 1
+            if position >= len(symbols):
+                # The remaining sentences are only counted (capacity of the haystack)
+                continue
+            symbol: int = symbols[position]
+            words: int = count if count is not None else len(Sentence(sentence).get_words())
+            if words % modulus == symbol:
+                unchanged += 1
+                continue
+            if self.local_rewriter is not None and self.local_rewriter.rewrite(sentence, symbol, modulus) is not None:
+                local_rewrites += 1
+                continue
+            to_reformulate += 1
+            prompt: str = hide_prompt(sentence, words, symbol, modulus)
+            prompt_tokens += self.message_tokens({'role': 'user', 'content': '[id={}] {}'.format(position, prompt)})
+            # The reformulation is expected to be about as long as the sentence (the separator is one token)
+            reformulation_tokens += self.count_tokens(json.dumps({'id': position, 'text': sentence}, ensure_ascii=False)) + 1
+
+        requests: int = math.ceil(to_reformulate / PROMPTS_PER_REQUEST)
+        # The messages sent with every request (system, assistant and format instructions), and the envelope of the response
+        request_tokens: int = TOKENS_PER_REQUEST + sum(self.message_tokens(m) for m in build_request_messages([]))
+        response_tokens: int = self.count_tokens(json.dumps({'results': []}))
+        input_tokens: int = prompt_tokens + requests * request_tokens
+        output_tokens: int = reformulation_tokens + requests * response_tokens
+        latency: float = self.request_latency if self.request_latency is not None \
+            else FIRST_TOKEN_LATENCY + (output_tokens / requests if requests > 0 else 0) / OUTPUT_TOKENS_PER_SECOND
+        return Estimate(model=self.model,
+                        needle_bits=len(bits),
+                        bits_per_sentence=self.bits_per_sentence,
+                        haystack_sentences=haystack_sentences,
+                        capacity=self.capacity(haystack_sentences),
+                        unchanged=unchanged,
+                        local_rewrites=local_rewrites,
+                        to_reformulate=to_reformulate,
+                        requests=requests,
+                        input_tokens=input_tokens,
+                        output_tokens=output_tokens,
+                        cost=cost(self.pricing, input_tokens, output_tokens, self.batch_mode) if self.pricing is not None else None,
+                        request_latency=latency,
+                        concurrency=self.concurrency,
+                        wall_clock=math.ceil(requests / self.concurrency) * latency)
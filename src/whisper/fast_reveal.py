@@ -0,0 +1,176 @@
+from typing import Optional, cast
+import mmap
+
+from whisper import Bit
+
+# The number of bytes processed at once (the chunks are extended to the end of a line)
+CHUNK_SIZE: int = 1 << 23
+
+# The whitespaces that are not ASCII spaces or tabulations, which the bytes operations cannot handle (see Sentence.split, which relies on "\s")
+CONTROL_WHITESPACES: bytes = b'\r\x0b\x0c\x1c\x1d\x1e\x1f'
+UNICODE_WHITESPACES: tuple[bytes, ...] = tuple(c.encode('utf-8') for c in '\x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000')
+# "!" is checked as "?", and the control whitespaces are all checked as "\r"
+CHECK: bytes = bytes.maketrans(b'!' + CONTROL_WHITESPACES, b'?' + b'\r' * len(CONTROL_WHITESPACES))
+
+
+def well_formed(chunk: bytes, after_dot: bool = False) -> bool:
+    """
+    Test whether each line of a chunk is one sentence for the sentence detector (see text_file_tool.SentenceDetector):
+    the detector would split or merge the lines that do not end with ".", "...", "?" or "!", or that contain one of
+    these characters before the end. The lines must not contain whitespaces other than spaces and tabulations.
+
+    The test only relies on bytes operations (count, find, replace...), that run at the speed of memchr.
+
+    :param chunk: The lines (the last line may not end with a new line).
+    :param after_dot: True if the previous line ends with a "." (the detector counts the dots across the new line).
+    """
+    data: bytes = chunk.translate(CHECK) if chunk.endswith(b'\n') else (chunk + b'\n').translate(CHECK)
+    if data.find(b'\r') >= 0:
+        return False
+    # "?" and "!" only at the end of the lines
+    questions: int = data.count(b'?\n')
+    if data.count(b'?') != questions:
+        return False
+    # "." only at the end of the lines, as "." or "..."
+    if data.find(b'....') >= 0:
+        return False
+    ellipses: bytes = data.replace(b'...\n', b'\n')
+    dots: int = ellipses.count(b'.\n')
+    if ellipses.count(b'.') != dots:
+        return False
+    # Every line ends with a terminator (this excludes the empty lines)
+    if data.count(b'\n') != questions + dots + (len(data) - len(ellipses)) // 3:
+        return False
+    # A line that starts with a terminator, after a line that ends with ".", is merged with it
+    if (after_dot and data[:1] in (b'.', b'?')) or data.find(b'.\n.') >= 0 or data.find(b'.\n?') >= 0:
+        return False
+    return data.isascii() or not any(data.find(c) >= 0 for c in UNICODE_WHITESPACES)
+
+
+# Tabulations are spaces, ";" is a comma, "?" and "!" are dots (see Sentence.clean and Sentence.split)
+NORMALIZE: bytes = bytes.maketrans(b'\t;?!', b' ,..')
+# All the characters, except the spaces and the new lines
+NOT_SPACE: bytes = bytes(c for c in range(256) if c not in b' \n')
+
+
+def collapse_spaces(data: bytes) -> bytes:
+    """Replace the runs of spaces by one space."""
+    while data.find(b'  ') >= 0:
+        data = data.replace(b'  ', b' ')
+    return data
+
+
+def chunk_spaces(chunk: bytes) -> bytes:
+    """
+    Transform the lines of a well-formed chunk (see well_formed) into lines of spaces: each line contains one space
+    less than its number of words, as Sentence.get_words() counts them.
+
+    The lines are transformed as a whole, by bytes operations: the final dots and the spaces that surround the
+    lines are removed (see Sentence.clean), the runs of separators are replaced by one space, and the other
+    characters are removed.
+
+    :param chunk: The lines (the last line may not end with a new line).
+    :return: The lines of spaces, each one followed by a new line, after a leading new line.
+    """
+    # The first new line marks the beginning of the first line
+    data: bytes = b'\n' + chunk.translate(NORMALIZE).replace(b'.', b'')
+    if not chunk.endswith(b'\n'):
+        data += b'\n'
+    data = collapse_spaces(data).replace(b' \n', b'\n').replace(b'\n ', b'\n')
+    return collapse_spaces(data.replace(b',', b' ')).translate(None, NOT_SPACE)
+
+
+def chunk_parities(chunk: bytes) -> list[Bit]:
+    """
+    Return the parities of the numbers of words of the lines of a well-formed chunk (see well_formed).
+
+    :param chunk: The lines (the last line may not end with a new line).
+    """
+    # Only the parity of the number of spaces matters: the line contains " " if the number of words is even
+    data: bytes = chunk_spaces(chunk).replace(b'  ', b'')[1:]
+    return cast(list[Bit], list(data.replace(b' \n', b'\x00').replace(b'\n', b'\x01')))
+
+
+def chunk_residues(chunk: bytes, modulus: int) -> list[int]:
+    """
+    Return the numbers of words of the lines of a well-formed chunk (see well_formed), modulo `modulus`.
+
+    :param chunk: The lines (the last line may not end with a new line).
+    :param modulus: The modulus.
+    """
+    if modulus == 2:
+        return cast(list[int], chunk_parities(chunk))
+    return [(len(spaces) + 1) % modulus for spaces in chunk_spaces(chunk)[1:-1].split(b'\n')]
+
+
+class LineParityReader:
+
+    def __init__(self, path: str, modulus: int = 2) -> None:
+        """
+        Read the parities of the sentences of a murmur that contains one sentence per line (as written by the hider).
+
+        The file is memory-mapped, and the words are counted by bytes operations on large chunks of lines, without
+        building the sentences. If a line is not a well-formed sentence, the reader returns None: the caller must
+        use the general path (see Revealer.read_bits).
+
+        :param path: The path to the murmur.
+        :param modulus: The modulus of the numbers of words (2: the parities).
+        """
+        self.path: str = path
+        self.modulus: int = modulus
+        self.file = open(path, 'rb')
+        self.size: int = self.file.seek(0, 2)
+        self.data: Optional[mmap.mmap] = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size > 0 else None
+        self.offset: int = 0
+        self.after_dot: bool = False
+
+    def __enter__(self) -> 'LineParityReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def next_chunk(self, count: int) -> bytes:
+        """Return (at most) the next `count` lines, and move after them."""
+        data: mmap.mmap = cast(mmap.mmap, self.data)
+        end: int = min(self.offset + CHUNK_SIZE, self.size)
+        if end < self.size:
+            # Extend the chunk to the end of the line
+            newline: int = data.find(b'\n', end - 1)
+            end = newline + 1 if newline >= 0 else self.size
+        chunk: bytes = data[self.offset:end]
+        if chunk.count(b'\n') >= count:
+            # Stop after the requested lines
+            position: int = -1
+            for _ in range(count):
+                position = chunk.index(b'\n', position + 1)
+            chunk = chunk[:position + 1]
+        self.offset += len(chunk)
+        if not chunk.endswith(b'\n'):
+            # The last line of the file: if it only contains spaces, it is not a sentence
+            last: int = chunk.rfind(b'\n') + 1
+            if chunk[last:].strip(b' \t') == b'':
+                chunk = chunk[:last]
+        return chunk
+
+    def read(self, count: int) -> Optional[list[int]]:
+        """
+        Return the parities (or the residues) of the next `count` sentences (less if the end of the file is reached).
+        Return None if the murmur does not contain one well-formed sentence per line.
+        """
+        bits: list[int] = []
+        while len(bits) < count and self.data is not None and self.offset < self.size:
+            chunk: bytes = self.next_chunk(count - len(bits))
+            if len(chunk) == 0:
+                break
+            if not well_formed(chunk, self.after_dot):
+                return None
+            self.after_dot = chunk.endswith(b'.\n')
+            bits.extend(chunk_residues(chunk, self.modulus))
+        return bits
@@ -0,0 +1,205 @@
+from typing import Generator, Iterable, Optional, TYPE_CHECKING
+from array import array
+from pathlib import Path
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+from .conversion import MAX_BITS_PER_SENTENCE
+from .sentence import Sentence
+from .text_file_tool import SEGMENTER_VERSION, read_sentences_from_file
+
+if TYPE_CHECKING:
+    from .configuration import HiderConfiguration
+
+# A haystack index is a sidecar file built once per haystack: the sentences found by the segmenter (normalized, see
+# SentenceDetector) and their numbers of words. It is keyed by the SHA-256 of the haystack and the version of the
+# segmenter: a stale index (modified haystack, new segmenter) is rebuilt. The file is memory-mapped:
+# - a header (HEADER_FORMAT),
+# - the text of the sentences (UTF-8, without separators), padded to a multiple of 8 bytes,
+# - the offsets of the sentences in the text (count + 1 unsigned 64-bit integers, the last one is the size of the text),
+# - the numbers of words of the sentences (count unsigned 32-bit integers), padded to a multiple of 8 bytes,
+# - the parity bitmaps: PARITY_PLANES bitmaps of count bits (little-endian, bit i is the sentence i), padded to a
+#   multiple of 8 bytes. The bitmap j holds the bit j of the numbers of words (the bitmap 0 holds the parities).
+# The arrays use the byte order of the machine that built the index (an index built elsewhere is rebuilt).
+INDEX_MAGIC: bytes = b'WHIX'
+INDEX_FORMAT_VERSION: int = 2
+# The number of parity bitmaps (one per bit hidden into a sentence, see --bits-per-sentence)
+PARITY_PLANES: int = MAX_BITS_PER_SENTENCE
+# magic, format version, segmenter version, byte order (0: little, 1: big), SHA-256 of the haystack, sentences count,
+# size of the text
+HEADER_FORMAT: str = '<4sHHB32sQQ'
+# The header is padded, so that the arrays are aligned
+HEADER_SIZE: int = 64
+INDEX_SUFFIX: str = '.index'
+# The number of bytes read at once to hash the haystack
+HASH_CHUNK_SIZE: int = 1 << 20
+BYTE_ORDER: int = 0 if sys.byteorder == 'little' else 1
+
+
+def padded(size: int) -> int:
+    """Round a size up to a multiple of 8 bytes (the alignment of the arrays)."""
+    return (size + 7) & ~7
+
+
+def parity_bitmap(values: Iterable[int], plane: int = 0) -> int:
+    """Pack the bit `plane` of a series of values into an integer (the bit i is the bit of the value i)."""
+    bits: str = ''.join('1' if (value >> plane) & 1 else '0' for value in values)
+    return int(bits[::-1], 2) if bits != '' else 0
+
+
+def file_sha256(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk: bytes = f.read(HASH_CHUNK_SIZE)
+            if chunk == b'':
+                return digest.digest()
+            digest.update(chunk)
+
+
+def index_path(haystack: str, digest: bytes, cache_dir: Optional[Path] = None) -> Path:
+    """
+    Return the path of the index of a haystack: next to the haystack, or in a cache directory (where the name of the
+    index is its key, so that the haystacks with the same content share an index).
+    """
+    if cache_dir is None:
+        return Path(haystack + INDEX_SUFFIX)
+    return cache_dir.joinpath('{}-{}{}'.format(digest.hex(), SEGMENTER_VERSION, INDEX_SUFFIX))
+
+
+class HaystackIndex:
+
+    def __init__(self, path: str, digest: Optional[bytes] = None) -> None:
+        """
+        Open (memory-map) a haystack index.
+
+        :param path: The path of the index.
+        :param digest: The expected SHA-256 of the haystack (None: not checked).
+        :raise ValueError: If the file is not an index, or a stale one (other haystack, segmenter version, byte order).
+        """
+        self.path: str = path
+        with open(path, 'rb') as f:
+            self.mm: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self.mm) < HEADER_SIZE:
+                raise ValueError('Invalid haystack index "{}"'.format(path))
+            magic, version, segmenter_version, byte_order, index_digest, count, text_size = struct.unpack_from(HEADER_FORMAT, self.mm)
+            if magic != INDEX_MAGIC or version != INDEX_FORMAT_VERSION:
+                raise ValueError('Invalid haystack index "{}"'.format(path))
+            if segmenter_version != SEGMENTER_VERSION or byte_order != BYTE_ORDER:
+                raise ValueError('The haystack index "{}" has been built by another version of the segmenter'.format(path))
+            if digest is not None and index_digest != digest:
+                raise ValueError('The haystack index "{}" has been built for another haystack'.format(path))
+            offsets_start: int = HEADER_SIZE + padded(text_size)
+            words_start: int = offsets_start + 8 * (count + 1)
+            self.planes_start: int = words_start + padded(4 * count)
+            self.plane_size: int = padded((count + 7) // 8)
+            if len(self.mm) != self.planes_start + PARITY_PLANES * self.plane_size:
+                raise ValueError('Invalid haystack index "{}" (truncated)'.format(path))
+            self.digest: bytes = index_digest
+            self.count: int = count
+            # Zero-copy views of the arrays
+            self.offsets: memoryview = memoryview(self.mm)[offsets_start:words_start].cast('Q')
+            self.words: memoryview = memoryview(self.mm)[words_start:words_start + 4 * count].cast('I')
+        except Exception:
+            self.mm.close()
+            raise
+
+    @staticmethod
+    def build(haystack: str, path: str, digest: Optional[bytes] = None) -> 'HaystackIndex':
+        """Segment a haystack and write its index (atomically: a concurrent reader never sees a partial index)."""
+        if digest is None:
+            digest = file_sha256(haystack)
+        offsets: array = array('Q', [0])
+        words: array = array('I')
+        tmp_path: str = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                # The header is written once the sizes are known
+                f.write(b'\0' * HEADER_SIZE)
+                for sentence in read_sentences_from_file(haystack):
+                    encoded: bytes = sentence.encode('utf-8')
+                    f.write(encoded)
+                    offsets.append(offsets[-1] + len(encoded))
+                    words.append(len(Sentence(sentence).get_words()))
+                text_size: int = offsets[-1]
+                f.write(b'\0' * (padded(text_size) - text_size))
+                offsets.tofile(f)
+                words.tofile(f)
+                f.write(b'\0' * (padded(4 * len(words)) - 4 * len(words)))
+                for plane in range(PARITY_PLANES):
+                    f.write(parity_bitmap(words, plane).to_bytes(padded((len(words) + 7) // 8), 'little'))
+                f.seek(0)
+                f.write(struct.pack(HEADER_FORMAT, INDEX_MAGIC, INDEX_FORMAT_VERSION, SEGMENTER_VERSION, BYTE_ORDER, digest, len(words), text_size))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return HaystackIndex(path, digest)
+
+    @staticmethod
+    def open(haystack: str, cache_dir: Optional[Path] = None, verbose: bool = False) -> 'HaystackIndex':
+        """
+        Return the index of a haystack, built on first use (or when it is stale).
+
+        :param haystack: The path of the haystack.
+        :param cache_dir: The directory of the indexes (default: the index is stored next to the haystack).
+        :param verbose: Verbose flag.
+        """
+        digest: bytes = file_sha256(haystack)
+        path: Path = index_path(haystack, digest, cache_dir)
+        if path.exists():
+            try:
+                return HaystackIndex(str(path), digest)
+            except ValueError as e:
+                if verbose:
+                    print('{}: rebuilding the index'.format(e))
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        if verbose:
+            print('Building the index of the haystack "{}": {}'.format(haystack, path))
+        return HaystackIndex.build(haystack, str(path), digest)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        # The views must be released before the map is closed
+        self.offsets.release()
+        self.words.release()
+        self.mm.close()
+
+    def sentence(self, position: int) -> str:
+        if position < 0 or position >= self.count:
+            raise IndexError(position)
+        return self.mm[HEADER_SIZE + self.offsets[position]:HEADER_SIZE + self.offsets[position + 1]].decode('utf-8')
+
+    def words_count(self, position: int) -> int:
+        return self.words[position]
+
+    def bitmap(self, plane: int = 0) -> int:
+        """Return a parity bitmap: the bit i is the bit `plane` of the number of words of the sentence i."""
+        start: int = self.planes_start + plane * self.plane_size
+        return int.from_bytes(self.mm[start:start + self.plane_size], 'little')
+
+    def iter_sentences(self, start: int = 0, stop: Optional[int] = None) -> Generator[tuple[str, int], None, None]:
+        """Yield the sentences from `start` to `stop` (excluded), with their numbers of words."""
+        stop = self.count if stop is None else min(stop, self.count)
+        for position in range(start, stop):
+            yield self.sentence(position), self.words[position]
+
+
+def open_index(haystack: str, config: 'HiderConfiguration') -> Optional[HaystackIndex]:
+    """Return the index of a haystack if the configuration enables the indexes, None otherwise."""
+    if not config.haystack_index:
+        return None
+    return HaystackIndex.open(haystack, config.index_dir, config.verbose)
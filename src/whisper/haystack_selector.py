@@ -0,0 +1,133 @@
+from typing import Any, Iterable, Optional
+from dataclasses import dataclass, asdict
+from pathlib import Path
+import glob
+import math
+import os
+
+from .conversion import Conversion
+from .estimator import needle_capacity
+from .haystack_index import HaystackIndex, INDEX_SUFFIX, parity_bitmap
+from .message import Message
+from .prompts import PROMPTS_PER_REQUEST
+from .types import Vector
+
+# The files of a directory considered as candidate haystacks
+DEFAULT_PATTERN: str = '*.txt'
+
+
+@dataclass
+class Candidate:
+    haystack: str
+    sentences: int
+    # The number of characters of the longest needle that the haystack can hide (from the offset)
+    capacity: int
+    needle_sentences: int
+    # The sentence where the needle starts, and the number of sentences whose number of words must change from there
+    offset: int
+    to_reformulate: int
+
+    def enough(self) -> bool:
+        """Test whether the haystack contains enough sentences (after the offset) to hide the needle."""
+        return self.sentences - self.offset >= self.needle_sentences
+
+    def requests(self) -> int:
+        """Return the number of requests to the LLM (without the retries, and without the local rewrites)."""
+        return math.ceil(self.to_reformulate / PROMPTS_PER_REQUEST)
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = asdict(self)
+        data['enough'] = self.enough()
+        data['requests'] = self.requests()
+        return data
+
+
+def find_haystacks(paths: Iterable[str], pattern: str = DEFAULT_PATTERN) -> list[str]:
+    """Return the candidate haystacks: the files given, and the files of the directories given that match the pattern."""
+    haystacks: list[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            haystacks += sorted(p for p in glob.glob(os.path.join(path, pattern)) if os.path.isfile(p) and not p.endswith(INDEX_SUFFIX))
+        else:
+            haystacks.append(path)
+    return haystacks
+
+
+class HaystackSelector:
+
+    def __init__(self, needle: str, bits_per_sentence: int = 1, ecc: int = 0, index_dir: Optional[Path] = None,
+                 max_offsets: int = 1) -> None:
+        """
+        Rank candidate haystacks for a needle, from the parity bitmaps of their indexes (see HaystackIndex): the number
+        of sentences to reformulate is the number of bits set in (bitmap XOR needle), computed on integers.
+
+        :param needle: The message to hide.
+        :param bits_per_sentence: The number of bits hidden into each sentence (the number of words modulo 2^k).
+        :param ecc: The number of ECC bytes per block added to the needle (see ErrorCorrection).
+        :param index_dir: The directory of the indexes (default: the indexes are stored next to the haystacks).
+        :param max_offsets: The number of start offsets tried in each haystack, evenly spaced (1: the first sentence only).
+        """
+        if max_offsets < 1:
+            raise ValueError("At least one offset must be tried!")
+        self.needle: str = needle
+        self.bits_per_sentence: int = bits_per_sentence
+        self.ecc: int = ecc
+        self.index_dir: Optional[Path] = index_dir
+        self.max_offsets: int = max_offsets
+        bits: Vector = Message.load_text_file_as_vector(needle, ecc)
+        symbols: list[int] = Conversion.bit_list_to_symbols(bits, bits_per_sentence)
+        self.needle_sentences: int = len(symbols)
+        # The bitmaps of the needle: the bitmap j holds the bit j of the symbols
+        self.needle_bitmaps: list[int] = [parity_bitmap(symbols, plane) for plane in range(bits_per_sentence)]
+        self.mask: int = (1 << self.needle_sentences) - 1
+
+    def mismatches(self, bitmaps: list[int], offset: int) -> int:
+        """Return the number of sentences (from the offset) whose number of words does not carry the symbol of the needle."""
+        different: int = 0
+        for bitmap, needle_bitmap in zip(bitmaps, self.needle_bitmaps):
+            different |= ((bitmap >> offset) ^ needle_bitmap) & self.mask
+        return different.bit_count()
+
+    def offsets(self, sentences: int) -> list[int]:
+        """Return the start offsets tried in a haystack of a number of sentences."""
+        last: int = sentences - self.needle_sentences
+        if last <= 0 or self.max_offsets == 1:
+            return [0]
+        step: int = max(1, math.ceil(last / (self.max_offsets - 1)))
+        return sorted(set(range(0, last, step)) | {last})
+
+    def evaluate(self, haystack: str, index: HaystackIndex) -> Candidate:
+        bitmaps: list[int] = [index.bitmap(plane) for plane in range(self.bits_per_sentence)]
+        count, offset = min((self.mismatches(bitmaps, offset), offset) for offset in self.offsets(len(index)))
+        return Candidate(haystack=haystack,
+                         sentences=len(index),
+                         capacity=needle_capacity(len(index) - offset, self.bits_per_sentence, self.ecc),
+                         needle_sentences=self.needle_sentences,
+                         offset=offset,
+                         to_reformulate=count)
+
+    def select(self, haystacks: Iterable[str], verbose: bool = False) -> list[Candidate]:
+        """
+        Evaluate the candidate haystacks (their indexes are built on first use). Return the candidates from the best to
+        the worst: the haystacks wide enough to hide the needle first, by number of sentences to reformulate, then by
+        capacity.
+        """
+        candidates: list[Candidate] = []
+        for haystack in haystacks:
+            with HaystackIndex.open(haystack, self.index_dir, verbose) as index:
+                candidates.append(self.evaluate(haystack, index))
+        return sorted(candidates, key=lambda c: (not c.enough(), c.to_reformulate, -c.capacity, c.haystack))
+
+
+def candidates_lines(candidates: list[Candidate]) -> list[str]:
+    lines: list[str] = ['{:>4}  {:>10}  {:>10}  {:>8}  {:>13}  {:>8}  {}'.format('rank', 'sentences', 'capacity', 'offset', 'reformulate', 'requests', 'haystack')]
+    for rank, candidate in enumerate(candidates, 1):
+        lines.append('{:>4}  {:>10}  {:>10}  {:>8}  {:>13}  {:>8}  {}'.format(
+            rank if candidate.enough() else '-',
+            candidate.sentences,
+            candidate.capacity,
+            candidate.offset,
+            candidate.to_reformulate if candidate.enough() else 'NOT ENOUGH',
+            candidate.requests() if candidate.enough() else '-',
+            candidate.haystack))
+    return lines
@@ -0,0 +1,192 @@
+from typing import Any, Callable, Optional, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from collections import deque
+from dataclasses import dataclass, asdict
+import re
+import threading
+import time
+
+from .dispatcher import LLMClient
+from .profiler import percentile
+from .response_parser import parse_response
+
+if TYPE_CHECKING:
+    from .configuration import HiderConfiguration
+
+# The number of recent latencies of the primary client used to compute the hedging delay
+LATENCY_WINDOW: int = 100
+# The number of latencies observed before the first hedge (the percentile of fewer latencies is meaningless)
+MIN_SAMPLES: int = 5
+# The ID of a sentence, at the beginning of a prompt (see build_request_messages)
+ID_PATTERN = re.compile(r'^\[id=(\d+)\]')
+# The threads used to run the calls: a primary and a duplicate per concurrent request, plus some room for the calls that
+# lost the race (they keep running until they complete), so that a call never waits for a thread
+HEADROOM_WORKERS: int = 4
+
+
+def valid_response(response: str, messages: list[dict[str, str]]) -> bool:
+    """Test whether a response of the LLM contains at least one of the requested reformulations (see parse_response)."""
+    ids: list[int] = [int(match.group(1)) for match in (ID_PATTERN.match(m['content']) for m in messages if m['role'] == 'user') if match is not None]
+    try:
+        return len(parse_response(response, ids).matched) > 0
+    except Exception:
+        return False
+
+
+@dataclass
+class HedgeStats:
+    # The calls, the duplicates sent, and the races won by the duplicates (hedging helped)
+    calls: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0
+    primary_wins: int = 0
+    # The duplicates not sent because the budget was exhausted
+    skipped: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class HedgedClient:
+
+    def __init__(self, primary: LLMClient, hedge: LLMClient,
+                 hedge_percentile: float = 90.0,
+                 max_hedge_ratio: float = 0.1,
+                 initial_delay: Optional[float] = None,
+                 validate: Callable[[str, list[dict[str, str]]], bool] = valid_response,
+                 concurrency: int = 4) -> None:
+        """
+        Cut the tail latency of the calls to the LLM: if a call has not completed after the given percentile of the
+        recent latencies, the same request is sent to another client (another key, endpoint or model). The first
+        valid response wins. The loser is cancelled if it has not started yet, otherwise its response is ignored
+        (a request in flight cannot be aborted, and its tokens are still counted).
+
+        :param primary: The client used for every call.
+        :param hedge: The client used for the duplicate requests.
+        :param hedge_percentile: The percentile (0-100) of the recent latencies of the primary client after which a duplicate is sent.
+        :param max_hedge_ratio: The maximum number of duplicates, as a fraction of the calls (the cap on the extra spend).
+        :param initial_delay: The delay used until enough latencies have been observed (None: no hedging until then).
+        :param validate: The function that tells whether a response is valid (an invalid response does not win the race).
+        :param concurrency: The number of calls made simultaneously (see Dispatcher), used to size the pool of threads.
+        """
+        if hedge_percentile <= 0 or hedge_percentile > 100:
+            raise ValueError("The hedging percentile must be between 0 and 100!")
+        if max_hedge_ratio < 0:
+            raise ValueError("The maximum ratio of hedged requests must be positive!")
+        self.primary: LLMClient = primary
+        self.hedge: LLMClient = hedge
+        self.hedge_percentile: float = hedge_percentile
+        self.max_hedge_ratio: float = max_hedge_ratio
+        self.initial_delay: Optional[float] = initial_delay
+        self.validate: Callable[[str, list[dict[str, str]]], bool] = validate
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.stats: HedgeStats = HedgeStats()
+        self.lock: threading.Lock = threading.Lock()
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=2 * concurrency + HEADROOM_WORKERS, thread_name_prefix='hedging')
+
+    @property
+    def prompt_tokens(self) -> int:
+        return getattr(self.primary, 'prompt_tokens', 0) + getattr(self.hedge, 'prompt_tokens', 0)
+
+    @property
+    def completion_tokens(self) -> int:
+        return getattr(self.primary, 'completion_tokens', 0) + getattr(self.hedge, 'completion_tokens', 0)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Return the number of seconds to wait before sending a duplicate (None: no duplicate)."""
+        with self.lock:
+            if len(self.latencies) < MIN_SAMPLES:
+                return self.initial_delay
+            return percentile(list(self.latencies), self.hedge_percentile)
+
+    def call_primary(self, messages: list[dict[str, str]], response_format: Optional[dict[str, Any]]) -> str:
+        # The latency is measured from the start of the call (not from its submission), and the latencies of the calls
+        # that lost the race are recorded too: the tail must not be hidden by the hedges
+        start: float = time.monotonic()
+        response: str = self.primary.call(messages, response_format)
+        with self.lock:
+            self.latencies.append(time.monotonic() - start)
+        return response
+
+    def allow_hedge(self) -> bool:
+        with self.lock:
+            if self.stats.hedged + 1 > self.max_hedge_ratio * self.stats.calls:
+                self.stats.skipped += 1
+                return False
+            self.stats.hedged += 1
+            return True
+
+    def call(self, messages: list[dict[str, str]], response_format: Optional[dict[str, Any]] = None) -> str:
+        with self.lock:
+            self.stats.calls += 1
+        delay: Optional[float] = self.hedge_delay()
+        primary: Future = self.executor.submit(self.call_primary, messages, response_format)
+        if delay is None:
+            return primary.result()
+        done, _ = wait([primary], timeout=delay)
+        if len(done) > 0 or not self.allow_hedge():
+            return primary.result()
+        hedge: Future = self.executor.submit(self.hedge.call, messages, response_format)
+        pending: set[Future] = {primary, hedge}
+        fallback: Optional[str] = None
+        error: Optional[BaseException] = None
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                response: str = future.result()
+                if not self.validate(response, messages):
+                    fallback = response if fallback is None else fallback
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                with self.lock:
+                    if future is hedge:
+                        self.stats.hedge_wins += 1
+                    else:
+                        self.stats.primary_wins += 1
+                return response
+        # No valid response: the caller handles the invalid response (the sentences are sent again)
+        if fallback is not None:
+            return fallback
+        raise error if error is not None else RuntimeError("No response")
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
+
+    def lines(self) -> list[str]:
+        stats: HedgeStats = self.stats
+        return ['Hedged requests:',
+                '- calls:                       {}'.format(stats.calls),
+                '- duplicates sent:             {} ({} skipped, budget: {:.0%} of the calls)'.format(stats.hedged, stats.skipped, self.max_hedge_ratio),
+                '- won by the duplicate:        {}'.format(stats.hedge_wins),
+                '- won by the first request:    {}'.format(stats.primary_wins)]
+
+
+def close_hedging(client: LLMClient) -> Optional[HedgeStats]:
+    """Shut down the threads of a hedged client and return its statistics (None if the client is not a hedged client)."""
+    if not isinstance(client, HedgedClient):
+        return None
+    client.close()
+    return client.stats
+
+
+def with_hedging(client: LLMClient, config: 'HiderConfiguration', hedge: Optional[LLMClient] = None) -> LLMClient:
+    """
+    Return the client used by the hider: `client`, or a hedged client if hedging is configured.
+
+    :param client: The primary client.
+    :param config: The configuration (hedge_percentile, hedge_model, hedge_token, hedge_base_url, max_hedge_ratio).
+    :param hedge: The client used for the duplicates (default: a ChatGPT client built from the configuration).
+    """
+    if config.hedge_percentile is None or isinstance(client, HedgedClient):
+        return client
+    if hedge is None:
+        from .chat_gpt import ChatGPT
+        options: dict[str, str] = {'base_url': config.hedge_base_url} if config.hedge_base_url is not None else {}
+        hedge = ChatGPT(config.hedge_model if config.hedge_model is not None else config.model,
+                        config.hedge_token if config.hedge_token is not None else config.token,
+                        options)
+    return HedgedClient(client, hedge, config.hedge_percentile, config.max_hedge_ratio, concurrency=config.concurrency)
@@ -0,0 +1,101 @@
+from typing import Optional
+from pathlib import Path
+import json
+import os
+
+JOB_FILE_NAME: str = 'job.json'
+
+# The stages of a hide job, in order
+STAGE_CREATED: str = 'created'
+STAGE_LOADED: str = 'loaded'
+STAGE_PROMPTS: str = 'prompts'
+STAGE_REQUESTS: str = 'requests'
+STAGE_DONE: str = 'done'
+STAGES: list[str] = [STAGE_CREATED, STAGE_LOADED, STAGE_PROMPTS, STAGE_REQUESTS, STAGE_DONE]
+
+
+class HideInterrupted(Exception):
+    """Raised when a hide job has been interrupted (SIGINT) after its state has been saved."""
+    pass
+
+
+class HideJob:
+
+    def __init__(self, path: Path) -> None:
+        """
+        The durable state of a hide job, stored in a directory next to the databases of the job.
+
+        The state records the stage reached by the job and the requests (of the current series of
+        requests) that have been processed: the requests themselves are stored into the requests
+        database of the job. It is saved after every processed request, so that an interrupted job
+        can be resumed without sending the completed requests again.
+
+        :param path: The path to the directory of the job.
+        """
+        self.path: Path = path
+        self.needle: Optional[str] = None
+        self.haystack: Optional[str] = None
+        self.murmur: Optional[str] = None
+        self.model: Optional[str] = None
+        # The encoding of the needle: a job must be resumed with the same values (None: unknown, older job)
+        self.bits_per_sentence: Optional[int] = None
+        self.ecc: Optional[int] = None
+        self.stage: str = STAGE_CREATED
+        self.call_count: int = 0
+        self.done_requests: list[int] = []
+        if self.exists():
+            self.load()
+
+    def file_path(self) -> Path:
+        return self.path.joinpath(JOB_FILE_NAME)
+
+    def exists(self) -> bool:
+        return self.file_path().exists()
+
+    def load(self) -> None:
+        with open(self.file_path(), 'r') as f:
+            state = json.load(f)
+        self.needle = state['needle']
+        self.haystack = state['haystack']
+        self.murmur = state['murmur']
+        self.model = state['model']
+        self.bits_per_sentence = state.get('bits_per_sentence')
+        self.ecc = state.get('ecc')
+        self.stage = state['stage']
+        self.call_count = state['call_count']
+        self.done_requests = state['done_requests']
+
+    def save(self) -> None:
+        state = {
+            'needle': self.needle,
+            'haystack': self.haystack,
+            'murmur': self.murmur,
+            'model': self.model,
+            'bits_per_sentence': self.bits_per_sentence,
+            'ecc': self.ecc,
+            'stage': self.stage,
+            'call_count': self.call_count,
+            'done_requests': self.done_requests
+        }
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_path: Path = self.file_path().with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=4)
+        os.replace(tmp_path, self.file_path())
+
+    def reached(self, stage: str) -> bool:
+        """Tell whether the job has reached (or passed) the given stage."""
+        return STAGES.index(self.stage) >= STAGES.index(stage)
+
+    def set_stage(self, stage: str) -> None:
+        self.stage = stage
+        self.save()
+
+    def request_done(self, index: int) -> None:
+        self.done_requests.append(index)
+        self.save()
+
+    def new_requests(self) -> None:
+        """Start a new series of requests (none of them has been processed)."""
+        self.done_requests = []
+        self.save()
@@ -1,9 +1,18 @@
-import tiktoken
+from typing import Any
+import functools
 import json
 
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str) -> Any:
+    """Load the tokenizer of a model (tiktoken is imported on first use: it takes a long time to import)."""
+    import tiktoken
+    return tiktoken.encoding_for_model(model)
+
+
 def calculate_tokens(prompt: str, model: str = "gpt-4") -> int:
     """Calculate the number of tokens used by a prompt."""
-    encoding = tiktoken.encoding_for_model(model)
+    encoding = get_encoding(model)
     p: list[dict[str, str]] = json.loads(prompt)
     total = 0
     for m in p:
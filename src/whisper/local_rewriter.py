@@ -0,0 +1,81 @@
+from typing import Optional, Generator
+from pathlib import Path
+import json
+import re
+
+from .sentence import Sentence
+
+DEFAULT_RULES_PATH: Path = Path(__file__).resolve().parent.joinpath('data', 'rewrite-rules.json')
+
+
+class RewriteRule:
+
+    def __init__(self, source: str, target: str, followed_by: Optional[str] = None) -> None:
+        """
+        Replace a phrase by another phrase (the search is case-insensitive).
+
+        :param source: The phrase to replace.
+        :param target: The replacement.
+        :param followed_by: If not None, a regular expression that must match the text following the phrase (e.g. a
+                            contraction such as "I'm" cannot end a clause: "I am" is only replaced before a word).
+        """
+        self.source: str = source
+        self.target: str = target
+        words: list[str] = [re.escape(w) for w in source.split()]
+        context: str = '(?={})'.format(followed_by) if followed_by is not None else ''
+        self.pattern: re.Pattern[str] = re.compile(r"(?<![\w'-])(?<!\d[.,])" + r'\s+'.join(words) + r"(?![\w'-])(?![.,]\d)" + context, re.IGNORECASE)
+
+    def apply(self, sentence: str) -> Generator[str, None, None]:
+        """Yield the sentences obtained by replacing each occurrence of the phrase, one at a time."""
+        for match in self.pattern.finditer(sentence):
+            replacement: str = self.target
+            if match.group(0)[0].isupper():
+                replacement = replacement[0].upper() + replacement[1:]
+            yield sentence[:match.start()] + replacement + sentence[match.end():]
+
+
+class LocalRewriter:
+
+    def __init__(self, rules: list[RewriteRule]) -> None:
+        """
+        Modify the parity of the number of words of a sentence with deterministic,
+        meaning-preserving rewrites (contractions, optional words, number spelling...),
+        so that the LLM is not called for the easy sentences.
+
+        :param rules: The rewrite rules, tried in order.
+        """
+        self.rules: list[RewriteRule] = rules
+
+    @staticmethod
+    def load(path: Optional[Path] = None) -> 'LocalRewriter':
+        """
+        Load the rules from a JSON file (default: the rules shipped with the package). A rule is only applied in both
+        directions if it is marked with "reverse": most rewrites are not symmetric ("prior to" => "before" is correct,
+        "before" => "prior to" is not).
+        """
+        with open(path if path is not None else DEFAULT_RULES_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        rules: list[RewriteRule] = []
+        for rule in data['rules']:
+            rules.append(RewriteRule(rule['from'], rule['to'], rule.get('followed_by')))
+            if rule.get('reverse', False):
+                rules.append(RewriteRule(rule['to'], rule['from']))
+        return LocalRewriter(rules)
+
+    def candidates(self, sentence: str) -> Generator[str, None, None]:
+        for rule in self.rules:
+            yield from rule.apply(sentence)
+
+    def rewrite(self, sentence: str, parity: int, modulus: int = 2) -> Optional[str]:
+        """
+        Rewrite a sentence so that its number of words has the given parity.
+
+        :param sentence: The sentence to rewrite.
+        :param parity: The expected parity of the number of words (0: even, 1: odd), or the expected remainder modulo `modulus`.
+        :param modulus: The modulus (2, unless several bits are hidden into each sentence).
+        :return: The rewritten sentence, or None if no rule applies.
+        """
+        for candidate in self.candidates(sentence):
+            if len(Sentence(candidate).get_words()) % modulus == parity:
+                return candidate
+        return None
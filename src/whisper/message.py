@@ -11,19 +11,24 @@ if __name__ == '__main__':
     SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir))
     sys.path.insert(0, SEARCH_PATH)
     from whisper.conversion import Conversion
+    from whisper.ecc import ErrorCorrection
     from whisper.types import Int64, Vector
 else:
     from .conversion import Conversion
+    from .ecc import ErrorCorrection
     from .types import Int64, Vector
 
 class Message:
 
     @staticmethod
-    def string_to_vector(s: str) -> Vector:
+    def string_to_vector(s: str, ecc: int = 0) -> Vector:
         """Convert a string to a vector.
         The vector is a list of bits, where the first 64 bits are the length of the string,
         And the remaining bits are the string.
+        If `ecc` is not 0, the length and the string are protected by `ecc` ECC bytes per block (see ErrorCorrection).
         """
+        if ecc > 0:
+            return Conversion.bytes_to_bit_list(ErrorCorrection(ecc).encode(s.encode("ascii")))
         length = Conversion.int64_to_bit_list(cast(Int64, len(s)))
         body = Conversion.bytes_to_bit_list(s.encode("ascii"))
         return length + body
@@ -49,7 +54,7 @@ class Message:
             raise ValueError("Invalid encoding for file '{}'.".format(file_path)) from e
 
     @staticmethod
-    def load_text_file_as_vector(file_path: str) -> Vector:
+    def load_text_file_as_vector(file_path: str, ecc: int = 0) -> Vector:
         """
         Loads the content of a text file and converts it into a Vector representation.
 
@@ -58,6 +63,7 @@ class Message:
 
         Args:
             file_path (str): The path to the text file to be loaded.
+            ecc (int): The number of ECC bytes per block (0: no error correction).
 
         Returns:
             Vector: A vector representation of the text file's content.
@@ -67,7 +73,7 @@ class Message:
             IOError: If an error occurs while reading the file.
         """
         text = Message.load_text_file(file_path)
-        return Message.string_to_vector(text)
+        return Message.string_to_vector(text, ecc)
 
 
 if __name__ == '__main__':
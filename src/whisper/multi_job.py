@@ -0,0 +1,315 @@
+from typing import Any, Iterable, Optional
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import itertools
+import json
+import time
+
+from .configuration import HiderConfiguration
+from .conversion import Conversion
+from .dispatcher import Dispatcher, RateLimiter, LLMClient, BACKOFF_BASE, DEFAULT_MAX_ATTEMPTS, backoff_delay, retryable
+from .haystack_index import HaystackIndex, open_index
+from .hedging import HedgeStats, HedgedClient, close_hedging, with_hedging
+from .local_rewriter import LocalRewriter
+from .message import Message
+from .prompts import PROMPTS_PER_REQUEST, PROMPT, REWRITE, decide_sentence, valid_reformulation, build_request_messages
+from .response_parser import parse_response, ParsedResponse, RESPONSE_FORMAT
+from .sentence import Sentence
+from .text_file_tool import read_sentences_from_file
+from .types import Vector
+
+# The maximum number of reformulations kept in the cache
+CACHE_SIZE: int = 100000
+# The size of the buffer used to write the murmurs
+MURMUR_BUFFER_SIZE: int = 1 << 20
+
+STATUS_PENDING: str = 'pending'
+STATUS_RUNNING: str = 'running'
+STATUS_DONE: str = 'done'
+STATUS_FAILED: str = 'failed'
+
+
+@dataclass
+class JobSpec:
+    needle: str
+    haystack: str
+    output: str
+
+
+@dataclass
+class JobStatus:
+    spec: JobSpec
+    status: str = STATUS_PENDING
+    error: Optional[str] = None
+    sentences: int = 0
+    local_rewrites: int = 0
+    cache_hits: int = 0
+    llm_sentences: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'needle': self.spec.needle,
+            'haystack': self.spec.haystack,
+            'output': self.spec.output,
+            'status': self.status,
+            'error': self.error,
+            'sentences': self.sentences,
+            'local_rewrites': self.local_rewrites,
+            'cache_hits': self.cache_hits,
+            'llm_sentences': self.llm_sentences,
+            'retries': self.retries,
+            'elapsed': round(self.elapsed, 3)
+        }
+
+
+class ReformulationCache:
+
+    def __init__(self, size: int = CACHE_SIZE) -> None:
+        """A LRU cache of the validated reformulations, keyed by sentence and expected parity (or symbol)."""
+        self.size: int = size
+        self.entries: OrderedDict[tuple[str, int], str] = OrderedDict()
+
+    def get(self, sentence: str, parity: int) -> Optional[str]:
+        key: tuple[str, int] = (sentence, parity)
+        reformulation: Optional[str] = self.entries.get(key)
+        if reformulation is not None:
+            self.entries.move_to_end(key)
+        return reformulation
+
+    def put(self, sentence: str, parity: int, reformulation: str) -> None:
+        self.entries[(sentence, parity)] = reformulation
+        self.entries.move_to_end((sentence, parity))
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+@dataclass
+class Job:
+    status: JobStatus
+    start_time: float = 0.0
+    sentences: list[str] = field(default_factory=list)
+    results: dict[int, str] = field(default_factory=dict)
+    remaining: int = 0
+
+
+@dataclass
+class PendingSentence:
+    job: Job
+    position: int
+    sentence: str
+    symbol: int
+    prompt: str
+    request_id: int = 0
+    attempts: int = 0
+
+
+class MultiJobRunner:
+
+    def __init__(self, specs: list[JobSpec], config: HiderConfiguration, client: Optional[LLMClient] = None,
+                 requests_per_minute: Optional[float] = None, max_attempts: Optional[int] = DEFAULT_MAX_ATTEMPTS,
+                 cache: Optional[ReformulationCache] = None, backoff: float = BACKOFF_BASE) -> None:
+        """
+        Hide many needles into many haystacks in one process.
+
+        The prompts of all the jobs are packed into shared requests, sent by a single rate-limited
+        dispatcher. The validated reformulations are stored into a cache shared by all the jobs:
+        the same sentence (with the same expected symbol) is sent to the LLM only once. All the jobs use the
+        same number of bits per sentence and the same ECC (see HiderConfiguration).
+
+        :param specs: The jobs to run (needle, haystack, output).
+        :param config: The options used to control the behavior of the hider (see Hider).
+        :param client: The client used to call the LLM (default: a ChatGPT client).
+        :param requests_per_minute: The maximum number of requests per minute (default: no limit).
+        :param max_attempts: The maximum number of reformulations of a sentence (invalid reformulations and failed
+                             requests), before its job fails (None: no limit).
+        :param cache: The reformulation cache (default: a new cache).
+        :param backoff: The delay after the first round of requests with errors, doubled after each following one
+                        (see backoff_delay). A request that cannot succeed (see retryable) fails its jobs at once.
+        """
+        self.options: HiderConfiguration = config
+        if client is None:
+            from .chat_gpt import ChatGPT
+            client = ChatGPT(config.model, config.token)
+        response_format: Optional[dict[str, Any]] = RESPONSE_FORMAT if config.structured_output else None
+        client = with_hedging(client, config)
+        self.dispatcher: Dispatcher[list[PendingSentence]] = Dispatcher(client, config.concurrency, RateLimiter(requests_per_minute), response_format)
+        self.max_attempts: Optional[int] = max_attempts
+        self.backoff: float = backoff
+        self.cache: ReformulationCache = cache if cache is not None else ReformulationCache()
+        self.local_rewriter: Optional[LocalRewriter] = LocalRewriter.load(config.rewrite_rules_path) if config.local_rewrite else None
+        # Each sentence hides a symbol of k bits: the number of words modulo 2^k (see Hider)
+        self.modulus: int = 1 << config.bits_per_sentence
+        self.jobs: list[Job] = [Job(JobStatus(spec)) for spec in specs]
+        # The indexes of the haystacks, shared by the jobs (see HiderConfiguration.haystack_index)
+        self.indexes: dict[str, Optional[HaystackIndex]] = {}
+        # The statistics of the hedged requests, once the jobs have run (None: no hedging)
+        self.hedge_stats: Optional[HedgeStats] = None
+
+    @staticmethod
+    def load_manifest(path: str) -> list[JobSpec]:
+        """Load a JSONL manifest: one job per line, with the keys "needle", "haystack" and "output"."""
+        specs: list[JobSpec] = []
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip() == '':
+                    continue
+                job = json.loads(line)
+                specs.append(JobSpec(job['needle'], job['haystack'], job['output']))
+        return specs
+
+    def fail(self, job: Job, error: str) -> None:
+        job.status.status = STATUS_FAILED
+        job.status.error = error
+        job.status.elapsed = time.monotonic() - job.start_time
+
+    def index_of(self, haystack: str) -> Optional[HaystackIndex]:
+        if haystack not in self.indexes:
+            self.indexes[haystack] = open_index(haystack, self.options)
+        return self.indexes[haystack]
+
+    def close_indexes(self) -> None:
+        for index in self.indexes.values():
+            if index is not None:
+                index.close()
+        self.indexes = {}
+
+    def prepare(self, job: Job) -> list[PendingSentence]:
+        """Load the needle and the needle-bearing sentences of the haystack. Return the sentences to send to the LLM."""
+        job.start_time = time.monotonic()
+        job.status.status = STATUS_RUNNING
+        bits: Vector = Message.load_text_file_as_vector(job.status.spec.needle, self.options.ecc)
+        symbols: list[int] = Conversion.bit_list_to_symbols(bits, self.options.bits_per_sentence)
+        index: Optional[HaystackIndex] = self.index_of(job.status.spec.haystack)
+        words: Optional[list[int]] = None
+        if index is not None:
+            job.sentences = [sentence for sentence, _ in index.iter_sentences(0, len(symbols))]
+            words = list(index.words[:len(job.sentences)])
+        else:
+            job.sentences = list(itertools.islice(read_sentences_from_file(job.status.spec.haystack), len(symbols)))
+        if len(job.sentences) < len(symbols):
+            raise ValueError("The haystack is not wide enough to conceal the needle! It should contain at least {} sentences!".format(len(symbols)))
+        job.status.sentences = len(job.sentences)
+        pending: list[PendingSentence] = []
+        for position, (sentence, symbol) in enumerate(zip(job.sentences, symbols)):
+            sentence_words: int = words[position] if words is not None else len(Sentence(sentence).get_words())
+            decision, text = decide_sentence(sentence, sentence_words, symbol, self.modulus, self.local_rewriter)
+            if decision == PROMPT:
+                pending.append(PendingSentence(job, position, sentence, symbol, text))
+                continue
+            if decision == REWRITE:
+                job.status.local_rewrites += 1
+            job.results[position] = text
+        job.remaining = len(pending)
+        job.status.llm_sentences = len(pending)
+        return pending
+
+    def resolve(self, pending: PendingSentence, reformulation: str) -> None:
+        job: Job = pending.job
+        if job.status.status != STATUS_RUNNING:
+            return
+        job.results[pending.position] = reformulation
+        job.remaining -= 1
+        if job.remaining == 0:
+            self.finish(job)
+
+    def finish(self, job: Job) -> None:
+        """Write the murmur of a job: the needle-bearing sentences, then the rest of the haystack."""
+        try:
+            with open(job.status.spec.output, 'w', buffering=MURMUR_BUFFER_SIZE) as fd_murmur:
+                for position in range(len(job.sentences)):
+                    fd_murmur.write(job.results[position] + "\n")
+                index: Optional[HaystackIndex] = self.index_of(job.status.spec.haystack)
+                remaining: Iterable[str] = (sentence for sentence, _ in index.iter_sentences(len(job.sentences))) if index is not None \
+                    else itertools.islice(read_sentences_from_file(job.status.spec.haystack), len(job.sentences), None)
+                for sentence in remaining:
+                    fd_murmur.write(sentence + "\n")
+        except Exception as e:
+            self.fail(job, str(e))
+            return
+        job.sentences = []
+        job.results = {}
+        job.status.status = STATUS_DONE
+        job.status.elapsed = time.monotonic() - job.start_time
+
+    def run(self) -> list[JobStatus]:
+        try:
+            return self.run_jobs()
+        finally:
+            self.close_indexes()
+            self.hedge_stats = close_hedging(self.dispatcher.client)
+            if self.options.verbose and isinstance(self.dispatcher.client, HedgedClient):
+                for line in self.dispatcher.client.lines():
+                    print(line)
+
+    def run_jobs(self) -> list[JobStatus]:
+        # Prepare all the jobs
+        pending: list[PendingSentence] = []
+        for job in self.jobs:
+            try:
+                job_pending: list[PendingSentence] = self.prepare(job)
+            except Exception as e:
+                self.fail(job, str(e))
+                continue
+            if len(job_pending) == 0:
+                self.finish(job)
+            pending += job_pending
+
+        # The number of consecutive rounds of requests with errors
+        failures: int = 0
+        while len(pending) > 0:
+            if failures > 0:
+                time.sleep(backoff_delay(failures, self.backoff))
+            # Group the identical sentences: only one of them is sent to the LLM
+            groups: dict[tuple[str, int], list[PendingSentence]] = {}
+            for p in pending:
+                if p.job.status.status != STATUS_RUNNING:
+                    continue
+                cached: Optional[str] = self.cache.get(p.sentence, p.symbol)
+                if cached is not None:
+                    p.job.status.cache_hits += 1
+                    self.resolve(p, cached)
+                    continue
+                groups.setdefault((p.sentence, p.symbol), []).append(p)
+            # The prompts of a request come from different jobs: they are identified by their index in this round
+            representatives: list[PendingSentence] = [group[0] for group in groups.values()]
+            for i, p in enumerate(representatives):
+                p.request_id = i
+            batches: list[list[PendingSentence]] = [representatives[i:i + PROMPTS_PER_REQUEST] for i in range(0, len(representatives), PROMPTS_PER_REQUEST)]
+
+            # Send the requests and validate the reformulations
+            pending = []
+            errors: int = 0
+            for batch, response, error in self.dispatcher.run(batches, lambda b: build_request_messages([(p.request_id, p.prompt) for p in b])):
+                if error is not None:
+                    errors += 1
+                    if not retryable(error):
+                        for p in batch:
+                            for g in groups[(p.sentence, p.symbol)]:
+                                if g.job.status.status == STATUS_RUNNING:
+                                    self.fail(g.job, "Error calling the LLM: {}".format(str(error)))
+                        continue
+                parsed: ParsedResponse = parse_response(response if response is not None else '', [p.request_id for p in batch])
+                for p in batch:
+                    group: list[PendingSentence] = groups[(p.sentence, p.symbol)]
+                    reformulation: Optional[str] = valid_reformulation(parsed.matched.get(p.request_id), p.symbol, self.modulus)
+                    if reformulation is not None:
+                        self.cache.put(p.sentence, p.symbol, reformulation)
+                        for g in group:
+                            self.resolve(g, reformulation)
+                        continue
+                    for g in group:
+                        g.attempts += 1
+                        g.job.status.retries += 1
+                        if self.max_attempts is not None and g.attempts >= self.max_attempts:
+                            self.fail(g.job, "Unable to reformulate sentence #{} after {} attempts{}".format(g.position, g.attempts, ': {}'.format(error) if error is not None else ''))
+                    pending += group
+            failures = failures + 1 if errors > 0 else 0
+
+        if self.options.verbose:
+            for job in self.jobs:
+                print('{:<7} {:>8.3f}s {} -> {}{}'.format(job.status.status, job.status.elapsed, job.status.spec.needle, job.status.spec.output,
+                                                          ' ({})'.format(job.status.error) if job.status.error is not None else ''))
+            print('Requests: {}'.format(self.dispatcher.requests_count))
+        return [job.status for job in self.jobs]
@@ -0,0 +1,333 @@
+from typing import Any, Iterable, Optional, Callable, cast
+from dataclasses import dataclass
+import queue
+import threading
+import time
+
+from .configuration import HiderConfiguration
+from .dispatcher import LLMClient, BACKOFF_BASE, DEFAULT_MAX_ATTEMPTS, backoff_delay, retryable
+from .haystack_index import HaystackIndex, open_index
+from .hedging import HedgeStats, HedgedClient, close_hedging, with_hedging
+from .conversion import Conversion
+from .message import Message
+from .prompts import PROMPTS_PER_REQUEST, PROMPT, REWRITE, decide_sentence, valid_reformulation, build_request_messages
+from .response_parser import parse_response, ParsedResponse, RESPONSE_FORMAT
+from .local_rewriter import LocalRewriter
+from .sentence import Sentence
+from .text_file_tool import read_sentences_from_file
+from .types import Vector
+
+# The maximum number of sentences read ahead of the parity decision
+SEGMENTS_QUEUE_SIZE: int = 1024
+# The maximum number of sentences between the last sentence written into the murmur and the last decided sentence
+WINDOW_SIZE: int = 8192
+# The number of seconds to wait for new prompts before an incomplete request is sent
+FLUSH_INTERVAL: float = 1.0
+# The number of seconds between two checks of the stop condition, while waiting
+POLL_INTERVAL: float = 0.1
+
+END = object()
+
+
+class PipelineStopped(Exception):
+    """Raised inside a stage when another stage failed."""
+    pass
+
+
+@dataclass
+class PendingSentence:
+    position: int
+    sentence: str
+    symbol: int
+    prompt: str
+    attempts: int = 0
+
+
+@dataclass
+class PipelineStats:
+    sentences: int = 0
+    local_rewrites: int = 0
+    llm_sentences: int = 0
+    requests: int = 0
+    retries: int = 0
+    first_request_delay: Optional[float] = None
+    elapsed: float = 0.0
+    # The statistics of the hedged requests (None: no hedging)
+    hedge: Optional[HedgeStats] = None
+
+
+class StreamingHider:
+
+    def __init__(self, needle: str, haystack: str, murmur: str, config: HiderConfiguration,
+                 client: Optional[LLMClient] = None,
+                 window: int = WINDOW_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 max_attempts: Optional[int] = DEFAULT_MAX_ATTEMPTS,
+                 backoff: float = BACKOFF_BASE) -> None:
+        """
+        Hide a needle into a haystack with a pipeline of overlapping stages connected by queues:
+
+            segmentation -> parity decision -> request packing -> LLM dispatch -> validation -> murmur writer
+
+        Unlike Hider, the haystack is never loaded as a whole: the number of sentences in flight
+        is bounded by `window`, so the memory used does not depend on the size of the haystack.
+        The sentences of the murmur are written (and flushed) as soon as all the preceding
+        sentences are final.
+
+        :param needle: The message to hide.
+        :param haystack: The message used to hide the needle.
+        :param murmur: The generated message that hides the needle.
+        :param config: The options used to control the behavior of the hider (see Hider).
+        :param client: The client used to call the LLM (default: a ChatGPT client).
+        :param window: The maximum number of sentences in flight.
+        :param flush_interval: The number of seconds to wait for new prompts before an incomplete request is sent.
+        :param max_attempts: The maximum number of attempts for a sentence (invalid reformulations and failed requests),
+                             before the hide fails (None: no limit).
+        :param backoff: The delay after a failed request, doubled after each following failure of the same dispatch
+                        thread (see backoff_delay). A request that cannot succeed (see retryable) fails the hide at once.
+        """
+        self.needle: str = needle
+        self.haystack: str = haystack
+        self.murmur: str = murmur
+        self.options: HiderConfiguration = config
+        if client is None:
+            from .chat_gpt import ChatGPT
+            client = ChatGPT(config.model, config.token)
+        self.client: LLMClient = with_hedging(client, config)
+        self.window: int = window
+        self.flush_interval: float = flush_interval
+        self.max_attempts: Optional[int] = max_attempts
+        self.backoff: float = backoff
+        self.response_format: Optional[dict[str, Any]] = RESPONSE_FORMAT if config.structured_output else None
+        self.local_rewriter: Optional[LocalRewriter] = LocalRewriter.load(config.rewrite_rules_path) if config.local_rewrite else None
+        self.message_bits: Vector = Message.load_text_file_as_vector(needle, config.ecc)
+        # Each sentence hides a symbol of k bits: the number of words modulo 2^k (see Hider)
+        self.modulus: int = 1 << config.bits_per_sentence
+        self.message_symbols: list[int] = Conversion.bit_list_to_symbols(self.message_bits, config.bits_per_sentence)
+        self.stats: PipelineStats = PipelineStats()
+
+        self.segments: queue.Queue = queue.Queue(maxsize=SEGMENTS_QUEUE_SIZE)
+        # The queues below do not need a maximum size: the number of sentences in flight is bounded by the window
+        self.prompts: queue.Queue = queue.Queue()
+        self.requests: queue.Queue = queue.Queue()
+        self.responses: queue.Queue = queue.Queue()
+        self.finals: queue.Queue = queue.Queue()
+
+        self.lock: threading.Lock = threading.Lock()
+        self.written: threading.Condition = threading.Condition()
+        self.next_position: int = 0
+        self.in_flight: int = 0
+        self.stop: threading.Event = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.start_time: float = 0.0
+
+    # Queue helpers: wait until the operation succeeds or until another stage fails.
+
+    def get(self, q: queue.Queue, timeout: Optional[float] = None) -> Any:
+        deadline: Optional[float] = time.monotonic() + timeout if timeout is not None else None
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+        raise PipelineStopped()
+
+    def put(self, q: queue.Queue, item: Any) -> None:
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+        raise PipelineStopped()
+
+    # The stages of the pipeline
+
+    def segment(self) -> None:
+        """Split the haystack into sentences (or read them from the index of the haystack, see HaystackIndex)."""
+        index: Optional[HaystackIndex] = open_index(self.haystack, self.options)
+        try:
+            sentences: Iterable[str] = (sentence for sentence, _ in index.iter_sentences()) if index is not None else read_sentences_from_file(self.haystack)
+            for position, sentence in enumerate(sentences):
+                self.put(self.segments, (position, sentence))
+        finally:
+            if index is not None:
+                index.close()
+        self.put(self.segments, END)
+
+    def decide(self) -> None:
+        """Compare the number of words of each sentence with the symbol to hide: keep the sentence, rewrite it locally, or prompt the LLM."""
+        while True:
+            item = self.get(self.segments)
+            if item is END:
+                break
+            position, sentence = cast(tuple[int, str], item)
+            self.stats.sentences += 1
+            with self.written:
+                while position - self.next_position >= self.window:
+                    if self.stop.is_set():
+                        raise PipelineStopped()
+                    self.written.wait(POLL_INTERVAL)
+            if position >= len(self.message_symbols):
+                self.finals.put((position, sentence))
+                continue
+            symbol: int = self.message_symbols[position]
+            decision, text = decide_sentence(sentence, len(Sentence(sentence).get_words()), symbol, self.modulus, self.local_rewriter)
+            if decision != PROMPT:
+                if decision == REWRITE:
+                    self.stats.local_rewrites += 1
+                self.finals.put((position, text))
+                continue
+            with self.lock:
+                self.in_flight += 1
+            self.stats.llm_sentences += 1
+            self.prompts.put(PendingSentence(position, sentence, symbol, text))
+        if self.stats.sentences < len(self.message_symbols):
+            raise ValueError("The haystack is not wide enough to conceal the needle! It should contain at least {} sentences!".format(len(self.message_symbols)))
+        self.prompts.put(END)
+
+    def pack(self) -> None:
+        """Group the prompts into requests. An incomplete request is sent when no prompt arrives for a while."""
+        buffer: list[PendingSentence] = []
+        decided: bool = False
+        while True:
+            idle: bool = False
+            try:
+                item = self.get(self.prompts, self.flush_interval)
+                if item is END:
+                    decided = True
+                else:
+                    buffer.append(cast(PendingSentence, item))
+            except queue.Empty:
+                idle = True
+            while len(buffer) >= PROMPTS_PER_REQUEST:
+                self.requests.put(buffer[:PROMPTS_PER_REQUEST])
+                buffer = buffer[PROMPTS_PER_REQUEST:]
+            if len(buffer) > 0 and (idle or (decided and self.prompts.empty())):
+                self.requests.put(buffer)
+                buffer = []
+            with self.lock:
+                done: bool = decided and self.in_flight == 0
+            if done:
+                break
+        for _ in range(self.options.concurrency):
+            self.requests.put(END)
+
+    def dispatch(self) -> None:
+        """Send the requests to the LLM. The sentences of a failed request are validated as unanswered (and sent again)."""
+        # The number of consecutive failed requests of this thread
+        failures: int = 0
+        while True:
+            item = self.get(self.requests)
+            if item is END:
+                break
+            batch: list[PendingSentence] = cast(list[PendingSentence], item)
+            messages: list[dict[str, str]] = build_request_messages([(p.position, p.prompt) for p in batch])
+            with self.lock:
+                self.stats.requests += 1
+                if self.stats.first_request_delay is None:
+                    self.stats.first_request_delay = time.monotonic() - self.start_time
+            try:
+                response: str = self.client.call(messages, self.response_format)
+            except Exception as e:
+                if not retryable(e):
+                    raise RuntimeError("Error calling the LLM: {}".format(str(e)))
+                failures += 1
+                self.responses.put((batch, None, e))
+                if self.stop.wait(backoff_delay(failures, self.backoff)):
+                    raise PipelineStopped()
+                continue
+            failures = 0
+            self.responses.put((batch, response, None))
+        self.responses.put(END)
+
+    def validate(self) -> None:
+        """Check the number of words of the reformulations: the invalid (or missing) reformulations are sent again."""
+        ends: int = 0
+        while ends < self.options.concurrency:
+            item = self.get(self.responses)
+            if item is END:
+                ends += 1
+                continue
+            batch, response, error = cast(tuple[list[PendingSentence], Optional[str], Optional[Exception]], item)
+            parsed: ParsedResponse = parse_response(response if response is not None else '', [p.position for p in batch])
+            for pending in batch:
+                reformulation: Optional[str] = valid_reformulation(parsed.matched.get(pending.position), pending.symbol, self.modulus)
+                if reformulation is not None:
+                    self.finals.put((pending.position, reformulation))
+                    with self.lock:
+                        self.in_flight -= 1
+                    continue
+                pending.attempts += 1
+                if self.max_attempts is not None and pending.attempts >= self.max_attempts:
+                    raise RuntimeError("Unable to reformulate sentence #{} after {} attempts: {}".format(pending.position, pending.attempts, error if error is not None else pending.sentence))
+                self.stats.retries += 1
+                self.prompts.put(pending)
+        self.finals.put(END)
+
+    def write(self) -> None:
+        """Write the sentences into the murmur, in order, as soon as they are final."""
+        pending: dict[int, str] = {}
+        with open(self.murmur, 'w') as fd_murmur:
+            while True:
+                item = self.get(self.finals)
+                if item is END:
+                    break
+                position, text = cast(tuple[int, str], item)
+                pending[position] = text
+                if position != self.next_position:
+                    continue
+                next_position: int = self.next_position
+                while next_position in pending:
+                    fd_murmur.write(pending.pop(next_position) + "\n")
+                    next_position += 1
+                fd_murmur.flush()
+                with self.written:
+                    self.next_position = next_position
+                    self.written.notify_all()
+        if len(pending) > 0:
+            raise RuntimeError("Missing sentence #{} in the murmur".format(self.next_position))
+
+    def run_stage(self, stage: Callable[[], None]) -> None:
+        try:
+            stage()
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            with self.lock:
+                if self.error is None:
+                    self.error = e
+            self.stop.set()
+
+    def hide(self) -> None:
+        self.start_time = time.monotonic()
+        stages: list[Callable[[], None]] = [self.segment, self.decide, self.pack, self.validate, self.write]
+        stages += [self.dispatch] * self.options.concurrency
+        threads: list[threading.Thread] = [threading.Thread(target=self.run_stage, args=(stage,), daemon=True) for stage in stages]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(POLL_INTERVAL)
+        except KeyboardInterrupt:
+            self.stop.set()
+            raise
+        finally:
+            self.stats.hedge = close_hedging(self.client)
+        self.stats.elapsed = time.monotonic() - self.start_time
+        if self.error is not None:
+            raise self.error
+        if self.options.verbose:
+            print("Streaming pipeline:")
+            print('- Sentences:                      {}'.format(self.stats.sentences))
+            print('- Sentences rewritten locally:    {}'.format(self.stats.local_rewrites))
+            print('- Sentences sent to the LLM:      {}'.format(self.stats.llm_sentences))
+            print('- Requests:                       {}'.format(self.stats.requests))
+            print('- Retries:                        {}'.format(self.stats.retries))
+            print('- First request sent after:       {}'.format('{:.3f}s'.format(self.stats.first_request_delay) if self.stats.first_request_delay is not None else '-'))
+            print('- Elapsed:                        {:.3f}s\n'.format(self.stats.elapsed))
+            if isinstance(self.client, HedgedClient):
+                for line in self.client.lines():
+                    print(line)
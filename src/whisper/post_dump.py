@@ -0,0 +1,60 @@
+from typing import Generator, Iterable
+
+from .sentence import Sentence
+from .stegano_db import SteganoDb
+
+
+def check_post_dump(path: str) -> Generator[str, None, None]:
+    """
+    Check a DEBUG file "haystack-post-processing.txt" (see SteganoDb.dump).
+    Yield one line per reformulated sentence: "S <line>" if the parity has been modified, "E <line>" otherwise.
+
+    :param path: The path to the file to check.
+    """
+    with open(path, 'r') as f:
+        yield from check_post_dump_lines(f)
+
+
+def check_post_dump_lines(lines: Iterable[str]) -> Generator[str, None, None]:
+    """
+    Check the lines of a dump (see SteganoDb.dump and DebugArchive.dump).
+
+    :param lines: The lines to check.
+    """
+    for line in lines:
+        line = line.rstrip('\n')
+        if line.strip() == '':
+            continue
+        fields = line.split('|')
+        if len(fields) != 5:
+            yield 'Invalid line: "{}"'.format(line)
+            continue
+        original_sentence: Sentence = Sentence(fields[1].strip())
+        action: str = fields[2].strip()
+        reformulation: Sentence = Sentence(fields[4].strip())
+
+        if 'N' == action:
+            continue
+
+        original_parity: int = 0 if len(original_sentence.get_words()) % 2 == 0 else 1
+        reformulation_parity: int = 0 if len(reformulation.get_words()) % 2 == 0 else 1
+        if original_parity == reformulation_parity:
+            yield 'E {}'.format(line)
+        else:
+            yield 'S {}'.format(line)
+
+
+def check_stegano_db(db: SteganoDb, modulus: int = 2) -> Generator[str, None, None]:
+    """
+    Check the reformulations stored into a stegano database, without parsing a dump: the parities are checked
+    from the stored words counts (see SteganoDb.get_invalid_sentences).
+    Yield one line per reformulated sentence, in the same format as check_post_dump.
+
+    :param db: The database to check.
+    :param modulus: The modulus of the words counts (2 to the power of the number of bits per sentence).
+    """
+    invalid: set[int] = {sentence_data.position for sentence_data in db.get_invalid_sentences(modulus)}
+    for (position, _, prompt, _), line in zip(db.iter_dump_rows(), db.dump_lines()):
+        if prompt is None:
+            continue
+        yield '{} {}'.format('E' if position in invalid else 'S', line)
@@ -0,0 +1,45 @@
+from typing import Optional
+from dataclasses import dataclass
+
+
+@dataclass
+class ModelPricing:
+    # Prices in dollars per million tokens
+    input_price: float
+    output_price: float
+
+
+# The public prices of the standard (synchronous) endpoint, in dollars per million tokens (the batch endpoint costs half)
+MODEL_PRICES: dict[str, ModelPricing] = {
+    'gpt-5.1': ModelPricing(1.25, 10.0),
+    'gpt-5': ModelPricing(1.25, 10.0),
+    'gpt-5-mini': ModelPricing(0.25, 2.0),
+    'gpt-5-nano': ModelPricing(0.05, 0.40),
+    'gpt-4.1': ModelPricing(2.0, 8.0),
+    'gpt-4.1-mini': ModelPricing(0.40, 1.60),
+    'gpt-4.1-nano': ModelPricing(0.10, 0.40),
+    'gpt-4o': ModelPricing(2.50, 10.0),
+    'gpt-4o-mini': ModelPricing(0.15, 0.60)
+}
+# The discount applied by the batch endpoint
+BATCH_DISCOUNT: float = 0.5
+
+
+def get_pricing(model: str) -> Optional[ModelPricing]:
+    """
+    Return the prices of a model, or None if the model is unknown.
+    A dated version of a model (ex: "gpt-4.1-2025-04-14") has the prices of the model.
+    """
+    if model in MODEL_PRICES:
+        return MODEL_PRICES[model]
+    # The longest name first: "gpt-4.1-mini-2025-04-14" is a "gpt-4.1-mini", not a "gpt-4.1"
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name + '-'):
+            return MODEL_PRICES[name]
+    return None
+
+
+def cost(pricing: ModelPricing, input_tokens: int, output_tokens: int, batch_mode: bool = False) -> float:
+    """Return the cost (in dollars) of a number of input and output tokens."""
+    total: float = (input_tokens * pricing.input_price + output_tokens * pricing.output_price) / 1000000.0
+    return total * BATCH_DISCOUNT if batch_mode else total
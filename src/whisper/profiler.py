@@ -0,0 +1,121 @@
+from typing import Any, Iterator, TYPE_CHECKING
+from contextlib import contextmanager, nullcontext
+import json
+import math
+import os
+import threading
+import time
+
+if TYPE_CHECKING:
+    import sqlite3
+
+# The maximum number of spans kept for the timeline (the totals are always computed)
+MAX_SPANS: int = 100000
+NO_SPAN = nullcontext()
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Return the p-th percentile (0 <= p <= 100) of a list of values (nearest-rank method)."""
+    if len(values) == 0:
+        return 0.0
+    ordered: list[float] = sorted(values)
+    rank: int = max(1, math.ceil(p / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Profiler:
+
+    def __init__(self, enabled: bool = True) -> None:
+        """
+        Collect the timing of the stages, the counters and the latencies of a run.
+
+        When the profiler is disabled, all the methods return immediately.
+
+        :param enabled: Enable flag.
+        """
+        self.enabled: bool = enabled
+        self.lock: threading.Lock = threading.Lock()
+        self.origin: float = time.perf_counter()
+        self.stages: dict[str, list[float]] = {} # name -> [calls, total seconds]
+        self.counters: dict[str, int] = {}
+        self.latencies: dict[str, list[float]] = {}
+        self.spans: list[tuple[str, float, float, int]] = [] # name, start, duration, thread ID
+
+    def stage(self, name: str):
+        """Return a context manager that measures the duration of a stage."""
+        if not self.enabled:
+            return NO_SPAN
+        return self.measure(name)
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration: float = time.perf_counter() - start
+            with self.lock:
+                stage: list[float] = self.stages.setdefault(name, [0, 0.0])
+                stage[0] += 1
+                stage[1] += duration
+                if len(self.spans) < MAX_SPANS:
+                    self.spans.append((name, start - self.origin, duration, threading.get_ident()))
+
+    def count(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def latency(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds)
+
+    def trace_sqlite(self, db: 'sqlite3.Connection', name: str) -> None:
+        """Count the statements and the commits executed on a SQLite connection."""
+        if not self.enabled:
+            return
+
+        def callback(statement: str) -> None:
+            self.count('sqlite.{}.statements'.format(name))
+            if statement == 'COMMIT':
+                self.count('sqlite.{}.commits'.format(name))
+
+        db.set_trace_callback(callback)
+
+    def report(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                'stages': {name: {'calls': int(calls), 'seconds': round(total, 6)} for name, (calls, total) in self.stages.items()},
+                'counters': dict(self.counters),
+                'latencies': {name: {'count': len(values),
+                                     'p50': round(percentile(values, 50), 6),
+                                     'p90': round(percentile(values, 90), 6),
+                                     'p99': round(percentile(values, 99), 6),
+                                     'max': round(max(values), 6)} for name, values in self.latencies.items()}
+            }
+
+    def trace(self) -> dict[str, Any]:
+        """Return the timeline of the stages, in the Chrome trace event format (chrome://tracing, Perfetto)."""
+        pid: int = os.getpid()
+        with self.lock:
+            events: list[dict[str, Any]] = [{'name': name,
+                                             'ph': 'X',
+                                             'ts': round(start * 1e6, 3),
+                                             'dur': round(duration * 1e6, 3),
+                                             'pid': pid,
+                                             'tid': tid} for name, start, duration, tid in self.spans]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, path: str) -> None:
+        """Write the JSON report into `path`, and the timeline into the same path with the extension ".trace.json"."""
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=4)
+        with open(os.path.splitext(path)[0] + '.trace.json', 'w') as f:
+            json.dump(self.trace(), f)
+
+
+# The profiler used when profiling is not requested
+DISABLED: Profiler = Profiler(enabled=False)
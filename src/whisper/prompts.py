@@ -0,0 +1,120 @@
+from typing import Optional
+
+from .local_rewriter import LocalRewriter
+from .prompt_builder import PromptBuilder
+from .sentence import Sentence
+
+PROMPTS_PER_REQUEST: int = 50
+PROMPT_HIDE_SYSTEM = "Tu es un assistant expert en stéganographie textuelle."
+PROMPT_HIDE_ASSISTANT = "Le style doit rester naturel, discret et humain. Un mot est toute séquence de lettres, de chiffres, d'apostrophes ou de traits d'union, séparée par un espace."
+PROMPT_HIDE_USER = 'Reformule, en anglais, la phrase suivante pour générer une phrase contenant un nombre **{PARITY}** de mots : "{SENTENCE}"'
+PROMPT_HIDE_USER_WORDS = 'Reformule, en anglais, la phrase suivante pour générer une phrase contenant exactement **{WORDS}** mots : "{SENTENCE}"'
+PROMPT_HIDE_LAST_USER = """Réponds STRICTEMENT en JSON valide.  
+Utilise ce format exact et rien d'autre :
+
+{
+  "results": [{"id": 12, "text": "..."}, {"id": 15, "text": "..."}]
+}
+
+Le tableau "results" doit contenir un élément par message ayant la structure : "[id=<id>] Reformule … : <texte>".
+Le champ "id" reprend l'identifiant du message, le champ "text" contient la phrase reformulée.
+
+Aucun texte en-dehors du JSON.  
+Pas de commentaire.  
+Pas de préface.  
+Pas d’explication.
+"""
+
+# How a sentence carries a symbol of the needle (see decide_sentence)
+KEEP: str = 'keep'
+REWRITE: str = 'rewrite'
+PROMPT: str = 'prompt'
+
+
+def parity_name(bit: int) -> str:
+    return "pair" if bit == 0 else "impair"
+
+
+def target_words_count(words: int, residue: int, modulus: int) -> int:
+    """
+    Return the number of words closest to `words` whose remainder modulo `modulus` is `residue`
+    (when several bits are hidden into each sentence, the LLM is asked for an exact number of words).
+    Adding words is preferred to removing words.
+
+    :param words: The number of words of the sentence.
+    :param residue: The expected remainder.
+    :param modulus: The modulus (2 to the power of the number of bits per sentence).
+    """
+    more: int = words + (residue - words) % modulus
+    less: int = words - (words - residue) % modulus
+    if less >= 1 and words - less < more - words:
+        return less
+    return more
+
+
+def hide_prompt(sentence: str, words: int, residue: int, modulus: int = 2) -> str:
+    """
+    Return the prompt used to modify the number of words of a sentence.
+
+    :param sentence: The sentence.
+    :param words: The number of words of the sentence.
+    :param residue: The expected parity (or remainder modulo `modulus`) of the number of words.
+    :param modulus: The modulus (2 to the power of the number of bits per sentence).
+    """
+    if modulus == 2:
+        return PromptBuilder(PROMPT_HIDE_USER).generate_prompt({'PARITY': parity_name(residue), 'SENTENCE': sentence})
+    return PromptBuilder(PROMPT_HIDE_USER_WORDS).generate_prompt({'WORDS': str(target_words_count(words, residue, modulus)), 'SENTENCE': sentence})
+
+
+def decide_sentence(sentence: str, words: int, residue: int, modulus: int = 2,
+                    rewriter: Optional[LocalRewriter] = None) -> tuple[str, str]:
+    """
+    Decide how a sentence carries a symbol of the needle: it is kept if its number of words already carries the
+    symbol, or else rewritten locally (see LocalRewriter), or else sent to the LLM.
+
+    :param sentence: The sentence.
+    :param words: The number of words of the sentence.
+    :param residue: The symbol: the expected parity (or remainder modulo `modulus`) of the number of words.
+    :param modulus: The modulus (2 to the power of the number of bits per sentence).
+    :param rewriter: The local rewriter (None: the sentences are not rewritten locally).
+    :return: KEEP and the sentence, REWRITE and its local rewrite, or PROMPT and the prompt to send to the LLM.
+    """
+    if words % modulus == residue:
+        return KEEP, sentence
+    rewrite: Optional[str] = rewriter.rewrite(sentence, residue, modulus) if rewriter is not None else None
+    if rewrite is not None:
+        return REWRITE, rewrite
+    return PROMPT, hide_prompt(sentence, words, residue, modulus)
+
+
+def normalize_reformulation(reformulation: str) -> str:
+    """Terminate a reformulation of the LLM with a period."""
+    return reformulation if reformulation.endswith(".") else reformulation + "."
+
+
+def valid_reformulation(reformulation: Optional[str], residue: int, modulus: int = 2) -> Optional[str]:
+    """
+    Return the normalized reformulation of a sentence if its number of words carries the symbol, None if it is
+    missing or invalid (the sentence must be sent again).
+    """
+    if reformulation is None:
+        return None
+    reformulation = normalize_reformulation(reformulation)
+    return reformulation if len(Sentence(reformulation).get_words()) % modulus == residue else None
+
+
+def build_request_messages(prompts: list[tuple[int, str]]) -> list[dict[str, str]]:
+    """
+    Build the messages of a request to the LLM.
+
+    :param prompts: The prompts to send, with the ID (the position) of the sentence to reformulate.
+    :return: The messages of the request.
+    """
+    messages: list[dict[str, str]] = [
+        {"role": "system", "content": PROMPT_HIDE_SYSTEM},
+        {"role": "assistant", "content": PROMPT_HIDE_ASSISTANT}
+    ]
+    for identifier, prompt in prompts:
+        messages.append({"role": "user", "content": "[id={}] {}".format(identifier, prompt)})
+    messages.append({"role": "user", "content": PROMPT_HIDE_LAST_USER})
+    return messages
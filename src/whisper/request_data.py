@@ -1,5 +1,6 @@
-from typing import cast, Optional, Union
-import json
+from typing import cast, Any, Optional, Union
+
+from . import codec
 
 class RequestMessage:
 
@@ -18,7 +19,7 @@ class RequestMessage:
     @staticmethod
     def from_json(text: str):
         try:
-            message: dict[str, str] = json.loads(text)
+            message: dict[str, str] = codec.loads(text)
         except ValueError:
             raise ValueError("Invalid message content")
         return RequestMessage.from_dict(message)
@@ -27,7 +28,7 @@ class RequestMessage:
         return {'role': self.role, 'content': self.content }
 
     def to_json(self) -> str:
-        return json.dumps(self.to_dict(), indent=4, ensure_ascii=False, sort_keys=True)
+        return codec.dumps(self.to_dict())
 
 class RequestData:
 
@@ -49,11 +50,21 @@ class RequestData:
 
     @staticmethod
     def from_json(text: str):
+        return RequestData.from_dict(RequestData.dict_from_json(text))
+
+    @staticmethod
+    def dict_from_json(text: str) -> dict[str, Union[list[int], list[dict[str, str]]]]:
+        """Load the dictionary of a request (see to_dict), without creating the messages (hot path of the hider)."""
         try:
-            data: dict[str, Union[list[int], list[dict[str, str]]]] = json.loads(text)
+            data: Any = codec.loads(text)
         except ValueError:
             raise ValueError("Invalid message data (not valid JSON)")
-        return RequestData.from_dict(data)
+        if not isinstance(data, dict) or 'positions' not in data or 'messages' not in data:
+            raise ValueError('Message must contain positions and messages.')
+        for message in data['messages']:
+            if 'role' not in message or 'content' not in message:
+                raise ValueError('Message must contain a role and a content.')
+        return data
 
     def add_message(self, message: RequestMessage) -> None:
         if self.messages is None:
@@ -71,11 +82,10 @@ class RequestData:
         return json_data
 
     def to_json(self) -> str:
-        json_data: dict[str, Union[list[int], list[dict[str, str]]]] = self.to_dict()
-        return json.dumps(json_data, indent=4, ensure_ascii=False, sort_keys=True)
+        return codec.dumps(self.to_dict())
 
     def messages_to_json(self) -> str:
         messages: list[dict[str, str]] = []
         for message in cast(list[RequestMessage], self.messages):
             messages.append(message.to_dict())
-        return json.dumps(messages, indent=4, ensure_ascii=False, sort_keys=True)
+        return codec.dumps_pretty(messages)
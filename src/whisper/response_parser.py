@@ -0,0 +1,162 @@
+from typing import Any, Optional
+from dataclasses import dataclass, field
+import json
+import re
+
+from . import codec
+
+# The format of the responses, expressed as a JSON schema (for the providers that support structured outputs).
+RESULTS_JSON_SCHEMA: dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "text": {"type": "string"}
+                },
+                "required": ["id", "text"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["results"],
+    "additionalProperties": False
+}
+
+RESPONSE_FORMAT: dict[str, Any] = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "reformulations",
+        "strict": True,
+        "schema": RESULTS_JSON_SCHEMA
+    }
+}
+
+ITEM_PATTERN = re.compile(r'\{\s*"id"\s*:\s*(\d+)\s*,\s*"text"\s*:\s*("(?:[^"\\]|\\.)*")\s*}')
+
+
+@dataclass
+class ParsedResponse:
+    matched: dict[int, str] = field(default_factory=dict)
+    missing: list[int] = field(default_factory=list)
+    repaired: bool = False
+
+
+def strip_code_fences(text: str) -> str:
+    """Remove the Markdown code fences (```json ... ```) around the JSON document."""
+    match = re.search(r'```[a-zA-Z]*\s*(.*?)(?:```|$)', text, re.DOTALL)
+    if match is None:
+        return text
+    return match.group(1)
+
+
+def remove_trailing_commas(text: str) -> str:
+    return re.sub(r',\s*([\]}])', r'\1', text)
+
+
+def close_truncated(text: str) -> list[str]:
+    """
+    Return candidate repairs for a truncated JSON document: the document with all open
+    arrays and objects closed, then the document cut after the last complete value.
+    """
+    stack: list[str] = []
+    in_string: bool = False
+    escape: bool = False
+    snapshots: list[tuple[int, list[str]]] = []
+    for i, c in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif c == '"':
+                in_string = False
+            continue
+        if c == '"':
+            in_string = True
+        elif c == '{' or c == '[':
+            stack.append('}' if c == '{' else ']')
+        elif (c == '}' or c == ']') and len(stack) > 0:
+            stack.pop()
+            snapshots.append((i + 1, list(stack)))
+    candidates: list[str] = []
+    if not in_string:
+        # A truncated string is never completed: the reformulation it contains would be truncated as well.
+        candidates.append(remove_trailing_commas(text.rstrip() + ''.join(reversed(stack))))
+    if len(snapshots) > 0:
+        index, remaining = snapshots[-1]
+        candidates.append(remove_trailing_commas(text[:index] + ''.join(reversed(remaining))))
+    return candidates
+
+
+def load_tolerant(response: str) -> tuple[Optional[Any], bool]:
+    """Load a JSON document, repairing the common defects if needed. Return the document and whether it was repaired."""
+    try:
+        return codec.loads(response), False
+    except ValueError:
+        pass
+    text: str = strip_code_fences(response).strip()
+    start: int = min([i for i in (text.find('{'), text.find('[')) if i >= 0], default=-1)
+    if start < 0:
+        return None, True
+    text = text[start:]
+    for candidate in [text, remove_trailing_commas(text)] + close_truncated(text):
+        try:
+            return json.loads(candidate), True
+        except ValueError:
+            continue
+    return None, True
+
+
+def parse_response(response: str, ids: list[int]) -> ParsedResponse:
+    """
+    Extract the reformulations from a LLM response, keyed by the ID of the sentence.
+
+    The expected format is `{"results": [{"id": <id>, "text": "<reformulation>"}, ...]}`.
+    Defective responses (code fences, trailing commas, truncation) are repaired. Items with
+    an unknown ID or an empty text are ignored. The legacy format (`{"results": ["...", ...]}`)
+    is accepted when it contains exactly one element per ID.
+
+    :param response: The response of the LLM.
+    :param ids: The IDs of the sentences sent to the LLM.
+    :return: The reformulations found in the response and the IDs that are missing.
+    """
+    result: ParsedResponse = ParsedResponse()
+    expected: set[int] = set(ids)
+    data, result.repaired = load_tolerant(response)
+    items: list[Any] = []
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        items = data['results']
+    elif isinstance(data, list):
+        items = data
+
+    if len(items) > 0 and all(isinstance(item, str) for item in items):
+        if len(items) == len(ids):
+            items = [{'id': i, 'text': text} for i, text in zip(ids, items)]
+        else:
+            items = []
+
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            identifier: int = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        text = item.get('text')
+        if identifier in expected and isinstance(text, str) and text.strip() != '':
+            result.matched[identifier] = text.strip()
+
+    if data is None:
+        # Last resort: salvage the complete items
+        for match in ITEM_PATTERN.finditer(response):
+            identifier = int(match.group(1))
+            text = json.loads(match.group(2))
+            if identifier in expected and text.strip() != '':
+                result.matched[identifier] = text.strip()
+
+    result.missing = [i for i in ids if i not in result.matched]
+    return result
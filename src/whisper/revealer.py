@@ -0,0 +1,148 @@
+from typing import Generator, Optional, cast
+
+from .conversion import Conversion
+from .ecc import ErrorCorrection
+from .fast_reveal import LineParityReader
+from .profiler import Profiler, DISABLED
+from .sentence import Sentence
+from .text_file_tool import read_sentences_from_file
+from whisper import Bit
+
+
+class Revealer:
+
+    def __init__(self, murmur: str, reveal_path: str, verbose: bool = False, profiler: Optional[Profiler] = None, fast: bool = True, ecc: int = 0, bits_per_sentence: int = 1) -> None:
+        """
+        Reveal the text file (the "needle") hidden into a text file (the "murmur").
+
+        :param murmur: The message that hides the needle.
+        :param reveal_path: The path to the file used to store the revealed needle.
+        :param verbose: Verbose flag.
+        :param profiler: The profiler used to measure the reveal (default: no profiling).
+        :param fast: If True, the murmurs that contain one sentence per line are read by the fast path (see LineParityReader).
+        :param ecc: The number of ECC bytes per block used by the hider (0: no error correction).
+        :param bits_per_sentence: The number of bits hidden into each sentence (the number of words modulo 2^k).
+        """
+        self.murmur: str = murmur
+        self.reveal_path: str = reveal_path
+        self.verbose: bool = verbose
+        self.profiler: Profiler = profiler if profiler is not None else DISABLED
+        self.fast: bool = fast
+        self.bits_per_sentence: int = bits_per_sentence
+        self.error_correction: Optional[ErrorCorrection] = ErrorCorrection(ecc) if ecc > 0 else None
+        # The number of bits that store the length of the needle
+        self.header_bits: int = self.error_correction.header_size * 8 if self.error_correction is not None else 64
+
+    @staticmethod
+    def read_bits(path: str, bits_per_sentence: int = 1) -> Generator[Bit, None, None]:
+        """
+        Yield the parity of the number of words of each sentence of a text file
+        (or the `bits_per_sentence` bits of the number of words modulo 2^bits_per_sentence).
+        """
+        modulus: int = 1 << bits_per_sentence
+        for line in read_sentences_from_file(path):
+            residue: int = len(Sentence(line).get_words()) % modulus
+            for i in range(bits_per_sentence - 1, -1, -1):
+                yield cast(Bit, (residue >> i) & 1)
+
+    def sentences_count(self, bits: int) -> int:
+        """Return the number of sentences that carry a number of bits."""
+        return (bits + self.bits_per_sentence - 1) // self.bits_per_sentence
+
+    def needle_length(self, length_vector: list[Bit]) -> int:
+        """Return the length of the needle (in characters) stored in the length vector."""
+        if self.error_correction is not None:
+            return self.error_correction.decode_length(Conversion.bit_list_to_bytes(length_vector))
+        return Conversion.bit_list_to_int64(length_vector)
+
+    def body_bits(self, length_vector: list[Bit]) -> int:
+        """Return the number of bits of the body vector."""
+        length: int = self.needle_length(length_vector)
+        if self.error_correction is not None:
+            return self.error_correction.body_size(length) * 8
+        return length * 8
+
+    def read_vectors_fast(self) -> Optional[tuple[list[Bit], list[Bit]]]:
+        """
+        Read the length vector and the body vector of a murmur that contains one sentence per line.
+        Return None if the murmur is not in this format.
+        """
+        with LineParityReader(self.murmur, 1 << self.bits_per_sentence) as reader:
+            residues: Optional[list[int]] = reader.read(self.sentences_count(self.header_bits))
+            if residues is None:
+                return None
+            bits: list[Bit] = Conversion.symbols_to_bit_list(residues, self.bits_per_sentence)
+            if len(bits) < self.header_bits:
+                return bits, []
+            # The last sentence of the length may also carry the first bits of the body
+            length_vector: list[Bit] = bits[:self.header_bits]
+            body_vector: list[Bit] = bits[self.header_bits:]
+            size: int = self.body_bits(length_vector)
+            if size > len(body_vector):
+                residues = reader.read(self.sentences_count(size - len(body_vector)))
+                if residues is None:
+                    return None
+                body_vector += Conversion.symbols_to_bit_list(residues, self.bits_per_sentence)
+        return length_vector, body_vector[:size]
+
+    def read_vectors(self) -> tuple[list[Bit], list[Bit]]:
+        """Read the length vector and the body vector of any murmur (the sentences are detected)."""
+        bits_iterator: Generator[Bit, None, None] = Revealer.read_bits(self.murmur, self.bits_per_sentence)
+        length_vector: list[Bit] = []
+        for bit in bits_iterator:
+            length_vector.append(bit)
+            if len(length_vector) == self.header_bits:
+                break
+        # Make sure that the number of bits is greater than the size of the length vector.
+        if len(length_vector) < self.header_bits:
+            raise ValueError("The murmur must contain at least {} sentences!".format(self.sentences_count(self.header_bits)))
+        size: int = self.body_bits(length_vector)
+        body_vector: list[Bit] = []
+        if size > 0:
+            for bit in bits_iterator:
+                body_vector.append(bit)
+                if len(body_vector) == size:
+                    break
+        bits_iterator.close()
+        return length_vector, body_vector
+
+    def decode(self) -> bytes:
+        """
+        Decode the needle. Only the sentences that carry the needle are read.
+
+        :return: The needle.
+        """
+        vectors: Optional[tuple[list[Bit], list[Bit]]] = self.read_vectors_fast() if self.fast else None
+        if vectors is None:
+            self.profiler.count('reveal.general')
+            vectors = self.read_vectors()
+        else:
+            self.profiler.count('reveal.fast')
+        length_vector, body_vector = vectors
+        if len(length_vector) < self.header_bits:
+            raise ValueError("The murmur must contain at least {} sentences!".format(self.sentences_count(self.header_bits)))
+        length: int = self.needle_length(length_vector)
+        sentences: int = self.sentences_count(len(length_vector) + len(body_vector))
+        self.profiler.count('sentences', sentences)
+        if len(body_vector) < self.body_bits(length_vector):
+            raise ValueError("The murmur is truncated: the needle contains {} characters, but the murmur only contains {} sentences!".format(length, sentences))
+        body: bytes = Conversion.bit_list_to_bytes(body_vector)
+        if self.error_correction is not None:
+            body, corrected = self.error_correction.decode_body(body)
+            corrected += self.error_correction.decode_header(Conversion.bit_list_to_bytes(length_vector))[1]
+            self.profiler.count('ecc.corrected', corrected)
+            if self.verbose:
+                print("ECC: {} bytes corrected".format(corrected))
+        if self.verbose:
+            print("length vector: {}".format(length_vector))
+            print("length: {} (characters) => {} bits".format(length, length*8))
+            print("body: {}".format(body_vector))
+            print('Message: "{}"'.format(self.reveal_path))
+        return body
+
+    def reveal(self) -> None:
+        with self.profiler.stage('decode'):
+            body: bytes = self.decode()
+        with self.profiler.stage('write_needle'):
+            with open(self.reveal_path, 'w') as f:
+                self.profiler.count('needle.bytes', f.write(str(body, 'ascii')))
@@ -0,0 +1,436 @@
+from typing import Any, Callable, Optional, cast
+from dataclasses import dataclass, asdict
+from pathlib import Path
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+
+from .configuration import HiderConfiguration
+from .conversion import Conversion
+from .dispatcher import Dispatcher, RateLimiter, LLMClient, BACKOFF_BASE, DEFAULT_MAX_ATTEMPTS, backoff_delay, retryable
+from .haystack_index import HaystackIndex
+from .hedging import HedgeStats, HedgedClient, close_hedging, with_hedging
+from .local_rewriter import LocalRewriter
+from .message import Message
+from .prompts import PROMPTS_PER_REQUEST, PROMPT, REWRITE, build_request_messages, decide_sentence, valid_reformulation
+from .response_parser import RESPONSE_FORMAT, ParsedResponse, parse_response
+from .types import Vector
+
+# A sharded hide splits the needle-bearing sentences of the haystack into ranges (the shards), published into a queue
+# stored in a shared directory. Workers, on any node that sees the directory, claim the shards, reformulate and
+# validate their sentences, and write the result of each shard into the directory. The murmur is assembled once all
+# the shards are done (see merge_shards). The sentences of a shard are read from the index of the haystack (see
+# HaystackIndex), built when the shards are published: a worker does not segment the haystack up to its shard.
+QUEUE_NAME: str = 'queue.sqlite'
+# The statuses of a shard
+SHARD_PENDING: str = 'pending'
+SHARD_CLAIMED: str = 'claimed'
+SHARD_DONE: str = 'done'
+SHARD_FAILED: str = 'failed'
+# The number of sentences of a shard
+DEFAULT_SHARD_SIZE: int = 1000
+# A claimed shard whose worker has not shown a sign of life for this number of seconds is given to another worker
+DEFAULT_LEASE: float = 300.0
+# The number of times a shard is claimed before it is marked as failed
+MAX_SHARD_ATTEMPTS: int = 3
+# The number of seconds waited by an idle worker before it looks for a shard again (stragglers)
+POLL_INTERVAL: float = 1.0
+# The number of seconds a connection waits for the lock of the queue
+LOCK_TIMEOUT: float = 60.0
+# The buffer size of the murmur (see Hider)
+MURMUR_BUFFER_SIZE: int = 1 << 20
+
+
+@dataclass
+class ShardTask:
+    id: int
+    start: int
+    stop: int
+    attempts: int
+
+
+def shard_output(shard_dir: Path, shard: int) -> Path:
+    """Return the path of the result of a shard: one sentence per line."""
+    return shard_dir.joinpath('shard-{:06d}.txt'.format(shard))
+
+
+class ShardQueue:
+
+    def __init__(self, shard_dir: Path) -> None:
+        """
+        The queue of the shards of a sharded hide, stored into a SQLite database in the shared directory.
+
+        The database uses the rollback journal (the default durability profile): a write-ahead log needs shared
+        memory, which is not available on a network file system. Each claim is a write transaction, so two workers
+        never claim the same shard (unless its lease has expired).
+
+        :param shard_dir: The shared directory.
+        """
+        self.shard_dir: Path = shard_dir
+        self.db: sqlite3.Connection = sqlite3.connect(str(shard_dir.joinpath(QUEUE_NAME)), timeout=LOCK_TIMEOUT, isolation_level=None)
+
+    @staticmethod
+    def exists(shard_dir: Path) -> bool:
+        return shard_dir.joinpath(QUEUE_NAME).exists()
+
+    @staticmethod
+    def publish(shard_dir: Path, needle: str, haystack: str, murmur: str, config: HiderConfiguration,
+                shard_size: int = DEFAULT_SHARD_SIZE) -> 'ShardQueue':
+        """
+        Create the queue of a sharded hide: split the needle-bearing sentences into ranges of `shard_size` sentences.
+
+        :param shard_dir: The shared directory (created if needed).
+        :param needle: The message to hide.
+        :param haystack: The message used to hide the needle (it must be readable by all the workers).
+        :param murmur: The generated message that hides the needle (written by the merge).
+        :param config: The configuration (bits_per_sentence and ecc are used to compute the symbols of the needle, the
+                       index of the haystack is built in index_dir).
+        :param shard_size: The number of sentences of a shard.
+        """
+        if shard_size < 1:
+            raise ValueError("A shard must contain at least one sentence!")
+        if ShardQueue.exists(shard_dir):
+            raise ValueError('A sharded hide has already been published into "{}"'.format(shard_dir))
+        bits: Vector = Message.load_text_file_as_vector(needle, config.ecc)
+        symbols: list[int] = Conversion.bit_list_to_symbols(bits, config.bits_per_sentence)
+        with HaystackIndex.open(haystack, config.index_dir, config.verbose) as index:
+            if len(index) < len(symbols):
+                raise ValueError("The haystack is not wide enough to conceal the needle! It should contain at least {} sentences!".format(len(symbols)))
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        queue: ShardQueue = ShardQueue(shard_dir)
+        db: sqlite3.Connection = queue.db
+        db.execute('BEGIN IMMEDIATE')
+        db.execute('CREATE TABLE meta ("key" TEXT PRIMARY KEY, "value")')
+        db.execute("""CREATE TABLE shards ("id" INTEGER PRIMARY KEY,
+                                           "start" INTEGER NOT NULL,
+                                           "stop" INTEGER NOT NULL,
+                                           "status" TEXT NOT NULL,
+                                           "worker" TEXT DEFAULT NULL,
+                                           "heartbeat" REAL DEFAULT NULL,
+                                           "attempts" INTEGER NOT NULL DEFAULT 0,
+                                           "error" TEXT DEFAULT NULL)""")
+        meta: dict[str, Any] = {
+            'needle': os.path.abspath(needle),
+            'haystack': os.path.abspath(haystack),
+            'murmur': os.path.abspath(murmur),
+            'bits_per_sentence': config.bits_per_sentence,
+            'ecc': config.ecc,
+            # The symbols of the needle (one per sentence, at most 4 bits): the workers do not need the needle
+            'symbols': bytes(symbols)
+        }
+        db.executemany('INSERT INTO meta ("key", "value") VALUES (?, ?)', meta.items())
+        db.executemany('INSERT INTO shards ("start", "stop", "status") VALUES (?, ?, ?)',
+                       ((start, min(start + shard_size, len(symbols)), SHARD_PENDING) for start in range(0, len(symbols), shard_size)))
+        db.execute('COMMIT')
+        return queue
+
+    def close(self) -> None:
+        self.db.close()
+
+    def meta(self) -> dict[str, Any]:
+        return dict(self.db.execute('SELECT "key", "value" FROM meta').fetchall())
+
+    def claim(self, worker: str, lease: float = DEFAULT_LEASE) -> Optional[ShardTask]:
+        """
+        Claim a shard: the first pending shard, or else the first shard whose worker has not shown a sign of life for
+        `lease` seconds (a straggler). A straggler already claimed MAX_SHARD_ATTEMPTS times is marked as failed instead
+        (its shard may kill its workers). Return None if no shard can be claimed.
+        """
+        now: float = time.time()
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            self.db.execute('UPDATE shards SET "status"=?, "error"=? WHERE "status"=? AND "heartbeat"<? AND "attempts">=?',
+                            (SHARD_FAILED, 'The lease expired {} times'.format(MAX_SHARD_ATTEMPTS), SHARD_CLAIMED, now - lease, MAX_SHARD_ATTEMPTS))
+            row = self.db.execute("""SELECT "id", "start", "stop", "attempts" FROM shards
+                                     WHERE "status"=? OR ("status"=? AND "heartbeat"<?)
+                                     ORDER BY "status"<>?, "id" LIMIT 1""", (SHARD_PENDING, SHARD_CLAIMED, now - lease, SHARD_PENDING)).fetchone()
+            if row is None:
+                self.db.execute('COMMIT')
+                return None
+            self.db.execute('UPDATE shards SET "status"=?, "worker"=?, "heartbeat"=?, "attempts"="attempts"+1 WHERE "id"=?', (SHARD_CLAIMED, worker, now, row[0]))
+            self.db.execute('COMMIT')
+        except Exception:
+            self.db.execute('ROLLBACK')
+            raise
+        return ShardTask(row[0], row[1], row[2], row[3] + 1)
+
+    def heartbeat(self, task: ShardTask, worker: str) -> bool:
+        """Extend the lease of a claimed shard. Return False if the shard has been given to another worker."""
+        cursor: sqlite3.Cursor = self.db.execute('UPDATE shards SET "heartbeat"=? WHERE "id"=? AND "worker"=? AND "status"=?', (time.time(), task.id, worker, SHARD_CLAIMED))
+        return cursor.rowcount > 0
+
+    def complete(self, task: ShardTask, worker: str) -> None:
+        """Mark a shard as done (its result has been written). A straggler may complete a shard reassigned to another worker."""
+        self.db.execute('UPDATE shards SET "status"=?, "worker"=?, "error"=NULL WHERE "id"=? AND "status"<>?', (SHARD_DONE, worker, task.id, SHARD_DONE))
+
+    def fail(self, task: ShardTask, worker: str, error: str) -> None:
+        """Give a shard back to the queue, or mark it as failed after MAX_SHARD_ATTEMPTS claims."""
+        status: str = SHARD_FAILED if task.attempts >= MAX_SHARD_ATTEMPTS else SHARD_PENDING
+        self.db.execute('UPDATE shards SET "status"=?, "error"=? WHERE "id"=? AND "worker"=? AND "status"=?', (status, error, task.id, worker, SHARD_CLAIMED))
+
+    def counts(self) -> dict[str, int]:
+        """Return the number of shards per status."""
+        counts: dict[str, int] = {status: 0 for status in (SHARD_PENDING, SHARD_CLAIMED, SHARD_DONE, SHARD_FAILED)}
+        counts.update(dict(self.db.execute('SELECT "status", COUNT(*) FROM shards GROUP BY "status"').fetchall()))
+        return counts
+
+    def errors(self) -> list[tuple[int, str]]:
+        return self.db.execute('SELECT "id", "error" FROM shards WHERE "status"=? ORDER BY "id"', (SHARD_FAILED,)).fetchall()
+
+    def finished(self) -> bool:
+        """Test whether no shard is pending or claimed (all the shards are done or failed)."""
+        counts: dict[str, int] = self.counts()
+        return counts[SHARD_PENDING] == 0 and counts[SHARD_CLAIMED] == 0
+
+    def shards(self) -> list[ShardTask]:
+        return [ShardTask(*row) for row in self.db.execute('SELECT "id", "start", "stop", "attempts" FROM shards ORDER BY "id"')]
+
+
+@dataclass
+class WorkerStats:
+    shards: int = 0
+    sentences: int = 0
+    local_rewrites: int = 0
+    llm_sentences: int = 0
+    retries: int = 0
+    requests: int = 0
+    failed_shards: int = 0
+    # The statistics of the hedged requests (None: no hedging)
+    hedge: Optional[HedgeStats] = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class PendingSentence:
+    position: int
+    sentence: str
+    symbol: int
+    prompt: str
+    attempts: int = 0
+
+
+class ShardWorker:
+
+    def __init__(self, shard_dir: Path, config: HiderConfiguration, client: Optional[LLMClient] = None,
+                 worker_id: Optional[str] = None,
+                 lease: float = DEFAULT_LEASE,
+                 requests_per_minute: Optional[float] = None,
+                 max_attempts: Optional[int] = DEFAULT_MAX_ATTEMPTS,
+                 poll_interval: float = POLL_INTERVAL,
+                 backoff: float = BACKOFF_BASE) -> None:
+        """
+        A worker of a sharded hide: claim the shards of the queue and hide their part of the needle, until no shard is
+        left. The sentences of a shard are rewritten locally or sent to the LLM (PROMPTS_PER_REQUEST sentences per
+        request), and sent again until their number of words carries the expected symbol. The lease of a shard is
+        extended after each answered request: a worker whose requests fail lets its shard go to another worker.
+
+        :param shard_dir: The shared directory of the hide (see ShardQueue.publish).
+        :param config: The options of the hider (model, token, concurrency, local rewrites, hedging, index_dir).
+        :param client: The client used to call the LLM (default: a ChatGPT client).
+        :param worker_id: The name of the worker (default: the host name and the process ID).
+        :param lease: The number of seconds without a sign of life after which a shard is given to another worker.
+        :param requests_per_minute: The maximum number of requests per minute of this worker (default: no limit).
+        :param max_attempts: The maximum number of attempts for a sentence (invalid reformulations and failed requests),
+                             before its shard fails (None: no limit).
+        :param poll_interval: The number of seconds waited for the stragglers when no shard can be claimed.
+        :param backoff: The delay after the first round of requests with errors, doubled after each following one
+                        (see backoff_delay). A request that cannot succeed (see retryable) fails its shard at once.
+        """
+        self.shard_dir: Path = shard_dir
+        self.options: HiderConfiguration = config
+        self.worker_id: str = worker_id if worker_id is not None else '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.lease: float = lease
+        self.max_attempts: Optional[int] = max_attempts
+        self.poll_interval: float = poll_interval
+        self.backoff: float = backoff
+        if client is None:
+            from .chat_gpt import ChatGPT
+            client = ChatGPT(config.model, config.token)
+        response_format: Optional[dict[str, Any]] = RESPONSE_FORMAT if config.structured_output else None
+        self.dispatcher: Dispatcher[list[PendingSentence]] = Dispatcher(with_hedging(client, config), config.concurrency, RateLimiter(requests_per_minute), response_format)
+        self.local_rewriter: Optional[LocalRewriter] = LocalRewriter.load(config.rewrite_rules_path) if config.local_rewrite else None
+        self.queue: ShardQueue = ShardQueue(shard_dir)
+        meta: dict[str, Any] = self.queue.meta()
+        self.haystack: str = meta['haystack']
+        self.symbols: bytes = meta['symbols']
+        self.modulus: int = 1 << meta['bits_per_sentence']
+        self.index: Optional[HaystackIndex] = None
+        self.stats: WorkerStats = WorkerStats()
+
+    def sentences(self, task: ShardTask) -> list[tuple[str, int]]:
+        """Return the sentences of a shard, with their numbers of words."""
+        return list(cast(HaystackIndex, self.index).iter_sentences(task.start, task.stop))
+
+    def reformulate(self, task: ShardTask, pending: list[PendingSentence], results: dict[int, str]) -> None:
+        """Send the sentences to the LLM until their reformulations are valid."""
+        # The number of consecutive rounds of requests with errors
+        failures: int = 0
+        while len(pending) > 0:
+            if failures > 0:
+                time.sleep(backoff_delay(failures, self.backoff))
+            batches: list[list[PendingSentence]] = [pending[i:i + PROMPTS_PER_REQUEST] for i in range(0, len(pending), PROMPTS_PER_REQUEST)]
+            pending = []
+            build: Callable[[list[PendingSentence]], list[dict[str, str]]] = lambda b: build_request_messages([(p.position, p.prompt) for p in b])
+            errors: int = 0
+            for batch, response, error in self.dispatcher.run(batches, build):
+                self.stats.requests += 1
+                if error is not None:
+                    errors += 1
+                    if not retryable(error):
+                        raise ValueError("Error calling the LLM: {}".format(str(error)))
+                parsed: ParsedResponse = parse_response(response if response is not None else '', [p.position for p in batch])
+                for p in batch:
+                    reformulation: Optional[str] = valid_reformulation(parsed.matched.get(p.position), p.symbol, self.modulus)
+                    if reformulation is not None:
+                        results[p.position] = reformulation
+                        continue
+                    p.attempts += 1
+                    self.stats.retries += 1
+                    if self.max_attempts is not None and p.attempts >= self.max_attempts:
+                        raise ValueError("Unable to reformulate sentence #{} after {} attempts{}".format(p.position, p.attempts, ': {}'.format(error) if error is not None else ''))
+                    pending.append(p)
+                # A sign of life after each answered request: a long shard is not given to another worker (a failed
+                # request is not a sign of life, so that the shard of a worker that cannot reach the LLM expires)
+                if error is None:
+                    self.queue.heartbeat(task, self.worker_id)
+            failures = failures + 1 if errors > 0 else 0
+
+    def process(self, task: ShardTask) -> None:
+        """Hide the symbols of a shard, and write the result of the shard."""
+        sentences: list[tuple[str, int]] = self.sentences(task)
+        if len(sentences) < task.stop - task.start:
+            raise ValueError("The haystack is not wide enough to conceal the needle! It should contain at least {} sentences!".format(len(self.symbols)))
+        results: dict[int, str] = {}
+        pending: list[PendingSentence] = []
+        for position, (sentence, words) in enumerate(sentences, task.start):
+            symbol: int = self.symbols[position]
+            decision, text = decide_sentence(sentence, words, symbol, self.modulus, self.local_rewriter)
+            if decision == PROMPT:
+                pending.append(PendingSentence(position, sentence, symbol, text))
+                continue
+            if decision == REWRITE:
+                self.stats.local_rewrites += 1
+            results[position] = text
+        self.stats.llm_sentences += len(pending)
+        self.reformulate(task, pending, results)
+        # The result is written atomically: a straggler and the worker that took its shard over write the same file
+        output: Path = shard_output(self.shard_dir, task.id)
+        tmp_path: Path = output.with_name('{}.{}.tmp'.format(output.name, self.worker_id.replace(os.sep, '_')))
+        with open(tmp_path, 'w') as f:
+            for position in range(task.start, task.stop):
+                f.write(results[position] + "\n")
+        os.replace(tmp_path, output)
+        self.stats.sentences += task.stop - task.start
+
+    def run(self) -> WorkerStats:
+        """Process the shards until no shard is pending or claimed (the shards of the stragglers are taken over)."""
+        self.index = HaystackIndex.open(self.haystack, self.options.index_dir, self.options.verbose)
+        try:
+            while True:
+                task: Optional[ShardTask] = self.queue.claim(self.worker_id, self.lease)
+                if task is None:
+                    if self.queue.finished():
+                        break
+                    # The remaining shards are being processed: wait for them, or for their lease to expire
+                    time.sleep(self.poll_interval)
+                    continue
+                if self.options.verbose:
+                    print('[{}] shard #{}: sentences {}-{} (attempt {})'.format(self.worker_id, task.id, task.start, task.stop - 1, task.attempts), flush=True)
+                try:
+                    self.process(task)
+                except Exception as e:
+                    self.stats.failed_shards += 1
+                    self.queue.fail(task, self.worker_id, str(e))
+                    if self.options.verbose:
+                        print('[{}] shard #{} failed: {}'.format(self.worker_id, task.id, e), flush=True)
+                    continue
+                self.queue.complete(task, self.worker_id)
+                self.stats.shards += 1
+        finally:
+            if self.index is not None:
+                self.index.close()
+                self.index = None
+            self.stats.hedge = close_hedging(self.dispatcher.client)
+        if self.options.verbose and isinstance(self.dispatcher.client, HedgedClient):
+            for line in self.dispatcher.client.lines():
+                print('[{}] {}'.format(self.worker_id, line), flush=True)
+        return self.stats
+
+    def close(self) -> None:
+        self.queue.close()
+
+
+def merge_shards(shard_dir: Path, config: Optional[HiderConfiguration] = None) -> str:
+    """
+    Write the murmur of a sharded hide: the results of the shards in order, then the rest of the haystack. The murmur
+    is written atomically (several workers may merge at the same time). Return the path of the murmur.
+
+    :param config: The configuration (index_dir: the directory of the index of the haystack, default: next to it).
+    :raise ValueError: If a shard is not done.
+    """
+    queue: ShardQueue = ShardQueue(shard_dir)
+    try:
+        counts: dict[str, int] = queue.counts()
+        if counts[SHARD_DONE] != sum(counts.values()):
+            errors: str = ''.join(' #{}: {}.'.format(shard, error) for shard, error in queue.errors())
+            raise ValueError('The sharded hide is not complete ({} shards done out of {}).{}'.format(counts[SHARD_DONE], sum(counts.values()), errors))
+        meta: dict[str, Any] = queue.meta()
+        shards: list[ShardTask] = queue.shards()
+    finally:
+        queue.close()
+    murmur: str = meta['murmur']
+    needle_sentences: int = len(meta['symbols'])
+    index: HaystackIndex = HaystackIndex.open(meta['haystack'], config.index_dir if config is not None else None)
+    tmp_path: str = '{}.{}-{}.tmp'.format(murmur, socket.gethostname(), os.getpid())
+    try:
+        with open(tmp_path, 'w', buffering=MURMUR_BUFFER_SIZE) as fd_murmur:
+            for shard in shards:
+                with open(shard_output(shard_dir, shard.id), 'r') as f:
+                    for line in f:
+                        fd_murmur.write(line)
+            # Copy the remaining sentences of the haystack
+            for sentence, _ in index.iter_sentences(needle_sentences):
+                fd_murmur.write(sentence + "\n")
+        os.replace(tmp_path, murmur)
+    finally:
+        index.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return murmur
+
+
+def run_worker(shard_dir: Path, config: HiderConfiguration, client: Optional[LLMClient] = None,
+               worker_id: Optional[str] = None, lease: float = DEFAULT_LEASE,
+               requests_per_minute: Optional[float] = None, max_attempts: Optional[int] = DEFAULT_MAX_ATTEMPTS,
+               backoff: float = BACKOFF_BASE) -> dict[str, Any]:
+    """Run a worker until no shard is left (the target of the local worker processes). Return its statistics."""
+    worker: ShardWorker = ShardWorker(shard_dir, config, client, worker_id, lease, requests_per_minute, max_attempts, backoff=backoff)
+    try:
+        return worker.run().to_dict()
+    finally:
+        worker.close()
+
+
+def run_workers(shard_dir: Path, config: HiderConfiguration, workers: int = 1, client: Optional[LLMClient] = None,
+                lease: float = DEFAULT_LEASE, requests_per_minute: Optional[float] = None,
+                max_attempts: Optional[int] = DEFAULT_MAX_ATTEMPTS, backoff: float = BACKOFF_BASE) -> list[dict[str, Any]]:
+    """
+    Run workers on this node, each in its own process, until no shard is left. Return the statistics of the workers.
+
+    :param workers: The number of worker processes (1: the worker runs in the current process).
+    :param client: The client used to call the LLM (it must be picklable if workers > 1).
+    :param requests_per_minute: The maximum number of requests per minute of each worker.
+    :param max_attempts: The maximum number of attempts for a sentence, before its shard fails (see ShardWorker).
+    """
+    if workers < 1:
+        raise ValueError("At least one worker is needed!")
+    if workers == 1:
+        return [run_worker(shard_dir, config, client, None, lease, requests_per_minute, max_attempts, backoff)]
+    with multiprocessing.Pool(workers) as pool:
+        results = [pool.apply_async(run_worker, (shard_dir, config, client, '{}:{}-{}'.format(socket.gethostname(), os.getpid(), i), lease, requests_per_minute, max_attempts, backoff))
+                   for i in range(workers)]
+        return [r.get() for r in results]
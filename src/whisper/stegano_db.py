@@ -1,7 +1,9 @@
 # Usage:
 #   python3 ../src/whisper/stegano_db.py debug/stegano-db.sqlite debug/stegano-db.txt
+#   python3 ../src/whisper/stegano_db.py debug/debug-archive.sqlite --calls
+#   python3 ../src/whisper/stegano_db.py debug/debug-archive.sqlite --call=2 debug/haystack-post-processing-2.txt
 
-from typing import Optional, List
+from typing import Optional, List, Generator, Iterable
 import os
 import sqlite3
 from pathlib import Path
@@ -14,11 +16,13 @@ if __name__ == '__main__':
     sys.path.insert(0, SEARCH_PATH)
     from whisper.sentence import Sentence
     from whisper.text_file_tool import read_sentences_from_file
-    from whisper.rand_tools import RandTools
+    from whisper.durability import DURABILITY_DEFAULT, apply_durability, checkpoint, default_db_path
+    from whisper.haystack_index import HaystackIndex
 else:
     from .sentence import Sentence
     from .text_file_tool import read_sentences_from_file
-    from .rand_tools import RandTools
+    from .durability import DURABILITY_DEFAULT, apply_durability, checkpoint, default_db_path
+    from .haystack_index import HaystackIndex
 
 @dataclass
 class SentenceData:
@@ -27,14 +31,45 @@ class SentenceData:
     sentence: Sentence
     prompt: Optional[str] = None
     reformulation: Optional[str] = None
+    sentence_words: Optional[int] = None
+    reformulation_words: Optional[int] = None
+    target_parity: Optional[int] = None
+
+# The columns used to build a SentenceData
+SENTENCE_DATA_COLUMNS: str = '"idx", "position", "sentence", "prompt", "reformulation", "sentence_words", "reformulation_words", "target_parity"'
+# The columns added after the first version of the database (they are added to the older databases when they are opened)
+COUNT_COLUMNS: tuple[str, ...] = ('sentence_words', 'reformulation_words', 'target_parity')
+# The sentences sent to the LLM whose reformulation is missing or invalid (the parameter is the modulus)
+INVALID_SENTENCES_QUERY: str = """SELECT {} FROM t
+                                  WHERE "prompt" IS NOT NULL
+                                    AND ("reformulation_words" IS NULL
+                                         OR "reformulation_words" % ? != coalesce("target_parity", 1 - "sentence_words" % 2))
+                                  ORDER BY "position"
+                               """.format(SENTENCE_DATA_COLUMNS)
+
+
+def words_count(sentence: str) -> int:
+    return len(Sentence(sentence).get_words())
+
 
 class SteganoDb:
 
-    def __init__(self, db_path: Optional[str] = None, init: bool = True):
+    def __init__(self, db_path: Optional[str] = None, init: bool = True, durability: str = DURABILITY_DEFAULT,
+                 read_only: bool = False):
+        """
+        :param db_path: The path of the database (default: a new database).
+        :param init: If True, the table is created, and a database created by an older version is upgraded.
+        :param durability: The durability profile (see whisper.durability).
+        :param read_only: If True, the database is opened read-only (it is neither initialized nor upgraded).
+        """
         if db_path is None:
-            db_path = 'file-db-' + RandTools.random_string(10) + '.sqlite'
+            db_path = default_db_path('file-db-', durability)
         self.db_file_path: Path = Path(db_path)
+        if read_only:
+            self.db = sqlite3.connect('{}?mode=ro'.format(self.db_file_path.resolve().as_uri()), uri=True)
+            return
         self.db = sqlite3.connect(db_path)
+        apply_durability(self.db, durability)
         if init:
             cursor = self.db.cursor()
             try:
@@ -42,11 +77,37 @@ class SteganoDb:
                                                                 "position" INTEGER NOT NULL,
                                                                 "sentence" TEXT NOT NULL,
                                                                 "prompt" TEXT DEFAULT NULL,
-                                                                "reformulation" TEXT DEFAULT NULL)""")
+                                                                "reformulation" TEXT DEFAULT NULL,
+                                                                "sentence_words" INTEGER DEFAULT NULL,
+                                                                "reformulation_words" INTEGER DEFAULT NULL,
+                                                                "target_parity" INTEGER DEFAULT NULL)""")
+                cursor.execute('CREATE INDEX IF NOT EXISTS t_position ON t ("position")')
+                self.upgrade(cursor)
+                # Only the sentences sent to the LLM are validated: get_invalid_sentences scans this partial index in
+                # the order of the positions, and skips the sentences that have not been sent (and their text)
+                cursor.execute("""CREATE INDEX IF NOT EXISTS t_validation ON t ("position", "target_parity", "sentence_words", "reformulation_words")
+                                  WHERE "prompt" IS NOT NULL""")
             finally:
                 cursor.close()
         self.db.commit()
 
+    @staticmethod
+    def missing_count_columns(cursor: sqlite3.Cursor) -> list[str]:
+        """Return the words count columns missing from a database created by an older version."""
+        columns: set[str] = {row[1] for row in cursor.execute('PRAGMA table_info(t)')}
+        return [c for c in COUNT_COLUMNS if c not in columns]
+
+    def upgrade(self, cursor: sqlite3.Cursor) -> None:
+        """Add the words count columns to a database created by an older version, and compute them."""
+        missing: list[str] = SteganoDb.missing_count_columns(cursor)
+        if len(missing) == 0:
+            return
+        for column in missing:
+            cursor.execute('ALTER TABLE t ADD COLUMN "{}" INTEGER DEFAULT NULL'.format(column))
+        rows = cursor.execute('SELECT "idx", "sentence", "reformulation" FROM t').fetchall()
+        cursor.executemany('UPDATE t SET "sentence_words"=?, "reformulation_words"=? WHERE "idx"=?',
+                           [(words_count(sentence), words_count(reformulation) if reformulation is not None else None, idx) for idx, sentence, reformulation in rows])
+
     def __enter__(self):
         return self
 
@@ -57,6 +118,10 @@ class SteganoDb:
         self.db.close()
         self.db = None
 
+    def checkpoint(self) -> None:
+        """Copy the write-ahead log of a durable database into the database (see durability.checkpoint)."""
+        checkpoint(self.db)
+
     def destroy(self):
         if not self.db_file_path.exists():
             return
@@ -67,17 +132,35 @@ class SteganoDb:
             print("Unable to remove file: " + str(self.db_file_path), flush=True)
         self.db = None
 
-    def load_file(self, path: str) -> int:
+    def load_file(self, path: str, limit: Optional[int] = None) -> int:
+        """Load the sentences of a file (at most `limit` sentences). Return the number of loaded sentences."""
         line_count: int = 0
         for sentence in read_sentences_from_file(path):
+            if limit is not None and line_count >= limit:
+                break
             self.add_sentence(sentence, line_count)
             line_count += 1
         return line_count
 
+    def load_index(self, index: HaystackIndex, limit: Optional[int] = None) -> int:
+        """
+        Load the sentences of an indexed haystack (at most `limit` sentences), in one transaction: the sentences and
+        their numbers of words are read from the index. Return the number of loaded sentences.
+        """
+        cursor = self.db.cursor()
+        try:
+            cursor.executemany('INSERT INTO t("position", "sentence", "sentence_words") VALUES (?, ?, ?)',
+                               ((position, sentence, words) for position, (sentence, words) in enumerate(index.iter_sentences(0, limit))))
+            count: int = cursor.rowcount
+        finally:
+            cursor.close()
+        self.db.commit()
+        return count
+
     def add_sentence(self, sentence: str, position: int):
         cursor = self.db.cursor()
         try:
-            cursor.execute('INSERT INTO t("position", "sentence") VALUES (?, ?)', (position, sentence,))
+            cursor.execute('INSERT INTO t("position", "sentence", "sentence_words") VALUES (?, ?, ?)', (position, sentence, words_count(sentence)))
         finally:
             cursor.close()
         self.db.commit()
@@ -85,12 +168,26 @@ class SteganoDb:
     def get_sentence_by_position(self, position: int) -> SentenceData:
         cursor = self.db.cursor()
         try:
-            row = cursor.execute('SELECT "idx", "position", "sentence", "prompt", "reformulation" FROM t WHERE "position"=?', (position,)).fetchone()
+            row = cursor.execute('SELECT {} FROM t WHERE "position"=?'.format(SENTENCE_DATA_COLUMNS), (position,)).fetchone()
             if row is None:
                 raise ValueError("Invalid position: {}".format(position))
         finally:
             cursor.close()
-        return SentenceData(idx=row[0], position=row[1], sentence=Sentence(row[2]), prompt=row[3], reformulation=row[4])
+        return SteganoDb.to_sentence_data(row)
+
+    @staticmethod
+    def to_sentence_data(row: tuple) -> SentenceData:
+        return SentenceData(idx=row[0], position=row[1], sentence=Sentence(row[2]), prompt=row[3], reformulation=row[4],
+                            sentence_words=row[5], reformulation_words=row[6], target_parity=row[7])
+
+    def iter_sentences(self) -> Generator[SentenceData, None, None]:
+        """Iterate over the sentences, ordered by position."""
+        cursor = self.db.cursor()
+        try:
+            for row in cursor.execute('SELECT {} FROM t ORDER BY "position"'.format(SENTENCE_DATA_COLUMNS)):
+                yield SteganoDb.to_sentence_data(row)
+        finally:
+            cursor.close()
 
     def get_number_of_sentences_to_reformulate(self) -> int:
         cursor = self.db.cursor()
@@ -104,33 +201,76 @@ class SteganoDb:
         sentences: List[SentenceData] = []
         cursor = self.db.cursor()
         try:
-            rows = cursor.execute('SELECT "idx", "position", "sentence", "prompt", "reformulation" FROM t WHERE "prompt" IS NOT NULL ORDER BY "idx" LIMIT ?, ?', (offset, batch_size,)).fetchall()
+            rows = cursor.execute('SELECT {} FROM t WHERE "prompt" IS NOT NULL ORDER BY "idx" LIMIT ?, ?'.format(SENTENCE_DATA_COLUMNS), (offset, batch_size,)).fetchall()
             for row in rows:
-                sentences.append(SentenceData(idx=row[0], position=row[1], sentence=Sentence(row[2]), prompt=row[3], reformulation=row[4]))
+                sentences.append(SteganoDb.to_sentence_data(row))
         finally:
             cursor.close()
         return sentences
 
-    def set_prompt_by_position(self, position: int, prompt: Optional[str]):
+    def set_prompt_by_position(self, position: int, prompt: Optional[str], target_parity: Optional[int] = None):
+        """
+        Set the prompt used to reformulate a sentence.
+
+        :param position: The position of the sentence.
+        :param prompt: The prompt.
+        :param target_parity: The parity of the number of words expected for the reformulation (default: the opposite of the parity of the sentence).
+        """
         cursor = self.db.cursor()
         try:
-            cursor.execute('UPDATE t SET "prompt"=? WHERE "position"=?', (prompt, position))
+            cursor.execute('UPDATE t SET "prompt"=?, "target_parity"=coalesce(?, 1 - "sentence_words" % 2) WHERE "position"=?', (prompt, target_parity, position))
             if cursor.rowcount != 1:
                 raise ValueError("Invalid position: {}".format(position))
         finally:
             cursor.close()
         self.db.commit()
 
-    def set_reformulation_by_position(self, position: int, reformulation: str):
+    def set_reformulation_by_position(self, position: int, reformulation: str, target_parity: Optional[int] = None):
+        """
+        Set the reformulation of a sentence (its number of words is stored along with it).
+
+        :param position: The position of the sentence.
+        :param reformulation: The reformulation.
+        :param target_parity: If not None, the parity of the number of words expected for the reformulation.
+        """
         cursor = self.db.cursor()
         try:
-            cursor.execute('UPDATE t SET "reformulation"=? WHERE "position"=?', (reformulation, position))
+            cursor.execute('UPDATE t SET "reformulation"=?, "reformulation_words"=?, "target_parity"=coalesce(?, "target_parity") WHERE "position"=?',
+                           (reformulation, words_count(reformulation), target_parity, position))
             if cursor.rowcount != 1:
                 raise ValueError("Invalid position: {}".format(position))
         finally:
             cursor.close()
         self.db.commit()
 
+    def get_invalid_sentences(self, modulus: int = 2) -> List[SentenceData]:
+        """
+        Return the sentences sent to the LLM whose reformulation is missing, or does not have the expected parity.
+        The validation relies on the stored words counts: only the failing sentences are read. The words are counted
+        here if the database was created by an older version and opened without being upgraded (see read_only).
+
+        :param modulus: The modulus of the words counts (2, unless several bits are hidden into each sentence:
+                        "target_parity" is then the expected remainder).
+        """
+        cursor = self.db.cursor()
+        try:
+            if len(SteganoDb.missing_count_columns(cursor)) == 0:
+                rows = cursor.execute(INVALID_SENTENCES_QUERY, (modulus,)).fetchall()
+                return [SteganoDb.to_sentence_data(row) for row in rows]
+            rows = cursor.execute('SELECT "idx", "position", "sentence", "prompt", "reformulation" FROM t WHERE "prompt" IS NOT NULL ORDER BY "position"').fetchall()
+        finally:
+            cursor.close()
+        invalid: List[SentenceData] = []
+        for idx, position, sentence, prompt, reformulation in rows:
+            sentence_words: int = words_count(sentence)
+            reformulation_words: Optional[int] = words_count(reformulation) if reformulation is not None else None
+            # Older versions only hid one bit per sentence, by inverting the parity of the sentence
+            target_parity: int = 1 - sentence_words % 2
+            if reformulation_words is None or reformulation_words % modulus != target_parity:
+                invalid.append(SentenceData(idx=idx, position=position, sentence=Sentence(sentence), prompt=prompt, reformulation=reformulation,
+                                            sentence_words=sentence_words, reformulation_words=reformulation_words))
+        return invalid
+
     def __len__(self) -> int:
         cursor = self.db.cursor()
         try:
@@ -163,48 +303,42 @@ class SteganoDb:
             cursor.close()
         return m
 
-    def dump(self, path: str):
-        max_sentence_length: int = self.get_sentences_max_length()
-        max_reformulation_length: int = self.get_reformulation_max_length()
+    def iter_dump_rows(self) -> Generator[tuple[int, str, Optional[str], Optional[str]], None, None]:
+        """Iterate over the rows of the dump (position, sentence, prompt, reformulation), ordered by position."""
         cursor = self.db.cursor()
-        counter: int = 0
         try:
-            with open(path, 'w') as f:
-                res = cursor.execute('SELECT "position", "sentence", "prompt", "reformulation" FROM t ORDER BY "position"')
-                while True:
-                    row = res.fetchone()
-                    if row is None:
-                        break
-                    position: int = row[0]
-                    sentence: str = row[1]
-                    prompt: Optional[str] = row[2]
-                    reformulation: Optional[str] = row[3]
-
-                    if prompt is not None:
-                        r: str = reformulation if reformulation is not None else ''
-                        counter += 1
-                        print('%-*d | %-*s | Y | %-*d | %-*s' % (5, position, max_sentence_length, sentence, 5, counter, max_reformulation_length, r), file=f)
-                    else:
-                        print('%-*d | %-*s | N | %-*s | %-*s' % (5, position, max_sentence_length, sentence, 5, ' ', max_reformulation_length, reformulation), file=f)
+            for row in cursor.execute('SELECT "position", "sentence", "prompt", "reformulation" FROM t ORDER BY "position"'):
+                yield row
         finally:
             cursor.close()
 
+    def dump_lines(self) -> Generator[str, None, None]:
+        return SteganoDb.format_dump(self.iter_dump_rows(), self.get_sentences_max_length(), self.get_reformulation_max_length())
+
+    def dump(self, path: str):
+        with open(path, 'w') as f:
+            for line in self.dump_lines():
+                print(line, file=f)
+
+    @staticmethod
+    def format_dump(rows: Iterable[tuple[int, str, Optional[str], Optional[str]]], max_sentence_length: int, max_reformulation_length: int) -> Generator[str, None, None]:
+        """
+        Format the rows of the database (position, sentence, prompt, reformulation) as the lines of a dump.
+
+        :param rows: The rows, ordered by position.
+        :param max_sentence_length: The length of the longest sentence (used to align the columns).
+        :param max_reformulation_length: The length of the longest reformulation (used to align the columns).
+        """
+        counter: int = 0
+        for position, sentence, prompt, reformulation in rows:
+            if prompt is not None:
+                r: str = reformulation if reformulation is not None else ''
+                counter += 1
+                yield '%-*d | %-*s | Y | %-*d | %-*s' % (5, position, max_sentence_length, sentence, 5, counter, max_reformulation_length, r)
+            else:
+                yield '%-*d | %-*s | N | %-*s | %-*s' % (5, position, max_sentence_length, sentence, 5, ' ', max_reformulation_length, reformulation)
 
 if __name__ == '__main__':
-    import argparse
-
-    # Parse the command line arguments
-    parser = argparse.ArgumentParser(description='Dump a steganographic database')
-    parser.add_argument('database',
-                        type=str,
-                        help='path to the database file')
-    parser.add_argument('output',
-                        type=str,
-                        help='path to the output file')
-
-    args = parser.parse_args()
-    database_path: str = args.database
-    output_path: str = args.output
-    db = SteganoDb(db_path=database_path, init=False)
-    print('Generating dump into "{}"'.format(output_path))
-    db.dump(output_path)
+    # Same as "whisper dump" (see whisper.cli): the database may also be the debug archive
+    from whisper.cli import main
+    sys.exit(main(['dump'] + sys.argv[1:]))
@@ -2,6 +2,12 @@ from typing import Tuple, Optional, cast
 from typing import Generator
 import re
 
+# The number of characters read from the file at once
+READ_CHUNK_SIZE: int = 1 << 16
+# The version of the segmenter (SentenceDetector) and of the words count (Sentence.split): it must be incremented
+# when a change modifies the sentences or their numbers of words, so that the haystack indexes are rebuilt
+SEGMENTER_VERSION: int = 1
+
 class SentenceDetector:
 
     def __init__(self) -> None:
@@ -60,16 +66,17 @@ def extract_sentences_from_string(text: str) -> list[str]:
         sentences.append(s)
     return sentences
 
-def read_sentences_from_file(path: str) -> Generator[str, None, None]:
+def read_sentences_from_file(path: str, chunk_size: int = READ_CHUNK_SIZE) -> Generator[str, None, None]:
     detector = SentenceDetector()
     with open(path, 'r') as f:
         while True:
-            character: str = f.read(1)
-            if character == '': # the end of the file as been reached
+            chunk: str = f.read(chunk_size)
+            if chunk == '': # the end of the file as been reached
                 found, sentence = detector.detect(character=None, last=True)
                 if found:
                     yield cast(str, sentence)
                 return
-            found, sentence = detector.detect(character=character)
-            if found:
-                yield cast(str, sentence)
+            for character in chunk:
+                found, sentence = detector.detect(character=character)
+                if found:
+                    yield cast(str, sentence)
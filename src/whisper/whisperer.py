@@ -1,56 +1,50 @@
+import dataclasses
+import itertools
 import json
 import re
+import signal
+import threading
+import time
 
-from typing import Optional, cast, Tuple, Union
+from typing import Optional, cast, Union
 from pathlib import Path
-from dataclasses import dataclass
 
+from .configuration import HiderConfiguration
+from .cascade import ModelCascade
+from .hedging import HedgedClient, with_hedging
 from .conversion import Conversion
+from .durability import resolve_durability
+from .haystack_index import HaystackIndex, open_index
 from .types import Vector
 from .message import Message
-from .prompt_builder import PromptBuilder
+from .prompts import PROMPTS_PER_REQUEST, KEEP, REWRITE, decide_sentence, hide_prompt, normalize_reformulation, build_request_messages
 from .stegano_db import SteganoDb, SentenceData
 from .llm import calculate_tokens
 from .disk_list import DiskList
 from .request_data import RequestData
 from .chat_gpt import ChatGPT
-from .sentence import Sentence
+from .dispatcher import LLMClient
+from .batch import BatchJob
+from .response_parser import parse_response, ParsedResponse, RESPONSE_FORMAT
+from .local_rewriter import LocalRewriter
+from .job import HideJob, HideInterrupted, STAGE_LOADED, STAGE_PROMPTS, STAGE_REQUESTS, STAGE_DONE
 from .text_file_tool import read_sentences_from_file
-from whisper import Bit, Int64
+# Not used here: Revealer is re-exported for the code that imports it from this module
+from .revealer import Revealer
+from .profiler import Profiler, DISABLED
+from .debug_writer import DebugWriter
+from .ecc import ErrorCorrection
 
-
-PROMPTS_PER_REQUEST: int = 50
-PROMPT_HIDE_SYSTEM = "Tu es un assistant expert en stéganographie textuelle."
-PROMPT_HIDE_ASSISTANT = "Le style doit rester naturel, discret et humain. Un mot est toute séquence de lettres, de chiffres, d'apostrophes ou de traits d'union, séparée par un espace."
-PROMPT_HIDE_USER = 'Reformule, en anglais, la phrase suivante pour générer une phrase contenant un nombre **{PARITY}** de mots : "{SENTENCE}"'
-PROMPT_HIDE_LAST_USER = """Réponds STRICTEMENT en JSON valide.  
-Utilise ce format exact et rien d'autre :
-
-{
-  "results": ["...", "...", "..."]
-}
-
-Le tableau "results" doit contenir N éléments, dans le même ordre que les messages ayant la structure : "Reformule … : <texte>".
-
-Aucun texte en-dehors du JSON.  
-Pas de commentaire.  
-Pas de préface.  
-Pas d’explication.
-"""
-
-
-@dataclass
-class HiderConfiguration:
-    model: str
-    token: str
-    debug_path: Optional[Path] = None
-    verbose: bool = False
-    dry_run: bool = False
+# The size of the buffer used to write the murmur
+MURMUR_BUFFER_SIZE: int = 1 << 20
+# The number of sentences recorded at once into the debug archive
+DEBUG_ROWS_PER_RECORD: int = 1000
 
 
 class Hider:
 
-    def __init__(self, needle: str, haystack: str, murmur: str, config: HiderConfiguration) -> None:
+    def __init__(self, needle: str, haystack: str, murmur: str, config: HiderConfiguration, client: Optional[LLMClient] = None,
+                 cascade_clients: Optional[list[LLMClient]] = None) -> None:
         """
         Hide a text file (called the "needle") into another text file (called the "haystack").
         The resulting text file is called the "murmur".
@@ -61,32 +55,121 @@ class Hider:
         :param config: The options used to control the behavior of the hider.
                         - model: the LLM model to use.
                         - token: the token used to authenticate the request to the LLM.
-                        - debug_path: the path to the directory where debug files will be written.
+                        - debug_path: the path to the directory where the debug archive will be written.
                         - verbose: activate verbose mode.
-                        - dry_run: if True, the hider will not call the LLM, but will instead generate debug files.
+                        - dry_run: if True, the hider will not call the LLM, but will instead record the requests into the debug archive.
+                        - batch_mode: if True, the requests are sent through the provider's batch endpoint.
+                        - batch_state_path: the path to the file used to store the state of the batch job
+                          (default: the path to the murmur followed by ".batch.json").
+                        - batch_poll_interval: the number of seconds to wait between two polls of the batch.
+                        - structured_output: if True, the format of the responses is enforced by a JSON schema
+                          (for the providers that support structured outputs).
+                        - local_rewrite: if True, the sentences are first rewritten with deterministic rules,
+                          and only the sentences that cannot be rewritten are sent to the LLM.
+                        - rewrite_rules_path: the path to the file that contains the rewrite rules
+                          (default: the rules shipped with the package).
+                        - job_path: the path to the directory used to store the durable state of the job.
+                          If the directory contains a job, the job is resumed.
+                        - streaming: if True, the hide is performed by the streaming pipeline (see StreamingHider).
+                        - concurrency: the number of requests sent to the LLM simultaneously (streaming pipeline).
+                        - profile: if True, the stages, the SQLite statements and the LLM calls are measured (see `profiler`).
+                        - ecc: the number of ECC bytes per block added to the needle (see ErrorCorrection). If not 0,
+                          the hider stops calling the LLM as soon as the remaining wrong sentences can be corrected.
+                        - bits_per_sentence: the number of bits hidden into each sentence (k): the number of words of
+                          the sentence modulo 2^k. For k > 1, the LLM is asked for an exact number of words.
+                        - durability: the durability profile of the databases (see durability). Default: "durable" for
+                          a resumable job, "ephemeral" otherwise.
+                        - model_cascade: if not None, the models used instead of `model`, from the cheapest to the
+                          strongest (see ModelCascade).
+                        - escalate_after: the number of failed attempts of a sentence before it is sent to the next
+                          model of the cascade.
+                        - hedge_percentile: if not None, a request that has not completed after this percentile of
+                          the recent latencies is duplicated (see HedgedClient), to the client built from hedge_model,
+                          hedge_token and hedge_base_url (default: the same model and token).
+                        - max_hedge_ratio: the maximum number of duplicated requests, as a fraction of the requests.
+                        - haystack_index: if True, the sentences of the haystack are read from its index (see
+                          HaystackIndex), built on first use next to the haystack or in index_dir.
+        :param client: The client used to call the LLM (default: a ChatGPT client).
+        :param cascade_clients: The clients of the models of the cascade (default: a ChatGPT client per model).
         """
         self.needle: str = needle
         self.haystack: str = haystack
         self.murmur: str = murmur
+        self.job: Optional[HideJob] = HideJob(config.job_path) if config.job_path is not None else None
+        if self.job is not None:
+            config = Hider.job_configuration(self.job, config)
         self.options: HiderConfiguration = config
         self.current_line: int = 0
+        self.interrupted: bool = False
+        self.profiler: Profiler = Profiler() if config.profile else DISABLED
         # Initialize the paths to the databases
-        if config.debug_path is not None:
+        if config.job_path is not None:
+            config.job_path.mkdir(parents=True, exist_ok=True)
+            stegano_db_path: Optional[Path] = config.job_path.joinpath('stegano-db.sqlite')
+            requests_db_path: Optional[Path] = config.job_path.joinpath('requests-db.sqlite')
+            if not self.job.reached(STAGE_LOADED):
+                # The haystack has not been (completely) loaded by a previous run
+                for path in (stegano_db_path, requests_db_path):
+                    # The write-ahead log of a durable database is removed with it
+                    for file_path in (path, Path(str(path) + '-wal'), Path(str(path) + '-shm')):
+                        if file_path.exists():
+                            file_path.unlink()
+        elif config.debug_path is not None:
             stegano_db_path = config.debug_path.joinpath('stegano-db.sqlite')
             requests_db_path = config.debug_path.joinpath('requests-db.sqlite')
         else:
             stegano_db_path = None
             requests_db_path = None
+        # Load the message to hide (the needle) as a series of bits
+        self.message_bits: Vector = Message.load_text_file_as_vector(needle, config.ecc)
+        # Each sentence hides a symbol of k bits: the number of words modulo 2^k
+        self.bits_per_sentence: int = config.bits_per_sentence
+        self.modulus: int = 1 << config.bits_per_sentence
+        self.message_symbols: list[int] = Conversion.bit_list_to_symbols(self.message_bits, config.bits_per_sentence)
+        self.error_correction: Optional[ErrorCorrection] = ErrorCorrection(config.ecc) if config.ecc > 0 else None
+        self.accepted_errors: int = 0
         # Create the database used to store the requests to the LLM
-        self.requests_db: DiskList = DiskList(requests_db_path.__str__())
+        self.durability: str = resolve_durability(config.durability, self.job is not None)
+        self.requests_db: DiskList = DiskList(str(requests_db_path) if requests_db_path is not None else None, self.durability)
+        self.profiler.trace_sqlite(self.requests_db.db, 'requests_db')
         # Load the text used to hide the needle (the haystack) as a series of lines
-        self.stegano_db: SteganoDb = SteganoDb(stegano_db_path.__str__())
-        self.line_count = self.stegano_db.load_file(haystack)
-        # Load the message to hide (the needle) as a series of bits
-        self.message_bits: Vector = Message.load_text_file_as_vector(needle)
-        self.chat_gpt_client = ChatGPT(config.model, config.token)
-        self.call_count: int = 0
-        self.create_requests_count: int = 0
+        self.stegano_db: SteganoDb = SteganoDb(str(stegano_db_path) if stegano_db_path is not None else None, durability=self.durability)
+        self.profiler.trace_sqlite(self.stegano_db.db, 'stegano_db')
+        with self.profiler.stage('open_index'):
+            self.index: Optional[HaystackIndex] = open_index(haystack, config)
+        if self.job is not None and self.job.reached(STAGE_LOADED):
+            self.line_count = len(self.stegano_db)
+        else:
+            # Only the sentences used to hide the needle are loaded: the others are copied into the murmur
+            with self.profiler.stage('load_haystack'):
+                if self.index is not None:
+                    self.line_count = self.stegano_db.load_index(self.index, len(self.message_symbols))
+                else:
+                    self.line_count = self.stegano_db.load_file(haystack, len(self.message_symbols))
+            if self.job is not None:
+                self.job.needle = needle
+                self.job.haystack = haystack
+                self.job.murmur = murmur
+                self.job.model = config.model
+                self.job.bits_per_sentence = config.bits_per_sentence
+                self.job.ecc = config.ecc
+                self.job.set_stage(STAGE_LOADED)
+        self.cascade: Optional[ModelCascade] = None
+        if config.model_cascade is not None:
+            if config.batch_mode:
+                raise ValueError("The model cascade cannot be used with the batch mode!")
+            self.cascade = ModelCascade.create(config.model_cascade, config.token, config.escalate_after, cascade_clients)
+            self.chat_gpt_client = self.cascade.tiers[0].client
+        else:
+            self.chat_gpt_client = with_hedging(client if client is not None else ChatGPT(config.model, config.token), config)
+        # The sentences sent to the cascade since the last check (position -> tier)
+        self.sent: dict[int, int] = {}
+        self.response_format: Optional[dict] = RESPONSE_FORMAT if config.structured_output else None
+        self.call_count: int = self.job.call_count if self.job is not None else 0
+        self.debug_writer: DebugWriter = DebugWriter(config.debug_path, self.profiler)
+        self.local_rewriter: Optional[LocalRewriter] = LocalRewriter.load(config.rewrite_rules_path) if config.local_rewrite else None
+        self.local_rewrite_count: int = 0
+        self.local_rewrite_tokens_saved: int = 0
 
         if config.verbose:
             print("Hiding text file '{}' into '{}'".format(self.needle, self.haystack))
@@ -96,14 +179,66 @@ class Hider:
             print('- model:                       {}'.format(config.model))
             print('- debug path:                  {}'.format(config.debug_path if config.debug_path is not None else ''))
             print('- dry run:                     {}'.format(config.dry_run))
+            print('- batch mode:                  {}'.format(config.batch_mode))
+            print('- local rewrite:               {}'.format(config.local_rewrite))
+            print('- ECC bytes per block:         {}'.format(config.ecc))
+            print('- bits per sentence:           {}'.format(config.bits_per_sentence))
+            print('- model cascade:               {}'.format(', '.join(config.model_cascade) if config.model_cascade is not None else ''))
+            print('- job:                         {}'.format(config.job_path if config.job_path is not None else ''))
+            print('- haystack index:              {}'.format(self.index.path if self.index is not None else ''))
+            if self.job is not None and self.job.reached(STAGE_PROMPTS):
+                print('- resumed at stage:            {}'.format(self.job.stage))
             print('- needle bits count:           {}'.format(len(self.message_bits)))
-            print('- haystack lines count:        {}\n'.format(self.line_count))
-        if len(self.message_bits) > self.line_count:
-            raise ValueError("The haystack is not wide enough to conceal the needle! It should contain at least {} sentences!".format(len(self.message_bits)))
+            print('- haystack lines loaded:       {}\n'.format(self.line_count))
+        if len(self.message_symbols) > self.line_count:
+            raise ValueError("The haystack is not wide enough to conceal the needle! It should contain at least {} sentences!".format(len(self.message_symbols)))
+
+    @staticmethod
+    def job_configuration(job: HideJob, config: HiderConfiguration) -> HiderConfiguration:
+        """
+        Return the configuration used to resume a job: the needle must be encoded as it was when the job was created,
+        so the number of bits per sentence and the ECC of the job are restored (when they are left to their defaults).
+
+        :raise ValueError: If the configuration asks for another number of bits per sentence or another ECC.
+        """
+        if not job.reached(STAGE_LOADED):
+            return config
+        defaults: HiderConfiguration = HiderConfiguration(config.model, config.token)
+        for name in ('bits_per_sentence', 'ecc'):
+            saved: Optional[int] = getattr(job, name)
+            value: int = getattr(config, name)
+            if saved is None or saved == value:
+                continue
+            if value != getattr(defaults, name):
+                raise ValueError('The job "{}" has been created with {}={}, it cannot be resumed with {}={}'.format(job.path, name, saved, name, value))
+            config = dataclasses.replace(config, **{name: saved})
+        return config
+
+    @staticmethod
+    def resume(config: HiderConfiguration, client: Optional[LLMClient] = None) -> 'Hider':
+        """Resume the job stored in the directory `config.job_path`."""
+        job: HideJob = HideJob(cast(Path, config.job_path))
+        if not job.reached(STAGE_LOADED):
+            raise ValueError('No job to resume in "{}"'.format(config.job_path))
+        return Hider(cast(str, job.needle), cast(str, job.haystack), cast(str, job.murmur), config, client)
 
     def destroy(self):
         self.stegano_db.destroy()
         self.requests_db.destroy()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+    def on_interrupt(self, signum, frame) -> None:
+        """Handle SIGINT: the current request is completed and the state of the job is saved."""
+        if self.interrupted:
+            raise KeyboardInterrupt()
+        self.interrupted = True
+        print('Interrupted: the job will stop after the current request (press CTRL-C again to abort).', flush=True)
+
+    def check_interrupted(self) -> None:
+        if self.interrupted:
+            raise HideInterrupted('The job has been interrupted')
 
     @staticmethod
     def keep_phrase(response: str) -> str:
@@ -113,73 +248,78 @@ class Hider:
         else:
             return response.strip()
 
-    def dump_stegano_db_pre_process_to_file(self) -> None:
-        """Dump the stegano database before the LLM is called for debugging purposes."""
-        if self.options.debug_path is None:
+    def archive_sentences(self) -> None:
+        """Record the state of the stegano database before the LLM is called into the debug archive."""
+        if not self.debug_writer.enabled():
             return
-        debug_path = self.options.debug_path.joinpath('haystack-pre-processing.txt')
-        self.stegano_db.dump(str(debug_path))
-
-    def dump_stegano_db_post_process_to_file(self) -> None:
-        """Dump the stegano database after the LLM has been called for debugging purposes."""
-        if self.options.debug_path is None:
+        rows: list[tuple[int, str, Optional[str], Optional[str]]] = []
+        for sentence_data in self.stegano_db.iter_sentences():
+            rows.append((sentence_data.position, sentence_data.sentence.string, sentence_data.prompt, sentence_data.reformulation))
+            if len(rows) == DEBUG_ROWS_PER_RECORD:
+                self.debug_writer.submit(lambda archive, batch=rows: archive.add_sentences(batch))
+                rows = []
+        if len(rows) > 0:
+            self.debug_writer.submit(lambda archive, batch=rows: archive.add_sentences(batch))
+
+    def archive_changes(self, reformulations: dict[int, str], request_index: int) -> None:
+        """Record the reformulations extracted from a response into the debug archive."""
+        if not self.debug_writer.enabled():
             return
-        debug_path = self.options.debug_path.joinpath('haystack-post-processing-{}.txt'.format(self.call_count))
-        self.stegano_db.dump(str(debug_path))
+        call_count: int = self.call_count
+        self.debug_writer.submit(lambda archive: archive.add_changes(call_count, request_index, reformulations))
 
     def create_prompts(self) -> None:
         """
         Create the prompts to call the LLM.
         """
-        prompter: PromptBuilder = PromptBuilder(PROMPT_HIDE_USER)
-
         position = 0
+        to_reformulate_count: int = 0
         # Process the lines that are used to hide the needle
-        for bit in self.message_bits:
+        for bit in self.message_symbols:
             # Extract the next line from the message and convert it into a Sentence object
             sentence_data: SentenceData = self.stegano_db.get_sentence_by_position(position)
-            words: list[str] = sentence_data.sentence.get_words()
-            # Hide the current bit of the message into the current line
-            if len(words) % 2 == bit:
-                self.stegano_db.set_reformulation_by_position(sentence_data.position, str(sentence_data.sentence))
+            # Hide the current bit (or symbol) of the message into the current line (the number of words is stored in the database)
+            words: int = cast(int, sentence_data.sentence_words)
+            decision, text = decide_sentence(str(sentence_data.sentence), words, bit, self.modulus, self.local_rewriter)
+            if decision == KEEP:
+                self.stegano_db.set_reformulation_by_position(sentence_data.position, text, bit)
+            elif decision == REWRITE:
+                # The parity has been modified locally: no need to call the LLM
+                self.stegano_db.set_reformulation_by_position(sentence_data.position, text, bit)
+                self.local_rewrite_count += 1
+                # The tokens saved are only reported in verbose mode: the tokenizer is slow to load (and optional)
+                if self.options.verbose:
+                    prompt: str = hide_prompt(str(sentence_data.sentence), words, bit, self.modulus)
+                    self.local_rewrite_tokens_saved += calculate_tokens(json.dumps([{'role': 'user', 'content': prompt}, {'role': 'assistant', 'content': text}]))
             else:
-                prompt: str = prompter.generate_prompt({'PARITY': "pair" if bit == 0 else "impair", 'SENTENCE': str(sentence_data.sentence)})
-                self.stegano_db.set_prompt_by_position(sentence_data.position, prompt)
+                self.stegano_db.set_prompt_by_position(sentence_data.position, text, bit)
+                to_reformulate_count += 1
             position += 1
 
-        # Process the extra lines of that haystack
-        for p in range(position, len(self.stegano_db)):
-            sentence_data: SentenceData = self.stegano_db.get_sentence_by_position(p)
-            self.stegano_db.set_reformulation_by_position(p, str(sentence_data.sentence))
-        self.dump_stegano_db_pre_process_to_file()
-
-    def dump_requests_to_file(self) -> None:
-        """Dump all requests to disk for debugging purposes."""
-        if self.options.debug_path is None:
+        self.archive_sentences()
+        if self.options.verbose and self.local_rewriter is not None:
+            modified_count: int = self.local_rewrite_count + to_reformulate_count
+            print("Local rewrites:")
+            print('- Sentences to modify:            {}'.format(modified_count))
+            print('- Sentences rewritten locally:    {} ({:.1f}%)'.format(self.local_rewrite_count, 100.0 * self.local_rewrite_count / modified_count if modified_count > 0 else 0.0))
+            print('- Tokens saved (estimation):      {}\n'.format(self.local_rewrite_tokens_saved))
+
+    def archive_request(self, request_data: RequestData, request_index: int) -> None:
+        """Record a request into the debug archive."""
+        if not self.debug_writer.enabled():
             return
-        for i in range(len(self.requests_db)):
-            debug_path = self.options.debug_path.joinpath('request-{}.txt'.format(self.create_requests_count))
-            self.create_requests_count += 1
-            request_data: RequestData = RequestData.from_json(self.requests_db[i])
-            r: str = request_data.messages_to_json()
-            with open(debug_path, "w") as fd_debug:
-                tokens_count: int = calculate_tokens(r)
-                fd_debug.write("tokens count: {}\n".format(tokens_count))
-                fd_debug.write("positions:    {}\n".format(json.dumps(request_data.positions)))
-                fd_debug.write("request:\n\n{}\n".format(r))
+        call_count: int = self.call_count
+        self.debug_writer.submit(lambda archive: archive.add_request(call_count, request_index, cast(list[int], request_data.positions), request_data.messages_to_json()))
+
+    def append_request(self, request_data: RequestData) -> None:
+        self.requests_db.append(request_data.to_json())
+        self.archive_request(request_data, len(self.requests_db) - 1)
 
     @staticmethod
     def create_requests_batch(sentences_data: list[SentenceData]) -> RequestData:
         """Create a request for the LLM containing the specified number of lines starting at the specified offset."""
-        positions: list[int] = []
-        messages: list[dict[str, str]] = [
-            {"role": "system", "content": PROMPT_HIDE_SYSTEM},
-            {"role": "assistant", "content": PROMPT_HIDE_ASSISTANT}
-        ]
-        for sentence_data in sentences_data:
-            positions.append(sentence_data.position)
-            messages.append({"role": "user", "content": cast(str, sentence_data.prompt)})
-        messages.append({"role": "user", "content": PROMPT_HIDE_LAST_USER})
+        positions: list[int] = [sentence_data.position for sentence_data in sentences_data]
+        messages: list[dict[str, str]] = build_request_messages([(sentence_data.position, cast(str, sentence_data.prompt)) for sentence_data in sentences_data])
         data: dict[str, Union[list[int], list[dict[str, str]]]] = {
             'positions': positions,
             'messages': messages
@@ -202,137 +342,264 @@ class Hider:
         # Create the requests
         for b in range(full_batch_count):
             sentences_data: list[SentenceData] = self.stegano_db.get_batch_of_sentences_to_reformulate(PROMPTS_PER_REQUEST, b * PROMPTS_PER_REQUEST)
-            self.requests_db.append(Hider.create_requests_batch(sentences_data).to_json())
+            self.append_request(Hider.create_requests_batch(sentences_data))
         sentences_data: list[SentenceData] = self.stegano_db.get_batch_of_sentences_to_reformulate(batch_reminder, full_batch_count * PROMPTS_PER_REQUEST)
-        self.requests_db.append(Hider.create_requests_batch(sentences_data).to_json())
-        self.dump_requests_to_file()
+        self.append_request(Hider.create_requests_batch(sentences_data))
 
-    def dump_llm_response_to_file(self, response: str, request_index: int) -> None:
-        """Dump the LLM response to disk for debugging purposes."""
-        if self.options.debug_path is None:
+    def archive_response(self, response: str, request_index: int) -> None:
+        """Record the LLM response into the debug archive."""
+        if not self.debug_writer.enabled():
             return
-        debug_path = self.options.debug_path.joinpath('llm-response-call:{}-req:{}.txt'.format(self.call_count, request_index))
-        with open(debug_path, "w") as fd_debug:
-            fd_debug.write(response)
+        call_count: int = self.call_count
+        self.debug_writer.submit(lambda archive: archive.add_response(call_count, request_index, response))
+
+    def ingest_response(self, response: str, positions: list[int], request_index: int) -> list[int]:
+        """
+        Extract the reformulated sentences from the LLM response and store them into the database.
+        The sentences missing from the response are left untouched: they will be sent again.
+        Return the positions of the stored reformulations.
+        """
+        parsed: ParsedResponse = parse_response(response, positions)
+        if len(parsed.missing) > 0:
+            print("WARNING: {}/{} reformulations missing from the response [call:{}, req:{}]: {}".format(len(parsed.missing), len(positions), self.call_count, request_index, parsed.missing))
+        elif parsed.repaired and self.options.verbose:
+            print("The response has been repaired [call:{}, req:{}]".format(self.call_count, request_index))
+        reformulations: dict[int, str] = {}
+        for p, s in parsed.matched.items():
+            # The reformulations are validated by the database (see check_responses)
+            s = normalize_reformulation(s)
+            self.stegano_db.set_reformulation_by_position(p, s)
+            reformulations[p] = s
+        self.archive_changes(reformulations, request_index)
+        return list(reformulations.keys())
 
     def call_llm(self) -> None:
         """Call the LLM for each request and extract the reformulated sentences from the response."""
         for i in range(len(self.requests_db)):
+            if self.job is not None and i in self.job.done_requests:
+                continue
+            self.check_interrupted()
             # Call the LLM and get the response
-            request: dict[str, Union[list[int], list[dict[str, str]]]] = RequestData.from_json(self.requests_db[i]).to_dict()
+            request: dict[str, Union[list[int], list[dict[str, str]]]] = RequestData.dict_from_json(self.requests_db[i])
             messages: list[dict[str, str]] = cast(list[dict[str, str]], request['messages'])
+            positions: list[int] = cast(list[int], request['positions'])
+            # The sentences of a request are all on the same tier of the cascade (see append_retry_requests)
+            tier: int = self.cascade.tier_of(positions[0]) if self.cascade is not None and len(positions) > 0 else 0
+            client: LLMClient = self.cascade.tiers[tier].client if self.cascade is not None else self.chat_gpt_client
+            start: float = time.perf_counter()
             try:
-                response: str = self.chat_gpt_client.call(messages)
+                with self.profiler.stage('llm_call'):
+                    response: str = client.call(messages, self.response_format)
             except Exception as e:
                 raise RuntimeError("Error calling the LLM: {}".format(str(e)))
-            self.dump_llm_response_to_file(response, i)
+            seconds: float = time.perf_counter() - start
+            self.profiler.latency('llm_call', seconds)
+            self.profiler.count('llm.requests')
+            if self.cascade is not None:
+                model: str = self.cascade.tiers[tier].model
+                self.profiler.latency('llm_call.{}'.format(model), seconds)
+                self.profiler.count('cascade.{}.sentences'.format(model), len(positions))
+                self.cascade.record_call(tier, positions, seconds)
+                self.sent.update((p, tier) for p in positions)
+            self.archive_response(response, i)
 
             # Extract the reformulated sentences from the LLM response
-            positions: list[int] = cast(list[int], request['positions'])
-            sentences: list[str] = json.loads(response)['results']
-
-            # sentences: list[str] = json.loads(response)['results']
-            if len(sentences) != len(positions):
-                raise ValueError("Invalid response from the LLM: expected {} sentences, got {} [call:{}, req:{}]\n\n{}\n\n".format(len(positions), len(sentences), self.call_count, i, response))
-            for p, s in zip(positions, sentences):
-                s = s if s.endswith(".") else s + "."
-                self.stegano_db.set_reformulation_by_position(p, s)
-        self.dump_stegano_db_post_process_to_file()
+            self.ingest_response(response, positions, i)
+            if self.job is not None:
+                self.job.request_done(i)
+        self.next_call()
+
+    def next_call(self) -> None:
         self.call_count += 1
+        if self.job is not None:
+            # The databases are checkpointed before the state of the job is saved
+            self.stegano_db.checkpoint()
+            self.requests_db.checkpoint()
+            self.job.call_count = self.call_count
+            self.job.save()
+
+    def batch_state_path(self) -> Path:
+        if self.options.batch_state_path is not None:
+            return self.options.batch_state_path
+        if self.options.job_path is not None:
+            return self.options.job_path.joinpath('batch.json')
+        return Path(self.murmur + '.batch.json')
+
+    def call_llm_batch(self, job: BatchJob) -> None:
+        """Send the requests through the batch endpoint, wait for the results and store them into the database."""
+        if not job.pending():
+            job.submit(self.requests_db)
+        i: int = 0
+        for positions, response in job.wait():
+            self.archive_response(response, i)
+            for p in self.ingest_response(response, positions, i):
+                job.complete(p, cast(str, self.stegano_db.get_sentence_by_position(p).reformulation))
+            i += 1
+        job.save()
+        self.next_call()
+
+    def hide_batch(self) -> None:
+        """Send the requests to the LLM through the batch endpoint, until all sentences are valid."""
+        job: BatchJob = BatchJob(self.chat_gpt_client, self.batch_state_path(), self.options.batch_poll_interval, self.options.verbose, self.response_format)
+        # Restore the reformulations ingested by a previous run
+        for p, s in job.completed.items():
+            self.stegano_db.set_reformulation_by_position(p, s)
+        if len(job.completed) > 0 and not job.pending():
+            self.replace_requests(self.accept_errors(self.check_responses()))
+        while len(self.requests_db) > 0:
+            self.check_interrupted()
+            self.call_llm_batch(job)
+            errors: list[SentenceData] = self.accept_errors(self.check_responses())
+            if len(errors) > 0:
+                print('LLM made {} errors, retrying...'.format(len(errors)), flush=True)
+                self.profiler.count('retries', len(errors))
+            self.replace_requests(errors)
+        job.clear()
+
+    def replace_requests(self, errors: list[SentenceData]) -> None:
+        """Replace the requests by the requests needed to reformulate the given sentences again."""
+        if self.job is not None:
+            self.job.new_requests()
+        self.requests_db.reset()
+        self.append_retry_requests(errors)
+
+    def append_retry_requests(self, errors: list[SentenceData]) -> None:
+        if self.cascade is not None:
+            # Each request is sent to one model: the sentences are grouped by tier
+            cascade: ModelCascade = self.cascade
+            errors = sorted(errors, key=lambda e: cascade.tier_of(e.position))
+            for _, group in itertools.groupby(errors, key=lambda e: cascade.tier_of(e.position)):
+                tier_errors: list[SentenceData] = list(group)
+                for offset in range(0, len(tier_errors), PROMPTS_PER_REQUEST):
+                    self.append_request(Hider.create_requests_batch(tier_errors[offset:offset + PROMPTS_PER_REQUEST]))
+            return
+        for offset in range(0, len(errors), PROMPTS_PER_REQUEST):
+            self.append_request(Hider.create_requests_batch(errors[offset:offset + PROMPTS_PER_REQUEST]))
 
     def check_responses(self) -> list[SentenceData]:
-        to_replay: list[SentenceData] = []
-
-        # Build the list of sentences that need to be reformulated again
-        for i in range(len(self.stegano_db)):
-            sentence_data: SentenceData = self.stegano_db.get_sentence_by_position(i)
-            if sentence_data.prompt is None:
-                continue
-            original_sentence = Sentence(sentence_data.sentence.string)
-            reformulated_sentence = Sentence(cast(str, sentence_data.reformulation))
-            if (len(original_sentence.get_words()) % 2) == (len(reformulated_sentence.get_words()) % 2):
-                print("WARNING: parity for #{} has not been modified! {} [{}/{}]".format(i, original_sentence.string, len(original_sentence.get_words()), len(reformulated_sentence.get_words())))
-                to_replay.append(sentence_data)
+        """Return the list of sentences that need to be reformulated again (the validation is performed by the database)."""
+        to_replay: list[SentenceData] = self.stegano_db.get_invalid_sentences(self.modulus)
+        for sentence_data in to_replay:
+            if sentence_data.reformulation is None:
+                print("WARNING: missing reformulation for sentence #{}".format(sentence_data.position))
+            else:
+                print("WARNING: parity for #{} has not been modified! {} [{}/{}]".format(sentence_data.position, sentence_data.sentence.string, sentence_data.sentence_words, sentence_data.reformulation_words))
         return to_replay
 
+    def validate(self) -> list[SentenceData]:
+        """Check the responses, record the results of the cascade, and return the sentences to reformulate again."""
+        errors: list[SentenceData] = self.check_responses()
+        if self.cascade is not None:
+            failures: set[int] = {e.position for e in errors}
+            self.cascade.record_results(self.sent, failures)
+            for position, tier in self.sent.items():
+                if position not in failures:
+                    self.profiler.count('cascade.{}.successes'.format(self.cascade.tiers[tier].model))
+            self.sent = {}
+        return self.accept_errors(errors)
+
+    def accept_errors(self, errors: list[SentenceData]) -> list[SentenceData]:
+        """
+        Return the sentences that must be reformulated again: none if the wrong sentences can be corrected
+        by the revealer (see ErrorCorrection), all of them otherwise.
+        """
+        if self.error_correction is None or len(errors) == 0:
+            return errors
+        # A wrong sentence may modify all the bits it carries
+        k: int = self.bits_per_sentence
+        if not self.error_correction.correctable(i for e in errors for i in range(e.position * k, (e.position + 1) * k)):
+            return errors
+        print('{} wrong sentences left to the error correcting code: no retry needed.'.format(len(errors)), flush=True)
+        self.accepted_errors = len(errors)
+        self.profiler.count('ecc.accepted_errors', len(errors))
+        return []
+
     def write_murmur(self):
-        with open(self.murmur, "w") as fd_murmur:
-            for i in range(len(self.stegano_db)):
-                sentence_data: SentenceData = self.stegano_db.get_sentence_by_position(i)
+        with open(self.murmur, "w", buffering=MURMUR_BUFFER_SIZE) as fd_murmur:
+            # Write the sentences that hide the needle
+            for sentence_data in self.stegano_db.iter_sentences():
                 if sentence_data.reformulation is None:
-                    print("WARNING: missing reformulation for sentence #{}".format(i))
-                fd_murmur.write(cast(str, sentence_data.reformulation) + "\n")
-
+                    # The sentence is a wrong bit, corrected by the revealer (see accept_errors)
+                    if self.error_correction is None:
+                        print("WARNING: missing reformulation for sentence #{}".format(sentence_data.position))
+                    fd_murmur.write(sentence_data.sentence.string + "\n")
+                else:
+                    fd_murmur.write(sentence_data.reformulation + "\n")
+            # Copy the remaining sentences of the haystack
+            if self.index is not None:
+                for sentence, _ in self.index.iter_sentences(self.line_count):
+                    fd_murmur.write(sentence + "\n")
+            else:
+                for sentence in itertools.islice(read_sentences_from_file(self.haystack), self.line_count, None):
+                    fd_murmur.write(sentence + "\n")
+            self.profiler.count('murmur.bytes', fd_murmur.tell())
 
     def hide(self) -> None:
-
+        # Without a job directory, there is nothing to resume: CTRL-C aborts the hide (KeyboardInterrupt)
+        handle_signal: bool = self.job is not None and threading.current_thread() is threading.main_thread()
+        previous_handler = signal.signal(signal.SIGINT, self.on_interrupt) if handle_signal else None
+        try:
+            self.run()
+        finally:
+            if handle_signal:
+                signal.signal(signal.SIGINT, previous_handler)
+            with self.profiler.stage('debug_flush'):
+                self.debug_writer.close()
+            if self.cascade is not None:
+                tokens_in, tokens_out = self.cascade.tokens()
+                self.profiler.count('llm.tokens_in', tokens_in)
+                self.profiler.count('llm.tokens_out', tokens_out)
+            else:
+                self.profiler.count('llm.tokens_in', getattr(self.chat_gpt_client, 'prompt_tokens', 0))
+                self.profiler.count('llm.tokens_out', getattr(self.chat_gpt_client, 'completion_tokens', 0))
+            if isinstance(self.chat_gpt_client, HedgedClient):
+                for name, value in self.chat_gpt_client.stats.to_dict().items():
+                    self.profiler.count('hedge.{}'.format(name), value)
+                self.chat_gpt_client.close()
+
+    def run(self) -> None:
         # Generate the prompts to call the LLM
-        self.create_prompts()
+        if self.job is None or not self.job.reached(STAGE_PROMPTS):
+            with self.profiler.stage('create_prompts'):
+                self.create_prompts()
+            if self.job is not None:
+                self.job.set_stage(STAGE_PROMPTS)
 
         # Generate the requests to call the LLM
-        self.create_requests()
+        if self.job is None or not self.job.reached(STAGE_REQUESTS):
+            self.requests_db.reset()
+            with self.profiler.stage('create_requests'):
+                self.create_requests()
+            if self.job is not None:
+                self.job.new_requests()
+                self.job.set_stage(STAGE_REQUESTS)
         if self.options.dry_run:
             return
-
-        # Send requests to the LLM
-        self.call_llm()
-        errors: list[SentenceData] = self.check_responses()
-        if len(errors) > 0:
-            while True:
-                print('LLM made {} errors, retrying...'.format(len(errors)), flush=True)
-                request_data: RequestData = Hider.create_requests_batch(errors)
-                self.requests_db.reset()
-                self.requests_db.append(request_data.to_json())
-                self.dump_requests_to_file()
+        if self.options.batch_mode:
+            self.hide_batch()
+        else:
+            # Send requests to the LLM
+            with self.profiler.stage('call_llm'):
                 self.call_llm()
-                errors: list[SentenceData] = self.check_responses()
-                self.dump_stegano_db_post_process_to_file()
-                if len(errors) == 0:
-                    break
+            with self.profiler.stage('check_responses'):
+                errors: list[SentenceData] = self.validate()
+            while len(errors) > 0:
+                print('LLM made {} errors, retrying...'.format(len(errors)), flush=True)
+                self.profiler.count('retries', len(errors))
+                self.replace_requests(errors)
+                with self.profiler.stage('call_llm'):
+                    self.call_llm()
+                with self.profiler.stage('check_responses'):
+                    errors = self.validate()
+            if self.cascade is not None:
+                for line in self.cascade.lines():
+                    print(line)
+            if isinstance(self.chat_gpt_client, HedgedClient):
+                for line in self.chat_gpt_client.lines():
+                    print(line)
 
         # Generate the final murmur
-        self.write_murmur()
-
-class Revealer:
-
-    def __init__(self, murmur: str, reveal_path: str, verbose: bool = False) -> None:
-        self.murmur: str = murmur
-        self.reveal_path: str = reveal_path
-        self.verbose: bool = verbose
-
-    @staticmethod
-    def load_text_file_as_sentences(path: str) -> DiskList:
-        sentences: DiskList = DiskList()
-        for sentence in read_sentences_from_file(path):
-            sentences.append(sentence)
-        return sentences
-
-    def reveal(self) -> None:
-        # Load the murmur into a series of lines
-        murmur_db: DiskList = Revealer.load_text_file_as_sentences(self.murmur)
-
-        try:
-            # Create a vector of bits.
-            bits: list[Bit] = []
-            for line in murmur_db:
-                sentence: Sentence = Sentence(line)
-                parity: int = 0 if len(sentence.get_words()) % 2 == 0 else 1
-                bits.append(cast(Bit, parity))
-
-            # Make sure that the number of bits is greater than 64.
-            if len(bits) < 64:
-                raise ValueError("The murmur must contain at least 64 sentences!")
-            length_vector: list[Bit] = bits[:64]
-            length: Int64 = Conversion.bit_list_to_int64(length_vector)
-            body_vector: list[Bit] = bits[64:64+length*8]
-            body = Conversion.bit_list_to_bytes(body_vector)
-            if self.verbose:
-                print("Data: {}".format(bits))
-                print("length vector: {}".format(length_vector))
-                print("length: {} (characters) => {} bits".format(length, length*8))
-                print("body: {}".format(body_vector))
-                print('Message: "{}"'.format(self.reveal_path))
-            with open(self.reveal_path, 'w') as f:
-                f.write(str(body, 'ascii'))
-        finally:
-            murmur_db.destroy()
+        with self.profiler.stage('write_murmur'):
+            self.write_murmur()
+        if self.job is not None:
+            self.job.set_stage(STAGE_DONE)
@@ -0,0 +1,133 @@
+# Usage:
+# python3 -m unittest -v test_batch.py
+
+from typing import Optional
+import json
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.batch import BatchJob
+from whisper.disk_list import DiskList
+from whisper.request_data import RequestData
+
+
+class FakeBatchEndpoint:
+    """A local batch endpoint: every prompt is answered by its upper-cased content."""
+
+    def __init__(self, polls_before_completion: int = 2, failed_ids: Optional[list[str]] = None) -> None:
+        self.model: str = 'fake-model'
+        self.polls_before_completion: int = polls_before_completion
+        self.failed_ids: list[str] = failed_ids if failed_ids is not None else []
+        self.files: dict[str, str] = {}
+        self.batches: dict[str, dict[str, Optional[str]]] = {}
+        self.polls: int = 0
+
+    def upload_batch_file(self, path: str) -> str:
+        file_id: str = 'file-{}'.format(len(self.files))
+        with open(path, 'r') as f:
+            self.files[file_id] = f.read()
+        return file_id
+
+    def create_batch(self, file_id: str) -> str:
+        batch_id: str = 'batch-{}'.format(len(self.batches))
+        self.batches[batch_id] = {'status': 'validating', 'input_file_id': file_id, 'output_file_id': None, 'error_file_id': None}
+        return batch_id
+
+    def get_batch(self, batch_id: str) -> dict[str, Optional[str]]:
+        batch = self.batches[batch_id]
+        self.polls += 1
+        if self.polls < self.polls_before_completion:
+            batch['status'] = 'in_progress'
+            return dict(batch)
+        output: list[str] = []
+        for line in self.files[str(batch['input_file_id'])].splitlines():
+            request = json.loads(line)
+            if request['custom_id'] in self.failed_ids:
+                output.append(json.dumps({'custom_id': request['custom_id'], 'response': None, 'error': {'code': 'server_error'}}))
+                continue
+            prompts = [m['content'] for m in request['body']['messages'] if m['role'] == 'user'][:-1]
+            content = json.dumps({'results': [p.upper() for p in prompts]})
+            body = {'choices': [{'message': {'role': 'assistant', 'content': content}}]}
+            output.append(json.dumps({'custom_id': request['custom_id'], 'response': {'status_code': 200, 'body': body}, 'error': None}))
+        output_file_id: str = 'file-{}'.format(len(self.files))
+        self.files[output_file_id] = '\n'.join(output)
+        batch['status'] = 'completed'
+        batch['output_file_id'] = output_file_id
+        return dict(batch)
+
+    def download_file(self, file_id: str) -> str:
+        return self.files[file_id]
+
+
+def create_requests_db(batches: list[list[int]]) -> DiskList:
+    requests_db: DiskList = DiskList()
+    for positions in batches:
+        messages = [{'role': 'system', 'content': 'system'}]
+        messages += [{'role': 'user', 'content': 'sentence {}'.format(p)} for p in positions]
+        messages.append({'role': 'user', 'content': 'last'})
+        requests_db.append(RequestData.from_dict({'positions': positions, 'messages': messages}).to_json())
+    return requests_db
+
+
+class TestBatchJob(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.state_path: Path = Path(tempfile.gettempdir()).joinpath('whisper-batch-test.json')
+        self.requests_db: DiskList = create_requests_db([[0, 2], [5], []])
+
+    def tearDown(self) -> None:
+        self.requests_db.destroy()
+        for path in (self.state_path, self.state_path.with_suffix('.jsonl')):
+            if path.exists():
+                path.unlink()
+
+    def test_submit_and_wait(self):
+        endpoint = FakeBatchEndpoint()
+        job = BatchJob(endpoint, self.state_path, poll_interval=0)
+        self.assertFalse(job.pending())
+        job.submit(self.requests_db)
+        self.assertTrue(job.pending())
+        # The empty request is not exported
+        self.assertEqual(len(job.requests), 2)
+        results = list(job.wait())
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0][0], [0, 2])
+        self.assertEqual(json.loads(results[0][1])['results'], ['SENTENCE 0', 'SENTENCE 2'])
+        self.assertEqual(results[1][0], [5])
+        self.assertFalse(job.pending())
+        job.clear()
+        self.assertFalse(self.state_path.exists())
+
+    def test_resume_pending_batch(self):
+        endpoint = FakeBatchEndpoint(polls_before_completion=1)
+        job = BatchJob(endpoint, self.state_path, poll_interval=0)
+        job.submit(self.requests_db)
+        job.complete(7, 'already done.')
+        job.save()
+
+        # A new process loads the state and polls the pending batch without submitting it again
+        resumed = BatchJob(endpoint, self.state_path, poll_interval=0)
+        self.assertTrue(resumed.pending())
+        self.assertEqual(resumed.completed, {7: 'already done.'})
+        results = list(resumed.wait())
+        self.assertEqual([r[0] for r in results], [[0, 2], [5]])
+        self.assertEqual(len(endpoint.batches), 1)
+
+    def test_failed_request(self):
+        endpoint = FakeBatchEndpoint(polls_before_completion=1, failed_ids=['request-0'])
+        job = BatchJob(endpoint, self.state_path, poll_interval=0)
+        job.submit(self.requests_db)
+        results = list(job.wait())
+        self.assertEqual([r[0] for r in results], [[5]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# Usage:
+# python3 -m unittest -v test_benchmarks.py
+
+import contextlib
+import filecmp
+import io
+import shutil
+import unittest
+import os
+import sys
+import tempfile
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+BENCHMARKS_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'benchmarks'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'benchmarks')
+sys.path.insert(0, SEARCH_PATH)
+sys.path.insert(0, BENCHMARKS_PATH)
+
+from generator import generate_haystack, generate_needle, generate_murmur, parse_size
+from bench import compare, run
+import bits_per_sentence
+from whisper.revealer import Revealer
+from whisper.text_file_tool import read_sentences_from_file
+
+
+class TestGenerator(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(WORK_DIR, exist_ok=True)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(WORK_DIR)
+
+    def path(self, name: str) -> str:
+        return os.path.join(WORK_DIR, name)
+
+    def test_parse_size(self):
+        self.assertEqual(100, parse_size('100'))
+        self.assertEqual(1024, parse_size('1KB'))
+        self.assertEqual(1536, parse_size('1.5kb'))
+        self.assertEqual(1 << 30, parse_size('1GB'))
+        with self.assertRaises(ValueError):
+            parse_size('1TB')
+
+    def test_haystack(self):
+        count: int = generate_haystack(self.path('h1.txt'), 10000, seed=1)
+        generate_haystack(self.path('h2.txt'), 10000, seed=1)
+        generate_haystack(self.path('h3.txt'), 10000, seed=2)
+        self.assertTrue(filecmp.cmp(self.path('h1.txt'), self.path('h2.txt'), shallow=False))
+        self.assertFalse(filecmp.cmp(self.path('h1.txt'), self.path('h3.txt'), shallow=False))
+        self.assertGreaterEqual(os.path.getsize(self.path('h1.txt')), 10000)
+        self.assertEqual(count, len(list(read_sentences_from_file(self.path('h1.txt')))))
+
+    def test_murmur(self):
+        generate_needle(self.path('needle.txt'), 50, seed=3)
+        with open(self.path('needle.txt'), 'rb') as f:
+            needle: bytes = f.read()
+        self.assertEqual(50, len(needle))
+        count: int = generate_murmur(self.path('murmur.txt'), needle, 100)
+        self.assertEqual(64 + 8 * 50, count)
+        self.assertEqual(needle, Revealer(self.path('murmur.txt'), self.path('revealed.txt')).decode())
+
+
+class TestBench(unittest.TestCase):
+
+    def test_run(self):
+        results = run(20000, 8, repeat=1, only=['read_sentences', 'conversion', 'reveal'])
+        self.assertEqual(['read_sentences', 'conversion', 'reveal'], list(results['benchmarks'].keys()))
+        self.assertGreater(results['benchmarks']['read_sentences']['items'], 0)
+        with self.assertRaises(ValueError):
+            run(20000, 8, repeat=1, only=['unknown'])
+
+    def test_compare(self):
+        baseline = {'haystack_size': 1, 'needle_size': 1, 'benchmarks': {'a': {'seconds': 1.0}, 'b': {'seconds': 1.0}, 'c': {'skipped': 'x'}}}
+        current = {'haystack_size': 1, 'needle_size': 1, 'benchmarks': {'a': {'seconds': 1.1}, 'b': {'seconds': 1.5}, 'c': {'seconds': 1.0}, 'd': {'seconds': 1.0}}}
+        regressions = compare(baseline, current, 0.2)
+        self.assertEqual(['b'], [r['name'] for r in regressions])
+        with self.assertRaises(ValueError):
+            compare(baseline, dict(current, needle_size=2))
+
+
+class TestBitsPerSentence(unittest.TestCase):
+
+    def test_run(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = bits_per_sentence.run(40000, 16, [1, 2, 3], error_rate=0.05, miscount_rate=0.1)
+        self.assertEqual([1, 2, 3], [r['bits_per_sentence'] for r in results['results']])
+        self.assertTrue(all(r['revealed'] for r in results['results']))
+        # The number of sentences used is divided by k
+        self.assertEqual([64 + 128, 96, 64], [r['sentences'] for r in results['results']])
+        self.assertTrue(all(0 < r['success_rate'] <= 1 for r in results['results']))
+
+
+if __name__ == '__main__':
+    unittest.main()
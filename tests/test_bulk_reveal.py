@@ -0,0 +1,68 @@
+# Usage:
+# python3 -m unittest -v test_bulk_reveal.py
+
+import json
+import shutil
+import unittest
+import os
+import sys
+import tempfile
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'bulk-reveal')
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.bulk_reveal import BulkRevealer, find_murmurs, output_path
+from whisper.conversion import Conversion
+from whisper import Bit, Int64
+
+
+def write_murmur(path: str, needle: bytes) -> None:
+    bits: list[Bit] = Conversion.int64_to_bit_list(Int64(len(needle))) + Conversion.bytes_to_bit_list(needle)
+    with open(path, 'w') as f:
+        for bit in bits:
+            f.write(('One two three.' if bit == 1 else 'One two three four.') + '\n')
+
+
+class TestBulkReveal(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(os.path.join(WORK_DIR, 'murmurs'), exist_ok=True)
+        for i in range(10):
+            write_murmur(os.path.join(WORK_DIR, 'murmurs', 'murmur{}.txt'.format(i)), 'Needle #{}'.format(i).encode('ascii'))
+        with open(os.path.join(WORK_DIR, 'murmurs', 'broken.txt'), 'w') as f:
+            f.write('Too short.\n')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(WORK_DIR)
+
+    def test_find_murmurs(self):
+        self.assertEqual(11, len(find_murmurs(os.path.join(WORK_DIR, 'murmurs'))))
+        self.assertEqual(10, len(find_murmurs(os.path.join(WORK_DIR, 'murmurs', 'murmur*.txt'))))
+        self.assertEqual([], find_murmurs(os.path.join(WORK_DIR, 'missing', '*.txt')))
+
+    def test_write_report(self):
+        murmurs: list[str] = find_murmurs(os.path.join(WORK_DIR, 'murmurs'))
+        output_dir: str = os.path.join(WORK_DIR, 'needles')
+        report_path: str = os.path.join(WORK_DIR, 'report.jsonl')
+        summary = BulkRevealer(murmurs, output_dir, workers=2).write_report(report_path)
+        self.assertEqual(11, summary['murmurs'])
+        self.assertEqual(10, summary['successes'])
+        self.assertEqual(1, summary['failures'])
+        for i in range(10):
+            with open(output_path(os.path.join(WORK_DIR, 'murmurs', 'murmur{}.txt'.format(i)), output_dir), 'r') as f:
+                self.assertEqual('Needle #{}'.format(i), f.read())
+        with open(report_path, 'r') as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(12, len(lines))
+        self.assertEqual([m for m in murmurs], [line['murmur'] for line in lines[:11]])
+        broken = lines[0]
+        self.assertFalse(broken['success'])
+        self.assertIn('ValueError', broken['error'])
+        self.assertTrue(lines[11]['summary'])
+
+
+if __name__ == '__main__':
+    unittest.main()
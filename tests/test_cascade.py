@@ -0,0 +1,67 @@
+# Usage:
+# python3 -m unittest -v test_cascade.py
+
+from typing import Any, Optional
+import unittest
+import os
+import sys
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.cascade import ModelCascade
+
+
+class CountingClient:
+    """A client that only counts the tokens."""
+
+    def __init__(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.prompt_tokens: int = prompt_tokens
+        self.completion_tokens: int = completion_tokens
+
+    def call(self, messages: list[dict[str, str]], response_format: Optional[dict[str, Any]] = None) -> str:
+        return ''
+
+
+class TestModelCascade(unittest.TestCase):
+
+    def test_tiers(self):
+        cascade: ModelCascade = ModelCascade.create(['gpt-4.1-mini', 'gpt-5.1'], 'token', escalate_after=2, clients=[CountingClient(0, 0), CountingClient(0, 0)])
+        self.assertEqual(0, cascade.tier_of(7))
+        cascade.record_call(0, [7, 8], 1.0)
+        self.assertEqual(0, cascade.tier_of(7))
+        cascade.record_call(0, [7], 2.0)
+        self.assertEqual(1, cascade.tier_of(7))
+        self.assertEqual(0, cascade.tier_of(8))
+        # The last tier handles all the remaining attempts
+        cascade.record_call(1, [7, 7, 7], 1.0)
+        self.assertEqual(1, cascade.tier_of(7))
+        with self.assertRaises(ValueError):
+            ModelCascade([], 1)
+        with self.assertRaises(ValueError):
+            ModelCascade.create(['gpt-4.1-mini'], 'token', escalate_after=0, clients=[CountingClient(0, 0)])
+        with self.assertRaises(ValueError):
+            ModelCascade.create(['gpt-4.1-mini', 'gpt-5.1'], 'token', clients=[CountingClient(0, 0)])
+
+    def test_report(self):
+        cascade: ModelCascade = ModelCascade.create(['gpt-4.1-mini', 'unknown'], 'token', clients=[CountingClient(1000000, 1000000), CountingClient(10, 20)])
+        cascade.record_call(0, [1, 2, 3, 4], 2.0)
+        cascade.record_call(0, [5, 6], 1.0)
+        cascade.record_results({1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0}, {2, 5})
+        cascade.record_call(1, [2, 5], 3.0)
+        cascade.record_results({2: 1, 5: 1}, set())
+        report = cascade.report()
+        self.assertEqual([6, 2], [t['sentences'] for t in report])
+        self.assertEqual([4, 2], [t['successes'] for t in report])
+        self.assertAlmostEqual(4 / 6, report[0]['success_rate'], places=3)
+        self.assertEqual([1.5, 3.0], [t['latency'] for t in report])
+        self.assertAlmostEqual(0.40 + 1.60, report[0]['cost'])
+        self.assertIsNone(report[1]['cost'])
+        self.assertEqual((1000010, 1000020), cascade.tokens())
+        self.assertEqual(3, len(cascade.lines()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# Usage:
+# python3 -m unittest -v test_cli.py
+
+import contextlib
+import io
+import json
+import shutil
+import sqlite3
+import subprocess
+import unittest
+import os
+import sys
+import tempfile
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+MURMUR_PATH: str = os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'test-data', 'murmur.txt'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'cli')
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.cli import main
+from whisper.stegano_db import SteganoDb
+from whisper.debug_archive import DebugArchive
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(WORK_DIR, exist_ok=True)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(WORK_DIR)
+
+    def test_reveal(self):
+        output: str = os.path.join(WORK_DIR, 'message.txt')
+        self.assertEqual(0, main(['reveal', MURMUR_PATH, output]))
+        with open(output, 'r') as f:
+            self.assertEqual('Hello World!', f.read())
+
+    def test_dump_and_check(self):
+        database: str = os.path.join(WORK_DIR, 'stegano-db.sqlite')
+        dump: str = os.path.join(WORK_DIR, 'dump.txt')
+        db: SteganoDb = SteganoDb(database)
+        db.add_sentence('One two three.', 0)
+        db.add_sentence('One two.', 1)
+        db.add_sentence('One two three four.', 2)
+        db.set_prompt_by_position(0, 'prompt')
+        db.set_reformulation_by_position(0, 'One two three four.')
+        db.set_prompt_by_position(2, 'prompt')
+        db.set_reformulation_by_position(2, 'One two.')
+        db.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(0, main(['dump', database, dump]))
+        output: io.StringIO = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(0, main(['check', dump]))
+        lines: list[str] = output.getvalue().splitlines()
+        self.assertEqual(['S', 'E'], [line[0] for line in lines])
+        # The database is checked directly, from the stored words counts
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(0, main(['check', database]))
+        self.assertEqual(lines, output.getvalue().splitlines())
+
+    def test_check_does_not_modify_the_database(self):
+        database: str = os.path.join(WORK_DIR, 'stegano-db-v1.sqlite')
+        # A database created before the words counts were stored
+        connection: sqlite3.Connection = sqlite3.connect(database)
+        connection.execute('CREATE TABLE t ("idx" INTEGER PRIMARY KEY, "position" INTEGER NOT NULL, "sentence" TEXT NOT NULL, "prompt" TEXT DEFAULT NULL, "reformulation" TEXT DEFAULT NULL)')
+        connection.execute('INSERT INTO t ("position", "sentence", "prompt", "reformulation") VALUES (0, \'One two three.\', \'prompt\', \'One two.\')')
+        connection.execute('INSERT INTO t ("position", "sentence", "prompt", "reformulation") VALUES (1, \'One two.\', \'prompt\', \'One two three four.\')')
+        connection.execute('INSERT INTO t ("position", "sentence") VALUES (2, \'One.\')')
+        connection.commit()
+        connection.close()
+        with open(database, 'rb') as f:
+            content: bytes = f.read()
+        output: io.StringIO = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(0, main(['check', database]))
+        self.assertEqual(['S', 'E'], [line[0] for line in output.getvalue().splitlines()])
+        with open(database, 'rb') as f:
+            self.assertEqual(content, f.read())
+
+    def test_dump_and_check_archive(self):
+        path: str = os.path.join(WORK_DIR, 'debug-archive.sqlite')
+        archive: DebugArchive = DebugArchive(path)
+        archive.add_sentences([(0, 'One two three.', 'prompt', None), (1, 'One two.', None, 'One two.')])
+        archive.add_response(0, 0, 'response')
+        archive.add_changes(0, 0, {0: 'One two three five six.'})
+        archive.add_changes(1, 0, {0: 'One two three four.'})
+        archive.commit()
+        archive.close()
+        output: io.StringIO = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(0, main(['dump', path, '--calls']))
+            self.assertEqual(0, main(['dump', path, '--call=0', '--responses']))
+        lines: list[str] = output.getvalue().splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertEqual('response', json.loads(lines[2])['response'])
+        for call, expected in ((0, 'E'), (1, 'S')):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(0, main(['check', path, '--call={}'.format(call)]))
+            self.assertEqual([expected], [line[0] for line in output.getvalue().splitlines()])
+
+    def test_hide_arguments(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(['hide', 'needle.txt'])
+            with self.assertRaises(SystemExit):
+                main(['unknown'])
+
+    def test_hide_shards_publish(self):
+        shard_dir: str = os.path.join(WORK_DIR, 'shards')
+        token: str = os.path.join(WORK_DIR, 'token.txt')
+        needle: str = os.path.join(WORK_DIR, 'needle.txt')
+        with open(token, 'w') as f:
+            f.write('token')
+        os.chmod(token, 0o600)
+        with open(needle, 'w') as f:
+            f.write('Hi')
+        haystack: str = os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'test-data', 'haystack.txt'))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            # The index of the haystack is built when the shards are published
+            self.assertEqual(0, main(['hide', '--shard-dir={}'.format(shard_dir), '--shard-size=20', '--shard-workers=0', '--token={}'.format(token),
+                                      '--index-dir={}'.format(WORK_DIR), needle, haystack, os.path.join(WORK_DIR, 'murmur.txt')]))
+            # The shards are published once
+            self.assertEqual(1, main(['hide', '--shard-dir={}'.format(shard_dir), '--shard-workers=0', '--token={}'.format(token),
+                                      needle, haystack, os.path.join(WORK_DIR, 'murmur.txt')]))
+            self.assertEqual(1, main(['hide', '--shard-dir={}'.format(os.path.join(WORK_DIR, 'missing')), '--token={}'.format(token)]))
+        # 64 bits for the length, then 2 characters
+        self.assertEqual('4 shards published into "{}"'.format(shard_dir), output.getvalue().splitlines()[0])
+        self.assertEqual(1, len([name for name in os.listdir(WORK_DIR) if name.endswith('.index')]))
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(['hide', '--shard-dir={}'.format(shard_dir), '--stream'])
+
+    def test_reveal_imports(self):
+        """Revealing a message does not import the LLM client, the tokenizer or SQLite."""
+        code: str = '; '.join(['import sys',
+                               'from whisper.cli import main',
+                               'main(["reveal", "{}", "{}"])'.format(MURMUR_PATH, os.path.join(WORK_DIR, 'message.txt')),
+                               'print(",".join(m for m in ("openai", "tiktoken", "sqlite3") if m in sys.modules))'])
+        process = subprocess.run([sys.executable, '-c', code], env=dict(os.environ, PYTHONPATH=SEARCH_PATH), capture_output=True, text=True, check=True)
+        self.assertEqual('', process.stdout.strip())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# Usage:
+# python3 -m unittest -v test_codec.py
+
+import json
+import unittest
+import os
+import sys
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper import codec
+
+DATA = {'positions': [3, 1, 2], 'messages': [{'role': 'user', 'content': '[id=3] Réécris la phrase : "Été".'}]}
+
+
+class TestCodec(unittest.TestCase):
+
+    def tearDown(self):
+        codec.set_codec(None)
+
+    def test_available(self):
+        names = codec.available_codecs()
+        self.assertIn(codec.CODEC_JSON, names)
+        self.assertEqual(names[0], codec.default_codec().name)
+        with self.assertRaises(ValueError):
+            codec.get_codec('unknown')
+
+    def test_round_trip(self):
+        for name in codec.available_codecs():
+            with self.subTest(codec=name):
+                json_codec = codec.get_codec(name)
+                text = json_codec.dumps(DATA)
+                self.assertIsInstance(text, str)
+                # Compact, non-ASCII characters kept, keys not sorted
+                self.assertEqual(json.dumps(DATA, ensure_ascii=False, separators=(',', ':')), text)
+                self.assertEqual(DATA, json_codec.loads(text))
+                self.assertEqual(DATA, json_codec.loads(text.encode('utf-8')))
+
+    def test_invalid(self):
+        for name in codec.available_codecs():
+            with self.subTest(codec=name):
+                with self.assertRaises(ValueError):
+                    codec.get_codec(name).loads('{"results": [')
+
+    def test_set_codec(self):
+        self.assertEqual(codec.CODEC_JSON, codec.set_codec(codec.CODEC_JSON).name)
+        self.assertEqual(DATA, codec.loads(codec.dumps(DATA)))
+        self.assertEqual(codec.available_codecs()[0], codec.set_codec(None).name)
+
+    def test_pretty(self):
+        text = codec.dumps_pretty(DATA)
+        self.assertTrue(text.startswith('{\n    "messages"'))
+        self.assertIn('Réécris', text)
+        self.assertEqual(DATA, codec.loads(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -73,6 +73,13 @@ class TestConversion(unittest.TestCase):
         self.assertEqual(Conversion.bit_list_to_bytes(input_bits), expected_bits)
         self.assertEqual(expected_bits.decode("ascii"), expected_str)
 
+    def test_symbols(self):
+        bits: list[Bit] = cast(list[Bit], [1, 0, 1, 1, 0, 0, 1])
+        self.assertEqual(Conversion.bit_list_to_symbols(bits, 1), bits)
+        self.assertEqual(Conversion.bit_list_to_symbols(bits, 3), [5, 4, 4])
+        self.assertEqual(Conversion.symbols_to_bit_list([5, 4, 4], 3), bits + [0, 0])
+        self.assertEqual(Conversion.symbols_to_bit_list(Conversion.bit_list_to_symbols(bits, 2), 2), bits + [0])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,88 @@
+# Usage:
+# python3 -m unittest -v test_debug_archive.py
+
+import json
+import shutil
+import unittest
+import os
+import sys
+import tempfile
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'debug-archive')
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.debug_archive import DebugArchive, is_archive, PREPARED_CALL
+from whisper.stegano_db import SteganoDb
+from whisper.post_dump import check_post_dump_lines
+
+
+class TestDebugArchive(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(WORK_DIR, exist_ok=True)
+        self.path: str = os.path.join(WORK_DIR, 'debug-archive.sqlite')
+        self.archive: DebugArchive = DebugArchive(self.path)
+        self.archive.add_sentences([(0, 'One two three.', 'prompt 0', None),
+                                    (1, 'One two.', None, 'One two.'),
+                                    (2, 'One two three four.', 'prompt 2', None)])
+        # Call 0: one good reformulation, one wrong
+        self.archive.add_request(0, 0, [0, 2], json.dumps([{'role': 'user', 'content': 'request'}]))
+        self.archive.add_response(0, 0, 'response 0')
+        self.archive.add_changes(0, 0, {0: 'One two three four.', 2: 'One two three five.'})
+        # Call 1: the wrong reformulation is replaced
+        self.archive.add_request(1, 0, [2], json.dumps([{'role': 'user', 'content': 'retry'}]))
+        self.archive.add_response(1, 0, 'response 1')
+        self.archive.add_changes(1, 0, {2: 'One two three.'})
+        self.archive.commit()
+
+    def tearDown(self) -> None:
+        self.archive.close()
+        shutil.rmtree(WORK_DIR)
+
+    def test_snapshot(self):
+        self.assertEqual(1, self.archive.last_call())
+        self.assertEqual([None, 'One two.', None], [row[3] for row in self.archive.snapshot(PREPARED_CALL)])
+        self.assertEqual(['One two three four.', 'One two.', 'One two three five.'], [row[3] for row in self.archive.snapshot(0)])
+        self.assertEqual(['One two three four.', 'One two.', 'One two three.'], [row[3] for row in self.archive.snapshot()])
+        self.assertEqual(['prompt 0', None, 'prompt 2'], [row[2] for row in self.archive.snapshot()])
+
+    def test_dump(self):
+        # The snapshot is dumped in the format of SteganoDb.dump
+        db_path: str = os.path.join(WORK_DIR, 'stegano-db.sqlite')
+        dump_path: str = os.path.join(WORK_DIR, 'dump.txt')
+        db: SteganoDb = SteganoDb(db_path)
+        for position, sentence, prompt, reformulation in self.archive.snapshot():
+            db.add_sentence(sentence, position)
+            if prompt is not None:
+                db.set_prompt_by_position(position, prompt)
+            db.set_reformulation_by_position(position, reformulation)
+        db.dump(dump_path)
+        db.close()
+        with open(dump_path, 'r') as f:
+            self.assertEqual(f.read().splitlines(), list(self.archive.dump()))
+        self.assertEqual(['S', 'E'], [line[0] for line in check_post_dump_lines(self.archive.dump(0))])
+        self.assertEqual(['S', 'S'], [line[0] for line in check_post_dump_lines(self.archive.dump(1))])
+
+    def test_calls(self):
+        self.assertEqual([{'call': 0, 'requests': 1, 'responses': 1, 'changes': 2},
+                          {'call': 1, 'requests': 1, 'responses': 1, 'changes': 1}], self.archive.calls())
+        self.assertEqual([[2]], [r['positions'] for r in self.archive.requests(1)])
+        self.assertEqual([[{'role': 'user', 'content': 'retry'}]], [r['messages'] for r in self.archive.requests(1)])
+        self.assertEqual(['response 0'], [r['response'] for r in self.archive.responses(0)])
+
+    def test_is_archive(self):
+        self.assertTrue(is_archive(self.path))
+        db: SteganoDb = SteganoDb(os.path.join(WORK_DIR, 'stegano-db.sqlite'))
+        db.close()
+        self.assertFalse(is_archive(os.path.join(WORK_DIR, 'stegano-db.sqlite')))
+        text: str = os.path.join(WORK_DIR, 'dump.txt')
+        with open(text, 'w') as f:
+            f.write('0     | One. | N |       | One.\n')
+        self.assertFalse(is_archive(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# Usage:
+# python3 -m unittest -v test_debug_writer.py
+
+import contextlib
+import io
+import shutil
+import threading
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'debug-writer')
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.debug_writer import DebugWriter
+from whisper.debug_archive import DebugArchive, ARCHIVE_NAME
+from whisper.profiler import Profiler
+
+
+class TestDebugWriter(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(WORK_DIR, exist_ok=True)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(WORK_DIR)
+
+    def archive(self) -> DebugArchive:
+        return DebugArchive(os.path.join(WORK_DIR, ARCHIVE_NAME), init=False)
+
+    def test_write(self):
+        profiler: Profiler = Profiler()
+        writer: DebugWriter = DebugWriter(Path(WORK_DIR), profiler)
+        threads: list[str] = []
+        writer.submit(lambda archive: archive.add_sentences([(0, 'One two.', 'prompt', None), (1, 'One.', None, 'One.')]))
+        for i in range(10):
+            writer.submit(lambda archive, i=i: archive.add_response(0, i, 'response {}'.format(i)))
+        # The records are written by the writer thread
+        writer.submit(lambda archive: threads.append(threading.current_thread().name))
+        writer.close()
+        self.assertEqual(['debug-writer'], threads)
+        self.assertEqual(12, writer.items_count)
+        self.assertEqual(12, profiler.report()['counters']['debug.items'])
+        archive: DebugArchive = self.archive()
+        self.assertEqual(['response {}'.format(i) for i in range(10)], [r['response'] for r in archive.responses(0)])
+        self.assertEqual(2, len(list(archive.snapshot())))
+        archive.close()
+
+    def test_disabled(self):
+        writer: DebugWriter = DebugWriter(None)
+        writer.submit(lambda archive: archive.add_response(0, 0, 'response'))
+        writer.close()
+        self.assertIsNone(writer.thread)
+        self.assertEqual(0, writer.items_count)
+        self.assertFalse(os.path.exists(os.path.join(WORK_DIR, ARCHIVE_NAME)))
+
+    def test_error(self):
+        def fail(archive: DebugArchive) -> None:
+            raise RuntimeError('record failed')
+
+        writer: DebugWriter = DebugWriter(Path(WORK_DIR))
+        writer.submit(fail)
+        writer.submit(lambda archive: archive.add_response(0, 0, 'response'))
+        output: io.StringIO = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            writer.close()
+        self.assertIn('record failed', output.getvalue())
+        archive: DebugArchive = self.archive()
+        self.assertEqual(['response'], [r['response'] for r in archive.responses(0)])
+        archive.close()
+
+    def test_bounded_queue(self):
+        release: threading.Event = threading.Event()
+        writer: DebugWriter = DebugWriter(Path(WORK_DIR), queue_size=2)
+        writer.submit(lambda archive: release.wait())
+        for i in range(2):
+            writer.submit(lambda archive: None)
+        producer: threading.Thread = threading.Thread(target=writer.submit, args=(lambda archive: archive.add_response(0, 0, 'last'),))
+        producer.start()
+        producer.join(0.2)
+        # The queue is full: the producer waits for the writer
+        self.assertTrue(producer.is_alive())
+        release.set()
+        producer.join()
+        writer.close()
+        archive: DebugArchive = self.archive()
+        self.assertEqual(['last'], [r['response'] for r in archive.responses(0)])
+        archive.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
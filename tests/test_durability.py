@@ -0,0 +1,86 @@
+# Usage:
+# python3 -m unittest -v test_durability.py
+
+import shutil
+import sqlite3
+import unittest
+import os
+import sys
+import tempfile
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'durability')
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper import durability
+from whisper.durability import DURABILITY_DEFAULT, DURABILITY_EPHEMERAL, DURABILITY_DURABLE, apply_durability, resolve_durability, default_db_path
+from whisper.disk_list import DiskList
+from whisper.stegano_db import SteganoDb
+
+
+def pragma(db: sqlite3.Connection, name: str):
+    return db.execute('PRAGMA {}'.format(name)).fetchone()[0]
+
+
+class TestDurability(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(WORK_DIR, exist_ok=True)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(WORK_DIR)
+
+    def test_resolve(self):
+        self.assertEqual(DURABILITY_DURABLE, resolve_durability(None, True))
+        self.assertEqual(DURABILITY_EPHEMERAL, resolve_durability(None, False))
+        self.assertEqual(DURABILITY_DEFAULT, resolve_durability(DURABILITY_DEFAULT, True))
+        with self.assertRaises(ValueError):
+            resolve_durability('unknown', False)
+
+    def test_pragmas(self):
+        path: str = os.path.join(WORK_DIR, 'db.sqlite')
+        db: sqlite3.Connection = sqlite3.connect(path)
+        try:
+            apply_durability(db, DURABILITY_EPHEMERAL)
+            self.assertEqual('memory', pragma(db, 'journal_mode'))
+            self.assertEqual(0, pragma(db, 'synchronous'))
+            self.assertEqual(2, pragma(db, 'temp_store'))
+            apply_durability(db, DURABILITY_DURABLE)
+            self.assertEqual('wal', pragma(db, 'journal_mode'))
+            self.assertEqual(1, pragma(db, 'synchronous'))
+        finally:
+            db.close()
+
+    def test_default_path(self):
+        previous: str = durability.TMPFS_PATH
+        durability.TMPFS_PATH = WORK_DIR
+        try:
+            self.assertEqual(WORK_DIR, os.path.dirname(default_db_path('file-db-', DURABILITY_EPHEMERAL)))
+            self.assertEqual('', os.path.dirname(default_db_path('file-db-', DURABILITY_DURABLE)))
+            db: SteganoDb = SteganoDb(durability=DURABILITY_EPHEMERAL)
+            requests: DiskList = DiskList(durability=DURABILITY_EPHEMERAL)
+            self.assertEqual(2, len([name for name in os.listdir(WORK_DIR) if name.endswith('.sqlite')]))
+            db.destroy()
+            requests.destroy()
+            self.assertEqual([], os.listdir(WORK_DIR))
+        finally:
+            durability.TMPFS_PATH = previous
+
+    def test_durable(self):
+        path: str = os.path.join(WORK_DIR, 'stegano-db.sqlite')
+        db: SteganoDb = SteganoDb(path, durability=DURABILITY_DURABLE)
+        db.add_sentence('One two.', 0)
+        self.assertTrue(os.path.exists(path + '-wal'))
+        db.checkpoint()
+        # The committed sentences are visible to another connection
+        other: SteganoDb = SteganoDb(path, init=False)
+        self.assertEqual(1, len(other))
+        other.close()
+        db.destroy()
+        self.assertEqual([], os.listdir(WORK_DIR))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# Usage:
+# python3 -m unittest -v test_ecc.py
+
+import random
+import unittest
+import os
+import sys
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.ecc import ErrorCorrection, rs_encode, rs_decode, BLOCK_SIZE
+
+
+class TestEcc(unittest.TestCase):
+
+    def test_block(self):
+        r: random.Random = random.Random(3)
+        for nsym in (2, 5, 16, 32):
+            for size in (1, 10, BLOCK_SIZE - nsym):
+                data: bytes = bytes(r.randrange(256) for _ in range(size))
+                block: bytearray = bytearray(rs_encode(data, nsym))
+                self.assertEqual(size + nsym, len(block))
+                self.assertEqual((data, 0), rs_decode(bytes(block), nsym))
+                errors: list[int] = r.sample(range(len(block)), min(nsym // 2, len(block)))
+                for p in errors:
+                    block[p] ^= r.randint(1, 255)
+                self.assertEqual((data, len(errors)), rs_decode(bytes(block), nsym))
+
+    def test_too_many_errors(self):
+        block: bytearray = bytearray(rs_encode(b'Hello, world!', 4))
+        for p in (0, 5, 9):
+            block[p] ^= 0x55
+        with self.assertRaises(ValueError):
+            rs_decode(bytes(block), 4)
+
+    def test_frame(self):
+        ecc: ErrorCorrection = ErrorCorrection(10)
+        body: bytes = bytes(range(128)) * 5
+        frame: bytearray = bytearray(ecc.encode(body))
+        self.assertEqual(ecc.header_size + ecc.body_size(len(body)), len(frame))
+        self.assertEqual(len(body), ecc.capacity(len(frame)))
+        self.assertEqual(len(body) - 1, ecc.capacity(len(frame) - 1))
+        # Five wrong bytes in each block
+        for block_start in range(ecc.header_size, len(frame), BLOCK_SIZE):
+            for p in range(block_start, min(block_start + 5, len(frame))):
+                frame[p] ^= 0xff
+        self.assertEqual(len(body), ecc.decode_length(bytes(frame[:ecc.header_size])))
+        self.assertEqual((body, 15), ecc.decode_body(bytes(frame[ecc.header_size:])))
+
+    def test_correctable(self):
+        ecc: ErrorCorrection = ErrorCorrection(4)
+        self.assertEqual(0, ecc.block_of(11))
+        self.assertEqual(1, ecc.block_of(12))
+        self.assertEqual(2, ecc.block_of(12 + BLOCK_SIZE))
+        # Two wrong bytes per block (several bits of the same byte count once)
+        self.assertTrue(ecc.correctable([0, 1, 2, 8 * 11, 8 * 12, 8 * 13 + 7]))
+        self.assertFalse(ecc.correctable([0, 8, 16]))
+        with self.assertRaises(ValueError):
+            ErrorCorrection(1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# Usage:
+# python3 -m unittest -v test_estimator.py
+
+import json
+import shutil
+import unittest
+import os
+import sys
+import tempfile
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+TEST_DATA=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'test-data'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'estimator')
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.estimator import Estimator, Estimate
+from whisper.haystack_index import HaystackIndex
+from whisper.local_rewriter import LocalRewriter
+from whisper.message import Message
+from whisper.pricing import ModelPricing
+from whisper.sentence import Sentence
+from whisper.text_file_tool import read_sentences_from_file
+
+
+def count_words(text: str) -> int:
+    """A tokenizer for the tests: one token per word."""
+    return len(text.split())
+
+
+class TestEstimator(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(WORK_DIR, exist_ok=True)
+        self.needle: str = os.path.join(TEST_DATA, 'needle.txt')
+        self.haystack: str = os.path.join(TEST_DATA, 'haystack.txt')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(WORK_DIR)
+
+    def test_estimate(self):
+        bits: list[int] = Message.load_text_file_as_vector(self.needle)
+        sentences: list[str] = list(read_sentences_from_file(self.haystack))
+        to_reformulate: int = sum(1 for bit, s in zip(bits, sentences) if len(Sentence(s).get_words()) % 2 != bit)
+        result: Estimate = Estimator(self.needle, self.haystack, 'gpt-4.1', concurrency=2, count_tokens=count_words).estimate()
+        self.assertEqual(len(bits), result.needle_bits)
+        self.assertEqual(len(sentences), result.haystack_sentences)
+        self.assertEqual((len(sentences) - 64) // 8, result.capacity)
+        self.assertTrue(result.enough())
+        self.assertEqual(to_reformulate, result.to_reformulate)
+        self.assertEqual(len(bits), result.unchanged + result.to_reformulate)
+        self.assertEqual(0, result.local_rewrites)
+        self.assertEqual((to_reformulate + 49) // 50, result.requests)
+        self.assertGreater(result.input_tokens, result.output_tokens)
+        self.assertAlmostEqual((result.input_tokens * 2.0 + result.output_tokens * 8.0) / 1000000.0, result.cost)
+        self.assertAlmostEqual(((result.requests + 1) // 2) * result.request_latency, result.wall_clock)
+        self.assertEqual(result.to_dict()['enough'], True)
+        json.dumps(result.to_dict())
+
+    def test_index(self):
+        result: Estimate = Estimator(self.needle, self.haystack, 'gpt-4.1', count_tokens=count_words).estimate()
+        with HaystackIndex.build(self.haystack, os.path.join(WORK_DIR, 'haystack.index')) as index:
+            indexed: Estimate = Estimator(self.needle, self.haystack, 'gpt-4.1', count_tokens=count_words, index=index).estimate()
+        self.assertEqual(result.to_dict(), indexed.to_dict())
+
+    def test_local_rewrites(self):
+        result: Estimate = Estimator(self.needle, self.haystack, 'gpt-4.1', count_tokens=count_words).estimate()
+        rewritten: Estimate = Estimator(self.needle, self.haystack, 'gpt-4.1', local_rewriter=LocalRewriter.load(), count_tokens=count_words).estimate()
+        self.assertEqual(result.to_reformulate, rewritten.to_reformulate + rewritten.local_rewrites)
+        self.assertLessEqual(rewritten.input_tokens, result.input_tokens)
+
+    def test_options(self):
+        result: Estimate = Estimator(self.needle, self.haystack, 'unknown-model', request_latency=3.0, count_tokens=count_words).estimate()
+        self.assertIsNone(result.cost)
+        self.assertEqual(3.0, result.request_latency)
+        pricing: ModelPricing = ModelPricing(1.0, 1.0)
+        result = Estimator(self.needle, self.haystack, 'unknown-model', pricing=pricing, batch_mode=True, count_tokens=count_words).estimate()
+        self.assertAlmostEqual((result.input_tokens + result.output_tokens) / 2000000.0, result.cost)
+
+    def test_bits_per_sentence(self):
+        bits: list[int] = Message.load_text_file_as_vector(self.needle)
+        sentences: list[str] = list(read_sentences_from_file(self.haystack))
+        result: Estimate = Estimator(self.needle, self.haystack, 'gpt-4.1', bits_per_sentence=3, count_tokens=count_words).estimate()
+        self.assertEqual(3, result.bits_per_sentence)
+        self.assertEqual((len(bits) + 2) // 3, result.needle_sentences())
+        self.assertEqual(result.needle_sentences(), result.unchanged + result.to_reformulate)
+        self.assertEqual((len(sentences) * 3 - 64) // 8, result.capacity)
+
+    def test_not_enough(self):
+        haystack: str = os.path.join(WORK_DIR, 'haystack.txt')
+        with open(haystack, 'w') as f:
+            f.write('One two. One.\n')
+        result: Estimate = Estimator(self.needle, haystack, 'gpt-4.1', count_tokens=count_words).estimate()
+        self.assertEqual(2, result.haystack_sentences)
+        self.assertEqual(0, result.capacity)
+        self.assertFalse(result.enough())
+        self.assertIn('NOT ENOUGH', '\n'.join(result.lines()))
+
+
+if __name__ == '__main__':
+    unittest.main()
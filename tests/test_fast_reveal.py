@@ -0,0 +1,101 @@
+# Usage:
+# python3 -m unittest -v test_fast_reveal.py
+
+from typing import Optional
+import random
+import unittest
+import os
+import sys
+import tempfile
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+MURMUR_PATH: str = os.path.join(tempfile.gettempdir(), 'fast-reveal-murmur.txt')
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper import fast_reveal
+from whisper.conversion import Conversion
+from whisper.fast_reveal import LineParityReader
+from whisper.revealer import Revealer
+from whisper import Bit
+
+
+def random_line(r: random.Random) -> str:
+    body: str = ''.join(r.choice(['a', 'b', 'é', ' ', ' ', '\t', ',', ';', ', ']) for _ in range(r.randint(1, 12)))
+    return body + r.choice(['.', '...', '?', '!'])
+
+
+class TestFastReveal(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        if os.path.exists(MURMUR_PATH):
+            os.remove(MURMUR_PATH)
+
+    def write(self, content: str) -> None:
+        with open(MURMUR_PATH, 'w') as f:
+            f.write(content)
+
+    def read(self, count: int = 1000000, modulus: int = 2) -> Optional[list[int]]:
+        with LineParityReader(MURMUR_PATH, modulus) as reader:
+            return reader.read(count)
+
+    def test_same_parities(self):
+        """The fast path counts the words as the sentence detector and Sentence do."""
+        r: random.Random = random.Random(7)
+        lines: list[str] = [random_line(r) for _ in range(2000)]
+        self.write('\n'.join(lines) + '\n')
+        expected: list[Bit] = list(Revealer.read_bits(MURMUR_PATH))
+        self.assertEqual(len(lines), len(expected))
+        self.assertEqual(expected, self.read())
+        # The last line may not end with a new line
+        self.write('\n'.join(lines))
+        self.assertEqual(expected, self.read())
+
+    def test_same_residues(self):
+        r: random.Random = random.Random(11)
+        lines: list[str] = [random_line(r) for _ in range(2000)]
+        self.write('\n'.join(lines) + '\n')
+        expected: list[Bit] = list(Revealer.read_bits(MURMUR_PATH, 3))
+        self.assertEqual(expected, Conversion.symbols_to_bit_list(self.read(modulus=8), 3))
+
+    def test_early_stop(self):
+        self.write('One two.\nOne.\nOne two three.\n' + 'Not. Read.\n')
+        with LineParityReader(MURMUR_PATH) as reader:
+            self.assertEqual([0, 1], reader.read(2))
+            self.assertEqual([1], reader.read(1))
+            # The malformed line is only read now
+            self.assertIsNone(reader.read(1))
+
+    def test_chunks(self):
+        previous: int = fast_reveal.CHUNK_SIZE
+        fast_reveal.CHUNK_SIZE = 16
+        try:
+            self.write('One, two; three four five six.\nOne.\n' * 10 + '   ')
+            self.assertEqual([0, 1] * 10, self.read())
+        finally:
+            fast_reveal.CHUNK_SIZE = previous
+
+    def test_malformed(self):
+        for content in ['One. Two.\n', 'One\nTwo.\n', 'One.\n\nTwo.\n', 'One..\n', 'One?!\n', 'One\xa0two.\n', 'One.\r\n', 'One.\n...\n', 'One.\n?\n']:
+            self.write(content)
+            self.assertIsNone(self.read(), content)
+
+    def test_fallback(self):
+        # Two sentences on the first line: the general path is used
+        bits: list[int] = [1] * 64 + [0, 1, 0, 0, 0, 0, 0, 1]
+        sentences: list[str] = ['One.' if bit == 1 else 'One two.' for bit in bits]
+        self.write(' '.join(sentences[:2]) + '\n' + '\n'.join(sentences[2:]) + '\n')
+        self.assertIsNone(self.read())
+        bits[:64] = [0] * 63 + [1]
+        sentences = ['One.' if bit == 1 else 'One two.' for bit in bits]
+        self.write(' '.join(sentences[:2]) + '\n' + '\n'.join(sentences[2:]) + '\n')
+        self.assertEqual(b'A', Revealer(MURMUR_PATH, MURMUR_PATH + '.out').decode())
+
+    def test_empty(self):
+        self.write('')
+        self.assertEqual([], self.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
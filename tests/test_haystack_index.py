@@ -0,0 +1,99 @@
+# Usage:
+# python3 -m unittest -v test_haystack_index.py
+
+import shutil
+import tempfile
+import unittest
+import os
+import sys
+from pathlib import Path
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+TEST_DATA=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'test-data'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'haystack_index')
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper import haystack_index
+from whisper.haystack_index import HaystackIndex, file_sha256, index_path
+from whisper.sentence import Sentence
+from whisper.stegano_db import SteganoDb
+from whisper.text_file_tool import read_sentences_from_file
+
+
+class TestHaystackIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(WORK_DIR, exist_ok=True)
+        self.haystack: str = os.path.join(WORK_DIR, 'haystack.txt')
+        shutil.copyfile(os.path.join(TEST_DATA, 'haystack.txt'), self.haystack)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(WORK_DIR)
+
+    def test_build(self):
+        sentences: list[str] = list(read_sentences_from_file(self.haystack))
+        with HaystackIndex.open(self.haystack) as index:
+            self.assertEqual(self.haystack + '.index', index.path)
+            self.assertEqual(len(sentences), len(index))
+            self.assertEqual([(s, len(Sentence(s).get_words())) for s in sentences], list(index.iter_sentences()))
+            self.assertEqual(sentences[10:12], [s for s, _ in index.iter_sentences(10, 12)])
+            self.assertEqual(sentences[-1], index.sentence(len(index) - 1))
+            with self.assertRaises(IndexError):
+                index.sentence(len(index))
+
+    def test_non_ascii(self):
+        with open(self.haystack, 'w') as f:
+            f.write("L'été   est là.\nÇa va?  Très   bien!")
+        with HaystackIndex.open(self.haystack) as index:
+            self.assertEqual([("L'été est là.", 3), ('Ça va?', 2), ('Très bien!', 2)], list(index.iter_sentences()))
+
+    def test_reuse_and_rebuild(self):
+        HaystackIndex.open(self.haystack).close()
+        modified: float = os.path.getmtime(self.haystack + '.index')
+        # The index is reused
+        with HaystackIndex.open(self.haystack) as index:
+            self.assertEqual(modified, os.path.getmtime(index.path))
+        # The haystack has changed: the index is rebuilt
+        with open(self.haystack, 'w') as f:
+            f.write('One two. Three.')
+        with HaystackIndex.open(self.haystack) as index:
+            self.assertEqual(['One two.', 'Three.'], [s for s, _ in index.iter_sentences()])
+        # Another version of the segmenter
+        original: int = haystack_index.SEGMENTER_VERSION
+        try:
+            haystack_index.SEGMENTER_VERSION = original + 1
+            with self.assertRaises(ValueError):
+                HaystackIndex(self.haystack + '.index')
+        finally:
+            haystack_index.SEGMENTER_VERSION = original
+        with open(self.haystack + '.index', 'wb') as f:
+            f.write(b'not an index')
+        with self.assertRaises(ValueError):
+            HaystackIndex(self.haystack + '.index')
+        HaystackIndex.open(self.haystack).close()
+
+    def test_cache_dir(self):
+        cache_dir: Path = Path(WORK_DIR).joinpath('cache')
+        copy: str = os.path.join(WORK_DIR, 'copy.txt')
+        shutil.copyfile(self.haystack, copy)
+        with HaystackIndex.open(self.haystack, cache_dir) as index:
+            self.assertEqual(str(index_path(self.haystack, file_sha256(self.haystack), cache_dir)), index.path)
+        # The haystacks with the same content share an index
+        with HaystackIndex.open(copy, cache_dir) as index:
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+        self.assertFalse(os.path.exists(self.haystack + '.index'))
+
+    def test_stegano_db(self):
+        sentences: list[str] = list(read_sentences_from_file(self.haystack))
+        with HaystackIndex.open(self.haystack) as index, SteganoDb(os.path.join(WORK_DIR, 'db.sqlite')) as db:
+            self.assertEqual(100, db.load_index(index, 100))
+            self.assertEqual(100, len(db))
+            data = db.get_sentence_by_position(99)
+            self.assertEqual(sentences[99], data.sentence.string)
+            self.assertEqual(len(Sentence(sentences[99]).get_words()), data.sentence_words)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# Usage:
+# python3 -m unittest -v test_haystack_selector.py
+
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import unittest
+import os
+import sys
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+TEST_DATA=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'test-data'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'haystack_selector')
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.cli import main
+from whisper.conversion import Conversion
+from whisper.estimator import Estimator, needle_capacity
+from whisper.haystack_index import HaystackIndex, parity_bitmap
+from whisper.haystack_selector import Candidate, HaystackSelector, find_haystacks
+from whisper.message import Message
+from whisper.sentence import Sentence
+from whisper.text_file_tool import read_sentences_from_file
+
+
+def write_haystack(path: str, sentences: int, shift: int = 0) -> None:
+    with open(path, 'w') as f:
+        for i in range(sentences):
+            f.write(' '.join(['word{}'.format(j) for j in range(3 + (i * 7 + shift) % 5)]) + '. ')
+
+
+class TestHaystackSelector(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(WORK_DIR, exist_ok=True)
+        self.needle: str = os.path.join(TEST_DATA, 'needle.txt')
+        self.haystack: str = os.path.join(WORK_DIR, 'haystack.txt')
+        shutil.copyfile(os.path.join(TEST_DATA, 'haystack.txt'), self.haystack)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(WORK_DIR)
+
+    def brute_force(self, haystack: str, bits_per_sentence: int, offset: int) -> int:
+        symbols: list[int] = Conversion.bit_list_to_symbols(Message.load_text_file_as_vector(self.needle), bits_per_sentence)
+        sentences: list[str] = list(read_sentences_from_file(haystack))[offset:offset + len(symbols)]
+        return sum(1 for s, symbol in zip(sentences, symbols) if len(Sentence(s).get_words()) % (1 << bits_per_sentence) != symbol)
+
+    def test_parity_bitmap(self):
+        self.assertEqual(0b0110, parity_bitmap([2, 3, 1, 4]))
+        self.assertEqual(0b1011, parity_bitmap([2, 3, 1, 6], 1))
+        self.assertEqual(0, parity_bitmap([]))
+
+    def test_evaluate(self):
+        for k in (1, 2, 3):
+            selector: HaystackSelector = HaystackSelector(self.needle, bits_per_sentence=k)
+            with HaystackIndex.open(self.haystack) as index:
+                candidate: Candidate = selector.evaluate(self.haystack, index)
+            self.assertEqual(0, candidate.offset)
+            self.assertEqual(self.brute_force(self.haystack, k, 0), candidate.to_reformulate)
+            estimator: Estimator = Estimator(self.needle, self.haystack, 'gpt-4.1', bits_per_sentence=k, count_tokens=len)
+            self.assertEqual(estimator.estimate().to_reformulate, candidate.to_reformulate)
+            self.assertEqual(estimator.capacity(candidate.sentences), candidate.capacity)
+            self.assertTrue(candidate.enough())
+
+    def test_offsets(self):
+        selector: HaystackSelector = HaystackSelector(self.needle, max_offsets=10)
+        offsets: list[int] = selector.offsets(224)
+        self.assertEqual(0, offsets[0])
+        self.assertEqual(224 - 160, offsets[-1])
+        self.assertLessEqual(len(offsets), 11)
+        self.assertEqual([0], selector.offsets(100))
+        with HaystackIndex.open(self.haystack) as index:
+            candidate: Candidate = selector.evaluate(self.haystack, index)
+        self.assertIn(candidate.offset, offsets)
+        self.assertEqual(self.brute_force(self.haystack, 1, candidate.offset), candidate.to_reformulate)
+        self.assertEqual(min(self.brute_force(self.haystack, 1, offset) for offset in offsets), candidate.to_reformulate)
+        # The capacity counts the sentences after the offset only
+        self.assertEqual(needle_capacity(224 - candidate.offset), candidate.capacity)
+        with self.assertRaises(ValueError):
+            HaystackSelector(self.needle, max_offsets=0)
+
+    def test_select(self):
+        library: str = os.path.join(WORK_DIR, 'library')
+        os.makedirs(library)
+        for i in range(3):
+            write_haystack(os.path.join(library, 'h{}.txt'.format(i)), 300, i)
+        write_haystack(os.path.join(library, 'small.txt'), 50)
+        haystacks: list[str] = find_haystacks([library, self.haystack])
+        self.assertEqual(5, len(haystacks))
+        candidates: list[Candidate] = HaystackSelector(self.needle).select(haystacks)
+        # The indexes are built next to the haystacks, and are not candidates
+        self.assertEqual(5, len(find_haystacks([library, self.haystack])))
+        self.assertEqual(os.path.join(library, 'small.txt'), candidates[-1].haystack)
+        self.assertFalse(candidates[-1].enough())
+        counts: list[int] = [c.to_reformulate for c in candidates[:-1]]
+        self.assertEqual(sorted(counts), counts)
+        for candidate in candidates[:-1]:
+            self.assertEqual(self.brute_force(candidate.haystack, 1, 0), candidate.to_reformulate)
+            self.assertEqual((candidate.to_reformulate + 49) // 50, candidate.requests())
+
+    def test_cli(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(0, main(['select-haystack', self.needle, self.haystack, '--json', '--index-dir={}'.format(os.path.join(WORK_DIR, 'indexes'))]))
+        candidates = json.loads(output.getvalue())
+        self.assertEqual(self.haystack, candidates[0]['haystack'])
+        self.assertTrue(candidates[0]['enough'])
+        os.makedirs(os.path.join(WORK_DIR, 'empty'))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(1, main(['select-haystack', self.needle, os.path.join(WORK_DIR, 'empty')]))
+            self.assertEqual(1, main(['select-haystack', self.needle, os.path.join(WORK_DIR, 'none.txt')]))
+
+
+if __name__ == '__main__':
+    unittest.main()
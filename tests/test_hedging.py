@@ -0,0 +1,131 @@
+# Usage:
+# python3 -m unittest -v test_hedging.py
+
+from typing import Any, Optional
+import json
+import threading
+import time
+import unittest
+import os
+import sys
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper import hedging
+from whisper.configuration import HiderConfiguration
+from whisper.hedging import HedgedClient, valid_response, with_hedging
+
+MESSAGES: list[dict[str, str]] = [{'role': 'system', 'content': 'system'}, {'role': 'user', 'content': '[id=1] prompt'}]
+
+
+class SlowClient:
+    """Answer after a delay. The answer is invalid (not JSON) if `valid` is False, and the call fails if `error` is True."""
+
+    def __init__(self, name: str, delay: float = 0.0, valid: bool = True, error: bool = False) -> None:
+        self.name: str = name
+        self.delay: float = delay
+        self.valid: bool = valid
+        self.error: bool = error
+        self.calls: int = 0
+        self.lock: threading.Lock = threading.Lock()
+        self.prompt_tokens: int = 0
+        self.completion_tokens: int = 0
+
+    def call(self, messages: list[dict[str, str]], response_format: Optional[dict[str, Any]] = None) -> str:
+        with self.lock:
+            self.calls += 1
+            self.prompt_tokens += 10
+            self.completion_tokens += 5
+        time.sleep(self.delay)
+        if self.error:
+            raise RuntimeError('error')
+        return json.dumps({'results': [{'id': 1, 'text': self.name}]}) if self.valid else 'invalid'
+
+
+class TestHedging(unittest.TestCase):
+
+    def test_valid_response(self):
+        self.assertTrue(valid_response(json.dumps({'results': [{'id': 1, 'text': 'One.'}]}), MESSAGES))
+        self.assertFalse(valid_response(json.dumps({'results': [{'id': 2, 'text': 'One.'}]}), MESSAGES))
+        self.assertFalse(valid_response('invalid', MESSAGES))
+
+    def test_no_samples(self):
+        # Without an initial delay, no duplicate is sent before the latencies are known
+        primary: SlowClient = SlowClient('primary', 0.05)
+        hedge: SlowClient = SlowClient('hedge')
+        client: HedgedClient = HedgedClient(primary, hedge, max_hedge_ratio=1.0)
+        self.assertIn('primary', client.call(MESSAGES))
+        self.assertEqual(0, hedge.calls)
+        client.close()
+
+    def test_hedge_wins(self):
+        primary: SlowClient = SlowClient('primary', 0.5)
+        hedge: SlowClient = SlowClient('hedge')
+        client: HedgedClient = HedgedClient(primary, hedge, max_hedge_ratio=1.0, initial_delay=0.02)
+        start: float = time.monotonic()
+        self.assertIn('hedge', client.call(MESSAGES))
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(1, client.stats.hedged)
+        self.assertEqual(1, client.stats.hedge_wins)
+        # The tokens of both calls are counted
+        self.assertEqual(20, client.prompt_tokens)
+        client.close()
+
+    def test_invalid_hedge(self):
+        primary: SlowClient = SlowClient('primary', 0.1)
+        client: HedgedClient = HedgedClient(primary, SlowClient('hedge', valid=False), max_hedge_ratio=1.0, initial_delay=0.01)
+        self.assertIn('primary', client.call(MESSAGES))
+        self.assertEqual(1, client.stats.primary_wins)
+        client = HedgedClient(primary, SlowClient('hedge', error=True), max_hedge_ratio=1.0, initial_delay=0.01)
+        self.assertIn('primary', client.call(MESSAGES))
+        # No valid response: the invalid response is returned
+        client = HedgedClient(SlowClient('primary', 0.05, valid=False), SlowClient('hedge', error=True), max_hedge_ratio=1.0, initial_delay=0.01)
+        self.assertEqual('invalid', client.call(MESSAGES))
+        client.close()
+
+    def test_budget(self):
+        hedge: SlowClient = SlowClient('hedge')
+        client: HedgedClient = HedgedClient(SlowClient('primary', 0.05), hedge, max_hedge_ratio=0.5, initial_delay=0.01)
+        for _ in range(4):
+            client.call(MESSAGES)
+        self.assertEqual(2, hedge.calls)
+        self.assertEqual(2, client.stats.skipped)
+        self.assertEqual(5, len(client.lines()))
+        client.close()
+
+    def test_percentile(self):
+        client: HedgedClient = HedgedClient(SlowClient('primary'), SlowClient('hedge'), hedge_percentile=50.0)
+        self.assertIsNone(client.hedge_delay())
+        client.latencies.extend([1.0, 2.0, 3.0, 4.0, 100.0][:hedging.MIN_SAMPLES])
+        self.assertEqual(3.0, client.hedge_delay())
+        with self.assertRaises(ValueError):
+            HedgedClient(SlowClient('primary'), SlowClient('hedge'), hedge_percentile=0.0)
+        client.close()
+
+    def test_concurrency(self):
+        """The calls never wait for a thread: the latencies measure the calls only."""
+        client: HedgedClient = HedgedClient(SlowClient('primary', 0.1), SlowClient('hedge'), concurrency=20)
+        threads: list[threading.Thread] = [threading.Thread(target=client.call, args=(MESSAGES,)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(20, len(client.latencies))
+        self.assertLess(max(client.latencies), 0.19)
+        client.close()
+
+    def test_with_hedging(self):
+        primary: SlowClient = SlowClient('primary')
+        self.assertIs(primary, with_hedging(primary, HiderConfiguration('model', 'token')))
+        hedged = with_hedging(primary, HiderConfiguration('model', 'token', hedge_percentile=95.0, max_hedge_ratio=0.2), SlowClient('hedge'))
+        self.assertIsInstance(hedged, HedgedClient)
+        self.assertEqual(0.2, hedged.max_hedge_ratio)
+        self.assertEqual(2 * 4 + hedging.HEADROOM_WORKERS, hedged.executor._max_workers)
+        hedged.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
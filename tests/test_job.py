@@ -0,0 +1,62 @@
+# Usage:
+# python3 -m unittest -v test_job.py
+
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.job import HideJob, STAGE_CREATED, STAGE_LOADED, STAGE_PROMPTS, STAGE_REQUESTS
+
+
+class TestHideJob(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.job_path: Path = Path(tempfile.gettempdir()).joinpath('whisper-job-test')
+        if self.job_path.exists():
+            shutil.rmtree(self.job_path)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.job_path, ignore_errors=True)
+
+    def test_new_job(self):
+        job = HideJob(self.job_path)
+        self.assertFalse(job.exists())
+        self.assertEqual(job.stage, STAGE_CREATED)
+        self.assertFalse(job.reached(STAGE_LOADED))
+
+    def test_save_and_load(self):
+        job = HideJob(self.job_path)
+        job.needle = 'needle.txt'
+        job.haystack = 'haystack.txt'
+        job.murmur = 'murmur.txt'
+        job.bits_per_sentence = 2
+        job.ecc = 8
+        job.set_stage(STAGE_REQUESTS)
+        job.request_done(0)
+        job.request_done(2)
+
+        loaded = HideJob(self.job_path)
+        self.assertTrue(loaded.exists())
+        self.assertEqual(loaded.needle, 'needle.txt')
+        self.assertEqual(loaded.murmur, 'murmur.txt')
+        self.assertEqual(loaded.bits_per_sentence, 2)
+        self.assertEqual(loaded.ecc, 8)
+        self.assertTrue(loaded.reached(STAGE_PROMPTS))
+        self.assertEqual(loaded.done_requests, [0, 2])
+
+        loaded.new_requests()
+        reloaded = HideJob(self.job_path)
+        self.assertEqual(reloaded.done_requests, [])
+        self.assertTrue(reloaded.reached(STAGE_REQUESTS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# Usage:
+# python3 -m unittest -v test_local_rewriter.py
+
+from typing import Optional
+import re
+import unittest
+import os
+import sys
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.local_rewriter import LocalRewriter, RewriteRule
+from whisper.sentence import Sentence
+
+
+class TestLocalRewriter(unittest.TestCase):
+
+    def test_rule(self):
+        rule = RewriteRule('do not', "don't")
+        self.assertEqual(list(rule.apply('Do not run and do  not shout.')), ["Don't run and do  not shout.", "Do not run and don't shout."])
+        self.assertEqual(list(rule.apply('I do nothing.')), [])
+        rule = RewriteRule('100', 'one hundred')
+        self.assertEqual(list(rule.apply('It costs 100 dollars.')), ['It costs one hundred dollars.'])
+        self.assertEqual(list(rule.apply('It costs 1,100 or 100.5 dollars.')), [])
+
+    def test_rewrite(self):
+        rewriter: LocalRewriter = LocalRewriter.load()
+        inputs: list[tuple[str, int, Optional[str]]] = [
+            ("I do not like the rain.", 1, "I don't like the rain."),
+            ("We cannot stay here.", 1, "We can not stay here."),
+            ("He said that the car was fast.", 0, "He said the car was fast."),
+            ("The road was 100 miles long.", 1, "The road was one hundred miles long."),
+            ("The car moves forward slowly.", 0, None),
+        ]
+        for sentence, parity, expected in inputs:
+            rewrite: Optional[str] = rewriter.rewrite(sentence, parity)
+            self.assertEqual(rewrite, expected)
+            if rewrite is not None:
+                self.assertEqual(len(Sentence(rewrite).get_words()) % 2, parity)
+
+    def test_parity_is_verified(self):
+        # "in order to" <=> "to" does not modify the parity
+        rewriter: LocalRewriter = LocalRewriter([RewriteRule('in order to', 'to')])
+        self.assertIsNone(rewriter.rewrite('He runs in order to win.', 1))
+
+    def test_directions(self):
+        rewriter: LocalRewriter = LocalRewriter([RewriteRule("I am", "I'm", r'\s+\w')])
+        self.assertEqual(["I'm sure."], list(rewriter.candidates('I am sure.')))
+        # A contraction cannot end a clause
+        self.assertEqual([], list(rewriter.candidates('Yes, I am.')))
+
+    def test_corpus(self):
+        """The shipped rules must not break a sentence, or modify its meaning."""
+        rewriter: LocalRewriter = LocalRewriter.load()
+        corpus: list[str] = [
+            "I have seen it before.",
+            "I think so.",
+            "He acts as if he knows.",
+            "Yes, I am.",
+            "I know who they are.",
+            "I will, if you will.",
+            "I'd gone home.",
+            "It's been a long day.",
+            "They let us in.",
+            "I think that is right.",
+            "He said that word again.",
+            "In addition to the car, he has a bike.",
+            "She went outside.",
+            "It was all the same to him.",
+            "They walked one hundred and five miles.",
+            "He can not only run, but also swim.",
+            "I do not know what it is.",
+            "We are sure that they are right.",
+            "He said that the car was fast.",
+            "I think that he knows.",
+        ]
+        # The rewrites that must not be produced
+        broken: list[re.Pattern[str]] = [re.compile(pattern, re.IGNORECASE) for pattern in [
+            r"\b(prior to|so that|in the event that|outside of|inside of|all of the|off of|up until)\W*$",
+            r"\bas in the event that\b",
+            r"\b(I'm|we're|they're|you're|I'll|we'll|they'll|you'll|I'd|it's|that's|he's|she's|what's)[,.!?]",
+            r"\bI would gone\b",
+            r"\bit is been\b",
+            r"\blet's in\b",
+            r"\b(think|said)( that)?( is| word)\b",
+            r"\badditionally to\b",
+            r"\b100 and\b",
+            r"\bcannot only\b",
+        ]]
+        for sentence in corpus:
+            for candidate in rewriter.candidates(sentence):
+                for pattern in broken:
+                    self.assertIsNone(pattern.search(candidate), '"{}" => "{}"'.format(sentence, candidate))
+        self.assertIn("He said the car was fast.", list(rewriter.candidates("He said that the car was fast.")))
+        self.assertIn("I think he knows.", list(rewriter.candidates("I think that he knows.")))
+        self.assertIn("We're sure that they are right.", list(rewriter.candidates("We are sure that they are right.")))
+
+    def test_modulus(self):
+        rewriter: LocalRewriter = LocalRewriter.load()
+        # 6 words, 5 words after the rewrite
+        self.assertEqual("I don't like the rain.", rewriter.rewrite("I do not like the rain.", 1, 4))
+        self.assertIsNone(rewriter.rewrite("I do not like the rain.", 3, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
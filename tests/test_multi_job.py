@@ -0,0 +1,231 @@
+# Usage:
+# python3 -m unittest -v test_multi_job.py
+
+import time
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+BENCHMARKS_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'benchmarks'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'multi-job')
+sys.path.insert(0, SEARCH_PATH)
+sys.path.insert(0, BENCHMARKS_PATH)
+
+from fake_llm import FakeLLM, StatusError
+from whisper.configuration import HiderConfiguration
+from whisper.conversion import Conversion
+from whisper.dispatcher import RateLimiter, backoff_delay, retryable
+from whisper.hedging import HedgedClient
+from whisper.multi_job import MultiJobRunner, JobSpec, ReformulationCache, STATUS_DONE, STATUS_FAILED
+from whisper.revealer import Revealer
+from whisper.sentence import Sentence
+from whisper import Bit
+
+
+def reveal(path: str) -> bytes:
+    with open(path, 'r') as f:
+        bits: list[Bit] = [Bit(len(Sentence(line).get_words()) % 2) for line in f.read().splitlines()]
+    length: int = Conversion.bit_list_to_int64(bits[:64])
+    return Conversion.bit_list_to_bytes(bits[64:64 + length * 8])
+
+
+def write_haystack(path: str, count: int, prefix: str) -> None:
+    with open(path, 'w') as f:
+        for i in range(count):
+            f.write(' '.join(['{}{}'.format(prefix, j) for j in range(3 + i % 4)]) + '.\n')
+
+
+class TestMultiJobRunner(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(WORK_DIR, exist_ok=True)
+        self.config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, concurrency=2)
+
+    def tearDown(self) -> None:
+        for name in os.listdir(WORK_DIR):
+            os.remove(os.path.join(WORK_DIR, name))
+        os.rmdir(WORK_DIR)
+
+    def path(self, name: str) -> str:
+        return os.path.join(WORK_DIR, name)
+
+    def test_run(self):
+        specs: list[JobSpec] = []
+        for i, needle in enumerate(['Hi!', 'Yo', 'Hello']):
+            with open(self.path('needle{}.txt'.format(i)), 'w') as f:
+                f.write(needle)
+            write_haystack(self.path('haystack{}.txt'.format(i)), 120 + i, 'w{}x'.format(i))
+            specs.append(JobSpec(self.path('needle{}.txt'.format(i)), self.path('haystack{}.txt'.format(i)), self.path('murmur{}.txt'.format(i))))
+        client: FakeLLM = FakeLLM(omissions={'w0x0 w0x1 w0x2', 'w1x0 w1x1 w1x2 w1x3'})
+        statuses = MultiJobRunner(specs, self.config, client=client).run()
+        for i, needle in enumerate([b'Hi!', b'Yo', b'Hello']):
+            self.assertEqual(STATUS_DONE, statuses[i].status)
+            self.assertEqual(needle, reveal(specs[i].output))
+            with open(specs[i].output, 'r') as f:
+                self.assertEqual(120 + i, len(f.read().splitlines()))
+        self.assertGreater(statuses[0].retries, 0)
+        self.assertGreater(statuses[1].retries, 0)
+        self.assertEqual(0, statuses[2].retries)
+        # The prompts of the jobs are packed into shared requests (50 prompts per request)
+        llm_sentences: int = sum(s.llm_sentences for s in statuses)
+        self.assertLessEqual(client.calls, (llm_sentences + 49) // 50 + 2)
+
+    def test_encoding(self):
+        """The jobs hide several bits into each sentence, and protect their needles with the error correcting code."""
+        write_haystack(self.path('haystack.txt'), 150, 'w')
+        with open(self.path('needle.txt'), 'w') as f:
+            f.write('Hi!')
+        config: HiderConfiguration = HiderConfiguration('model', 'token', concurrency=2, bits_per_sentence=2, ecc=4)
+        specs: list[JobSpec] = [JobSpec(self.path('needle.txt'), self.path('haystack.txt'), self.path('murmur.txt'))]
+        self.assertEqual(STATUS_DONE, MultiJobRunner(specs, config, client=FakeLLM()).run()[0].status)
+        self.assertEqual(b'Hi!', Revealer(self.path('murmur.txt'), self.path('revealed.txt'), ecc=4, bits_per_sentence=2).decode())
+
+    def test_hedging(self):
+        write_haystack(self.path('haystack.txt'), 150, 'w')
+        with open(self.path('needle.txt'), 'w') as f:
+            f.write('Hi!')
+        client: HedgedClient = HedgedClient(FakeLLM(), FakeLLM(), hedge_percentile=50.0)
+        runner: MultiJobRunner = MultiJobRunner([JobSpec(self.path('needle.txt'), self.path('haystack.txt'), self.path('murmur.txt'))], self.config, client=client)
+        self.assertEqual(STATUS_DONE, runner.run()[0].status)
+        self.assertIs(client.stats, runner.hedge_stats)
+        self.assertGreater(runner.hedge_stats.calls, 0)
+        with self.assertRaises(RuntimeError):
+            client.executor.submit(print)
+
+    def test_haystack_index(self):
+        # Two needles in the same haystack: its index is built once, in the directory of the indexes
+        write_haystack(self.path('haystack.txt'), 150, 'w')
+        specs: list[JobSpec] = []
+        for i, needle in enumerate(['Hi!', 'Yo']):
+            with open(self.path('needle{}.txt'.format(i)), 'w') as f:
+                f.write(needle)
+            specs.append(JobSpec(self.path('needle{}.txt'.format(i)), self.path('haystack.txt'), self.path('murmur{}.txt'.format(i))))
+        config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, concurrency=2, haystack_index=True, index_dir=Path(WORK_DIR))
+        runner: MultiJobRunner = MultiJobRunner(specs, config, client=FakeLLM())
+        statuses = runner.run()
+        self.assertEqual({}, runner.indexes)
+        self.assertEqual(1, len([name for name in os.listdir(WORK_DIR) if name.endswith('.index')]))
+        for i, needle in enumerate([b'Hi!', b'Yo']):
+            self.assertEqual(STATUS_DONE, statuses[i].status)
+            self.assertEqual(needle, reveal(specs[i].output))
+            with open(specs[i].output, 'r') as f:
+                self.assertEqual(150, len(f.read().splitlines()))
+
+    def test_shared_cache(self):
+        specs: list[JobSpec] = []
+        with open(self.path('needle.txt'), 'w') as f:
+            f.write('Hi!')
+        write_haystack(self.path('haystack.txt'), 100, 'w')
+        for i in range(3):
+            specs.append(JobSpec(self.path('needle.txt'), self.path('haystack.txt'), self.path('murmur{}.txt'.format(i))))
+        client: FakeLLM = FakeLLM()
+        cache: ReformulationCache = ReformulationCache()
+        statuses = MultiJobRunner(specs, self.config, client=client, cache=cache).run()
+        for i in range(3):
+            self.assertEqual(STATUS_DONE, statuses[i].status)
+            self.assertEqual(b'Hi!', reveal(specs[i].output))
+        # The haystack contains only 4 distinct sentences: each one is sent once
+        self.assertLessEqual(client.prompts, 4)
+
+        # A second run only uses the cache
+        statuses = MultiJobRunner(specs[:1], self.config, client=client, cache=cache).run()
+        self.assertEqual(STATUS_DONE, statuses[0].status)
+        self.assertEqual(statuses[0].llm_sentences, statuses[0].cache_hits)
+
+    def test_failure(self):
+        with open(self.path('needle.txt'), 'w') as f:
+            f.write('Hi!')
+        write_haystack(self.path('haystack.txt'), 100, 'w')
+        write_haystack(self.path('short.txt'), 10, 's')
+        specs: list[JobSpec] = [JobSpec(self.path('missing.txt'), self.path('haystack.txt'), self.path('murmur0.txt')),
+                                JobSpec(self.path('needle.txt'), self.path('short.txt'), self.path('murmur1.txt')),
+                                JobSpec(self.path('needle.txt'), self.path('haystack.txt'), self.path('murmur2.txt'))]
+        statuses = MultiJobRunner(specs, self.config, client=FakeLLM()).run()
+        self.assertEqual(STATUS_FAILED, statuses[0].status)
+        self.assertEqual(STATUS_FAILED, statuses[1].status)
+        self.assertIn('not wide enough', statuses[1].error)
+        self.assertEqual(STATUS_DONE, statuses[2].status)
+        self.assertEqual(b'Hi!', reveal(specs[2].output))
+        self.assertEqual('failed', statuses[1].to_dict()['status'])
+
+    def test_max_attempts(self):
+        with open(self.path('needle.txt'), 'w') as f:
+            f.write('Hi!')
+        write_haystack(self.path('haystack.txt'), 100, 'w')
+        specs: list[JobSpec] = [JobSpec(self.path('needle.txt'), self.path('haystack.txt'), self.path('murmur.txt'))]
+        client: FakeLLM = FakeLLM(omissions={'w0 w1 w2'})
+        statuses = MultiJobRunner(specs, self.config, client=client, max_attempts=1).run()
+        self.assertEqual(STATUS_FAILED, statuses[0].status)
+        self.assertFalse(os.path.exists(specs[0].output))
+
+    def test_errors(self):
+        """A failed request is retried a bounded number of times, and an invalid key fails the jobs at once."""
+        with open(self.path('needle.txt'), 'w') as f:
+            f.write('Hi!')
+        write_haystack(self.path('haystack.txt'), 100, 'w')
+        specs: list[JobSpec] = [JobSpec(self.path('needle.txt'), self.path('haystack.txt'), self.path('murmur.txt'))]
+        client: FakeLLM = FakeLLM(error=RuntimeError('connection reset'))
+        statuses = MultiJobRunner(specs, self.config, client=client, max_attempts=3, backoff=0.0).run()
+        self.assertEqual(STATUS_FAILED, statuses[0].status)
+        self.assertIn('connection reset', statuses[0].error)
+        self.assertEqual(3, client.calls)
+        client = FakeLLM(error=StatusError(401))
+        statuses = MultiJobRunner(specs, self.config, client=client, backoff=0.0).run()
+        self.assertEqual(STATUS_FAILED, statuses[0].status)
+        self.assertIn('401', statuses[0].error)
+        self.assertEqual(1, client.calls)
+        self.assertFalse(os.path.exists(specs[0].output))
+
+    def test_backoff(self):
+        self.assertEqual(0.0, backoff_delay(0))
+        self.assertEqual([1.0, 2.0, 4.0, 8.0], [backoff_delay(n) for n in range(1, 5)])
+        self.assertEqual(60.0, backoff_delay(20))
+        self.assertTrue(retryable(RuntimeError('timeout')))
+        self.assertTrue(retryable(StatusError(429)))
+        self.assertFalse(retryable(StatusError(401)))
+
+    def test_load_manifest(self):
+        with open(self.path('manifest.jsonl'), 'w') as f:
+            f.write('{"needle": "n1", "haystack": "h1", "output": "o1"}\n\n{"needle": "n2", "haystack": "h2", "output": "o2"}\n')
+        specs: list[JobSpec] = MultiJobRunner.load_manifest(self.path('manifest.jsonl'))
+        self.assertEqual([JobSpec('n1', 'h1', 'o1'), JobSpec('n2', 'h2', 'o2')], specs)
+
+
+class TestReformulationCache(unittest.TestCase):
+
+    def test_lru(self):
+        cache: ReformulationCache = ReformulationCache(2)
+        cache.put('a', 0, 'A')
+        cache.put('b', 0, 'B')
+        self.assertEqual('A', cache.get('a', 0))
+        cache.put('c', 0, 'C')
+        self.assertIsNone(cache.get('b', 0))
+        self.assertEqual('A', cache.get('a', 0))
+        self.assertEqual('C', cache.get('c', 0))
+        self.assertIsNone(cache.get('a', 1))
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_acquire(self):
+        limiter: RateLimiter = RateLimiter(1200) # one request every 50 ms
+        start: float = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_no_limit(self):
+        limiter: RateLimiter = RateLimiter()
+        start: float = time.monotonic()
+        for _ in range(1000):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - start, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# Usage:
+# python3 -m unittest -v test_pipeline.py
+
+import unittest
+import os
+import sys
+import tempfile
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+BENCHMARKS_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'benchmarks'))
+NEEDLE_PATH: str = os.path.join(tempfile.gettempdir(), 'pipeline-needle.txt')
+HAYSTACK_PATH: str = os.path.join(tempfile.gettempdir(), 'pipeline-haystack.txt')
+MURMUR_PATH: str = os.path.join(tempfile.gettempdir(), 'pipeline-murmur.txt')
+sys.path.insert(0, SEARCH_PATH)
+sys.path.insert(0, BENCHMARKS_PATH)
+
+from fake_llm import FakeLLM, StatusError
+from whisper.configuration import HiderConfiguration
+from whisper.conversion import Conversion
+from whisper.hedging import HedgedClient
+from whisper.pipeline import StreamingHider
+from whisper.revealer import Revealer
+from whisper.sentence import Sentence
+from whisper import Bit
+
+
+def reveal(path: str) -> bytes:
+    with open(path, 'r') as f:
+        bits: list[Bit] = [Bit(len(Sentence(line).get_words()) % 2) for line in f.read().splitlines()]
+    length: int = Conversion.bit_list_to_int64(bits[:64])
+    return Conversion.bit_list_to_bytes(bits[64:64 + length * 8])
+
+
+class TestStreamingHider(unittest.TestCase):
+
+    def setUp(self) -> None:
+        with open(NEEDLE_PATH, 'w') as f:
+            f.write('Hi!')
+        with open(HAYSTACK_PATH, 'w') as f:
+            for i in range(150):
+                f.write(' '.join(['word{}'.format(j) for j in range(3 + i % 4)]) + '.\n')
+
+    def tearDown(self) -> None:
+        for path in (NEEDLE_PATH, HAYSTACK_PATH, MURMUR_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_hide(self):
+        config = HiderConfiguration('fake', 'token', concurrency=3)
+        client = FakeLLM()
+        hider = StreamingHider(NEEDLE_PATH, HAYSTACK_PATH, MURMUR_PATH, config, client, window=16, flush_interval=0.05)
+        hider.hide()
+        self.assertEqual(reveal(MURMUR_PATH), b'Hi!')
+        with open(MURMUR_PATH, 'r') as f:
+            lines: list[str] = f.read().splitlines()
+        self.assertEqual(len(lines), 150)
+        # The sentences that do not hide the needle are copied
+        self.assertEqual(lines[-1], 'word0 word1 word2 word3.')
+        self.assertGreater(hider.stats.requests, 1)
+        self.assertEqual(hider.stats.retries, 0)
+
+    def test_encoding(self):
+        """The pipeline hides several bits into each sentence, and protects the needle with the error correcting code."""
+        config = HiderConfiguration('fake', 'token', concurrency=2, bits_per_sentence=2, ecc=4)
+        hider = StreamingHider(NEEDLE_PATH, HAYSTACK_PATH, MURMUR_PATH, config, FakeLLM(), flush_interval=0.05)
+        hider.hide()
+        revealed: str = os.path.join(tempfile.gettempdir(), 'pipeline-revealed.txt')
+        try:
+            self.assertEqual(b'Hi!', Revealer(MURMUR_PATH, revealed, ecc=4, bits_per_sentence=2).decode())
+        finally:
+            if os.path.exists(revealed):
+                os.remove(revealed)
+
+    def test_hedging(self):
+        """The statistics of the hedged requests are reported, and the threads of the hedged client are released."""
+        config = HiderConfiguration('fake', 'token', concurrency=2)
+        client = HedgedClient(FakeLLM(), FakeLLM(), hedge_percentile=50.0)
+        hider = StreamingHider(NEEDLE_PATH, HAYSTACK_PATH, MURMUR_PATH, config, client, window=16, flush_interval=0.05)
+        hider.hide()
+        self.assertEqual(reveal(MURMUR_PATH), b'Hi!')
+        self.assertIs(client.stats, hider.stats.hedge)
+        self.assertEqual(hider.stats.requests, hider.stats.hedge.calls)
+        with self.assertRaises(RuntimeError):
+            client.executor.submit(print)
+
+    def test_retries(self):
+        config = HiderConfiguration('fake', 'token', concurrency=2, local_rewrite=False)
+        client = FakeLLM(failures=set(range(1, 88, 2)), omissions=set(range(0, 88, 2)))
+        hider = StreamingHider(NEEDLE_PATH, HAYSTACK_PATH, MURMUR_PATH, config, client, flush_interval=0.05)
+        hider.hide()
+        self.assertEqual(reveal(MURMUR_PATH), b'Hi!')
+        self.assertGreater(hider.stats.retries, 0)
+
+    def test_max_attempts(self):
+        config = HiderConfiguration('fake', 'token', concurrency=1, local_rewrite=False)
+        client = FakeLLM(failures=set(range(0, 88)))
+        hider = StreamingHider(NEEDLE_PATH, HAYSTACK_PATH, MURMUR_PATH, config, client, flush_interval=0.05, max_attempts=1)
+        self.assertRaises(RuntimeError, hider.hide)
+
+    def test_errors(self):
+        """A failed request is sent again after a backoff, until the sentence reaches its maximum number of attempts."""
+        config = HiderConfiguration('fake', 'token', concurrency=2, local_rewrite=False)
+        client = FakeLLM(error=RuntimeError('connection reset'), errors=3)
+        hider = StreamingHider(NEEDLE_PATH, HAYSTACK_PATH, MURMUR_PATH, config, client, flush_interval=0.05, backoff=0.01)
+        hider.hide()
+        self.assertEqual(reveal(MURMUR_PATH), b'Hi!')
+        self.assertGreaterEqual(hider.stats.retries, 3)
+        client = FakeLLM(error=RuntimeError('connection reset'))
+        hider = StreamingHider(NEEDLE_PATH, HAYSTACK_PATH, MURMUR_PATH, config, client, flush_interval=0.05, max_attempts=3, backoff=0.0)
+        with self.assertRaisesRegex(RuntimeError, 'connection reset'):
+            hider.hide()
+        self.assertLess(client.calls, 100)
+
+    def test_invalid_key(self):
+        """An error that cannot be fixed by retrying stops the pipeline at once."""
+        config = HiderConfiguration('fake', 'token', concurrency=1, local_rewrite=False)
+        client = FakeLLM(error=StatusError(401))
+        hider = StreamingHider(NEEDLE_PATH, HAYSTACK_PATH, MURMUR_PATH, config, client, flush_interval=0.05)
+        with self.assertRaisesRegex(RuntimeError, '401'):
+            hider.hide()
+        self.assertEqual(1, client.calls)
+
+    def test_haystack_too_small(self):
+        with open(HAYSTACK_PATH, 'w') as f:
+            f.write('This is too short.')
+        config = HiderConfiguration('fake', 'token', concurrency=1)
+        hider = StreamingHider(NEEDLE_PATH, HAYSTACK_PATH, MURMUR_PATH, config, FakeLLM(), flush_interval=0.05)
+        self.assertRaises(ValueError, hider.hide)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+# Usage:
+# python3 -m unittest -v test_pricing.py
+
+import unittest
+import os
+import sys
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.pricing import MODEL_PRICES, get_pricing, cost
+
+
+class TestPricing(unittest.TestCase):
+
+    def test_get_pricing(self):
+        self.assertEqual(MODEL_PRICES['gpt-4.1'], get_pricing('gpt-4.1'))
+        self.assertEqual(MODEL_PRICES['gpt-4.1'], get_pricing('gpt-4.1-2025-04-14'))
+        self.assertEqual(MODEL_PRICES['gpt-4.1-mini'], get_pricing('gpt-4.1-mini-2025-04-14'))
+        self.assertIsNone(get_pricing('gpt-4.10'))
+        self.assertIsNone(get_pricing('unknown'))
+
+    def test_cost(self):
+        self.assertAlmostEqual(2.0 + 8.0, cost(MODEL_PRICES['gpt-4.1'], 1000000, 1000000))
+        self.assertAlmostEqual(5.0, cost(MODEL_PRICES['gpt-4.1'], 1000000, 1000000, batch_mode=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
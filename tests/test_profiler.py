@@ -0,0 +1,114 @@
+# Usage:
+# python3 -m unittest -v test_profiler.py
+
+import json
+import sqlite3
+import threading
+import unittest
+import os
+import sys
+import tempfile
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+PROFILE_PATH: str = os.path.join(tempfile.gettempdir(), 'profiler-profile.json')
+TRACE_PATH: str = os.path.join(tempfile.gettempdir(), 'profiler-profile.trace.json')
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.profiler import Profiler, DISABLED, percentile
+
+
+class TestProfiler(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        for path in (PROFILE_PATH, TRACE_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_percentile(self):
+        values: list[float] = [float(v) for v in range(1, 101)]
+        self.assertEqual(50.0, percentile(values, 50))
+        self.assertEqual(90.0, percentile(values, 90))
+        self.assertEqual(100.0, percentile(values, 100))
+        self.assertEqual(1.0, percentile([1.0], 99))
+        self.assertEqual(0.0, percentile([], 50))
+
+    def test_report(self):
+        profiler: Profiler = Profiler()
+        for _ in range(3):
+            with profiler.stage('stage'):
+                pass
+        profiler.count('counter')
+        profiler.count('counter', 4)
+        for v in (0.1, 0.2, 0.3):
+            profiler.latency('call', v)
+        report = profiler.report()
+        self.assertEqual(3, report['stages']['stage']['calls'])
+        self.assertEqual(5, report['counters']['counter'])
+        self.assertEqual(3, report['latencies']['call']['count'])
+        self.assertEqual(0.2, report['latencies']['call']['p50'])
+        self.assertEqual(0.3, report['latencies']['call']['max'])
+
+    def test_stage_error(self):
+        profiler: Profiler = Profiler()
+        with self.assertRaises(ValueError):
+            with profiler.stage('stage'):
+                raise ValueError()
+        self.assertEqual(1, profiler.report()['stages']['stage']['calls'])
+
+    def test_threads(self):
+        profiler: Profiler = Profiler()
+
+        def work() -> None:
+            for _ in range(1000):
+                profiler.count('counter')
+
+        threads: list[threading.Thread] = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(4000, profiler.report()['counters']['counter'])
+
+    def test_trace_sqlite(self):
+        profiler: Profiler = Profiler()
+        db: sqlite3.Connection = sqlite3.connect(':memory:')
+        profiler.trace_sqlite(db, 'db')
+        db.execute('CREATE TABLE t (v INTEGER)')
+        db.execute('INSERT INTO t VALUES (1)')
+        db.execute('INSERT INTO t VALUES (2)')
+        db.commit()
+        db.close()
+        counters = profiler.report()['counters']
+        self.assertEqual(1, counters['sqlite.db.commits'])
+        self.assertGreaterEqual(counters['sqlite.db.statements'], 3)
+
+    def test_disabled(self):
+        with DISABLED.stage('stage'):
+            pass
+        DISABLED.count('counter')
+        DISABLED.latency('call', 1.0)
+        db: sqlite3.Connection = sqlite3.connect(':memory:')
+        DISABLED.trace_sqlite(db, 'db')
+        db.execute('CREATE TABLE t (v INTEGER)')
+        db.close()
+        self.assertEqual({'stages': {}, 'counters': {}, 'latencies': {}}, DISABLED.report())
+
+    def test_write(self):
+        profiler: Profiler = Profiler()
+        with profiler.stage('outer'):
+            with profiler.stage('inner'):
+                pass
+        profiler.write(PROFILE_PATH)
+        with open(PROFILE_PATH, 'r') as f:
+            self.assertIn('outer', json.load(f)['stages'])
+        with open(TRACE_PATH, 'r') as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual(['inner', 'outer'], [e['name'] for e in events])
+        self.assertEqual('X', events[0]['ph'])
+        self.assertLessEqual(events[1]['ts'], events[0]['ts'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# Usage:
+# python3 -m unittest -v test_prompts.py
+
+import unittest
+import os
+import sys
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.local_rewriter import LocalRewriter
+from whisper.prompts import target_words_count, hide_prompt, decide_sentence, valid_reformulation, KEEP, PROMPT, REWRITE
+
+
+class TestPrompts(unittest.TestCase):
+
+    def test_target_words_count(self):
+        # The nearest number of words with the expected remainder
+        self.assertEqual(9, target_words_count(10, 1, 4))
+        self.assertEqual(9, target_words_count(10, 1, 8))
+        self.assertEqual(7, target_words_count(10, 7, 8))
+        self.assertEqual(11, target_words_count(10, 3, 8))
+        # Never less than one word
+        self.assertEqual(8, target_words_count(2, 0, 8))
+        self.assertEqual(1, target_words_count(2, 1, 4))
+
+    def test_hide_prompt(self):
+        self.assertIn('**impair** de mots : "One two."', hide_prompt('One two.', 2, 1))
+        self.assertIn('exactement **3** mots : "One two."', hide_prompt('One two.', 2, 3, 4))
+
+    def test_decide_sentence(self):
+        self.assertEqual((KEEP, 'One two.'), decide_sentence('One two.', 2, 0))
+        self.assertEqual((KEEP, 'One two.'), decide_sentence('One two.', 2, 2, 4))
+        self.assertEqual((PROMPT, hide_prompt('One two.', 2, 1)), decide_sentence('One two.', 2, 1))
+        self.assertEqual((PROMPT, hide_prompt('One two.', 2, 3, 4)), decide_sentence('One two.', 2, 3, 4, LocalRewriter.load()))
+        self.assertEqual((REWRITE, "I don't know."), decide_sentence('I do not know.', 4, 1, 2, LocalRewriter.load()))
+
+    def test_valid_reformulation(self):
+        self.assertEqual('One two three.', valid_reformulation('One two three', 1))
+        self.assertEqual('One two three.', valid_reformulation('One two three.', 3, 4))
+        self.assertIsNone(valid_reformulation('One two three.', 0))
+        self.assertIsNone(valid_reformulation(None, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -52,6 +52,22 @@ class RequestDataTest(unittest.TestCase):
         request_dict = request_data.to_dict()
         self.assertDictEqual(request_dict, data)
 
+    def test_dict_from_json(self):
+        data = {
+            'positions': [0, 1],
+            'messages': [{ 'role': 'system', 'content': 'p1' },
+                         { 'role': 'user',   'content': 'p2' }]
+        }
+        request_data = RequestData.from_dict(data)
+        self.assertDictEqual(RequestData.dict_from_json(request_data.to_json()), data)
+        self.assertNotIn('\n', request_data.to_json())
+        with self.assertRaises(ValueError):
+            RequestData.dict_from_json('{"positions": [0]}')
+        with self.assertRaises(ValueError):
+            RequestData.dict_from_json('{"positions": [0], "messages": [{"role": "user"}]}')
+        with self.assertRaises(ValueError):
+            RequestData.from_json('not json')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,69 @@
+# Usage:
+# python3 -m unittest -v test_response_parser.py
+
+import json
+import unittest
+import os
+import sys
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.response_parser import parse_response, ParsedResponse
+
+
+class TestResponseParser(unittest.TestCase):
+
+    def test_valid(self):
+        response = json.dumps({'results': [{'id': 4, 'text': 'four'}, {'id': 2, 'text': 'two'}]})
+        parsed: ParsedResponse = parse_response(response, [2, 4])
+        self.assertEqual(parsed.matched, {2: 'two', 4: 'four'})
+        self.assertEqual(parsed.missing, [])
+        self.assertFalse(parsed.repaired)
+
+    def test_missing_and_invalid_items(self):
+        response = json.dumps({'results': [{'id': 2, 'text': 'two'}, {'id': 9, 'text': 'unknown'}, {'id': 5, 'text': ' '}]})
+        parsed: ParsedResponse = parse_response(response, [2, 4, 5])
+        self.assertEqual(parsed.matched, {2: 'two'})
+        self.assertEqual(parsed.missing, [4, 5])
+
+    def test_code_fences_and_trailing_commas(self):
+        response = 'Here it is:\n```json\n{"results": [{"id": 1, "text": "one"}, {"id": 3, "text": "three"},],}\n```'
+        parsed: ParsedResponse = parse_response(response, [1, 3])
+        self.assertEqual(parsed.matched, {1: 'one', 3: 'three'})
+        self.assertTrue(parsed.repaired)
+
+    def test_truncated(self):
+        response = '{"results": [{"id": 1, "text": "one"}, {"id": 3, "text": "three"'
+        parsed: ParsedResponse = parse_response(response, [1, 3])
+        self.assertEqual(parsed.matched, {1: 'one', 3: 'three'})
+        # A truncated reformulation is never accepted
+        for response in ['{"results": [{"id": 1, "text": "one"}, {"id": 3, "text": "thr',
+                         '{"results": [{"id": 1, "text": "one"}, {"id": 3, "te']:
+            parsed = parse_response(response, [1, 3])
+            self.assertEqual(parsed.matched, {1: 'one'})
+            self.assertEqual(parsed.missing, [3])
+
+    def test_salvage(self):
+        response = '{"results": [{"id": 1, "text": "one"} {"id": 3, "text": "three \\"quoted\\""}} oops'
+        parsed: ParsedResponse = parse_response(response, [1, 3])
+        self.assertEqual(parsed.matched, {1: 'one', 3: 'three "quoted"'})
+
+    def test_legacy_format(self):
+        parsed: ParsedResponse = parse_response(json.dumps({'results': ['a', 'b']}), [7, 8])
+        self.assertEqual(parsed.matched, {7: 'a', 8: 'b'})
+        # The elements cannot be matched to the sentences
+        parsed = parse_response(json.dumps({'results': ['a']}), [7, 8])
+        self.assertEqual(parsed.matched, {})
+        self.assertEqual(parsed.missing, [7, 8])
+
+    def test_not_json(self):
+        parsed: ParsedResponse = parse_response('I cannot do that.', [1])
+        self.assertEqual(parsed.matched, {})
+        self.assertEqual(parsed.missing, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
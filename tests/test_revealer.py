@@ -0,0 +1,89 @@
+# Usage:
+# python3 -m unittest -v test_revealer.py
+
+import unittest
+import os
+import sys
+import tempfile
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+MURMUR_PATH: str = os.path.join(tempfile.gettempdir(), 'revealer-murmur.txt')
+OUTPUT_PATH: str = os.path.join(tempfile.gettempdir(), 'revealer-needle.txt')
+sys.path.insert(0, SEARCH_PATH)
+
+from whisper.conversion import Conversion
+from whisper.message import Message
+from whisper.revealer import Revealer
+from whisper import Bit, Int64
+
+
+def write_murmur(path: str, needle: bytes, extra: int = 5, truncate: int = 0) -> None:
+    bits: list[Bit] = Conversion.int64_to_bit_list(Int64(len(needle))) + Conversion.bytes_to_bit_list(needle)
+    bits = bits[:len(bits) - truncate]
+    with open(path, 'w') as f:
+        for bit in bits:
+            f.write(('One two three.' if bit == 1 else 'One two three four.') + '\n')
+        for _ in range(extra):
+            f.write('One two three four five.\n')
+
+
+class TestRevealer(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        for path in (MURMUR_PATH, OUTPUT_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_reveal(self):
+        write_murmur(MURMUR_PATH, b'Hello, world!')
+        Revealer(MURMUR_PATH, OUTPUT_PATH).reveal()
+        with open(OUTPUT_PATH, 'r') as f:
+            self.assertEqual('Hello, world!', f.read())
+
+    def test_decode_empty(self):
+        write_murmur(MURMUR_PATH, b'', extra=0)
+        self.assertEqual(b'', Revealer(MURMUR_PATH, OUTPUT_PATH).decode())
+
+    def test_too_short(self):
+        with open(MURMUR_PATH, 'w') as f:
+            f.write('One two.\n' * 63)
+        with self.assertRaises(ValueError):
+            Revealer(MURMUR_PATH, OUTPUT_PATH).decode()
+
+    def test_ecc(self):
+        bits: list[Bit] = Message.string_to_vector('Hello, world!', ecc=4)
+        # Flip two bits of the length block and three bits of one byte of the body
+        for i in (3, 50, 100, 101, 103):
+            bits[i] = 1 - bits[i]
+        with open(MURMUR_PATH, 'w') as f:
+            for bit in bits:
+                f.write(('One two three.' if bit == 1 else 'One two three four.') + '\n')
+        self.assertEqual(b'Hello, world!', Revealer(MURMUR_PATH, OUTPUT_PATH, ecc=4).decode())
+        self.assertEqual(b'Hello, world!', Revealer(MURMUR_PATH, OUTPUT_PATH, fast=False, ecc=4).decode())
+        # Too many errors in the length block
+        with open(MURMUR_PATH, 'w') as f:
+            for i, bit in enumerate(bits):
+                f.write(('One two three.' if (bit == 1) != (i in (8, 16, 24)) else 'One two three four.') + '\n')
+        with self.assertRaises(ValueError):
+            Revealer(MURMUR_PATH, OUTPUT_PATH, ecc=4).decode()
+
+    def test_bits_per_sentence(self):
+        bits: list[Bit] = Message.string_to_vector('Hello, world!')
+        for k in (2, 3):
+            with open(MURMUR_PATH, 'w') as f:
+                for symbol in Conversion.bit_list_to_symbols(bits, k):
+                    f.write(' '.join(['word'] * (symbol + (1 << k))) + '.\n')
+                f.write('One.\n')
+            self.assertEqual(b'Hello, world!', Revealer(MURMUR_PATH, OUTPUT_PATH, bits_per_sentence=k).decode())
+            self.assertEqual(b'Hello, world!', Revealer(MURMUR_PATH, OUTPUT_PATH, fast=False, bits_per_sentence=k).decode())
+
+    def test_truncated(self):
+        write_murmur(MURMUR_PATH, b'Hello', extra=0, truncate=3)
+        with self.assertRaises(ValueError):
+            Revealer(MURMUR_PATH, OUTPUT_PATH).decode()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+# Usage:
+# python3 -m unittest -v test_shards.py
+
+from typing import Any, Optional
+import shutil
+import time
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+BENCHMARKS_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'benchmarks'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'shards')
+sys.path.insert(0, SEARCH_PATH)
+sys.path.insert(0, BENCHMARKS_PATH)
+
+from fake_llm import FakeLLM, StatusError
+from whisper.configuration import HiderConfiguration
+from whisper.hedging import HedgedClient
+from whisper.revealer import Revealer
+from whisper.shards import ShardQueue, ShardTask, merge_shards, run_worker, run_workers, shard_output, \
+    MAX_SHARD_ATTEMPTS, SHARD_CLAIMED, SHARD_DONE, SHARD_FAILED, SHARD_PENDING
+
+
+class TestShards(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(WORK_DIR, exist_ok=True)
+        self.shard_dir: Path = Path(WORK_DIR).joinpath('queue')
+        self.needle: str = os.path.join(WORK_DIR, 'needle.txt')
+        self.haystack: str = os.path.join(WORK_DIR, 'haystack.txt')
+        self.murmur: str = os.path.join(WORK_DIR, 'murmur.txt')
+        with open(self.needle, 'w') as f:
+            f.write('Sharded secret')
+        with open(self.haystack, 'w') as f:
+            for i in range(250):
+                f.write(' '.join(['word{}'.format(j) for j in range(3 + i % 4)]) + '.\n')
+        self.config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, concurrency=2)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(WORK_DIR)
+
+    def reveal(self) -> bytes:
+        return Revealer(self.murmur, os.path.join(WORK_DIR, 'revealed.txt')).decode()
+
+    def publish(self, shard_size: int = 50) -> ShardQueue:
+        return ShardQueue.publish(self.shard_dir, self.needle, self.haystack, self.murmur, self.config, shard_size)
+
+    def test_publish(self) -> None:
+        queue: ShardQueue = self.publish()
+        # 64 bits for the length, then 14 characters
+        needle_sentences: int = 64 + 14 * 8
+        shards: list[ShardTask] = queue.shards()
+        self.assertEqual(4, len(shards))
+        self.assertEqual([(0, 50), (50, 100), (100, 150), (150, needle_sentences)], [(s.start, s.stop) for s in shards])
+        self.assertEqual({SHARD_PENDING: 4, SHARD_CLAIMED: 0, SHARD_DONE: 0, SHARD_FAILED: 0}, queue.counts())
+        self.assertEqual(needle_sentences, len(queue.meta()['symbols']))
+        queue.close()
+        with self.assertRaises(ValueError):
+            self.publish()
+        # The index of the haystack is built when the shards are published
+        self.assertTrue(os.path.exists(self.haystack + '.index'))
+        with open(self.needle, 'w') as f:
+            f.write('A needle too long for the haystack')
+        with self.assertRaises(ValueError):
+            ShardQueue.publish(Path(WORK_DIR).joinpath('other'), self.needle, self.haystack, self.murmur, self.config)
+
+    def test_claim(self) -> None:
+        queue: ShardQueue = self.publish(100)
+        first: Optional[ShardTask] = queue.claim('a')
+        second: Optional[ShardTask] = queue.claim('b')
+        self.assertEqual(1, first.id)
+        self.assertEqual(2, second.id)
+        # Both shards are claimed, and their leases have not expired
+        self.assertIsNone(queue.claim('c'))
+        self.assertFalse(queue.finished())
+        queue.complete(first, 'a')
+        # The lease of the straggler expires: its shard is given to another worker
+        time.sleep(0.05)
+        taken: Optional[ShardTask] = queue.claim('c', lease=0.01)
+        self.assertEqual(2, taken.id)
+        self.assertEqual(2, taken.attempts)
+        self.assertFalse(queue.heartbeat(second, 'b'))
+        self.assertTrue(queue.heartbeat(taken, 'c'))
+        queue.complete(taken, 'c')
+        self.assertTrue(queue.finished())
+        self.assertEqual(2, queue.counts()[SHARD_DONE])
+        queue.close()
+
+    def test_fail(self) -> None:
+        queue: ShardQueue = self.publish(1000)
+        for attempt in range(1, MAX_SHARD_ATTEMPTS + 1):
+            task: Optional[ShardTask] = queue.claim('a')
+            self.assertEqual(attempt, task.attempts)
+            queue.fail(task, 'a', 'error {}'.format(attempt))
+        self.assertIsNone(queue.claim('a'))
+        self.assertTrue(queue.finished())
+        self.assertEqual([(1, 'error {}'.format(MAX_SHARD_ATTEMPTS))], queue.errors())
+        queue.close()
+        with self.assertRaises(ValueError):
+            merge_shards(self.shard_dir)
+
+    def test_expired_lease(self) -> None:
+        """A shard whose workers die is not claimed again after MAX_SHARD_ATTEMPTS claims."""
+        queue: ShardQueue = self.publish(1000)
+        for attempt in range(1, MAX_SHARD_ATTEMPTS + 1):
+            time.sleep(0.05)
+            task: Optional[ShardTask] = queue.claim('dead {}'.format(attempt), lease=0.01)
+            self.assertEqual(attempt, task.attempts)
+        time.sleep(0.05)
+        self.assertIsNone(queue.claim('alive', lease=0.01))
+        self.assertTrue(queue.finished())
+        self.assertEqual(1, queue.counts()[SHARD_FAILED])
+        self.assertEqual(1, len(queue.errors()))
+        # The last worker has lost its shard
+        self.assertFalse(queue.heartbeat(task, 'dead {}'.format(MAX_SHARD_ATTEMPTS)))
+        queue.close()
+
+    def test_workers(self) -> None:
+        self.publish(20).close()
+        stats: list[dict[str, Any]] = run_workers(self.shard_dir, self.config, workers=3, client=FakeLLM())
+        self.assertEqual(3, len(stats))
+        self.assertEqual(9, sum(s['shards'] for s in stats))
+        self.assertEqual(64 + 14 * 8, sum(s['sentences'] for s in stats))
+        self.assertEqual(0, sum(s['failed_shards'] for s in stats))
+        self.assertEqual(self.murmur, merge_shards(self.shard_dir))
+        self.assertEqual(b'Sharded secret', self.reveal())
+        with open(self.murmur, 'r') as f:
+            # The sentences that do not bear the needle are copied
+            self.assertEqual(250, len(f.read().splitlines()))
+
+    def test_straggler(self) -> None:
+        queue: ShardQueue = self.publish(100)
+        # A worker claims a shard and dies
+        dead: Optional[ShardTask] = queue.claim('dead')
+        queue.close()
+        time.sleep(0.05)
+        stats: dict[str, Any] = run_worker(self.shard_dir, self.config, FakeLLM(), 'alive', lease=0.01)
+        self.assertEqual(2, stats['shards'])
+        self.assertTrue(shard_output(self.shard_dir, dead.id).exists())
+        merge_shards(self.shard_dir)
+        self.assertEqual(b'Sharded secret', self.reveal())
+
+    def test_hedging(self) -> None:
+        self.publish(100).close()
+        client: HedgedClient = HedgedClient(FakeLLM(), FakeLLM(), hedge_percentile=50.0)
+        stats: dict[str, Any] = run_worker(self.shard_dir, self.config, client, 'hedged')
+        self.assertEqual(client.stats.to_dict(), stats['hedge'])
+        self.assertGreater(stats['hedge']['calls'], 0)
+        with self.assertRaises(RuntimeError):
+            client.executor.submit(print)
+
+    def test_max_attempts(self) -> None:
+        self.publish(1000).close()
+        stats: dict[str, Any] = run_worker(self.shard_dir, self.config, FakeLLM(error_rate=1.0), 'wrong', max_attempts=2)
+        self.assertEqual(MAX_SHARD_ATTEMPTS, stats['failed_shards'])
+        with self.assertRaises(ValueError):
+            merge_shards(self.shard_dir)
+        self.assertFalse(os.path.exists(self.murmur))
+
+    def test_errors(self) -> None:
+        """A worker that cannot reach the LLM gives up: its shard fails after MAX_SHARD_ATTEMPTS claims."""
+        self.publish(1000).close()
+        client: FakeLLM = FakeLLM(error=RuntimeError('connection reset'))
+        stats: dict[str, Any] = run_worker(self.shard_dir, self.config, client, 'offline', max_attempts=2, backoff=0.0)
+        self.assertEqual(MAX_SHARD_ATTEMPTS, stats['failed_shards'])
+        queue: ShardQueue = ShardQueue(self.shard_dir)
+        self.assertIn('connection reset', queue.errors()[0][1])
+        queue.close()
+
+    def test_invalid_key(self) -> None:
+        """An error that cannot be fixed by retrying fails the shard at once."""
+        self.publish(1000).close()
+        stats: dict[str, Any] = run_worker(self.shard_dir, self.config, FakeLLM(error=StatusError(401)), 'unauthorized', backoff=0.0)
+        self.assertEqual(MAX_SHARD_ATTEMPTS, stats['failed_shards'])
+        # No retry: at most one round of requests (2 requests) per claim
+        self.assertLessEqual(stats['requests'], MAX_SHARD_ATTEMPTS * 2)
+        queue: ShardQueue = ShardQueue(self.shard_dir)
+        self.assertIn('401', queue.errors()[0][1])
+        queue.close()
+
+    def test_index_dir(self) -> None:
+        self.config.index_dir = Path(WORK_DIR)
+        self.publish(50).close()
+        run_workers(self.shard_dir, self.config, workers=2, client=FakeLLM())
+        merge_shards(self.shard_dir, self.config)
+        self.assertEqual(b'Sharded secret', self.reveal())
+        self.assertEqual(1, len([name for name in os.listdir(WORK_DIR) if name.endswith('.index')]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@ from typing import Optional, List, Tuple
 import unittest
 import os
 import sys
+import sqlite3
 import tempfile
 
 # Set the Python search path...
@@ -13,7 +14,7 @@ SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
 INPUT_PATH: str = os.path.join(tempfile.gettempdir(), 'needle.txt')
 sys.path.insert(0, SEARCH_PATH)
 
-from whisper.stegano_db import SteganoDb, SentenceData
+from whisper.stegano_db import SteganoDb, SentenceData, INVALID_SENTENCES_QUERY
 
 def set_input_file(path: str, content: str) -> None:
     with open(path, 'w') as f:
@@ -142,6 +143,63 @@ class TestSteganoDb(unittest.TestCase):
             self.assertIsNone(sentence.reformulation)
 
 
+    def test_load_file_limit(self):
+        input: list[str] = ['This is a test.', 'And the rest...', 'The end.']
+        set_input_file(INPUT_PATH, "\n".join(input))
+        with SteganoDb(None) as db:
+            count = db.load_file(INPUT_PATH, 2)
+            self.assertEqual(count, 2)
+            self.assertEqual(len(db), 2)
+            self.assertEqual([str(s.sentence) for s in db.iter_sentences()], input[:2])
+        with SteganoDb(None) as db:
+            self.assertEqual(db.load_file(INPUT_PATH, 10), 3)
+            self.assertEqual([s.position for s in db.iter_sentences()], [0, 1, 2])
+
+
+    def test_words_count(self):
+        with SteganoDb(None) as db:
+            db.add_sentence('One two three.', 0)
+            db.add_sentence('One two.', 1)
+            db.add_sentence('One, two; three four.', 2)
+            db.add_sentence('One.', 3)
+            self.assertEqual([3, 2, 4, 1], [s.sentence_words for s in db.iter_sentences()])
+            db.set_prompt_by_position(0, 'prompt', 0)
+            db.set_prompt_by_position(1, 'prompt', 1)
+            db.set_prompt_by_position(2, 'prompt')
+            db.set_reformulation_by_position(3, 'One.', 1)
+            self.assertEqual([0, 1, 1, 1], [s.target_parity for s in db.iter_sentences()])
+            # No reformulation yet
+            self.assertEqual([0, 1, 2], [s.position for s in db.get_invalid_sentences()])
+            db.set_reformulation_by_position(0, 'One two three four.')
+            db.set_reformulation_by_position(1, 'One two, three four.')
+            db.set_reformulation_by_position(2, 'One two three.')
+            invalid: list[SentenceData] = db.get_invalid_sentences()
+            self.assertEqual([1], [s.position for s in invalid])
+            self.assertEqual(4, invalid[0].reformulation_words)
+            # The target is a remainder modulo 4
+            self.assertEqual([1, 2], [s.position for s in db.get_invalid_sentences(4)])
+
+    def test_validation_plan(self):
+        """The validation query scans the partial index of the sentences sent to the LLM."""
+        with SteganoDb() as db:
+            plan: str = ' '.join(row[3] for row in db.db.execute('EXPLAIN QUERY PLAN ' + INVALID_SENTENCES_QUERY, (2,)))
+            self.assertIn('t_validation', plan)
+
+    def test_upgrade(self):
+        db_path: str = os.path.join(tempfile.gettempdir(), 'stegano-db-v1.sqlite')
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        # A database created before the words counts were stored
+        connection: sqlite3.Connection = sqlite3.connect(db_path)
+        connection.execute('CREATE TABLE t ("idx" INTEGER PRIMARY KEY, "position" INTEGER NOT NULL, "sentence" TEXT NOT NULL, "prompt" TEXT DEFAULT NULL, "reformulation" TEXT DEFAULT NULL)')
+        connection.execute('INSERT INTO t ("position", "sentence", "prompt", "reformulation") VALUES (0, \'One two three.\', \'prompt\', \'One two.\')')
+        connection.execute('INSERT INTO t ("position", "sentence", "prompt", "reformulation") VALUES (1, \'One two.\', \'prompt\', \'One two three four.\')')
+        connection.commit()
+        connection.close()
+        with SteganoDb(db_path) as db:
+            self.assertEqual([(3, 2), (2, 4)], [(s.sentence_words, s.reformulation_words) for s in db.iter_sentences()])
+            self.assertEqual([1], [s.position for s in db.get_invalid_sentences()])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -154,6 +154,16 @@ class TestFileTool(unittest.TestCase):
         self.assertEqual(sentences[0], 'Sentence1 is first Is sentence2 second ?')
         self.assertEqual(sentences[1], "Sentence3 is next Test's is processed.")
         self.assertEqual(sentences[2], "Sentence3 is next Test's is processed...")
+    def test_read_lines_from_file_chunks(self):
+        inputs = ['Sentence1 is first.',
+                  'Is sentence2 second ?',
+                  'Sentence3 is next ...',
+                  "Test's is processed.",
+                  'This is a unit-test.']
+        set_input_file(INPUT_PATH, "\n".join(inputs))
+        for chunk_size in [1, 2, 7, 1000]:
+            sentences: list[str] = list(text_file_tool.read_sentences_from_file(INPUT_PATH, chunk_size))
+            self.assertEqual(sentences, inputs)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,272 @@
+# Usage:
+# python3 -m unittest -v test_whisperer.py
+
+from typing import Any, Optional
+import contextlib
+import io
+import shutil
+import signal
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# Set the Python search path...
+CURRENT_DIR=os.path.dirname(os.path.abspath(__file__))
+SEARCH_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'src'))
+BENCHMARKS_PATH=os.path.abspath(os.path.join(CURRENT_DIR, os.path.pardir, 'benchmarks'))
+WORK_DIR: str = os.path.join(tempfile.gettempdir(), 'whisperer')
+sys.path.insert(0, SEARCH_PATH)
+sys.path.insert(0, BENCHMARKS_PATH)
+
+from fake_llm import FakeLLM
+from whisper.configuration import HiderConfiguration
+from whisper.job import HideInterrupted
+from whisper.revealer import Revealer
+from whisper.whisperer import Hider
+from whisper.debug_archive import DebugArchive, ARCHIVE_NAME, PREPARED_CALL
+from whisper.post_dump import check_post_dump_lines
+
+class InterruptingLLM(FakeLLM):
+    """Interrupt the hider (as CTRL-C does) during the given call."""
+
+    def __init__(self, interrupt_after: int) -> None:
+        super().__init__()
+        self.hider: Optional[Hider] = None
+        self.interrupt_after: int = interrupt_after
+
+    def call(self, messages: list[dict[str, str]], response_format: Optional[dict[str, Any]] = None) -> str:
+        response: str = super().call(messages, response_format)
+        if self.hider is not None and self.calls == self.interrupt_after:
+            self.hider.interrupted = True
+        return response
+
+
+class TestHider(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.makedirs(WORK_DIR, exist_ok=True)
+        self.needle: str = os.path.join(WORK_DIR, 'needle.txt')
+        self.haystack: str = os.path.join(WORK_DIR, 'haystack.txt')
+        self.murmur: str = os.path.join(WORK_DIR, 'murmur.txt')
+        with open(self.needle, 'w') as f:
+            f.write('Hello, world!')
+        with open(self.haystack, 'w') as f:
+            for i in range(400):
+                f.write(' '.join(['word{}'.format(j) for j in range(3 + i % 5)]) + '. ')
+        self.config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, job_path=Path(WORK_DIR).joinpath('job'))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(WORK_DIR)
+
+    def reveal(self) -> bytes:
+        return Revealer(self.murmur, os.path.join(WORK_DIR, 'revealed.txt')).decode()
+
+    def test_hide(self):
+        client: FakeLLM = FakeLLM(failures={70, 71, 150})
+        hider: Hider = Hider(self.needle, self.haystack, self.murmur, self.config, client=client)
+        hider.hide()
+        hider.destroy()
+        self.assertEqual(b'Hello, world!', self.reveal())
+        with open(self.murmur, 'r') as f:
+            self.assertEqual(400, len(f.read().splitlines()))
+        # 2 requests (65 prompts or so), then 1 request to retry the failures
+        self.assertEqual(3, client.calls)
+
+    def prompted_positions(self, hider: Hider) -> list[int]:
+        """Return the positions of the sentences sent to the LLM."""
+        return [s.position for s, bit in zip(hider.stegano_db.iter_sentences(), hider.message_symbols) if s.sentence_words is not None and s.sentence_words % hider.modulus != bit]
+
+    def test_ecc(self):
+        config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, job_path=self.config.job_path, ecc=4)
+        client: FakeLLM = FakeLLM()
+        hider: Hider = Hider(self.needle, self.haystack, self.murmur, config, client=client)
+        # One wrong sentence in the length block, two wrong sentences in the same byte of the body: no retry
+        positions: list[int] = self.prompted_positions(hider)
+        header: list[int] = [p for p in positions if p < 8 * 12]
+        body: list[int] = [p for p in positions if p >= 8 * 12]
+        same_byte: list[int] = next([p, q] for p, q in zip(body, body[1:]) if p // 8 == q // 8)
+        client.failures = {header[0]} | set(same_byte)
+        with contextlib.redirect_stdout(io.StringIO()):
+            hider.hide()
+        requests_count: int = len(hider.requests_db)
+        hider.destroy()
+        self.assertEqual(set(), client.failures)
+        self.assertEqual(3, hider.accepted_errors)
+        self.assertEqual(requests_count, client.calls)
+        self.assertEqual(b'Hello, world!', Revealer(self.murmur, os.path.join(WORK_DIR, 'revealed.txt'), ecc=4).decode())
+
+    def test_ecc_retry(self):
+        config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, job_path=self.config.job_path, ecc=4)
+        client: FakeLLM = FakeLLM()
+        hider: Hider = Hider(self.needle, self.haystack, self.murmur, config, client=client)
+        # Three wrong bytes in the same block: the budget (2 bytes per block) is exceeded
+        positions: list[int] = self.prompted_positions(hider)
+        wrong: dict[int, int] = {}
+        for p in positions:
+            if p >= 8 * 12:
+                wrong.setdefault(p // 8, p)
+        client.failures = set(list(wrong.values())[:3])
+        with contextlib.redirect_stdout(io.StringIO()):
+            hider.hide()
+        hider.destroy()
+        self.assertEqual(set(), client.failures)
+        self.assertEqual(0, hider.accepted_errors)
+        self.assertEqual(b'Hello, world!', Revealer(self.murmur, os.path.join(WORK_DIR, 'revealed.txt'), ecc=4).decode())
+
+    def test_haystack_index(self):
+        config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, haystack_index=True)
+        for i in range(2):
+            hider: Hider = Hider(self.needle, self.haystack, self.murmur, config, client=FakeLLM())
+            self.assertIsNotNone(hider.index)
+            hider.hide()
+            hider.destroy()
+            self.assertEqual(b'Hello, world!', self.reveal())
+            with open(self.murmur, 'r') as f:
+                self.assertEqual(400, len(f.read().splitlines()))
+        self.assertTrue(os.path.exists(self.haystack + '.index'))
+
+    def test_bits_per_sentence(self):
+        config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, job_path=self.config.job_path, bits_per_sentence=3)
+        client: FakeLLM = FakeLLM()
+        hider: Hider = Hider(self.needle, self.haystack, self.murmur, config, client=client)
+        client.failures = set(self.prompted_positions(hider)[:2])
+        hider.hide()
+        hider.destroy()
+        self.assertEqual(set(), client.failures)
+        self.assertEqual(b'Hello, world!', Revealer(self.murmur, os.path.join(WORK_DIR, 'revealed.txt'), bits_per_sentence=3).decode())
+        self.assertEqual(b'Hello, world!', Revealer(self.murmur, os.path.join(WORK_DIR, 'revealed.txt'), fast=False, bits_per_sentence=3).decode())
+        # (64 + 13 * 8) bits, 3 bits per sentence
+        self.assertEqual(56, len(hider.message_symbols))
+
+    def test_cascade(self):
+        config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, job_path=self.config.job_path, model_cascade=['cheap', 'strong'])
+        cheap: FakeLLM = FakeLLM()
+        strong: FakeLLM = FakeLLM()
+        hider: Hider = Hider(self.needle, self.haystack, self.murmur, config, cascade_clients=[cheap, strong])
+        prompted: int = len(self.prompted_positions(hider))
+        failures: set[int] = set(self.prompted_positions(hider)[:3])
+        cheap.failures = set(failures)
+        with contextlib.redirect_stdout(io.StringIO()):
+            hider.hide()
+        hider.destroy()
+        self.assertEqual(b'Hello, world!', self.reveal())
+        # The failures of the cheap model are sent to the strong model, in one request
+        self.assertEqual(1, strong.calls)
+        self.assertEqual({p: 1 for p in failures}, {p: hider.cascade.tier_of(p) for p in failures})
+        report = hider.cascade.report()
+        self.assertEqual([prompted, 3], [t['sentences'] for t in report])
+        self.assertEqual([prompted - 3, 3], [t['successes'] for t in report])
+
+    def test_resume(self):
+        client: InterruptingLLM = InterruptingLLM(interrupt_after=1)
+        hider: Hider = Hider(self.needle, self.haystack, self.murmur, self.config, client=client)
+        client.hider = hider
+        with self.assertRaises(HideInterrupted):
+            hider.hide()
+        self.assertFalse(os.path.exists(self.murmur))
+
+        client = FakeLLM()
+        hider = Hider.resume(self.config, client)
+        hider.hide()
+        hider.destroy()
+        self.assertEqual(b'Hello, world!', self.reveal())
+        # Only the request that has not been processed is sent
+        self.assertEqual(1, client.calls)
+
+    def test_interrupt_without_job(self):
+        """Without a job directory, the SIGINT handler is not installed: CTRL-C aborts the hide."""
+        handlers: list[Any] = []
+
+        class SignalLLM(FakeLLM):
+            def call(self, messages: list[dict[str, str]], response_format: Optional[dict[str, Any]] = None) -> str:
+                handlers.append(signal.getsignal(signal.SIGINT))
+                return super().call(messages, response_format)
+
+        config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False)
+        hider: Hider = Hider(self.needle, self.haystack, self.murmur, config, client=SignalLLM())
+        hider.hide()
+        hider.destroy()
+        self.assertNotIn(hider.on_interrupt, handlers)
+        hider = Hider(self.needle, self.haystack, self.murmur, self.config, client=SignalLLM())
+        hider.hide()
+        hider.destroy()
+        self.assertIn(hider.on_interrupt, handlers)
+
+    def test_resume_encoding(self):
+        """A job is resumed with the number of bits per sentence and the ECC it has been created with."""
+        config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, job_path=self.config.job_path, bits_per_sentence=2, ecc=4)
+        client: InterruptingLLM = InterruptingLLM(interrupt_after=1)
+        hider: Hider = Hider(self.needle, self.haystack, self.murmur, config, client=client)
+        client.hider = hider
+        with self.assertRaises(HideInterrupted):
+            hider.hide()
+        with self.assertRaises(ValueError):
+            Hider.resume(HiderConfiguration('model', 'token', local_rewrite=False, job_path=self.config.job_path, bits_per_sentence=3))
+        # The values of the job are restored
+        hider = Hider.resume(self.config, FakeLLM())
+        self.assertEqual(2, hider.options.bits_per_sentence)
+        self.assertEqual(4, hider.options.ecc)
+        self.assertEqual(1, self.config.bits_per_sentence)
+        hider.hide()
+        hider.destroy()
+        self.assertEqual(b'Hello, world!', Revealer(self.murmur, os.path.join(WORK_DIR, 'revealed.txt'), ecc=4, bits_per_sentence=2).decode())
+
+    def test_local_rewrite(self):
+        """The local rewrites do not need the tokenizer: it is only used for the statistics of the verbose mode."""
+        with open(self.haystack, 'w') as f:
+            for i in range(400):
+                f.write('I do not know what {} is. '.format(' '.join(['word{}'.format(j) for j in range(1 + i % 2)])))
+        config: HiderConfiguration = HiderConfiguration('model', 'token', job_path=self.config.job_path)
+        with mock.patch.dict(sys.modules, {'tiktoken': None}):
+            hider: Hider = Hider(self.needle, self.haystack, self.murmur, config, client=FakeLLM())
+            hider.hide()
+        hider.destroy()
+        self.assertEqual(b'Hello, world!', self.reveal())
+        self.assertGreater(hider.local_rewrite_count, 0)
+        self.assertEqual(0, hider.local_rewrite_tokens_saved)
+
+    def test_haystack_too_small(self):
+        with open(self.haystack, 'w') as f:
+            f.write('Too short.')
+        with self.assertRaises(ValueError):
+            Hider(self.needle, self.haystack, self.murmur, self.config, client=FakeLLM())
+
+    def test_profile(self):
+        config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, job_path=self.config.job_path, profile=True)
+        hider: Hider = Hider(self.needle, self.haystack, self.murmur, config, client=FakeLLM())
+        hider.hide()
+        hider.destroy()
+        report = hider.profiler.report()
+        for stage in ('load_haystack', 'create_prompts', 'create_requests', 'call_llm', 'check_responses', 'write_murmur'):
+            self.assertIn(stage, report['stages'])
+        self.assertGreater(report['counters']['sqlite.stegano_db.commits'], 0)
+        self.assertEqual(os.path.getsize(self.murmur), report['counters']['murmur.bytes'])
+        self.assertEqual(report['counters']['llm.requests'], report['latencies']['llm_call']['count'])
+
+    def test_debug(self):
+        debug_path: Path = Path(WORK_DIR).joinpath('debug')
+        debug_path.mkdir()
+        config: HiderConfiguration = HiderConfiguration('model', 'token', local_rewrite=False, debug_path=debug_path)
+        hider: Hider = Hider(self.needle, self.haystack, self.murmur, config, client=FakeLLM(failures={70}))
+        with contextlib.redirect_stdout(io.StringIO()):
+            hider.hide()
+        prompts_count: int = hider.stegano_db.get_number_of_sentences_to_reformulate()
+        hider.destroy()
+        self.assertEqual(b'Hello, world!', self.reveal())
+        archive: DebugArchive = DebugArchive(str(debug_path.joinpath(ARCHIVE_NAME)), init=False)
+        calls: list[dict[str, int]] = archive.calls()
+        self.assertEqual([0, 1], [c['call'] for c in calls])
+        self.assertEqual(3, sum(c['responses'] for c in calls))
+        # One change per reformulation received (including the wrong one)
+        self.assertEqual(prompts_count + 1, sum(c['changes'] for c in calls))
+        # The snapshots: before the first call, with the wrong reformulation, and final
+        self.assertTrue(all(row[3] is None for row in archive.snapshot(PREPARED_CALL) if row[2] is not None))
+        self.assertEqual(['E'] + ['S'] * (prompts_count - 1), sorted(line[0] for line in check_post_dump_lines(archive.dump(0))))
+        self.assertEqual(['S'] * prompts_count, [line[0] for line in check_post_dump_lines(archive.dump())])
+        archive.close()
+
+if __name__ == '__main__':
+    unittest.main()